@@ -6,6 +6,7 @@ from msgq import fake_event_handle, drain_sock_raw
 import msgq
 
 import os
+import bisect
 import capnp
 import time
 
@@ -149,14 +150,51 @@ class FrequencyTracker:
     return self.min_freq <= avg_freq_recent <= self.max_freq
 
 
+class LatencyHistogram:
+  """Receive latencies, from logMonoTime to the SubMaster receive time, counted in exponentially growing buckets"""
+  def __init__(self, min_latency: float = 1e-4, n_buckets: int = 16):
+    # bucket i counts latencies below bucket_edges[i], the last one everything above
+    self.bucket_edges = [min_latency * 2**i for i in range(n_buckets - 1)]
+    self.counts = [0] * n_buckets
+    self.count = 0
+    self.max = 0.
+
+  def add(self, latency: float) -> None:
+    self.counts[bisect.bisect_right(self.bucket_edges, latency)] += 1
+    self.count += 1
+    if latency > self.max:
+      self.max = latency
+
+  def percentile(self, p: float) -> float:
+    """Upper bound of the p-th percentile latency, the edge of the bucket it falls in"""
+    if self.count == 0:
+      return 0.
+    target = p / 100. * self.count
+    total = 0
+    for i, c in enumerate(self.counts):
+      total += c
+      if total >= target and c > 0:
+        return min(self.bucket_edges[i], self.max) if i < len(self.bucket_edges) else self.max
+    return self.max
+
+  def reset(self) -> None:
+    self.counts = [0] * len(self.counts)
+    self.count = 0
+    self.max = 0.
+
+
 class SubMaster:
   def __init__(self, services: List[str], poll: Optional[str] = None,
                ignore_alive: Optional[List[str]] = None, ignore_avg_freq: Optional[List[str]] = None,
-               ignore_valid: Optional[List[str]] = None, addr: str = "127.0.0.1", frequency: Optional[float] = None):
+               ignore_valid: Optional[List[str]] = None, addr: str = "127.0.0.1", frequency: Optional[float] = None,
+               latency_histograms: bool = False):
     self.frame = -1
     self.services = services
     self.seen = {s: False for s in services}
+    # all state is kept in these dicts, updated in place only for the services that received a message.
+    # updated is the exception, every service is reset on each update, callers may set or replace it
     self.updated = {s: False for s in services}
+    self._not_updated = dict.fromkeys(services, False)
     self.recv_time = {s: 0. for s in services}
     self.recv_frame = {s: 0 for s in services}
     self.sock = {}
@@ -166,10 +204,18 @@ class SubMaster:
     # zero-frequency / on-demand services are always alive and presumed valid; all others must pass checks
     on_demand = {s: SERVICE_LIST[s].frequency <= 1e-5 for s in services}
     self.static_freq_services = set(s for s in services if not on_demand[s])
+    self._avg_freq_services = set(s for s in services if SERVICE_LIST[s].frequency > 0.99)
     self.alive = {s: on_demand[s] for s in services}
     self.freq_ok = {s: on_demand[s] for s in services}
     self.valid = {s: on_demand[s] for s in services}
 
+    # a service is no longer alive 10x its expected period after its last message. alive only needs
+    # to be checked for all services once the earliest of those deadlines has passed
+    self._alive_period = {s: 10. / SERVICE_LIST[s].frequency for s in self.static_freq_services}
+    self._next_alive_check = -float('inf')
+
+    self.latency: Dict[str, LatencyHistogram] = {s: LatencyHistogram() for s in services} if latency_histograms else {}
+
     self.freq_tracker: Dict[str, FrequencyTracker] = {}
     self.poller = Poller()
     polled_services = set([poll, ] if poll is not None else services)
@@ -201,7 +247,7 @@ class SubMaster:
     return self.data[s]
 
   def _check_avg_freq(self, s: str) -> bool:
-    return SERVICE_LIST[s].frequency > 0.99 and (s not in self.ignore_average_freq) and (s not in self.ignore_alive)
+    return s in self._avg_freq_services and (s not in self.ignore_average_freq) and (s not in self.ignore_alive)
 
   def update(self, timeout: int = 100) -> None:
     msgs = []
@@ -215,26 +261,46 @@ class SubMaster:
 
   def update_msgs(self, cur_time: float, msgs: List[capnp.lib.capnp._DynamicStructReader]) -> None:
     self.frame += 1
-    self.updated = dict.fromkeys(self.services, False)
+    updated = self.updated
+    updated.update(self._not_updated)
+
     for msg in msgs:
       if msg is None:
         continue
 
       s = msg.which()
+      log_mono_time = msg.logMonoTime
       self.seen[s] = True
-      self.updated[s] = True
+      updated[s] = True
 
-      self.freq_tracker[s].record_recv_time(cur_time)
+      freq_tracker = self.freq_tracker[s]
+      freq_tracker.record_recv_time(cur_time)
       self.recv_time[s] = cur_time
       self.recv_frame[s] = self.frame
       self.data[s] = getattr(msg, s)
-      self.logMonoTime[s] = msg.logMonoTime
+      self.logMonoTime[s] = log_mono_time
       self.valid[s] = msg.valid
-
-    for s in self.static_freq_services:
-      # alive if delay is within 10x the expected frequency; checks relaxed in simulator
-      self.alive[s] = (cur_time - self.recv_time[s]) < (10. / SERVICE_LIST[s].frequency) or (self.seen[s] and self.simulation)
-      self.freq_ok[s] = self.freq_tracker[s].valid or self.simulation
+      if self.latency:
+        self.latency[s].add(cur_time - log_mono_time * 1e-9)
+
+      # the frequency only changes when a message is received
+      if s in self.static_freq_services:
+        self.alive[s] = True
+        self.freq_ok[s] = freq_tracker.valid or self.simulation
+        self._next_alive_check = min(self._next_alive_check, cur_time + self._alive_period[s])
+
+    if self.frame == 0:
+      for s in self.static_freq_services:
+        self.freq_ok[s] = self.freq_tracker[s].valid or self.simulation
+
+    if cur_time >= self._next_alive_check:
+      self._next_alive_check = float('inf')
+      for s in self.static_freq_services:
+        # alive if delay is within 10x the expected frequency; checks relaxed in simulator
+        alive = (cur_time - self.recv_time[s]) < self._alive_period[s]
+        self.alive[s] = alive or (self.seen[s] and self.simulation)
+        if alive:
+          self._next_alive_check = min(self._next_alive_check, self.recv_time[s] + self._alive_period[s])
 
   def all_alive(self, service_list: Optional[List[str]] = None) -> bool:
     return all(self.alive[s] for s in (service_list or self.services) if s not in self.ignore_alive)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import time
+
+import cereal.messaging as messaging
+from cereal.services import SERVICE_LIST
+from openpilot.common.benchmark import benchmark_parser, format_times
+
+
+class FullUpdateSubMaster(messaging.SubMaster):
+  """Recomputes the state of every service on every update, like SubMaster did before the incremental updates"""
+  def update_msgs(self, cur_time, msgs):
+    self.frame += 1
+    self.updated = dict.fromkeys(self.services, False)
+    for msg in msgs:
+      if msg is None:
+        continue
+
+      s = msg.which()
+      self.seen[s] = True
+      self.updated[s] = True
+
+      self.freq_tracker[s].record_recv_time(cur_time)
+      self.recv_time[s] = cur_time
+      self.recv_frame[s] = self.frame
+      self.data[s] = getattr(msg, s)
+      self.logMonoTime[s] = msg.logMonoTime
+      self.valid[s] = msg.valid
+
+    for s in self.static_freq_services:
+      self.alive[s] = (cur_time - self.recv_time[s]) < (10. / SERVICE_LIST[s].frequency) or (self.seen[s] and self.simulation)
+      self.freq_ok[s] = self.freq_tracker[s].valid or self.simulation
+
+
+def benchmark(sm_cls, services, n_updates, **kwargs):
+  sm = sm_cls(services, frequency=100., **kwargs)
+  # every service sends at its own rate, the update loop runs at 100Hz
+  periods = {s: max(int(100 / SERVICE_LIST[s].frequency), 1) for s in services if SERVICE_LIST[s].frequency > 0}
+  msgs = {s: messaging.new_message(s).as_reader() for s in periods}
+  frames = [[msgs[s] for s, p in periods.items() if i % p == 0] for i in range(100)]
+
+  # without any new messages this is only the bookkeeping, the rest is mostly reading the capnp messages
+  results = []
+  for frame_msgs in (frames, [[]]):
+    times = []
+    for i in range(n_updates):
+      t = time.perf_counter()
+      sm.update_msgs(i * 0.01, frame_msgs[i % len(frame_msgs)])
+      sm.all_checks()
+      times.append(time.perf_counter() - t)
+    results.append(format_times(times))
+  return results
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark SubMaster.update_msgs and all_checks against the number of services")
+  parser.add_argument("-n", type=int, default=5000, help="number of updates")
+  parser.add_argument("--services", type=int, nargs="+", default=[5, 10, 20, 40])
+  args = parser.parse_args()
+
+  # list services need a size, skip them
+  all_services = [s for s in SERVICE_LIST if SERVICE_LIST[s].frequency > 0 and
+                  messaging.log.Event.schema.fields[s].proto.slot.type.which() == 'struct']
+  configs = {
+    "full update": (FullUpdateSubMaster, {}),
+    "incremental": (messaging.SubMaster, {}),
+    "incremental + latency": (messaging.SubMaster, {"latency_histograms": True}),
+  }
+  for n_services in args.services:
+    print(f"{n_services} services")
+    for name, (sm_cls, kwargs) in configs.items():
+      traffic, no_msgs = benchmark(sm_cls, all_services[:n_services], args.n, **kwargs)
+      print(f"  {name:>21}: {traffic} | no new messages: {no_msgs}")
@@ -98,7 +98,94 @@ class TestSubMaster:
           assert not sm._check_avg_freq(service)
 
   def test_alive(self):
-    pass
+    sm = messaging.SubMaster(["carState", "liveCalibration", "userBookmark"])
+    assert sm.alive["userBookmark"]
+
+    sm.update_msgs(100., [messaging.new_message("carState"), messaging.new_message("liveCalibration")])
+    assert sm.alive["carState"] and sm.alive["liveCalibration"]
+
+    # carState is 100Hz, liveCalibration 4Hz
+    sm.update_msgs(100.09, [])
+    assert sm.alive["carState"]
+    sm.update_msgs(100.11, [])
+    assert not sm.alive["carState"] and sm.alive["liveCalibration"]
+    sm.update_msgs(102.6, [])
+    assert not sm.alive["liveCalibration"]
+
+    sm.update_msgs(103., [messaging.new_message("carState")])
+    assert sm.alive["carState"] and not sm.alive["liveCalibration"]
+    assert sm.alive["userBookmark"]
+
+  def test_updated_set_by_caller(self):
+    services = ["carState", "modelV2", "liveCalibration"]
+    sm = messaging.SubMaster(services)
+    sm.update_msgs(100., [messaging.new_message("carState")])
+    assert sm.updated == {"carState": True, "modelV2": False, "liveCalibration": False}
+
+    # set in place, like mocked updates do
+    sm.updated["modelV2"] = True
+    sm.update_msgs(100.01, [messaging.new_message("liveCalibration")])
+    assert sm.updated == {"carState": False, "modelV2": False, "liveCalibration": True}
+
+    # replaced
+    sm.updated = dict.fromkeys(services, True)
+    sm.update_msgs(100.02, [])
+    assert not any(sm.updated.values())
+
+  def test_simulation_faster_than_real_time(self, monkeypatch):
+    # the lockstep sim bridge drives openpilot faster than real time
+    for simulation in (False, True):
+      monkeypatch.setenv("SIMULATION", str(int(simulation)))
+      sm = messaging.SubMaster(["carState"])
+      for i in range(200):
+        sm.update_msgs(100. + i * 0.002, [messaging.new_message("carState")])
+      assert sm.all_alive()
+      assert sm.all_freq_ok() == simulation
+
+  def test_incremental_update(self):
+    """The incremental bookkeeping matches recomputing everything for all services every update"""
+    services = ["carState", "modelV2", "liveCalibration", "carParams", "deviceState", "controlsState"]
+    for simulation in (False, True):
+      sm = messaging.SubMaster(services)
+      sm.simulation = simulation
+      ref_seen = dict.fromkeys(services, False)
+      ref_recv_time = dict.fromkeys(services, 0.)
+      ref_valid = dict(sm.valid)
+
+      cur_time = 0.
+      for _ in range(500):
+        cur_time += random.choice([0.01, 0.05, 1.])
+        msgs = [messaging.new_message(s, valid=random.random() > 0.1) for s in services if random.random() > 0.6]
+        sm.update_msgs(cur_time, msgs)
+
+        updated = {m.which() for m in msgs}
+        for m in msgs:
+          ref_seen[m.which()] = True
+          ref_recv_time[m.which()] = cur_time
+          ref_valid[m.which()] = m.valid
+        assert sm.updated == {s: s in updated for s in services}
+        for s in sm.static_freq_services:
+          assert sm.alive[s] == ((cur_time - ref_recv_time[s]) < (10. / SERVICE_LIST[s].frequency) or (ref_seen[s] and simulation)), s
+          assert sm.freq_ok[s] == (sm.freq_tracker[s].valid or simulation), s
+        assert sm.valid == ref_valid
+
+  def test_latency_histograms(self):
+    sm = messaging.SubMaster(["carState", "modelV2"])
+    assert sm.latency == {}
+
+    sm = messaging.SubMaster(["carState", "modelV2"], latency_histograms=True)
+    for i, latency in enumerate([0.5e-3] * 98 + [5e-3, 1.]):
+      msg = messaging.new_message("carState", logMonoTime=int((10 + i) * 1e9))
+      sm.update_msgs(10 + i + latency, [msg])
+
+    hist = sm.latency["carState"]
+    assert hist.count == 100 and sum(hist.counts) == 100
+    assert hist.percentile(50) == 0.8e-3
+    assert hist.percentile(99) == 6.4e-3
+    assert hist.percentile(100) == 1.
+    assert hist.max == 1.
+    assert sm.latency["modelV2"].count == 0
+    assert sm.latency["modelV2"].percentile(50) == 0.
 
   def test_ignore_alive(self):
     pass
@@ -0,0 +1,41 @@
+import argparse
+import time
+from collections.abc import Callable, Sequence
+import numpy as np
+
+# shared by the benchmark and profile scripts in the tests directories
+
+TIME_UNITS = (('s', 1.), ('ms', 1e3), ('us', 1e6), ('ns', 1e9))
+
+
+def benchmark_parser(description: str) -> argparse.ArgumentParser:
+  return argparse.ArgumentParser(description=description, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+
+def time_calls(fn: Callable[[], object], n: int) -> list[float]:
+  """Wall time of each of n calls of fn, in seconds"""
+  times = []
+  for _ in range(n):
+    t = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - t)
+  return times
+
+
+def format_time(t: float) -> str:
+  """A duration in seconds, in the largest unit it's at least 1 of"""
+  unit, scale = next(((u, s) for u, s in TIME_UNITS if abs(t) * s >= 1.), TIME_UNITS[-1])
+  return f"{t * scale:.1f} {unit}" if abs(t) * scale < 100. else f"{t * scale:.0f} {unit}"
+
+
+def format_times(times: Sequence[float], n_items: int | None = None, item: str = "item") -> str:
+  """Mean, p99 and max of times in seconds. With n_items, the total number of items processed
+  across all times, also the time per item"""
+  s = f"{format_time(float(np.mean(times)))} mean, {format_time(float(np.percentile(times, 99)))} p99, {format_time(float(np.max(times)))} max"
+  if n_items:
+    s += f", {format_time(float(np.sum(times)) / n_items)}/{item}"
+  return s
+
+
+def print_times(name: str, times: Sequence[float], n_items: int | None = None, item: str = "item") -> None:
+  print(f"{name}: {format_times(times, n_items, item)}")
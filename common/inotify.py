@@ -0,0 +1,107 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import NamedTuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyEvent(NamedTuple):
+  wd: int
+  mask: int
+  cookie: int
+  name: str
+
+
+def _load_libc():
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+  except (OSError, AttributeError):
+    return None
+
+_libc = _load_libc()
+
+
+def inotify_available() -> bool:
+  return _libc is not None
+
+
+class Inotify:
+  """Minimal ctypes wrapper around the Linux inotify API."""
+
+  def __init__(self):
+    if _libc is None:
+      raise OSError("inotify is not available on this platform")
+    self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.fd < 0:
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err))
+    self.poller = select.poll()
+    self.poller.register(self.fd, select.POLLIN)
+
+  def fileno(self) -> int:
+    return self.fd
+
+  def add_watch(self, path: str, mask: int) -> int:
+    wd = _libc.inotify_add_watch(self.fd, path.encode(), mask)
+    if wd < 0:
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err), path)
+    return wd
+
+  def rm_watch(self, wd: int) -> None:
+    _libc.inotify_rm_watch(self.fd, wd)
+
+  def read(self, timeout: float | None = None) -> list[InotifyEvent]:
+    """Wait up to timeout seconds (forever if None) and return all pending events."""
+    if not self.poller.poll(None if timeout is None else int(timeout * 1000)):
+      return []
+
+    events = []
+    while True:
+      try:
+        buf = os.read(self.fd, 64 * 1024)
+      except BlockingIOError:
+        break
+
+      offset = 0
+      while offset < len(buf):
+        wd, mask, cookie, length = EVENT_HEADER.unpack_from(buf, offset)
+        offset += EVENT_HEADER.size
+        name = buf[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+        offset += length
+        events.append(InotifyEvent(wd, mask, cookie, name))
+    return events
+
+  def close(self) -> None:
+    if self.fd >= 0:
+      os.close(self.fd)
+      self.fd = -1
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
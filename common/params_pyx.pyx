@@ -178,6 +178,15 @@ cdef class Params:
     cdef string key_bytes = ensure_bytes(key)
     return self.p.getParamPath(key_bytes).decode("utf-8")
 
+  def watch(self, keys, callback=None, bool poll=False):
+    """
+    Returns a ParamWatcher reporting changes to keys, either through
+    ParamWatcher.wait() or by calling callback with the set of changed keys.
+    """
+    from openpilot.common.params_watcher import ParamWatcher
+    keys = [self.check_key(k).decode("utf-8") for k in keys]
+    return ParamWatcher(self.get_param_path(), keys, callback=callback, poll=poll)
+
   def get_type(self, key):
     return self.p.getKeyType(self.check_key(key))
 
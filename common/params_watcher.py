@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+
+from openpilot.common.inotify import Inotify, inotify_available, IN_CLOSE_WRITE, IN_MOVED_TO, IN_MOVED_FROM, IN_CREATE, \
+                                     IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED
+from openpilot.common.swaglog import cloudlog
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+RESET_MASK = IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+
+
+class ParamWatcher:
+  """
+  Reports which of a set of params changed, without reading them.
+
+  Uses inotify on the params directory, so waiting costs nothing while no param
+  is written. Where inotify isn't available, falls back to comparing a stat() of
+  each watched key every poll_interval. Params are replaced atomically on write,
+  so any change shows up as a new inode. While the directory is gone, e.g. during
+  an atomic swap, it polls too, until the watch can be added again.
+
+  Usage:
+    with Params().watch(["IsMetric"]) as watcher:
+      while True:
+        if watcher.wait(timeout=1.):
+          is_metric = params.get_bool("IsMetric")
+
+  or, delivered on a background thread (pass queue.put to get a queue):
+    watcher = Params().watch(["IsMetric"], callback=on_change)
+  """
+
+  def __init__(self, path: str, keys: Iterable[str], callback: Callable[[set[str]], None] | None = None,
+               poll: bool = False, poll_interval: float = 0.1):
+    self.path = path
+    self.keys = frozenset(keys)
+    self.poll_interval = poll_interval
+
+    self.inotify: Inotify | None = None
+    self.watching = False
+    if not poll and inotify_available():
+      try:
+        self.inotify = Inotify()
+        self.inotify.add_watch(self.path, WATCH_MASK)
+        self.watching = True
+      except OSError:
+        # out of inotify instances or watches (EMFILE/ENOSPC), or no inotify at all (ENOSYS)
+        cloudlog.exception("params watcher: failed to set up inotify, falling back to polling")
+        if self.inotify is not None:
+          self.inotify.close()
+        self.inotify = None
+    self.signatures = {k: self._signature(k) for k in self.keys} if not self.watching else {}
+
+    self.callback_thread: threading.Thread | None = None
+    self.exit_event = threading.Event()
+    if callback is not None:
+      self.callback_thread = threading.Thread(target=self._callback_thread, args=(callback,), daemon=True)
+      self.callback_thread.start()
+
+  @property
+  def polling(self) -> bool:
+    return not self.watching
+
+  def _signature(self, key: str) -> tuple[int, int, int] | None:
+    try:
+      st = os.stat(os.path.join(self.path, key))
+      return st.st_ino, st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+      return None
+
+  def _poll_changes(self) -> set[str]:
+    changed = set()
+    for k in self.keys:
+      sig = self._signature(k)
+      if sig != self.signatures[k]:
+        self.signatures[k] = sig
+        changed.add(k)
+    return changed
+
+  def _inotify_changes(self, timeout: float | None) -> set[str]:
+    assert self.inotify is not None
+    changed = set()
+    for ev in self.inotify.read(timeout):
+      if ev.mask & RESET_MASK:
+        # queue overflowed or the directory went away (e.g. the prefix symlink was replaced)
+        cloudlog.warning(f"params watcher: reset on inotify event {ev.mask:#x}")
+        if ev.mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED) and not self._rewatch():
+          cloudlog.warning("params watcher: directory is gone, polling until it's back")
+          self.watching = False
+          self.signatures = {k: self._signature(k) for k in self.keys}
+        changed |= self.keys
+      elif ev.name in self.keys:
+        changed.add(ev.name)
+    return changed
+
+  def _rewatch(self) -> bool:
+    assert self.inotify is not None
+    try:
+      self.inotify.add_watch(self.path, WATCH_MASK)
+      return True
+    except OSError:
+      return False
+
+  def wait(self, timeout: float | None = None) -> set[str]:
+    """Block until at least one watched key changed or timeout expires. Returns the changed keys."""
+    if self.watching:
+      return self._inotify_changes(timeout)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not self.exit_event.is_set():
+      if self.inotify is not None and self._rewatch():
+        cloudlog.warning("params watcher: directory is back, watching it again")
+        self.watching = True
+        # the watch is in place before the last poll, so no change is missed in between
+        if changed := self._poll_changes():
+          return changed
+        return self._inotify_changes(None if deadline is None else max(deadline - time.monotonic(), 0.))
+      if changed := self._poll_changes():
+        return changed
+      remaining = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.monotonic())
+      if remaining <= 0:
+        break
+      self.exit_event.wait(remaining)
+    return set()
+
+  def _callback_thread(self, callback: Callable[[set[str]], None]) -> None:
+    while not self.exit_event.is_set():
+      changed = self.wait(timeout=self.poll_interval)
+      if changed and not self.exit_event.is_set():
+        callback(changed)
+
+  def close(self) -> None:
+    self.exit_event.set()
+    if self.callback_thread is not None and self.callback_thread is not threading.current_thread():
+      self.callback_thread.join()
+      self.callback_thread = None
+    if self.inotify is not None:
+      self.inotify.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
@@ -6,6 +6,7 @@ import time
 
 from setproctitle import getproctitle
 
+from openpilot.common.swaglog import cloudlog
 from openpilot.common.util import MovingAverage
 from openpilot.system.hardware import PC
 
@@ -16,6 +17,9 @@ DT_MDL = 0.05  # model
 DT_HW = 0.5  # hardwared and manager
 DT_DMON = 0.05  # driver monitoring
 
+TIMING_LOG_INTERVAL = 60.  # seconds between the ratekeeper_timing events of each process
+TIMING_BUCKETS = 20  # buckets of a tenth of the interval, the last one also counts everything above
+
 
 class Priority:
   # CORE 2
@@ -41,20 +45,49 @@ def config_realtime_process(cores: int | list[int], priority: int) -> None:
   set_core_affinity(c)
 
 
+class TimingHistogram:
+  """Durations counted in fixed buckets of a tenth of the loop interval"""
+  def __init__(self, interval: float, n_buckets: int = TIMING_BUCKETS) -> None:
+    self.bucket_width = interval / 10
+    self.counts = [0] * n_buckets
+    self.max = 0.
+
+  def add(self, dt: float) -> None:
+    self.counts[min(int(dt / self.bucket_width), len(self.counts) - 1)] += 1
+    if dt > self.max:
+      self.max = dt
+
+  def reset(self) -> None:
+    self.counts = [0] * len(self.counts)
+    self.max = 0.
+
+  def to_dict(self) -> dict:
+    return {"counts": self.counts, "max": round(self.max, 6)}
+
+
 class Ratekeeper:
-  def __init__(self, rate: float, print_delay_threshold: float | None = 0.0) -> None:
-    """Rate in Hz for ratekeeping. print_delay_threshold must be nonnegative."""
+  def __init__(self, rate: float, print_delay_threshold: float | None = 0.0, timing_log_interval: float | None = TIMING_LOG_INTERVAL) -> None:
+    """Rate in Hz for ratekeeping. print_delay_threshold must be nonnegative.
+    Every timing_log_interval seconds, histograms of the loop timing are logged in a ratekeeper_timing event."""
     self._interval = 1. / rate
     self._print_delay_threshold = print_delay_threshold
+    self._timing_log_interval = timing_log_interval
     self._frame = 0
     self._remaining = 0.0
     self._process_name = getproctitle()
     self._last_monitor_time = -1.
     self._next_frame_time = -1.
+    self._wake_time = -1.
+    self._last_timing_log_time = -1.
 
     self.avg_dt = MovingAverage(100)
     self.avg_dt.add_value(self._interval)
 
+    # period between loops, work time from waking up in keep_time to the next loop, and how late the loops end
+    self.period = TimingHistogram(self._interval)
+    self.work_time = TimingHistogram(self._interval)
+    self.overrun = TimingHistogram(self._interval)
+
   @property
   def frame(self) -> int:
     return self._frame
@@ -73,6 +106,7 @@ class Ratekeeper:
     lagged = self.monitor_time()
     if self._remaining > 0:
       time.sleep(self._remaining)
+    self._wake_time = time.monotonic()
     return lagged
 
   # Monitors the cumulative lag, but does not enforce a rate
@@ -80,6 +114,7 @@ class Ratekeeper:
     if self._last_monitor_time < 0:
       self._next_frame_time = time.monotonic() + self._interval
       self._last_monitor_time = time.monotonic()
+      self._last_timing_log_time = self._last_monitor_time
 
     prev = self._last_monitor_time
     self._last_monitor_time = time.monotonic()
@@ -91,6 +126,23 @@ class Ratekeeper:
     if self._print_delay_threshold is not None and remaining < -self._print_delay_threshold:
       print(f"{self._process_name} lagging by {-remaining * 1000:.2f} ms")
       lagged = True
+
+    if self._frame > 0:
+      self.period.add(self._last_monitor_time - prev)
+      # without keep_time, the whole period is work
+      self.work_time.add(self._last_monitor_time - max(prev, self._wake_time))
+      if remaining < 0:
+        self.overrun.add(-remaining)
+    if self._timing_log_interval is not None and self._last_monitor_time - self._last_timing_log_time >= self._timing_log_interval:
+      self.log_timing()
+
     self._frame += 1
     self._remaining = remaining
     return lagged
+
+  def log_timing(self) -> None:
+    cloudlog.event("ratekeeper_timing", process=self._process_name, interval=self._interval, bucket_width=self.period.bucket_width,
+                   frames=sum(self.period.counts), period=self.period.to_dict(), work_time=self.work_time.to_dict(), overrun=self.overrun.to_dict())
+    for h in (self.period, self.work_time, self.overrun):
+      h.reset()
+    self._last_timing_log_time = self._last_monitor_time
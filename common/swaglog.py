@@ -1,7 +1,11 @@
 import logging
+import multiprocessing.util
 import os
+import struct
+import threading
 import time
 import warnings
+import weakref
 from pathlib import Path
 from logging.handlers import BaseRotatingHandler
 
@@ -63,23 +67,82 @@ class SwaglogRotatingFileHandler(BaseRotatingHandler):
         if os.path.exists(to_delete): # just being safe, should always exist
           os.remove(to_delete)
 
+# A message on the swaglog socket is either a single record, its level as one byte followed
+# by the JSON record, or a batch of records starting with BATCH_MAGIC, which is never a level.
+# A batch has the sender's pid and its dropped records so far, then the length prefixed records.
+BATCH_MAGIC = 0xff
+BATCH_HEADER = struct.Struct("<BIQ")  # magic, pid, dropped records
+RECORD_HEADER = struct.Struct("<I")  # length
+
+
+def pack_batch(pid: int, dropped: int, records: list[bytes]) -> bytes:
+  return BATCH_HEADER.pack(BATCH_MAGIC, pid, dropped) + b''.join(RECORD_HEADER.pack(len(r)) + r for r in records)
+
+
+def unpack_batch(dat: bytes) -> tuple[int | None, int, list[bytes]]:
+  """Returns the pid, dropped records count and records of a message, single records have no pid"""
+  if not dat or dat[0] != BATCH_MAGIC:
+    return None, 0, [dat]
+
+  _, pid, dropped = BATCH_HEADER.unpack_from(dat)
+  records = []
+  offset = BATCH_HEADER.size
+  while offset < len(dat):
+    length, = RECORD_HEADER.unpack_from(dat, offset)
+    offset += RECORD_HEADER.size
+    records.append(dat[offset:offset + length])
+    offset += length
+  return pid, dropped, records
+
+
 class UnixDomainSocketHandler(logging.Handler):
-  def __init__(self, formatter):
+  """
+  Sends records to logmessaged in batches.
+
+  Records are buffered and sent once the batch reaches max_batch_bytes, or by a
+  background thread every flush_interval. Errors are sent right away, and so is
+  every record with a flush_interval of 0. Records that can't be sent because
+  logmessaged isn't keeping up are dropped and counted, the count goes out with
+  every batch.
+
+  The handler is closed, sending the buffer, by logging.shutdown at exit and
+  before multiprocessing children exit with os._exit. Processes that exit any
+  other way without running atexit handlers lose what's still buffered.
+  """
+
+  def __init__(self, formatter, flush_interval: float = 0.1, max_batch_bytes: int = 64 * 1024):
     logging.Handler.__init__(self)
     self.setFormatter(formatter)
+    self.flush_interval = flush_interval
+    self.max_batch_bytes = max_batch_bytes
     self.pid = None
 
     self.zctx = None
     self.sock = None
 
+    self.buffer: list[bytes] = []
+    self.buffer_bytes = 0
+    self.dropped = 0
+    self.flush_thread: threading.Thread | None = None
+    self.exit_event, self.pending = threading.Event(), threading.Event()
+    self.finalizer: multiprocessing.util.Finalize | None = None
+
   def __del__(self):
     self.close()
 
   def close(self):
-    if self.sock is not None:
-      self.sock.close()
-    if self.zctx is not None:
-      self.zctx.term()
+    self.exit_event.set()
+    self.pending.set()
+    with self.lock:
+      if self.sock is not None:
+        self.flush()
+        self.sock.close()
+        self.sock = None
+      if self.zctx is not None:
+        self.zctx.term()
+        self.zctx = None
+      self.flush_thread = None
+      self.pid = None
 
   def connect(self):
     self.zctx = zmq.Context()
@@ -88,6 +151,40 @@ class UnixDomainSocketHandler(logging.Handler):
     self.sock.connect(Paths.swaglog_ipc())
     self.pid = os.getpid()
 
+    # multiprocessing runs its finalizers before a child exits, atexit handlers aren't run there. They're
+    # cleared in a new child, so this is registered per process. closing waits up to the linger time for the sends
+    if self.finalizer is not None:
+      self.finalizer.cancel()
+    self.finalizer = multiprocessing.util.Finalize(self, _close_handler, args=(weakref.ref(self),), exitpriority=0)
+
+    # records buffered before a fork are the parent's to send
+    self.buffer.clear()
+    self.buffer_bytes = 0
+    self.dropped = 0
+    self.exit_event, self.pending = threading.Event(), threading.Event()
+    if self.flush_interval <= 0:
+      return
+    self.flush_thread = threading.Thread(target=self._flush_thread, args=(self.exit_event, self.pending), name="swaglog_flush", daemon=True)
+    self.flush_thread.start()
+
+  def _flush_thread(self, exit_event: threading.Event, pending: threading.Event):
+    # only wakes up while there are records to send
+    while pending.wait() and not exit_event.is_set():
+      exit_event.wait(self.flush_interval)
+      pending.clear()
+      self.flush()
+
+  def flush(self):
+    with self.lock:
+      if not self.buffer or self.sock is None or os.getpid() != self.pid:
+        return
+      records, self.buffer, self.buffer_bytes = self.buffer, [], 0
+      try:
+        self.sock.send(pack_batch(self.pid, self.dropped, records), zmq.NOBLOCK)
+      except zmq.error.Again:
+        # drop, and count it to send with the next batch
+        self.dropped += len(records)
+
   def emit(self, record):
     if os.getpid() != self.pid:
       # TODO suppresses warning about forking proc with zmq socket, fix root cause
@@ -95,13 +192,18 @@ class UnixDomainSocketHandler(logging.Handler):
       self.connect()
 
     msg = self.format(record).rstrip('\n')
-    # print("SEND".format(repr(msg)))
-    try:
-      s = chr(record.levelno)+msg
-      self.sock.send(s.encode('utf8'), zmq.NOBLOCK)
-    except zmq.error.Again:
-      # drop :/
-      pass
+    s = (chr(record.levelno)+msg).encode('utf8')
+    self.buffer.append(s)
+    self.buffer_bytes += len(s)
+    if self.flush_interval <= 0 or self.buffer_bytes >= self.max_batch_bytes or record.levelno >= logging.ERROR:
+      self.flush()
+    else:
+      self.pending.set()
+
+
+def _close_handler(ref: weakref.ref) -> None:
+  if (handler := ref()) is not None:
+    handler.close()
 
 
 class ForwardingHandler(logging.Handler):
@@ -137,7 +239,7 @@ elif print_level == 'info':
 elif print_level == 'warning':
   outhandler.setLevel(logging.WARNING)
 
-ipchandler = UnixDomainSocketHandler(SwagFormatter(log))
+ipchandler = UnixDomainSocketHandler(SwagFormatter(log), flush_interval=float(os.environ.get('SWAGLOG_FLUSH_INTERVAL', '0.1')))
 
 log.addHandler(outhandler)
 # logs are sent through IPC before writing to disk to prevent disk I/O blocking
@@ -0,0 +1,15 @@
+from openpilot.common.benchmark import format_time, format_times
+
+
+class TestBenchmark:
+  def test_format_time(self):
+    assert format_time(2.5) == "2.5 s"
+    assert format_time(0.0123) == "12.3 ms"
+    assert format_time(0.000456) == "456 us"
+    assert format_time(5e-9) == "5.0 ns"
+    assert format_time(0.) == "0.0 ns"
+
+  def test_format_times(self):
+    times = [0.001] * 98 + [0.002] * 2
+    assert format_times(times) == "1.0 ms mean, 2.0 ms p99, 2.0 ms max"
+    assert format_times(times, 1020, "row") == "1.0 ms mean, 2.0 ms p99, 2.0 ms max, 100 us/row"
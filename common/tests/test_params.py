@@ -139,3 +139,17 @@ class TestParams:
     now = datetime.datetime.now(datetime.UTC)
     self.params.put("InstallDate", now)
     assert self.params.get("InstallDate") == now
+
+  def test_params_watch(self):
+    self.params.remove("IsMetric")
+    with self.params.watch(["IsMetric", "ExperimentalMode"]) as watcher:
+      assert watcher.wait(timeout=0.1) == set()
+
+      self.params.put_bool("IsMetric", True)
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+
+      self.params.put("DongleId", "cb38263377b873ee")
+      assert watcher.wait(timeout=0.1) == set()
+
+    with pytest.raises(UnknownKeyName):
+      self.params.watch(["swag"])
@@ -0,0 +1,80 @@
+import os
+import queue
+import shutil
+import tempfile
+import pytest
+
+from openpilot.common.inotify import inotify_available
+from openpilot.common import params_watcher
+from openpilot.common.params_watcher import ParamWatcher
+
+
+def put(path, key, value):
+  # same as Params::put, write a temp file and rename it over the key
+  tmp = os.path.join(path, f".tmp_value_{key}")
+  with open(tmp, "wb") as f:
+    f.write(value)
+  os.rename(tmp, os.path.join(path, key))
+
+
+@pytest.mark.parametrize("poll", [True, False] if inotify_available() else [True])
+class TestParamWatcher:
+  def setup_method(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = self.tmpdir.name
+
+  def teardown_method(self):
+    self.tmpdir.cleanup()
+
+  def test_no_changes(self, poll):
+    put(self.path, "IsMetric", b"1")
+    with ParamWatcher(self.path, ["IsMetric"], poll=poll, poll_interval=0.01) as watcher:
+      assert watcher.polling == poll
+      assert watcher.wait(timeout=0.05) == set()
+
+  def test_put_and_remove(self, poll):
+    with ParamWatcher(self.path, ["IsMetric", "ExperimentalMode"], poll=poll, poll_interval=0.01) as watcher:
+      put(self.path, "IsMetric", b"1")
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+
+      put(self.path, "IsMetric", b"0")
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+
+      os.unlink(os.path.join(self.path, "IsMetric"))
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+
+  def test_directory_replaced(self, poll):
+    put(self.path, "IsMetric", b"1")
+    with ParamWatcher(self.path, ["IsMetric"], poll=poll, poll_interval=0.01) as watcher:
+      shutil.rmtree(self.path)
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+      assert watcher.polling
+
+      os.mkdir(self.path)
+      put(self.path, "IsMetric", b"0")
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+      assert watcher.polling == poll
+
+      put(self.path, "IsMetric", b"1")
+      assert watcher.wait(timeout=1) == {"IsMetric"}
+
+  def test_unwatched_keys_ignored(self, poll):
+    with ParamWatcher(self.path, ["IsMetric"], poll=poll, poll_interval=0.01) as watcher:
+      put(self.path, "DongleId", b"abc")
+      assert watcher.wait(timeout=0.05) == set()
+
+  def test_callback(self, poll):
+    q: queue.Queue = queue.Queue()
+    with ParamWatcher(self.path, ["IsMetric"], callback=q.put, poll=poll, poll_interval=0.01):
+      put(self.path, "IsMetric", b"1")
+      assert q.get(timeout=1) == {"IsMetric"}
+      assert q.empty()
+
+
+def test_inotify_unavailable(mocker):
+  mocker.patch.object(params_watcher, "inotify_available", return_value=True)
+  mocker.patch.object(params_watcher, "Inotify", side_effect=OSError(24, "Too many open files"))
+  with tempfile.TemporaryDirectory() as path, ParamWatcher(path, ["IsMetric"], poll_interval=0.01) as watcher:
+    assert watcher.polling
+    put(path, "IsMetric", b"1")
+    assert watcher.wait(timeout=1) == {"IsMetric"}
@@ -0,0 +1,54 @@
+from openpilot.common import realtime
+from openpilot.common.realtime import Ratekeeper
+
+
+class FakeTime:
+  def __init__(self):
+    self.t = 100.
+
+  def monotonic(self):
+    return self.t
+
+  def sleep(self, dt):
+    self.t += dt
+
+
+class TestRatekeeper:
+  def test_timing_histograms(self, mocker):
+    clock = FakeTime()
+    mocker.patch.object(realtime, "time", clock)
+    event = mocker.patch.object(realtime.cloudlog, "event")
+
+    rk = Ratekeeper(100, print_delay_threshold=None, timing_log_interval=None)
+    for i in range(101):
+      # every tenth loop works 15.5 ms and overruns by 5.5 ms
+      clock.sleep(0.0155 if i % 10 == 9 else 0.0025)
+      rk.keep_time()
+
+    # the first loop only starts the clock
+    assert sum(rk.period.counts) == 100
+    assert rk.work_time.counts[2] == 90 and rk.work_time.counts[15] == 10
+    assert sum(rk.overrun.counts) == 10 and rk.overrun.counts[5] == 10
+    assert abs(rk.overrun.max - 0.0055) < 1e-9
+    # overrunning loops are over twice the interval after the previous one, the next loops don't sleep to catch up
+    assert rk.period.counts[-1] == 10 and rk.period.counts[2] == 10
+    assert rk.period.counts[10] >= 70
+    event.assert_not_called()
+
+  def test_timing_log(self, mocker):
+    clock = FakeTime()
+    mocker.patch.object(realtime, "time", clock)
+    event = mocker.patch.object(realtime.cloudlog, "event")
+
+    rk = Ratekeeper(20, print_delay_threshold=None, timing_log_interval=0.99)
+    for _ in range(41):
+      clock.sleep(0.0125)
+      rk.keep_time()
+
+    assert event.call_count == 2
+    name, kwargs = event.call_args_list[0].args[0], event.call_args_list[0].kwargs
+    assert name == "ratekeeper_timing"
+    assert kwargs["interval"] == 0.05 and kwargs["frames"] == 20
+    assert kwargs["work_time"]["counts"][2] == 20
+    # reset after each event
+    assert sum(rk.period.counts) == 0
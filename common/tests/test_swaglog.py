@@ -0,0 +1,142 @@
+import json
+import logging
+import multiprocessing
+import time
+
+import pytest
+import zmq
+
+from openpilot.common.logging_extra import SwagFormatter, SwagLogger
+from openpilot.common.swaglog import UnixDomainSocketHandler, pack_batch, unpack_batch
+from openpilot.system.hardware.hw import Paths
+from openpilot.system.logmessaged import DroppedRecords
+
+
+class FailingSocket:
+  def send(self, dat, flags=0):
+    raise zmq.error.Again
+
+
+class TestSwaglogBatching:
+  @pytest.fixture(autouse=True)
+  def setup(self, tmp_path, monkeypatch):
+    monkeypatch.setattr(Paths, "swaglog_ipc", staticmethod(lambda: f"ipc://{tmp_path}/logmessage"))
+    self.ctx = zmq.Context()
+    self.sock = self.ctx.socket(zmq.PULL)
+    self.sock.bind(Paths.swaglog_ipc())
+    self.log = SwagLogger()
+    self.log.setLevel(logging.DEBUG)
+    yield
+    for h in self.log.handlers:
+      h.close()
+    self.sock.close()
+    self.ctx.term()
+
+  def _handler(self, **kwargs) -> UnixDomainSocketHandler:
+    handler = UnixDomainSocketHandler(SwagFormatter(self.log), **kwargs)
+    self.log.addHandler(handler)
+    return handler
+
+  def _recv(self, timeout: float = 1.) -> list[tuple[int | None, int, list[bytes]]]:
+    batches = []
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+      if self.sock.poll(10):
+        batches.append(unpack_batch(self.sock.recv()))
+      elif batches:
+        break
+    return batches
+
+  def test_pack_batch(self):
+    records = [b"\x14{}", b"\x28" + b"a" * 1000, b""]
+    assert unpack_batch(pack_batch(123, 4, records)) == (123, 4, records)
+    assert unpack_batch(pack_batch(1, 0, [])) == (1, 0, [])
+
+    # single records from the C++ swaglog
+    assert unpack_batch(b"\x0a{}") == (None, 0, [b"\x0a{}"])
+
+  def test_batched(self):
+    self._handler(flush_interval=0.1)
+    for i in range(100):
+      self.log.info(f"msg {i}")
+
+    batches = self._recv()
+    assert 1 <= len(batches) < 10
+    records = [r for _, _, rs in batches for r in rs]
+    assert [json.loads(r[1:])['msg'] for r in records] == [f"msg {i}" for i in range(100)]
+    assert all(r[0] == logging.INFO for r in records)
+    assert all(pid is not None and dropped == 0 for pid, dropped, _ in batches)
+
+  def test_flush_on_size(self):
+    self._handler(flush_interval=100, max_batch_bytes=10 * 1024)
+    for _ in range(10):
+      self.log.info("a" * 3 * 1024)
+    batches = self._recv()
+    assert len(batches) == 3
+    assert [len(rs) for _, _, rs in batches] == [3, 3, 3]
+
+  def test_flush_on_error(self):
+    self._handler(flush_interval=100)
+    self.log.info("info")
+    self.log.error("error")
+    batches = self._recv()
+    assert len(batches) == 1
+    assert [json.loads(r[1:])['msg'] for r in batches[0][2]] == ["info", "error"]
+
+  def test_flush_on_close(self):
+    handler = self._handler(flush_interval=100)
+    self.log.info("info")
+    handler.close()
+    assert len(self._recv()) == 1
+
+  def test_dropped(self):
+    handler = self._handler(flush_interval=100)
+    self.log.info("first")
+
+    sock, handler.sock = handler.sock, FailingSocket()
+    try:
+      for i in range(3):
+        self.log.error(f"dropped {i}")
+    finally:
+      handler.sock = sock
+    # along with the buffered record
+    assert handler.dropped == 4
+
+    self.log.error("after")
+    batches = self._recv()
+    assert len(batches) == 1
+    pid, dropped, records = batches[0]
+    assert dropped == 4
+    assert [json.loads(r[1:])['msg'] for r in records] == ["after"]
+
+    dropped_records = DroppedRecords()
+    warning = dropped_records.update(pid, dropped)
+    assert warning is not None and warning[0] == logging.WARNING
+    assert json.loads(warning[1:])['msg'] == {'event': 'swaglog_dropped', 'pid': pid, 'dropped': 4, 'total': 4}
+    assert dropped_records.update(pid, dropped) is None
+    assert json.loads(dropped_records.update(pid, 6)[1:])['msg']['dropped'] == 2
+
+  def _child(self, target) -> int | None:
+    p = multiprocessing.get_context("fork").Process(target=target)
+    p.start()
+    p.join(5)
+    return p.exitcode
+
+  def test_flush_in_child(self):
+    self._handler(flush_interval=100)
+    self.log.info("parent")
+    assert len(self._recv()) == 0
+
+    # multiprocessing children exit with os._exit once the target returns
+    assert self._child(lambda: self.log.info("child")) == 0
+    batches = self._recv()
+    assert len(batches) == 1
+    assert [json.loads(r[1:])['msg'] for r in batches[0][2]] == ["child"]
+
+  def test_unbuffered(self):
+    handler = self._handler(flush_interval=0)
+    for i in range(3):
+      self.log.info(f"msg {i}")
+    assert handler.flush_thread is None
+    batches = self._recv()
+    assert [len(rs) for _, _, rs in batches] == [1, 1, 1]
@@ -1,14 +1,14 @@
 import numpy as np
 from collections.abc import Callable
 
-from openpilot.common.transformations.transformations import (ecef_euler_from_ned_single,
-                                                    euler2quat_single,
-                                                    euler2rot_single,
-                                                    ned_euler_from_ecef_single,
-                                                    quat2euler_single,
-                                                    quat2rot_single,
-                                                    rot2euler_single,
-                                                    rot2quat_single)
+from openpilot.common.transformations.transformations import (ecef_euler_from_ned_batch,
+                                                    euler2quat_batch,
+                                                    euler2rot_batch,
+                                                    ned_euler_from_ecef_batch,
+                                                    quat2euler_batch,
+                                                    quat2rot_batch,
+                                                    rot2euler_batch,
+                                                    rot2quat_batch)
 
 
 def numpy_wrap(function, input_shape, output_shape) -> Callable[..., np.ndarray]:
@@ -33,14 +33,34 @@ def numpy_wrap(function, input_shape, output_shape) -> Callable[..., np.ndarray]
   return f
 
 
-euler2quat = numpy_wrap(euler2quat_single, (3,), (4,))
-quat2euler = numpy_wrap(quat2euler_single, (4,), (3,))
-quat2rot = numpy_wrap(quat2rot_single, (4,), (3, 3))
-rot2quat = numpy_wrap(rot2quat_single, (3, 3), (4,))
-euler2rot = numpy_wrap(euler2rot_single, (3,), (3, 3))
-rot2euler = numpy_wrap(rot2euler_single, (3, 3), (3,))
-ecef_euler_from_ned = numpy_wrap(ecef_euler_from_ned_single, (3,), (3,))
-ned_euler_from_ecef = numpy_wrap(ned_euler_from_ecef_single, (3,), (3,))
+def numpy_wrap_batch(function, input_shape, output_shape) -> Callable[..., np.ndarray]:
+  """Wrap a function on a contiguous (N,) + input_shape array to take either an input or an array of inputs and return the correct shape"""
+  def f(*inps):
+    *args, inp = inps
+    inp = np.asarray(inp, dtype=np.float64)
+    batch_shape = inp.shape[:inp.ndim - len(input_shape)]
+    assert inp.shape[len(batch_shape):] == input_shape
+    result = function(*args, np.ascontiguousarray(inp.reshape((-1,) + input_shape)))
+    return result.reshape(batch_shape + output_shape)
+  return f
+
+
+def ecef_init_wrap(function) -> Callable[..., np.ndarray]:
+  """Like numpy_wrap_batch, with an ecef_init for all the poses or one per pose"""
+  wrapped = numpy_wrap_batch(function, (3,), (3,))
+  def f(ecef_init, pose):
+    return wrapped(np.ascontiguousarray(np.reshape(ecef_init, (-1, 3)), dtype=np.float64), pose)
+  return f
+
+
+euler2quat = numpy_wrap_batch(euler2quat_batch, (3,), (4,))
+quat2euler = numpy_wrap_batch(quat2euler_batch, (4,), (3,))
+quat2rot = numpy_wrap_batch(quat2rot_batch, (4,), (3, 3))
+rot2quat = numpy_wrap_batch(rot2quat_batch, (3, 3), (4,))
+euler2rot = numpy_wrap_batch(euler2rot_batch, (3,), (3, 3))
+rot2euler = numpy_wrap_batch(rot2euler_batch, (3, 3), (3,))
+ecef_euler_from_ned = ecef_init_wrap(ecef_euler_from_ned_batch)
+ned_euler_from_ecef = ecef_init_wrap(ned_euler_from_ecef_batch)
 
 quats_from_rotations = rot2quat
 quat_from_rot = rot2quat
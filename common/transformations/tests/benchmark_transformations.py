@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+from functools import partial
+import numpy as np
+
+from openpilot.common.benchmark import benchmark_parser, print_times, time_calls
+import openpilot.common.transformations.coordinates as coord
+import openpilot.common.transformations.orientation as orient
+from openpilot.common.transformations import transformations as t
+
+
+def benchmark(n_rows: int, n_iters: int):
+  rng = np.random.default_rng(0)
+  eulers = rng.uniform(-np.pi, np.pi, (n_rows, 3))
+  quats = orient.euler2quat(eulers)
+  rots = orient.euler2rot(eulers)
+  geodetic = np.column_stack([rng.uniform(37., 38., n_rows), rng.uniform(-123., -122., n_rows), rng.uniform(0., 100., n_rows)])
+  ecef = coord.geodetic2ecef(geodetic)
+  lc = coord.LocalCoord.from_geodetic(geodetic[0])
+
+  # the per row wrappers, like before the batched kernels
+  single = {
+    'euler2quat': (orient.numpy_wrap(t.euler2quat_single, (3,), (4,)), orient.euler2quat, eulers),
+    'quat2euler': (orient.numpy_wrap(t.quat2euler_single, (4,), (3,)), orient.quat2euler, quats),
+    'quat2rot': (orient.numpy_wrap(t.quat2rot_single, (4,), (3, 3)), orient.quat2rot, quats),
+    'rot2quat': (orient.numpy_wrap(t.rot2quat_single, (3, 3), (4,)), orient.rot2quat, rots),
+    'euler2rot': (orient.numpy_wrap(t.euler2rot_single, (3,), (3, 3)), orient.euler2rot, eulers),
+    'rot2euler': (orient.numpy_wrap(t.rot2euler_single, (3, 3), (3,)), orient.rot2euler, rots),
+    'geodetic2ecef': (orient.numpy_wrap(t.geodetic2ecef_single, (3,), (3,)), coord.geodetic2ecef, geodetic),
+    'ecef2geodetic': (orient.numpy_wrap(t.ecef2geodetic_single, (3,), (3,)), coord.ecef2geodetic, ecef),
+    'LocalCoord.ecef2ned': (lambda x: orient.numpy_wrap(t.LocalCoord.ecef2ned_single, (3,), (3,))(lc, x), lc.ecef2ned, ecef),
+    'LocalCoord.ned2geodetic': (lambda x: orient.numpy_wrap(t.LocalCoord.ned2geodetic_single, (3,), (3,))(lc, x), lc.ned2geodetic, ecef - ecef[0]),
+  }
+  for name, (per_row, batched, inp) in single.items():
+    np.testing.assert_allclose(per_row(inp), batched(inp), rtol=1e-12, atol=1e-12)
+    for label, fn in (("per row", per_row), ("batched", batched)):
+      print_times(f"{name:>24} {label}", time_calls(partial(fn, inp), n_iters), n_rows * n_iters, "row")
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the batched transformations against the per row wrappers")
+  parser.add_argument("-n", type=int, default=100000, help="rows per call")
+  parser.add_argument("--iters", type=int, default=5)
+  args = parser.parse_args()
+  benchmark(args.n, args.iters)
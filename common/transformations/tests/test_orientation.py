@@ -2,7 +2,10 @@ import numpy as np
 
 from openpilot.common.transformations.orientation import euler2quat, quat2euler, euler2rot, rot2euler, \
                                                rot2quat, quat2rot, \
-                                               ned_euler_from_ecef
+                                               ned_euler_from_ecef, ecef_euler_from_ned
+from openpilot.common.transformations.transformations import euler2quat_single, quat2euler_single, euler2rot_single, \
+                                               rot2euler_single, rot2quat_single, quat2rot_single, \
+                                               ned_euler_from_ecef_single, ecef_euler_from_ned_single
 
 eulers = np.array([[ 1.46520501,  2.78688383,  2.92780854],
        [ 4.86909526,  3.60618161,  4.30648981],
@@ -58,4 +61,26 @@ class TestOrientation:
     for i in range(len(eulers)):
       np.testing.assert_allclose(ned_eulers[i], ned_euler_from_ecef(ecef_positions[i], eulers[i]), rtol=1e-7)
       #np.testing.assert_allclose(eulers[i], ecef_euler_from_ned(ecef_positions[i], ned_eulers[i]), rtol=1e-7)
-    # np.testing.assert_allclose(ned_eulers, ned_euler_from_ecef(ecef_positions, eulers), rtol=1e-7)
+    np.testing.assert_allclose(ned_eulers, ned_euler_from_ecef(ecef_positions, eulers), rtol=1e-7)
+
+  def test_batch_matches_single(self):
+    rng = np.random.default_rng(0)
+    e = rng.uniform(-np.pi, np.pi, (100, 3))
+    q = euler2quat(e)
+    r = euler2rot(e)
+    ecef = ecef_positions[rng.integers(len(ecef_positions), size=100)]
+    for fn, single, inp in ((euler2quat, euler2quat_single, e), (quat2euler, quat2euler_single, q), (euler2rot, euler2rot_single, e),
+                            (rot2euler, rot2euler_single, r), (rot2quat, rot2quat_single, r), (quat2rot, quat2rot_single, q)):
+      np.testing.assert_allclose(fn(inp), [single(i) for i in inp], rtol=1e-12, atol=1e-15)
+    for fn, single in ((ned_euler_from_ecef, ned_euler_from_ecef_single), (ecef_euler_from_ned, ecef_euler_from_ned_single)):
+      np.testing.assert_allclose(fn(ecef[0], e), [single(ecef[0], i) for i in e], rtol=1e-12, atol=1e-15)
+      np.testing.assert_allclose(fn(ecef, e), [single(p, i) for p, i in zip(ecef, e, strict=True)], rtol=1e-12, atol=1e-15)
+
+  def test_batch_shapes(self):
+    assert euler2quat(eulers[0]).shape == (4,)
+    assert euler2rot(eulers).shape == (5, 3, 3)
+    assert euler2rot(np.stack([eulers, eulers])).shape == (2, 5, 3, 3)
+    assert rot2quat(np.zeros((0, 3, 3))).shape == (0, 4)
+    # non contiguous and integer inputs
+    np.testing.assert_allclose(quat2rot(quats.T.copy().T), quat2rot(quats))
+    np.testing.assert_allclose(euler2quat([[0, 0, 0]]), [[1., 0., 0., 0.]])
@@ -17,6 +17,7 @@ from openpilot.common.transformations.transformations cimport ecef2geodetic as e
 from openpilot.common.transformations.transformations cimport LocalCoord_c
 
 
+cimport cython
 import numpy as np
 cimport numpy as np
 
@@ -111,6 +112,158 @@ def ecef2geodetic_single(ecef):
     return [g.lat, g.lon, g.alt]
 
 
+# *** batched kernels, on contiguous (N, 3), (N, 4) and (N, 3, 3) float64 arrays ***
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Matrix3 row2matrix(const double[:, :, ::1] m, Py_ssize_t i):
+    # Matrix3(double*) is column major
+    cdef double buf[9]
+    cdef int j, k
+    for j in range(3):
+        for k in range(3):
+            buf[k*3 + j] = m[i, j, k]
+    return Matrix3(buf)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void matrix2row(Matrix3 m, double[:, :, ::1] out, Py_ssize_t i):
+    cdef int j, k
+    for j in range(3):
+        for k in range(3):
+            out[i, j, k] = m(j, k)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def euler2quat_batch(const double[:, ::1] euler):
+    cdef Py_ssize_t i, n = euler.shape[0]
+    out = np.empty((n, 4))
+    cdef double[:, ::1] o = out
+    cdef Quaternion q
+    for i in range(n):
+        q = euler2quat_c(Vector3(euler[i, 0], euler[i, 1], euler[i, 2]))
+        o[i, 0], o[i, 1], o[i, 2], o[i, 3] = q.w(), q.x(), q.y(), q.z()
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def quat2euler_batch(const double[:, ::1] quat):
+    cdef Py_ssize_t i, n = quat.shape[0]
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef Vector3 e
+    for i in range(n):
+        e = quat2euler_c(Quaternion(quat[i, 0], quat[i, 1], quat[i, 2], quat[i, 3]))
+        o[i, 0], o[i, 1], o[i, 2] = e(0), e(1), e(2)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def quat2rot_batch(const double[:, ::1] quat):
+    cdef Py_ssize_t i, n = quat.shape[0]
+    out = np.empty((n, 3, 3))
+    cdef double[:, :, ::1] o = out
+    for i in range(n):
+        matrix2row(quat2rot_c(Quaternion(quat[i, 0], quat[i, 1], quat[i, 2], quat[i, 3])), o, i)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def rot2quat_batch(const double[:, :, ::1] rot):
+    cdef Py_ssize_t i, n = rot.shape[0]
+    out = np.empty((n, 4))
+    cdef double[:, ::1] o = out
+    cdef Quaternion q
+    for i in range(n):
+        q = rot2quat_c(row2matrix(rot, i))
+        o[i, 0], o[i, 1], o[i, 2], o[i, 3] = q.w(), q.x(), q.y(), q.z()
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def euler2rot_batch(const double[:, ::1] euler):
+    cdef Py_ssize_t i, n = euler.shape[0]
+    out = np.empty((n, 3, 3))
+    cdef double[:, :, ::1] o = out
+    for i in range(n):
+        matrix2row(euler2rot_c(Vector3(euler[i, 0], euler[i, 1], euler[i, 2])), o, i)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def rot2euler_batch(const double[:, :, ::1] rot):
+    cdef Py_ssize_t i, n = rot.shape[0]
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef Vector3 e
+    for i in range(n):
+        e = rot2euler_c(row2matrix(rot, i))
+        o[i, 0], o[i, 1], o[i, 2] = e(0), e(1), e(2)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def ecef_euler_from_ned_batch(const double[:, ::1] ecef_init, const double[:, ::1] ned_pose):
+    # ecef_init is a single row for all poses, or a row per pose
+    cdef Py_ssize_t i, n = ned_pose.shape[0]
+    cdef Py_ssize_t init_step = 0 if ecef_init.shape[0] == 1 else 1
+    assert ecef_init.shape[0] == 1 or ecef_init.shape[0] == n
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef ECEF init
+    cdef Vector3 e
+    for i in range(n):
+        init.x, init.y, init.z = ecef_init[i*init_step, 0], ecef_init[i*init_step, 1], ecef_init[i*init_step, 2]
+        e = ecef_euler_from_ned_c(init, Vector3(ned_pose[i, 0], ned_pose[i, 1], ned_pose[i, 2]))
+        o[i, 0], o[i, 1], o[i, 2] = e(0), e(1), e(2)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def ned_euler_from_ecef_batch(const double[:, ::1] ecef_init, const double[:, ::1] ecef_pose):
+    # ecef_init is a single row for all poses, or a row per pose
+    cdef Py_ssize_t i, n = ecef_pose.shape[0]
+    cdef Py_ssize_t init_step = 0 if ecef_init.shape[0] == 1 else 1
+    assert ecef_init.shape[0] == 1 or ecef_init.shape[0] == n
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef ECEF init
+    cdef Vector3 e
+    for i in range(n):
+        init.x, init.y, init.z = ecef_init[i*init_step, 0], ecef_init[i*init_step, 1], ecef_init[i*init_step, 2]
+        e = ned_euler_from_ecef_c(init, Vector3(ecef_pose[i, 0], ecef_pose[i, 1], ecef_pose[i, 2]))
+        o[i, 0], o[i, 1], o[i, 2] = e(0), e(1), e(2)
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def geodetic2ecef_batch(const double[:, ::1] geodetic):
+    cdef Py_ssize_t i, n = geodetic.shape[0]
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef Geodetic g
+    cdef ECEF e
+    for i in range(n):
+        g.lat, g.lon, g.alt = geodetic[i, 0], geodetic[i, 1], geodetic[i, 2]
+        e = geodetic2ecef_c(g)
+        o[i, 0], o[i, 1], o[i, 2] = e.x, e.y, e.z
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def ecef2geodetic_batch(const double[:, ::1] ecef):
+    cdef Py_ssize_t i, n = ecef.shape[0]
+    out = np.empty((n, 3))
+    cdef double[:, ::1] o = out
+    cdef ECEF e
+    cdef Geodetic g
+    for i in range(n):
+        e.x, e.y, e.z = ecef[i, 0], ecef[i, 1], ecef[i, 2]
+        g = ecef2geodetic_c(e)
+        o[i, 0], o[i, 1], o[i, 2] = g.lat, g.lon, g.alt
+    return out
+
+
 cdef class LocalCoord:
     cdef LocalCoord_c * lc
 
@@ -169,5 +322,65 @@ cdef class LocalCoord:
         cdef Geodetic g = self.lc.ned2geodetic(n)
         return [g.lat, g.lon, g.alt]
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def ecef2ned_batch(self, const double[:, ::1] ecef):
+        assert self.lc
+        cdef Py_ssize_t i, n = ecef.shape[0]
+        out = np.empty((n, 3))
+        cdef double[:, ::1] o = out
+        cdef ECEF e
+        cdef NED r
+        for i in range(n):
+            e.x, e.y, e.z = ecef[i, 0], ecef[i, 1], ecef[i, 2]
+            r = self.lc.ecef2ned(e)
+            o[i, 0], o[i, 1], o[i, 2] = r.n, r.e, r.d
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def ned2ecef_batch(self, const double[:, ::1] ned):
+        assert self.lc
+        cdef Py_ssize_t i, n = ned.shape[0]
+        out = np.empty((n, 3))
+        cdef double[:, ::1] o = out
+        cdef NED d
+        cdef ECEF r
+        for i in range(n):
+            d.n, d.e, d.d = ned[i, 0], ned[i, 1], ned[i, 2]
+            r = self.lc.ned2ecef(d)
+            o[i, 0], o[i, 1], o[i, 2] = r.x, r.y, r.z
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def geodetic2ned_batch(self, const double[:, ::1] geodetic):
+        assert self.lc
+        cdef Py_ssize_t i, n = geodetic.shape[0]
+        out = np.empty((n, 3))
+        cdef double[:, ::1] o = out
+        cdef Geodetic g
+        cdef NED r
+        for i in range(n):
+            g.lat, g.lon, g.alt = geodetic[i, 0], geodetic[i, 1], geodetic[i, 2]
+            r = self.lc.geodetic2ned(g)
+            o[i, 0], o[i, 1], o[i, 2] = r.n, r.e, r.d
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def ned2geodetic_batch(self, const double[:, ::1] ned):
+        assert self.lc
+        cdef Py_ssize_t i, n = ned.shape[0]
+        out = np.empty((n, 3))
+        cdef double[:, ::1] o = out
+        cdef NED d
+        cdef Geodetic r
+        for i in range(n):
+            d.n, d.e, d.d = ned[i, 0], ned[i, 1], ned[i, 2]
+            r = self.lc.ned2geodetic(d)
+            o[i, 0], o[i, 1], o[i, 2] = r.lat, r.lon, r.alt
+        return out
+
     def __dealloc__(self):
         del self.lc
@@ -253,10 +253,14 @@ class Car:
     self.CS_prev = CS
 
   def params_thread(self, evt):
-    while not evt.is_set():
-      self.is_metric = self.params.get_bool("IsMetric")
-      self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
-      time.sleep(0.1)
+    with self.params.watch(["IsMetric", "ExperimentalMode"]) as watcher:
+      changed = True
+      while not evt.is_set():
+        if changed:
+          self.is_metric = self.params.get_bool("IsMetric")
+          self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
+        # only wakes up on param writes, the timeout bounds how long exiting takes
+        changed = watcher.wait(timeout=0.1)
 
   def card_thread(self):
     e = threading.Event()
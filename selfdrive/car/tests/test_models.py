@@ -18,10 +18,11 @@ from opendbc.car.tests.routes import non_tested_cars, routes, CarTestRoute
 from opendbc.car.values import Platform, PLATFORMS
 from opendbc.safety.tests.libsafety import libsafety_py
 from openpilot.common.basedir import BASEDIR
-from openpilot.selfdrive.pandad import can_capnp_to_list
 from openpilot.selfdrive.test.helpers import read_segment_list
 from openpilot.system.hardware.hw import DEFAULT_DOWNLOAD_CACHE_ROOT
-from openpilot.tools.lib.logreader import LogReader, LogsUnavailable, openpilotci_source, internal_source, comma_api_source
+from openpilot.tools.lib.can_columns import CanColumns, extract_can
+from openpilot.tools.lib.logreader import LogReader, LogsUnavailable, _LogFileReader, read_log_file, openpilotci_source, internal_source, \
+                                         comma_api_source
 from openpilot.tools.lib.route import SegmentName
 
 SafetyModel = car.CarParams.SafetyModel
@@ -72,43 +73,53 @@ class TestCarModelBase(unittest.TestCase):
   @classmethod
   def get_testing_data_from_logreader(cls, lr):
     car_fw = []
-    can_msgs = []
     cls.elm_frame = None
     cls.car_safety_mode_frame = None
     cls.fingerprint = gen_empty_fingerprint()
     alpha_long = False
-    for msg in lr:
-      if msg.which() == "can":
-        can = can_capnp_to_list((msg.as_builder().to_bytes(),))[0]
-        can_msgs.append((can[0], [CanData(*can) for can in can[1]]))
-        if len(can_msgs) <= FRAME_FINGERPRINT:
-          for m in msg.can:
-            if m.src < 64:
-              cls.fingerprint[m.src][m.address] = len(m.dat)
-
-      elif msg.which() == "carParams":
-        car_fw = msg.carParams.carFw
-        if msg.carParams.openpilotLongitudinalControl:
-          alpha_long = True
-        if cls.platform is None:
-          live_fingerprint = msg.carParams.carFingerprint
-          cls.platform = MIGRATION.get(live_fingerprint, live_fingerprint)
-
-      # Log which can frame the panda safety mode left ELM327, for CAN validity checks
-      elif msg.which() == 'pandaStates':
-        for ps in msg.pandaStates:
-          if cls.elm_frame is None and ps.safetyModel != SafetyModel.elm327:
-            cls.elm_frame = len(can_msgs)
-          if cls.car_safety_mode_frame is None and ps.safetyModel not in \
+
+    # each log is read once, the CAN frames are extracted straight from its bytes and the other
+    # messages are iterated in the same order as lr, without building the CAN messages
+    can_columns = []
+    n_can = 0
+    for fn in lr.logreader_identifiers:
+      dat = read_log_file(fn)
+      columns = extract_can(dat)
+      can_columns.append(columns.sorted_by_time() if lr.sort_by_time else columns)
+
+      for msg in _LogFileReader(fn, sort_by_time=lr.sort_by_time, dat=dat):
+        if msg.which() == "can":
+          n_can += 1
+
+        elif msg.which() == "carParams":
+          car_fw = msg.carParams.carFw
+          if msg.carParams.openpilotLongitudinalControl:
+            alpha_long = True
+          if cls.platform is None:
+            live_fingerprint = msg.carParams.carFingerprint
+            cls.platform = MIGRATION.get(live_fingerprint, live_fingerprint)
+
+        # Log which can frame the panda safety mode left ELM327, for CAN validity checks
+        elif msg.which() == 'pandaStates':
+          for ps in msg.pandaStates:
+            if cls.elm_frame is None and ps.safetyModel != SafetyModel.elm327:
+              cls.elm_frame = n_can
+            if cls.car_safety_mode_frame is None and ps.safetyModel not in \
+              (SafetyModel.elm327, SafetyModel.noOutput):
+              cls.car_safety_mode_frame = n_can
+
+        elif msg.which() == 'pandaStateDEPRECATED':
+          if cls.elm_frame is None and msg.pandaStateDEPRECATED.safetyModel != SafetyModel.elm327:
+            cls.elm_frame = n_can
+          if cls.car_safety_mode_frame is None and msg.pandaStateDEPRECATED.safetyModel not in \
             (SafetyModel.elm327, SafetyModel.noOutput):
-            cls.car_safety_mode_frame = len(can_msgs)
-
-      elif msg.which() == 'pandaStateDEPRECATED':
-        if cls.elm_frame is None and msg.pandaStateDEPRECATED.safetyModel != SafetyModel.elm327:
-          cls.elm_frame = len(can_msgs)
-        if cls.car_safety_mode_frame is None and msg.pandaStateDEPRECATED.safetyModel not in \
-          (SafetyModel.elm327, SafetyModel.noOutput):
-          cls.car_safety_mode_frame = len(can_msgs)
+            cls.car_safety_mode_frame = n_can
+
+    can_msgs = [(t, [CanData(*frame) for frame in frames]) for t, frames in CanColumns.concatenate(can_columns).to_can_list()]
+    for _, frames in can_msgs[:FRAME_FINGERPRINT]:
+      for m in frames:
+        if m.src < 64:
+          cls.fingerprint[m.src][m.address] = len(m.dat)
 
     assert len(can_msgs) > int(50 / DT_CTRL), "no can data found"
     return car_fw, can_msgs, alpha_long
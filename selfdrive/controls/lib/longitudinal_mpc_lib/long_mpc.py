@@ -42,6 +42,8 @@ CRASH_DISTANCE = .25
 LEAD_DANGER_FACTOR = 0.75
 LIMIT_COST = 1e6
 ACADOS_SOLVER_TYPE = 'SQP_RTI'
+# record per phase timings and solver iterations of every run, published in longitudinalPlan.solverTiming
+PROFILE = os.getenv("LONG_MPC_PROFILE") is not None
 
 
 # Fewer timestamps don't hurt performance and lead to
@@ -222,9 +224,16 @@ def gen_long_ocp():
 
 
 class LongitudinalMpc:
-  def __init__(self, mode='acc', dt=DT_MDL):
+  def __init__(self, mode='acc', dt=DT_MDL, profile=PROFILE):
     self.mode = mode
     self.dt = dt
+    self.profile = profile
+    # only updated when profiling, and kept across resets to show the run that failed
+    self.time_param_upload = 0.0
+    self.time_solve = 0.0
+    self.time_solution_readback = 0.0
+    self.sqp_iter = 0
+    self.qp_iter = 0
     self.solver = AcadosOcpSolverCython(MODEL_NAME, ACADOS_SOLVER_TYPE, N)
     self.reset()
     self.source = SOURCES[2]
@@ -409,26 +418,23 @@ class LongitudinalMpc:
         self.source = 'lead1'
 
   def run(self):
-    # t0 = time.monotonic()
-    # reset = 0
+    if self.profile:
+      t0 = time.monotonic()
     for i in range(N+1):
       self.solver.set(i, 'p', self.params[i])
     self.solver.constraints_set(0, "lbx", self.x0)
     self.solver.constraints_set(0, "ubx", self.x0)
+    if self.profile:
+      t1 = time.monotonic()
 
     self.solution_status = self.solver.solve()
+    if self.profile:
+      t2 = time.monotonic()
     self.solve_time = float(self.solver.get_stats('time_tot')[0])
     self.time_qp_solution = float(self.solver.get_stats('time_qp')[0])
     self.time_linearization = float(self.solver.get_stats('time_lin')[0])
     self.time_integrator = float(self.solver.get_stats('time_sim')[0])
 
-    # qp_iter = self.solver.get_stats('statistics')[-1][-1] # SQP_RTI specific
-    # print(f"long_mpc timings: tot {self.solve_time:.2e}, qp {self.time_qp_solution:.2e}, lin {self.time_linearization:.2e}, \
-    # integrator {self.time_integrator:.2e}, qp_iter {qp_iter}")
-    # res = self.solver.get_residuals()
-    # print(f"long_mpc residuals: {res[0]:.2e}, {res[1]:.2e}, {res[2]:.2e}, {res[3]:.2e}")
-    # self.solver.print_statistics()
-
     for i in range(N+1):
       self.x_sol[i] = self.solver.get(i, 'x')
     for i in range(N):
@@ -438,6 +444,13 @@ class LongitudinalMpc:
     self.a_solution = self.x_sol[:,2]
     self.j_solution = self.u_sol[:,0]
 
+    if self.profile:
+      self.time_param_upload = t1 - t0
+      self.time_solve = t2 - t1
+      self.time_solution_readback = time.monotonic() - t2
+      self.sqp_iter = self.solver.get_stats('sqp_iter')
+      self.qp_iter = int(np.sum(self.solver.get_stats('qp_iter')))
+
     self.prev_a = np.interp(T_IDXS + self.dt, T_IDXS, self.a_solution)
 
     t = time.monotonic()
@@ -446,9 +459,6 @@ class LongitudinalMpc:
         self.last_cloudlog_t = t
         cloudlog.warning(f"Long mpc reset, solution_status: {self.solution_status}")
       self.reset()
-      # reset = 1
-    # print(f"long_mpc timings: total internal {self.solve_time:.2e}, external: {(time.monotonic() - t0):.2e} qp {self.time_qp_solution:.2e}, \
-    # lin {self.time_linearization:.2e} qp_iter {qp_iter}, reset {reset}")
 
 
 if __name__ == "__main__":
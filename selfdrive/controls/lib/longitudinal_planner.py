@@ -184,6 +184,16 @@ class LongitudinalPlanner:
     longitudinalPlan.modelMonoTime = sm.logMonoTime['modelV2']
     longitudinalPlan.processingDelay = (plan_send.logMonoTime / 1e9) - sm.logMonoTime['modelV2']
     longitudinalPlan.solverExecutionTime = self.mpc.solve_time
+    if self.mpc.profile:
+      timing = longitudinalPlan.solverTiming
+      timing.paramUpload = self.mpc.time_param_upload
+      timing.solve = self.mpc.time_solve
+      timing.solutionReadback = self.mpc.time_solution_readback
+      timing.qpSolution = self.mpc.time_qp_solution
+      timing.linearization = self.mpc.time_linearization
+      timing.integrator = self.mpc.time_integrator
+      timing.sqpIterations = self.mpc.sqp_iter
+      timing.qpIterations = self.mpc.qp_iter
 
     longitudinalPlan.speeds = self.v_desired_trajectory.tolist()
     longitudinalPlan.accels = self.a_desired_trajectory.tolist()
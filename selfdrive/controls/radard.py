@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import math
 import numpy as np
 from collections import deque
 from typing import Any
@@ -10,15 +9,11 @@ from openpilot.common.filter_simple import FirstOrderFilter
 from openpilot.common.params import Params
 from openpilot.common.realtime import DT_MDL, Priority, config_realtime_process
 from openpilot.common.swaglog import cloudlog
-from openpilot.common.simple_kalman import KF1D
 
 
 # Default lead acceleration decay set to 50% at 1s
 _LEAD_ACCEL_TAU = 1.5
 
-# radar tracks
-SPEED, ACCEL = 0, 1     # Kalman filter states enum
-
 # stationary qualification parameters
 V_EGO_STATIONARY = 4.   # no stationary object flag below this speed
 
@@ -48,96 +43,161 @@ class KalmanParams:
     self.K = [[np.interp(dt, dts, K0)], [np.interp(dt, dts, K1)]]
 
 
-class Track:
-  def __init__(self, identifier: int, v_lead: float, kalman_params: KalmanParams):
-    self.identifier = identifier
-    self.cnt = 0
-    self.aLeadTau = FirstOrderFilter(_LEAD_ACCEL_TAU, 0.45, DT_MDL)
-    self.K_A = kalman_params.A
-    self.K_C = kalman_params.C
-    self.K_K = kalman_params.K
-    self.kf = KF1D([[v_lead], [0.0]], self.K_A, self.K_C, self.K_K)
-
-  def update(self, d_rel: float, y_rel: float, v_rel: float, v_lead: float, measured: float):
-    # relative values, copy
-    self.dRel = d_rel   # LONG_DIST
-    self.yRel = y_rel   # -LAT_DIST
-    self.vRel = v_rel   # REL_SPEED
-    self.vLead = v_lead
-    self.measured = measured   # measured or estimate
-
-    # computed velocity and accelerations
-    if self.cnt > 0:
-      self.kf.update(self.vLead)
-
-    self.vLeadK = float(self.kf.x[SPEED][0])
-    self.aLeadK = float(self.kf.x[ACCEL][0])
+class Tracks:
+  """
+  Radar tracks stored as a structure of arrays, one row per track.
+
+  Rows stay in the order tracks were first seen, so ties in matching and in the
+  low speed lead search resolve the same way as iterating the tracks in order.
+  The lead Kalman filter is the same constant gain filter as KF1D, updated for
+  all tracks at once.
+  """
+
+  def __init__(self, kalman_params: KalmanParams):
+    A, C, K = kalman_params.A, kalman_params.C, kalman_params.K
+    self.K0 = K[0][0]
+    self.K1 = K[1][0]
+    self.A_K_0 = A[0][0] - self.K0 * C[0]
+    self.A_K_1 = A[0][1] - self.K0 * C[1]
+    self.A_K_2 = A[1][0] - self.K1 * C[0]
+    self.A_K_3 = A[1][1] - self.K1 * C[1]
+    self.tau_alpha = FirstOrderFilter(_LEAD_ACCEL_TAU, 0.45, DT_MDL).alpha
+
+    self.identifier = np.zeros(0, dtype=np.uint64)
+    self.cnt = np.zeros(0, dtype=np.int64)
+    self.dRel = np.zeros(0)
+    self.yRel = np.zeros(0)
+    self.vRel = np.zeros(0)
+    self.vLead = np.zeros(0)
+    self.measured = np.zeros(0, dtype=bool)
+    self.vLeadK = np.zeros(0)
+    self.aLeadK = np.zeros(0)
+    self.aLeadTau = np.zeros(0)
+
+  def __len__(self) -> int:
+    return len(self.identifier)
+
+  def update(self, ids: np.ndarray, d_rel: np.ndarray, y_rel: np.ndarray, v_rel: np.ndarray, measured: np.ndarray, v_ego: float):
+    # *** remove missing points, keeping the order of the rest ***
+    keep = np.isin(self.identifier, ids)
+    if not keep.all():
+      for name in ('identifier', 'cnt', 'vLeadK', 'aLeadK', 'aLeadTau'):
+        setattr(self, name, getattr(self, name)[keep])
+
+    # *** find the row of each point, new tracks are appended in point order ***
+    order = np.argsort(self.identifier, kind='stable')
+    pos = np.minimum(np.searchsorted(self.identifier, ids, sorter=order), max(len(order) - 1, 0))
+    rows = order[pos] if len(order) else np.zeros(len(ids), dtype=np.int64)
+    new = self.identifier[rows] != ids if len(order) else np.ones(len(ids), dtype=bool)
+
+    n_old, n_new = len(self.identifier), int(np.count_nonzero(new))
+    rows[new] = np.arange(n_old, n_old + n_new)
+
+    # align v_ego by a fixed time to align it with the radar measurement
+    v_lead = v_rel + v_ego
+    self.identifier = np.concatenate((self.identifier, ids[new]))
+    self.cnt = np.concatenate((self.cnt, np.zeros(n_new, dtype=np.int64)))
+    self.vLeadK = np.concatenate((self.vLeadK, v_lead[new]))
+    self.aLeadK = np.concatenate((self.aLeadK, np.zeros(n_new)))
+    self.aLeadTau = np.concatenate((self.aLeadTau, np.full(n_new, _LEAD_ACCEL_TAU)))
+
+    # every remaining track has a point, so the measurements just need reordering
+    n = len(rows)
+    for name, values in (('dRel', d_rel), ('yRel', y_rel), ('vRel', v_rel), ('vLead', v_lead), ('measured', measured)):
+      arr = np.empty(n, dtype=values.dtype)
+      arr[rows] = values
+      setattr(self, name, arr)
+
+    # computed velocity and accelerations, new tracks start at [vLead, 0]
+    upd = self.cnt > 0
+    x0, x1, meas = self.vLeadK[upd], self.aLeadK[upd], self.vLead[upd]
+    self.vLeadK[upd] = self.A_K_0 * x0 + self.A_K_1 * x1 + self.K0 * meas
+    self.aLeadK[upd] = self.A_K_2 * x0 + self.A_K_3 * x1 + self.K1 * meas
 
     # Learn if constant acceleration
-    if abs(self.aLeadK) < 0.5:
-      self.aLeadTau.x = _LEAD_ACCEL_TAU
-    else:
-      self.aLeadTau.update(0.0)
+    self.aLeadTau = np.where(np.abs(self.aLeadK) < 0.5, _LEAD_ACCEL_TAU, (1. - self.tau_alpha) * self.aLeadTau + self.tau_alpha * 0.0)
 
     self.cnt += 1
 
-  def get_RadarState(self, model_prob: float = 0.0):
+  def get_RadarState(self, idx: int, model_prob: float = 0.0):
     return {
-      "dRel": float(self.dRel),
-      "yRel": float(self.yRel),
-      "vRel": float(self.vRel),
-      "vLead": float(self.vLead),
-      "vLeadK": float(self.vLeadK),
-      "aLeadK": float(self.aLeadK),
-      "aLeadTau": float(self.aLeadTau.x),
+      "dRel": float(self.dRel[idx]),
+      "yRel": float(self.yRel[idx]),
+      "vRel": float(self.vRel[idx]),
+      "vLead": float(self.vLead[idx]),
+      "vLeadK": float(self.vLeadK[idx]),
+      "aLeadK": float(self.aLeadK[idx]),
+      "aLeadTau": float(self.aLeadTau[idx]),
       "status": True,
       "fcw": self.is_potential_fcw(model_prob),
       "modelProb": model_prob,
       "radar": True,
-      "radarTrackId": self.identifier,
+      "radarTrackId": int(self.identifier[idx]),
     }
 
-  def potential_low_speed_lead(self, v_ego: float):
+  def potential_low_speed_lead(self, v_ego: float) -> np.ndarray:
     # stop for stuff in front of you and low speed, even without model confirmation
     # Radar points closer than 0.75, are almost always glitches on toyota radars
-    return abs(self.yRel) < 1.0 and (v_ego < V_EGO_STATIONARY) and (0.75 < self.dRel < 25)
+    if v_ego >= V_EGO_STATIONARY:
+      return np.zeros(len(self), dtype=bool)
+    return (np.abs(self.yRel) < 1.0) & (0.75 < self.dRel) & (self.dRel < 25)
 
   def is_potential_fcw(self, model_prob: float):
     return model_prob > .9
 
   def __str__(self):
-    ret = f"x: {self.dRel:4.1f}  y: {self.yRel:4.1f}  v: {self.vRel:4.1f}  a: {self.aLeadK:4.1f}"
-    return ret
+    return "\n".join(f"x: {self.dRel[i]:4.1f}  y: {self.yRel[i]:4.1f}  v: {self.vRel[i]:4.1f}  a: {self.aLeadK[i]:4.1f}" for i in range(len(self)))
 
 
-def laplacian_pdf(x: float, mu: float, b: float):
+def laplacian_pdf(x: np.ndarray, mu: float, b: float) -> np.ndarray:
   b = max(b, 1e-4)
-  return math.exp(-abs(x-mu)/b)
+  return np.exp(-np.abs(x-mu)/b)
 
 
-def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: dict[int, Track]):
+def match_vision_to_track(v_ego: float, lead: capnp._DynamicStructReader, tracks: Tracks) -> int | None:
   offset_vision_dist = lead.x[0] - RADAR_TO_CAMERA
 
-  def prob(c):
-    prob_d = laplacian_pdf(c.dRel, offset_vision_dist, lead.xStd[0])
-    prob_y = laplacian_pdf(c.yRel, -lead.y[0], lead.yStd[0])
-    prob_v = laplacian_pdf(c.vRel + v_ego, lead.v[0], lead.vStd[0])
-
-    # This isn't exactly right, but it's a good heuristic
-    return prob_d * prob_y * prob_v
+  prob_d = laplacian_pdf(tracks.dRel, offset_vision_dist, lead.xStd[0])
+  prob_y = laplacian_pdf(tracks.yRel, -lead.y[0], lead.yStd[0])
+  prob_v = laplacian_pdf(tracks.vRel + v_ego, lead.v[0], lead.vStd[0])
 
-  track = max(tracks.values(), key=prob)
+  # This isn't exactly right, but it's a good heuristic
+  idx = int(np.argmax(prob_d * prob_y * prob_v))
 
   # if no 'sane' match is found return -1
   # stationary radar points can be false positives
-  dist_sane = abs(track.dRel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
-  vel_sane = (abs(track.vRel + v_ego - lead.v[0]) < 10) or (v_ego + track.vRel > 3)
+  d_rel, v_rel = float(tracks.dRel[idx]), float(tracks.vRel[idx])
+  dist_sane = abs(d_rel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
+  vel_sane = (abs(v_rel + v_ego - lead.v[0]) < 10) or (v_ego + v_rel > 3)
   if dist_sane and vel_sane:
-    return track
+    return idx
   else:
     return None
 
 
+def radar_points_to_arrays(points) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+  n = len(points)
+  ids = np.empty(n, dtype=np.uint64)
+  vals = np.empty((3, n))
+  measured = np.empty(n, dtype=bool)
+  for i, pt in enumerate(points):
+    ids[i] = pt.trackId
+    vals[0, i] = pt.dRel
+    vals[1, i] = pt.yRel
+    vals[2, i] = pt.vRel
+    measured[i] = pt.measured
+
+  # a repeated trackId keeps the position of its first point and the values of its last
+  _, first = np.unique(ids, return_index=True)
+  if len(first) != n:
+    _, last = np.unique(ids[::-1], return_index=True)
+    last = n - 1 - last
+    order = np.argsort(first)
+    first, last = first[order], last[order]
+    return ids[first], vals[0, last], vals[1, last], vals[2, last], measured[last]
+  return ids, vals[0], vals[1], vals[2], measured
+
+
 def get_RadarState_from_vision(lead_msg: capnp._DynamicStructReader, v_ego: float, model_v_ego: float):
   lead_v_rel_pred = lead_msg.v[0] - model_v_ego
   return {
@@ -156,7 +216,7 @@ def get_RadarState_from_vision(lead_msg: capnp._DynamicStructReader, v_ego: floa
   }
 
 
-def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capnp._DynamicStructReader,
+def get_lead(v_ego: float, ready: bool, tracks: Tracks, lead_msg: capnp._DynamicStructReader,
              model_v_ego: float, low_speed_override: bool = True) -> dict[str, Any]:
   # Determine leads, this is where the essential logic happens
   if len(tracks) > 0 and ready and lead_msg.prob > .5:
@@ -166,18 +226,18 @@ def get_lead(v_ego: float, ready: bool, tracks: dict[int, Track], lead_msg: capn
 
   lead_dict = {'status': False}
   if track is not None:
-    lead_dict = track.get_RadarState(lead_msg.prob)
+    lead_dict = tracks.get_RadarState(track, lead_msg.prob)
   elif (track is None) and ready and (lead_msg.prob > .5):
     lead_dict = get_RadarState_from_vision(lead_msg, v_ego, model_v_ego)
 
   if low_speed_override:
-    low_speed_tracks = [c for c in tracks.values() if c.potential_low_speed_lead(v_ego)]
+    low_speed_tracks = np.flatnonzero(tracks.potential_low_speed_lead(v_ego))
     if len(low_speed_tracks) > 0:
-      closest_track = min(low_speed_tracks, key=lambda c: c.dRel)
+      closest_track = int(low_speed_tracks[np.argmin(tracks.dRel[low_speed_tracks])])
 
       # Only choose new track if it is actually closer than the previous one
-      if (not lead_dict['status']) or (closest_track.dRel < lead_dict['dRel']):
-        lead_dict = closest_track.get_RadarState()
+      if (not lead_dict['status']) or (tracks.dRel[closest_track] < lead_dict['dRel']):
+        lead_dict = tracks.get_RadarState(closest_track)
 
   return lead_dict
 
@@ -186,8 +246,8 @@ class RadarD:
   def __init__(self, delay: float = 0.0):
     self.current_time = 0.0
 
-    self.tracks: dict[int, Track] = {}
     self.kalman_params = KalmanParams(DT_MDL)
+    self.tracks = Tracks(self.kalman_params)
 
     self.v_ego = 0.0
     self.v_ego_hist = deque([0.0], maxlen=int(round(delay / DT_MDL))+1)
@@ -207,24 +267,8 @@ class RadarD:
       self.v_ego_hist.append(self.v_ego)
       self.last_v_ego_frame = sm.recv_frame['carState']
 
-    ar_pts = {pt.trackId: [pt.dRel, pt.yRel, pt.vRel, pt.measured] for pt in rr.points}
-
-    # *** remove missing points from meta data ***
-    for ids in list(self.tracks.keys()):
-      if ids not in ar_pts:
-        self.tracks.pop(ids, None)
-
-    # *** compute the tracks ***
-    for ids in ar_pts:
-      rpt = ar_pts[ids]
-
-      # align v_ego by a fixed time to align it with the radar measurement
-      v_lead = rpt[2] + self.v_ego_hist[0]
-
-      # create the track if it doesn't exist or it's a new track
-      if ids not in self.tracks:
-        self.tracks[ids] = Track(ids, v_lead, self.kalman_params)
-      self.tracks[ids].update(rpt[0], rpt[1], rpt[2], v_lead, rpt[3])
+    ids, d_rel, y_rel, v_rel, measured = radar_points_to_arrays(rr.points)
+    self.tracks.update(ids, d_rel, y_rel, v_rel, measured, self.v_ego_hist[0])
 
     # *** publish radarState ***
     self.radar_state_valid = sm.all_checks()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from cereal import log
+
+pytest.importorskip("openpilot.selfdrive.controls.lib.longitudinal_mpc_lib.c_generated_code.acados_ocp_solver_pyx",
+                    reason="the longitudinal MPC solver isn't built")
+
+from openpilot.selfdrive.controls.lib.longitudinal_mpc_lib.long_mpc import LongitudinalMpc, N
+
+
+def run_mpc(mpc, v_ego=20., d_rel=30., v_lead=15., n_iters=10):
+  radarstate = log.RadarState.new_message()
+  radarstate.leadOne.status = True
+  radarstate.leadOne.dRel = d_rel
+  radarstate.leadOne.vLead = v_lead
+  radarstate.leadOne.modelProb = 1.0
+
+  mpc.set_cur_state(v_ego, 0.)
+  zeros = np.zeros(N+1)
+  for _ in range(n_iters):
+    mpc.update(radarstate, v_ego, zeros.copy(), zeros.copy(), zeros.copy(), zeros.copy())
+
+
+class TestLongitudinalMpc:
+  def test_profile(self):
+    mpc = LongitudinalMpc()
+    run_mpc(mpc, n_iters=1)
+    assert mpc.time_solve == 0. and mpc.sqp_iter == 0
+
+    mpc = LongitudinalMpc(profile=True)
+    run_mpc(mpc, n_iters=1)
+    assert mpc.time_param_upload > 0.
+    assert mpc.time_solve > 0.
+    assert mpc.time_solution_readback > 0.
+    assert mpc.sqp_iter == 1  # SQP_RTI
+    assert mpc.qp_iter > 0
@@ -0,0 +1,167 @@
+import math
+import random
+
+import numpy as np
+
+from cereal import car, log, messaging
+from openpilot.common.filter_simple import FirstOrderFilter
+from openpilot.common.realtime import DT_MDL
+from openpilot.common.simple_kalman import KF1D
+from openpilot.selfdrive.controls.radard import RadarD, KalmanParams, RADAR_TO_CAMERA, V_EGO_STATIONARY, _LEAD_ACCEL_TAU
+
+
+# reference per-track implementation the array-backed track table must match
+class RefTrack:
+  def __init__(self, identifier, v_lead, kalman_params):
+    self.identifier = identifier
+    self.cnt = 0
+    self.aLeadTau = FirstOrderFilter(_LEAD_ACCEL_TAU, 0.45, DT_MDL)
+    self.kf = KF1D([[v_lead], [0.0]], kalman_params.A, kalman_params.C, kalman_params.K)
+
+  def update(self, d_rel, y_rel, v_rel, v_lead):
+    self.dRel, self.yRel, self.vRel, self.vLead = d_rel, y_rel, v_rel, v_lead
+    if self.cnt > 0:
+      self.kf.update(self.vLead)
+    self.vLeadK = float(self.kf.x[0][0])
+    self.aLeadK = float(self.kf.x[1][0])
+    if abs(self.aLeadK) < 0.5:
+      self.aLeadTau.x = _LEAD_ACCEL_TAU
+    else:
+      self.aLeadTau.update(0.0)
+    self.cnt += 1
+
+  def get_RadarState(self, model_prob=0.0):
+    return {"dRel": float(self.dRel), "yRel": float(self.yRel), "vRel": float(self.vRel), "vLead": float(self.vLead),
+            "vLeadK": float(self.vLeadK), "aLeadK": float(self.aLeadK), "aLeadTau": float(self.aLeadTau.x), "status": True,
+            "fcw": model_prob > .9, "modelProb": model_prob, "radar": True, "radarTrackId": self.identifier}
+
+
+def ref_get_lead(v_ego, ready, tracks, lead, model_v_ego, low_speed_override):
+  def laplacian_pdf(x, mu, b):
+    return math.exp(-abs(x-mu)/max(b, 1e-4))
+
+  track = None
+  if len(tracks) > 0 and ready and lead.prob > .5:
+    offset = lead.x[0] - RADAR_TO_CAMERA
+    track = max(tracks.values(), key=lambda c: laplacian_pdf(c.dRel, offset, lead.xStd[0]) * laplacian_pdf(c.yRel, -lead.y[0], lead.yStd[0]) *
+                                               laplacian_pdf(c.vRel + v_ego, lead.v[0], lead.vStd[0]))
+    dist_sane = abs(track.dRel - offset) < max([offset*.25, 5.0])
+    vel_sane = (abs(track.vRel + v_ego - lead.v[0]) < 10) or (v_ego + track.vRel > 3)
+    if not (dist_sane and vel_sane):
+      track = None
+
+  lead_dict = {'status': False}
+  if track is not None:
+    lead_dict = track.get_RadarState(lead.prob)
+  elif ready and lead.prob > .5:
+    v_rel = lead.v[0] - model_v_ego
+    lead_dict = {"dRel": float(lead.x[0] - RADAR_TO_CAMERA), "yRel": float(-lead.y[0]), "vRel": float(v_rel), "vLead": float(v_ego + v_rel),
+                 "vLeadK": float(v_ego + v_rel), "aLeadK": float(lead.a[0]), "aLeadTau": 0.3, "fcw": False, "modelProb": float(lead.prob),
+                 "status": True, "radar": False, "radarTrackId": -1}
+
+  if low_speed_override:
+    low_speed = [c for c in tracks.values() if abs(c.yRel) < 1.0 and v_ego < V_EGO_STATIONARY and 0.75 < c.dRel < 25]
+    if len(low_speed) > 0:
+      closest = min(low_speed, key=lambda c: c.dRel)
+      if (not lead_dict['status']) or (closest.dRel < lead_dict['dRel']):
+        lead_dict = closest.get_RadarState()
+  return lead_dict
+
+
+class FakeSubMaster:
+  def __init__(self):
+    self.data = {}
+    self.seen = {'modelV2': True}
+    self.logMonoTime = {'modelV2': 0, 'carState': 0}
+    self.recv_frame = {'carState': 0}
+
+  def __getitem__(self, s):
+    return self.data[s]
+
+  def all_checks(self):
+    return True
+
+
+def random_frame(rng, active):
+  # tracks come and go, and some points move into the low speed lead window
+  for track_id in list(active):
+    if rng.random() < 0.05:
+      active.pop(track_id)
+  while len(active) < 48 and rng.random() < 0.5:
+    active[rng.randrange(2**16)] = [rng.uniform(0.5, 120), rng.uniform(-5, 5), rng.uniform(-15, 5)]
+
+  rr = car.RadarData.new_message()
+  rr.init('points', len(active))
+  for pt, (track_id, state) in zip(rr.points, active.items(), strict=True):
+    state[0] = max(0.1, state[0] + state[2] * DT_MDL + rng.gauss(0, 0.2))
+    state[1] += rng.gauss(0, 0.05)
+    state[2] += rng.gauss(0, 0.8)
+    pt.trackId, pt.dRel, pt.yRel, pt.vRel, pt.measured = track_id, state[0], state[1], state[2], True
+  return rr.as_reader()
+
+
+def random_model(rng, active):
+  msg = messaging.new_message('modelV2')
+  msg.modelV2.velocity.x = [rng.uniform(0, 30)]
+  leads = msg.modelV2.init('leadsV3', 2)
+  targets = list(active.values())
+  for lead in leads:
+    d, y, v = rng.choice(targets) if targets and rng.random() < 0.8 else (rng.uniform(0, 100), 0., 0.)
+    lead.prob = rng.random()
+    lead.x = [d + RADAR_TO_CAMERA + rng.gauss(0, 1)]
+    lead.y = [-y + rng.gauss(0, 0.3)]
+    lead.v = [v + 10 + rng.gauss(0, 1)]
+    lead.a = [rng.gauss(0, 1)]
+    lead.xStd = [rng.uniform(0, 5)]
+    lead.yStd = [rng.uniform(0, 1)]
+    lead.vStd = [rng.uniform(0, 2)]
+  return msg.modelV2.as_reader()
+
+
+class TestRadarD:
+  def test_matches_reference(self):
+    rng = random.Random(0)
+    rd = RadarD()
+    kalman_params = KalmanParams(DT_MDL)
+    ref_tracks: dict[int, RefTrack] = {}
+    active: dict[int, list[float]] = {}
+    sm = FakeSubMaster()
+
+    for frame in range(2000):
+      v_ego = max(0., 10 + 10 * math.sin(frame / 300))
+      cs = messaging.new_message('carState')
+      cs.carState.vEgo = v_ego
+      sm.data['carState'] = cs.carState.as_reader()
+      v_ego = sm['carState'].vEgo
+      sm.recv_frame['carState'] = frame
+      sm.data['modelV2'] = random_model(rng, active)
+      rr = random_frame(rng, active)
+      rd.update(sm, rr)
+
+      ar_pts = {pt.trackId: [pt.dRel, pt.yRel, pt.vRel] for pt in rr.points}
+      ref_tracks = {k: v for k, v in ref_tracks.items() if k in ar_pts}
+      for track_id, (d_rel, y_rel, v_rel) in ar_pts.items():
+        if track_id not in ref_tracks:
+          ref_tracks[track_id] = RefTrack(track_id, v_rel + v_ego, kalman_params)
+        ref_tracks[track_id].update(d_rel, y_rel, v_rel, v_rel + v_ego)
+
+      model = sm['modelV2']
+      expected = log.RadarState.new_message()
+      expected.leadOne = ref_get_lead(v_ego, True, ref_tracks, model.leadsV3[0], model.velocity.x[0], True)
+      expected.leadTwo = ref_get_lead(v_ego, True, ref_tracks, model.leadsV3[1], model.velocity.x[0], False)
+      assert rd.radar_state.leadOne.to_dict() == expected.leadOne.to_dict()
+      assert rd.radar_state.leadTwo.to_dict() == expected.leadTwo.to_dict()
+
+  def test_repeated_track_id(self):
+    rr = car.RadarData.new_message()
+    rr.init('points', 3)
+    for pt, (track_id, d_rel) in zip(rr.points, [(5, 10.), (3, 20.), (5, 30.)], strict=True):
+      pt.trackId, pt.dRel = track_id, d_rel
+
+    rd = RadarD()
+    sm = FakeSubMaster()
+    sm.data['carState'] = messaging.new_message('carState').carState.as_reader()
+    sm.data['modelV2'] = messaging.new_message('modelV2').modelV2.as_reader()
+    rd.update(sm, rr.as_reader())
+    assert list(rd.tracks.identifier) == [5, 3]
+    assert np.array_equal(rd.tracks.dRel, [30., 20.])
@@ -1,36 +1,176 @@
 #!/usr/bin/env python3
-import numpy as np
+import argparse
+import json
+import os
+import sys
 import time
+import tracemalloc
+from collections import defaultdict
+import numpy as np
 from tqdm import tqdm
 
-from cereal import car
-from opendbc.car.tests.routes import CarTestRoute
+from opendbc.car.car_helpers import interfaces
 from openpilot.selfdrive.car.tests.test_models import TestCarModelBase
+from openpilot.tools.lib.logreader import LogReader
 from openpilot.tools.plotjuggler.juggle import DEMO_ROUTE
 
-N_RUNS = 10
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "can_parser_baseline.json")
+# compared against the baseline, the rest is informational
+REGRESSION_METRICS = ("mean_ns", "p99_ns", "alloc_peak_bytes")
+
+
+def load_segment(fn: str):
+  """The CarInterface, CarParams and CAN packets of a segment. Raises AssertionError for segments without enough CAN"""
+  # a fresh class per segment, get_testing_data_from_logreader stores the fingerprint and platform on it
+  case = type("CanParserSegment", (TestCarModelBase,), {})
+  car_fw, can_msgs, alpha_long = case.get_testing_data_from_logreader(LogReader(fn, sort_by_time=True))
+  if case.platform is None:
+    return None, None, None
+
+  CarInterface = interfaces[case.platform]
+  CP = CarInterface.get_params(case.platform, case.fingerprint, car_fw, alpha_long, False, docs=False)
+  return CarInterface, CP, can_msgs
+
+
+def time_packets(CarInterface, CP, can_msgs) -> tuple[np.ndarray, np.ndarray]:
+  # CI.update and RI.update per packet, like card.state_update at 100 Hz
+  CI, RI = CarInterface(CP.copy()), CarInterface.RadarInterface(CP)
+  ci_ns = np.empty(len(can_msgs), dtype=np.int64)
+  ri_ns = np.empty(len(can_msgs), dtype=np.int64)
+  for i, msg in enumerate(can_msgs):
+    t0 = time.perf_counter_ns()
+    CI.update([msg])
+    t1 = time.perf_counter_ns()
+    RI.update([msg])
+    ri_ns[i] = time.perf_counter_ns() - t1
+    ci_ns[i] = t1 - t0
+  return ci_ns, ri_ns
+
+
+def count_allocations(CarInterface, CP, can_msgs) -> tuple[float, float]:
+  """Mean peak of the memory allocated while handling a packet, and the blocks still held per packet after the segment"""
+  CI, RI = CarInterface(CP.copy()), CarInterface.RadarInterface(CP)
+  peaks = np.empty(len(can_msgs), dtype=np.int64)
+  tracemalloc.start()
+  try:
+    start_blocks = sys.getallocatedblocks()
+    for i, msg in enumerate(can_msgs):
+      tracemalloc.reset_peak()
+      current = tracemalloc.get_traced_memory()[0]
+      CI.update([msg])
+      RI.update([msg])
+      peaks[i] = tracemalloc.get_traced_memory()[1] - current
+    retained_blocks = sys.getallocatedblocks() - start_blocks
+  finally:
+    tracemalloc.stop()
+  return float(np.mean(peaks)), retained_blocks / len(can_msgs)
+
+
+def benchmark(segments: list[str], n_runs: int) -> dict[str, dict]:
+  by_platform: dict[str, dict] = defaultdict(lambda: {"segments": [], "ci_ns": [], "ri_ns": [], "alloc_peak_bytes": [], "retained_blocks": []})
+  for fn in tqdm(segments):
+    try:
+      CarInterface, CP, can_msgs = load_segment(fn)
+    except AssertionError as e:
+      # short fixture segments, or ones without CAN
+      print(f"{fn}: {e}, skipping")
+      continue
+    if CarInterface is None:
+      print(f"{fn}: no carParams, skipping")
+      continue
 
+    r = by_platform[CP.carFingerprint]
+    r["segments"].append(fn)
+    # the fastest run of each packet, to leave out scheduling noise
+    times = [time_packets(CarInterface, CP, can_msgs) for _ in range(n_runs)]
+    r["ci_ns"].append(np.min([ci for ci, _ in times], axis=0))
+    r["ri_ns"].append(np.min([ri for _, ri in times], axis=0))
+    alloc_peak, retained = count_allocations(CarInterface, CP, can_msgs)
+    r["alloc_peak_bytes"].append(alloc_peak)
+    r["retained_blocks"].append(retained)
 
-class CarModelTestCase(TestCarModelBase):
-  test_route = CarTestRoute(DEMO_ROUTE, None)
+  results = {}
+  for platform, r in sorted(by_platform.items()):
+    ci_ns, ri_ns = np.concatenate(r["ci_ns"]), np.concatenate(r["ri_ns"])
+    total_ns = ci_ns + ri_ns
+    results[platform] = {
+      "segments": r["segments"],
+      "packets": len(total_ns),
+      "mean_ns": float(np.mean(total_ns)),
+      "p99_ns": float(np.percentile(total_ns, 99)),
+      "max_ns": float(np.max(total_ns)),
+      "ci_mean_ns": float(np.mean(ci_ns)),
+      "ri_mean_ns": float(np.mean(ri_ns)),
+      "alloc_peak_bytes": float(np.average(r["alloc_peak_bytes"], weights=[len(ci) for ci in r["ci_ns"]])),
+      "retained_blocks": float(np.average(r["retained_blocks"], weights=[len(ci) for ci in r["ci_ns"]])),
+    }
+  return results
+
+
+def load_baseline(fn: str) -> dict[str, dict]:
+  """The platforms of a baseline file, empty if it doesn't exist or was written by another BASELINE_VERSION"""
+  if not os.path.isfile(fn):
+    return {}
+  with open(fn) as f:
+    baseline = json.load(f)
+  if baseline.get("version") != BASELINE_VERSION:
+    print(f"{fn}: baseline version {baseline.get('version')} isn't {BASELINE_VERSION}, ignoring it")
+    return {}
+  return baseline["platforms"]
+
+
+def find_regressions(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+  regressions = []
+  for platform, r in results.items():
+    if platform not in baseline:
+      continue
+    for metric in REGRESSION_METRICS:
+      old, new = baseline[platform][metric], r[metric]
+      if new > old * (1 + threshold):
+        regressions.append(f"{platform}: {metric} {old:.0f} -> {new:.0f} (+{(new / max(old, 1e-9) - 1) * 100:.0f}%)")
+  return regressions
+
+
+def print_results(results: dict[str, dict], baseline: dict[str, dict]):
+  print(f"{'platform':<40} {'packets':>8} {'mean us':>8} {'CI us':>8} {'RI us':>8} {'p99 us':>8} {'max us':>8} {'peak KB':>8} {'baseline':>9}")
+  for platform, r in sorted(results.items(), key=lambda x: -x[1]["mean_ns"]):
+    change = f"{(r['mean_ns'] / baseline[platform]['mean_ns'] - 1) * 100:+.0f}%" if platform in baseline else "new"
+    print(f"{platform:<40} {r['packets']:>8} {r['mean_ns'] / 1e3:>8.1f} {r['ci_mean_ns'] / 1e3:>8.1f} {r['ri_mean_ns'] / 1e3:>8.1f} " +
+          f"{r['p99_ns'] / 1e3:>8.1f} {r['max_ns'] / 1e3:>8.1f} {r['alloc_peak_bytes'] / 1e3:>8.1f} {change:>9}")
+
+
+def expand_segments(paths: list[str]) -> list[str]:
+  # fixture directories hold one log per segment
+  segments = []
+  for p in paths:
+    if os.path.isdir(p):
+      segments.extend(sorted(os.path.join(p, f) for f in os.listdir(p) if os.path.isfile(os.path.join(p, f))))
+    else:
+      segments.append(p)
+  return segments
 
 
 if __name__ == '__main__':
-  # Get CAN messages and parsers
-  tm = CarModelTestCase()
-  tm.setUpClass()
-  tm.setUp()
-
-  CC = car.CarControl.new_message()
-  ets = []
-  for _ in tqdm(range(N_RUNS)):
-    start_t = time.process_time_ns()
-    for msg in tm.can_msgs:
-      for cp in tm.CI.can_parsers.values():
-        if cp is not None:
-          cp.update_strings(msg)
-    ets.append((time.process_time_ns() - start_t) * 1e-6)
-
-  print(f'{len(tm.can_msgs)} CAN packets, {N_RUNS} runs')
-  print(f'{np.mean(ets):.2f} mean ms, {max(ets):.2f} max ms, {min(ets):.2f} min ms, {np.std(ets):.2f} std ms')
-  print(f'{np.mean(ets) / len(tm.can_msgs):.4f} mean ms / CAN packet')
+  parser = argparse.ArgumentParser(description="Benchmark CI.update and RI.update per CAN packet for the platforms of the given segments",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("segments", nargs="*", default=[f"{DEMO_ROUTE}/2"], help="segment logs or directories of them, the platform is read from carParams")
+  parser.add_argument("--runs", type=int, default=3, help="timing runs per segment")
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON baseline to compare against")
+  parser.add_argument("--threshold", type=float, default=0.2, help="relative increase over the baseline that's flagged as a regression")
+  parser.add_argument("--update-baseline", action="store_true", help="write the results of the benchmarked platforms to the baseline")
+  args = parser.parse_args()
+
+  baseline = load_baseline(args.baseline)
+  results = benchmark(expand_segments(args.segments), args.runs)
+  print_results(results, baseline)
+
+  if args.update_baseline:
+    with open(args.baseline, "w") as f:
+      json.dump({"version": BASELINE_VERSION, "platforms": baseline | results}, f, indent=2, sort_keys=True)
+    print(f"wrote {args.baseline}")
+  else:
+    regressions = find_regressions(results, baseline, args.threshold)
+    for r in regressions:
+      print(f"REGRESSION {r}")
+    sys.exit(int(len(regressions) > 0))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import argparse
+import json
+from collections.abc import Iterable, Iterator
+import numpy as np
+
+from openpilot.tools.lib.logreader import LogReader
+
+HISTOGRAMS = ("period", "work_time", "overrun")
+
+
+def timing_events(lr: Iterable) -> Iterator[dict]:
+  for msg in lr:
+    # ratekeeper_timing events are logged by every process through cloudlog
+    if msg.which() != 'logMessage' or 'ratekeeper_timing' not in msg.logMessage:
+      continue
+    try:
+      evt = json.loads(msg.logMessage)['msg']
+    except (json.decoder.JSONDecodeError, KeyError):
+      continue
+    if isinstance(evt, dict) and evt.get('event') == 'ratekeeper_timing':
+      yield evt
+
+
+def aggregate(events: Iterable[dict]) -> dict[tuple[str, float], dict]:
+  # processes with more than one Ratekeeper are told apart by their interval
+  procs: dict[tuple[str, float], dict] = {}
+  for evt in events:
+    key = (evt['process'], evt['interval'])
+    if key not in procs:
+      procs[key] = {'bucket_width': evt['bucket_width'], 'frames': 0, 'events': 0}
+      for h in HISTOGRAMS:
+        procs[key][h] = {'counts': np.zeros(len(evt[h]['counts']), dtype=np.int64), 'max': 0.}
+    p = procs[key]
+    p['frames'] += evt['frames']
+    p['events'] += 1
+    for h in HISTOGRAMS:
+      p[h]['counts'] += evt[h]['counts']
+      p[h]['max'] = max(p[h]['max'], evt[h]['max'])
+  return procs
+
+
+def percentile(hist: dict, bucket_width: float, p: float) -> float:
+  """Upper bound of the p-th percentile, the upper edge of the bucket it falls in"""
+  counts = hist['counts']
+  if counts.sum() == 0:
+    return 0.
+  i = int(np.searchsorted(np.cumsum(counts), p / 100. * counts.sum()))
+  return hist['max'] if i == len(counts) - 1 else min((i + 1) * bucket_width, hist['max'])
+
+
+def print_timing(procs: dict[tuple[str, float], dict]):
+  print(f"{'process':<40} {'Hz':>5} {'frames':>8} {'period p50':>10} {'p99':>6} {'max':>6} " +
+        f"{'work p50':>8} {'p99':>6} {'max':>6} {'overruns':>8} {'p99':>6} {'max':>6}")
+  print(f"{'':<40} {'':>5} {'':>8} {'ms':>10} {'ms':>6} {'ms':>6} {'% budget':>8} {'%':>6} {'%':>6} {'%':>8} {'ms':>6} {'ms':>6}")
+
+  # the processes that use the most of their budget first
+  for (name, interval), p in sorted(procs.items(), key=lambda x: -percentile(x[1]['work_time'], x[1]['bucket_width'], 99) / x[0][1]):
+    w = p['bucket_width']
+    period, work, overrun = (p[h] for h in HISTOGRAMS)
+    overruns = overrun['counts'].sum() / max(p['frames'], 1) * 100
+    print(f"{name[:40]:<40} {1 / interval:>5.0f} {p['frames']:>8} " +
+          f"{percentile(period, w, 50) * 1e3:>10.1f} {percentile(period, w, 99) * 1e3:>6.1f} {period['max'] * 1e3:>6.1f} " +
+          f"{percentile(work, w, 50) / interval * 100:>8.0f} {percentile(work, w, 99) / interval * 100:>6.0f} {work['max'] / interval * 100:>6.0f} " +
+          f"{overruns:>8.2f} {percentile(overrun, w, 99) * 1e3:>6.1f} {overrun['max'] * 1e3:>6.1f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Aggregate the Ratekeeper loop timing histograms that each process logs, over routes or segments",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("route", nargs="+", help="routes or segments, the timing events are in the rlogs")
+  parser.add_argument("--json", action="store_true", help="print the aggregated histograms as JSON")
+  args = parser.parse_args()
+
+  procs = aggregate(timing_events(LogReader(args.route, sort_by_time=True)))
+  if not procs:
+    print("no ratekeeper_timing events found")
+  elif args.json:
+    print(json.dumps([{'process': name, 'interval': interval, 'bucket_width': p['bucket_width'], 'frames': p['frames'],
+                       **{h: {'counts': p[h]['counts'].tolist(), 'max': p[h]['max']} for h in HISTOGRAMS}}
+                      for (name, interval), p in procs.items()], indent=2))
+  else:
+    print_timing(procs)
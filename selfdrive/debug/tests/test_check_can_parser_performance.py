@@ -0,0 +1,55 @@
+import json
+
+from opendbc.car.can_definitions import CanData
+from opendbc.car.car_helpers import interfaces
+from openpilot.selfdrive.debug import check_can_parser_performance as perf
+
+PLATFORM = "HONDA_CIVIC_2022"
+
+
+def result(mean_ns: float, p99_ns: float, alloc_peak_bytes: float) -> dict:
+  return {"mean_ns": mean_ns, "p99_ns": p99_ns, "alloc_peak_bytes": alloc_peak_bytes}
+
+
+class TestCanParserPerformance:
+  def test_find_regressions(self):
+    baseline = {PLATFORM: result(1000, 2000, 500), "TOYOTA_RAV4": result(1000, 2000, 500)}
+    results = {PLATFORM: result(1100, 3000, 500), "TOYOTA_RAV4": result(900, 2000, 500), "NEW_PLATFORM": result(1e6, 1e6, 1e6)}
+    # within the threshold, improvements and platforms without a baseline aren't regressions
+    assert perf.find_regressions(results, baseline, 0.2) == [f"{PLATFORM}: p99_ns 2000 -> 3000 (+50%)"]
+    assert len(perf.find_regressions(results, baseline, 0.05)) == 2
+
+  def test_load_baseline(self, tmp_path):
+    fn = str(tmp_path / "baseline.json")
+    assert perf.load_baseline(fn) == {}
+
+    platforms = {PLATFORM: result(1000, 2000, 500)}
+    with open(fn, "w") as f:
+      json.dump({"version": perf.BASELINE_VERSION, "platforms": platforms}, f)
+    assert perf.load_baseline(fn) == platforms
+
+    with open(fn, "w") as f:
+      json.dump({"version": perf.BASELINE_VERSION + 1, "platforms": platforms}, f)
+    assert perf.load_baseline(fn) == {}
+
+  def test_benchmark(self, mocker):
+    CarInterface = interfaces[PLATFORM]
+    CP = CarInterface.get_non_essential_params(PLATFORM)
+    can_msgs = [(i * 10_000_000, [CanData(0x1a6, b"\x00" * 8, 0)]) for i in range(100)]
+
+    def load_segment(fn):
+      if fn == "short":
+        raise AssertionError("no can data found")
+      elif fn == "no_car_params":
+        return None, None, None
+      return CarInterface, CP, can_msgs
+    mocker.patch.object(perf, "load_segment", side_effect=load_segment)
+
+    # segments that can't be benchmarked are skipped
+    results = perf.benchmark(["short", "civic", "no_car_params", "civic"], n_runs=1)
+    assert list(results) == [PLATFORM]
+    r = results[PLATFORM]
+    assert r["segments"] == ["civic", "civic"]
+    assert r["packets"] == 2 * len(can_msgs)
+    assert 0 < r["ci_mean_ns"] < r["mean_ns"] <= r["max_ns"]
+    assert r["alloc_peak_bytes"] > 0
@@ -1,5 +1,6 @@
 import os
 import capnp
+import functools
 import numpy as np
 from cereal import log
 from openpilot.selfdrive.modeld.constants import ModelConstants, Plan, Meta
@@ -42,6 +43,19 @@ def fill_xyvat(builder, t, x, y, v, a, x_std=None, y_std=None, v_std=None, a_std
   if a_std is not None:
     builder.aStd = a_std.tolist()
 
+def fill_xyzt_fast(builder, t, xyz, xyz_std=None):
+  # same as fill_xyzt, but converts each (N, 3) array with a single tolist() call
+  builder.t = t
+  builder.x, builder.y, builder.z = xyz.T.tolist()
+  if xyz_std is not None:
+    builder.xStd, builder.yStd, builder.zStd = xyz_std.T.tolist()
+
+def fill_xyvat_fast(builder, t, xyva, xyva_std):
+  # same as fill_xyvat, but takes already converted [x, y, v, a] lists
+  builder.t = t
+  builder.x, builder.y, builder.v, builder.a = xyva
+  builder.xStd, builder.yStd, builder.vStd, builder.aStd = xyva_std
+
 def fill_xyz_poly(builder, degree, x, y, z):
   xyz = np.stack([x, y, z], axis=1)
   coeffs = np.polynomial.polynomial.polyfit(ModelConstants.T_IDXS, xyz, deg=degree)
@@ -49,39 +63,23 @@ def fill_xyz_poly(builder, degree, x, y, z):
   builder.yCoefficients = coeffs[:, 1].tolist()
   builder.zCoefficients = coeffs[:, 2].tolist()
 
+@functools.cache
+def poly_fit_projection(degree: int) -> np.ndarray:
+  # least squares fit over the fixed T_IDXS, precomputed so fitting is a single matmul
+  return np.linalg.pinv(np.polynomial.polynomial.polyvander(np.array(ModelConstants.T_IDXS), degree))
+
+def fill_xyz_poly_fast(builder, degree, xyz):
+  coeffs = poly_fit_projection(degree) @ xyz
+  builder.xCoefficients, builder.yCoefficients, builder.zCoefficients = coeffs.T.tolist()
+
 def fill_lane_line_meta(builder, lane_lines, lane_line_probs):
   builder.leftY = lane_lines[1].y[0]
   builder.leftProb = lane_line_probs[1]
   builder.rightY = lane_lines[2].y[0]
   builder.rightProb = lane_line_probs[2]
 
-def fill_model_msg(base_msg: capnp._DynamicStructBuilder, extended_msg: capnp._DynamicStructBuilder,
-                   net_output_data: dict[str, np.ndarray], action: log.ModelDataV2.Action,
-                   publish_state: PublishState, vipc_frame_id: int, vipc_frame_id_extra: int,
-                   frame_id: int, frame_drop: float, timestamp_eof: int, model_execution_time: float,
-                   valid: bool) -> None:
-  frame_age = frame_id - vipc_frame_id if frame_id > vipc_frame_id else 0
-  frame_drop_perc = frame_drop * 100
-  extended_msg.valid = valid
-  base_msg.valid = valid
-
-  driving_model_data = base_msg.drivingModelData
-
-  driving_model_data.frameId = vipc_frame_id
-  driving_model_data.frameIdExtra = vipc_frame_id_extra
-  driving_model_data.frameDropPerc = frame_drop_perc
-  driving_model_data.modelExecutionTime = model_execution_time
-
-  driving_model_data.action = action
-
-  modelV2 = extended_msg.modelV2
-  modelV2.frameId = vipc_frame_id
-  modelV2.frameIdExtra = vipc_frame_id_extra
-  modelV2.frameAge = frame_age
-  modelV2.frameDropPerc = frame_drop_perc
-  modelV2.timestampEof = timestamp_eof
-  modelV2.modelExecutionTime = model_execution_time
-
+def fill_model_arrays(modelV2: capnp._DynamicStructBuilder, driving_model_data: capnp._DynamicStructBuilder,
+                      net_output_data: dict[str, np.ndarray], action: log.ModelDataV2.Action) -> None:
   # plan
   fill_xyzt(modelV2.position, ModelConstants.T_IDXS, *net_output_data['plan'][0,:,Plan.POSITION].T, *net_output_data['plan_stds'][0,:,Plan.POSITION].T)
   fill_xyzt(modelV2.velocity, ModelConstants.T_IDXS, *net_output_data['plan'][0,:,Plan.VELOCITY].T)
@@ -140,13 +138,114 @@ def fill_model_msg(base_msg: capnp._DynamicStructBuilder, extended_msg: capnp._D
   disengage_predictions.gasPressProbs = net_output_data['meta'][0,Meta.GAS_PRESS].tolist()
   disengage_predictions.brakePressProbs = net_output_data['meta'][0,Meta.BRAKE_PRESS].tolist()
 
+def fill_model_arrays_fast(modelV2: capnp._DynamicStructBuilder, driving_model_data: capnp._DynamicStructBuilder,
+                           net_output_data: dict[str, np.ndarray], action: log.ModelDataV2.Action) -> None:
+  # Same fields in the same order as fill_model_arrays, so the serialized modelV2 messages are identical.
+  # pycapnp only accepts Python lists for List(Float32) fields, so the cost is dominated by the
+  # numpy -> list conversions: convert each output tensor once and slice the resulting lists.
+  plan = net_output_data['plan'][0]
+  fill_xyzt_fast(modelV2.position, ModelConstants.T_IDXS, plan[:,Plan.POSITION], net_output_data['plan_stds'][0,:,Plan.POSITION])
+  fill_xyzt_fast(modelV2.velocity, ModelConstants.T_IDXS, plan[:,Plan.VELOCITY])
+  fill_xyzt_fast(modelV2.acceleration, ModelConstants.T_IDXS, plan[:,Plan.ACCELERATION])
+  fill_xyzt_fast(modelV2.orientation, ModelConstants.T_IDXS, plan[:,Plan.T_FROM_CURRENT_EULER])
+  fill_xyzt_fast(modelV2.orientationRate, ModelConstants.T_IDXS, plan[:,Plan.ORIENTATION_RATE])
+
+  # poly path
+  fill_xyz_poly_fast(driving_model_data.path, ModelConstants.POLY_PATH_DEGREE, plan[:,Plan.POSITION])
+
+  # action
+  modelV2.action = action
+
+  # times at X_IDXS of edges and lines aren't used
+  LINE_T_IDXS: list[float] = []
+
+  # lane lines, [line][y/z][x_idx]
+  lane_lines = net_output_data['lane_lines'][0].transpose(0, 2, 1).tolist()
+  for lane_line, (y, z) in zip(modelV2.init('laneLines', 4), lane_lines, strict=True):
+    lane_line.t = LINE_T_IDXS
+    lane_line.x = ModelConstants.X_IDXS
+    lane_line.y = y
+    lane_line.z = z
+  modelV2.laneLineStds = net_output_data['lane_lines_stds'][0,:,0,0].tolist()
+  modelV2.laneLineProbs = net_output_data['lane_lines_prob'][0,1::2].tolist()
+
+  fill_lane_line_meta(driving_model_data.laneLineMeta, modelV2.laneLines, modelV2.laneLineProbs)
+
+  # road edges, [edge][y/z][x_idx]
+  road_edges = net_output_data['road_edges'][0].transpose(0, 2, 1).tolist()
+  for road_edge, (y, z) in zip(modelV2.init('roadEdges', 2), road_edges, strict=True):
+    road_edge.t = LINE_T_IDXS
+    road_edge.x = ModelConstants.X_IDXS
+    road_edge.y = y
+    road_edge.z = z
+  modelV2.roadEdgeStds = net_output_data['road_edges_stds'][0,:,0,0].tolist()
+
+  # leads, [lead][x/y/v/a][t_idx]
+  leads = net_output_data['lead'][0].transpose(0, 2, 1).tolist()
+  lead_stds = net_output_data['lead_stds'][0].transpose(0, 2, 1).tolist()
+  lead_probs = net_output_data['lead_prob'][0].tolist()
+  for i, lead in enumerate(modelV2.init('leadsV3', 3)):
+    fill_xyvat_fast(lead, ModelConstants.LEAD_T_IDXS, leads[i], lead_stds[i])
+    lead.prob = lead_probs[i]
+    lead.probTime = ModelConstants.LEAD_T_OFFSETS[i]
+
+  # meta
+  meta_out = net_output_data['meta'][0].tolist()
+  meta = modelV2.meta
+  meta.desireState = net_output_data['desire_state'][0].reshape(-1).tolist()
+  meta.desirePrediction = net_output_data['desire_pred'][0].reshape(-1).tolist()
+  meta.engagedProb = meta_out[Meta.ENGAGED][0]
+  meta.init('disengagePredictions')
+  disengage_predictions = meta.disengagePredictions
+  disengage_predictions.t = ModelConstants.META_T_IDXS
+  disengage_predictions.brakeDisengageProbs = meta_out[Meta.BRAKE_DISENGAGE]
+  disengage_predictions.gasDisengageProbs = meta_out[Meta.GAS_DISENGAGE]
+  disengage_predictions.steerOverrideProbs = meta_out[Meta.STEER_OVERRIDE]
+  disengage_predictions.brake3MetersPerSecondSquaredProbs = meta_out[Meta.HARD_BRAKE_3]
+  disengage_predictions.brake4MetersPerSecondSquaredProbs = meta_out[Meta.HARD_BRAKE_4]
+  disengage_predictions.brake5MetersPerSecondSquaredProbs = meta_out[Meta.HARD_BRAKE_5]
+  disengage_predictions.gasPressProbs = meta_out[Meta.GAS_PRESS]
+  disengage_predictions.brakePressProbs = meta_out[Meta.BRAKE_PRESS]
+
+def fill_model_msg(base_msg: capnp._DynamicStructBuilder, extended_msg: capnp._DynamicStructBuilder,
+                   net_output_data: dict[str, np.ndarray], action: log.ModelDataV2.Action,
+                   publish_state: PublishState, vipc_frame_id: int, vipc_frame_id_extra: int,
+                   frame_id: int, frame_drop: float, timestamp_eof: int, model_execution_time: float,
+                   valid: bool, fast: bool = True) -> None:
+  frame_age = frame_id - vipc_frame_id if frame_id > vipc_frame_id else 0
+  frame_drop_perc = frame_drop * 100
+  extended_msg.valid = valid
+  base_msg.valid = valid
+
+  driving_model_data = base_msg.drivingModelData
+
+  driving_model_data.frameId = vipc_frame_id
+  driving_model_data.frameIdExtra = vipc_frame_id_extra
+  driving_model_data.frameDropPerc = frame_drop_perc
+  driving_model_data.modelExecutionTime = model_execution_time
+
+  driving_model_data.action = action
+
+  modelV2 = extended_msg.modelV2
+  modelV2.frameId = vipc_frame_id
+  modelV2.frameIdExtra = vipc_frame_id_extra
+  modelV2.frameAge = frame_age
+  modelV2.frameDropPerc = frame_drop_perc
+  modelV2.timestampEof = timestamp_eof
+  modelV2.modelExecutionTime = model_execution_time
+
+  if fast:
+    fill_model_arrays_fast(modelV2, driving_model_data, net_output_data, action)
+  else:
+    fill_model_arrays(modelV2, driving_model_data, net_output_data, action)
+
   publish_state.prev_brake_5ms2_probs[:-1] = publish_state.prev_brake_5ms2_probs[1:]
   publish_state.prev_brake_5ms2_probs[-1] = net_output_data['meta'][0,Meta.HARD_BRAKE_5][0]
   publish_state.prev_brake_3ms2_probs[:-1] = publish_state.prev_brake_3ms2_probs[1:]
   publish_state.prev_brake_3ms2_probs[-1] = net_output_data['meta'][0,Meta.HARD_BRAKE_3][0]
   hard_brake_predicted = (publish_state.prev_brake_5ms2_probs > ModelConstants.FCW_THRESHOLDS_5MS2).all() and \
     (publish_state.prev_brake_3ms2_probs > ModelConstants.FCW_THRESHOLDS_3MS2).all()
-  meta.hardBrakePredicted = hard_brake_predicted.item()
+  modelV2.meta.hardBrakePredicted = hard_brake_predicted.item()
 
   # confidence
   if vipc_frame_id % (2*ModelConstants.MODEL_RUN_FREQ) == 0:
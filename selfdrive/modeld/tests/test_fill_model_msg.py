@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from cereal import log
+from openpilot.selfdrive.modeld.constants import ModelConstants
+from openpilot.selfdrive.modeld.fill_model_msg import fill_model_msg, PublishState
+
+OUTPUT_SHAPES = {
+  'plan': (1, ModelConstants.IDX_N, ModelConstants.PLAN_WIDTH),
+  'plan_stds': (1, ModelConstants.IDX_N, ModelConstants.PLAN_WIDTH),
+  'lane_lines': (1, ModelConstants.NUM_LANE_LINES, ModelConstants.IDX_N, ModelConstants.LANE_LINES_WIDTH),
+  'lane_lines_stds': (1, ModelConstants.NUM_LANE_LINES, ModelConstants.IDX_N, ModelConstants.LANE_LINES_WIDTH),
+  'lane_lines_prob': (1, 2 * ModelConstants.NUM_LANE_LINES),
+  'road_edges': (1, ModelConstants.NUM_ROAD_EDGES, ModelConstants.IDX_N, ModelConstants.LANE_LINES_WIDTH),
+  'road_edges_stds': (1, ModelConstants.NUM_ROAD_EDGES, ModelConstants.IDX_N, ModelConstants.LANE_LINES_WIDTH),
+  'lead': (1, ModelConstants.LEAD_MHP_SELECTION, ModelConstants.LEAD_TRAJ_LEN, ModelConstants.LEAD_WIDTH),
+  'lead_stds': (1, ModelConstants.LEAD_MHP_SELECTION, ModelConstants.LEAD_TRAJ_LEN, ModelConstants.LEAD_WIDTH),
+  'lead_prob': (1, ModelConstants.LEAD_MHP_SELECTION),
+  'desire_state': (1, ModelConstants.DESIRE_PRED_WIDTH),
+  'desire_pred': (1, ModelConstants.DESIRE_PRED_LEN, ModelConstants.DESIRE_PRED_WIDTH),
+  'meta': (1, 55),
+}
+
+
+def fill(net_output_data, publish_state, frame_id, fast):
+  base_msg = log.Event.new_message()
+  base_msg.init('drivingModelData')
+  extended_msg = log.Event.new_message()
+  extended_msg.init('modelV2')
+  action = log.ModelDataV2.Action(desiredCurvature=0.01, desiredAcceleration=-0.5)
+  fill_model_msg(base_msg, extended_msg, net_output_data, action, publish_state, frame_id, frame_id, frame_id + 1,
+                 0.05, 1000 * frame_id, 0.02, True, fast=fast)
+  return base_msg, extended_msg
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fast_path_matches_reference(seed):
+  rng = np.random.default_rng(seed)
+  ref_state, fast_state = PublishState(), PublishState()
+  for frame_id in range(2 * 2 * ModelConstants.MODEL_RUN_FREQ + 1):
+    net_output_data = {k: rng.random(shape, dtype=np.float32) for k, shape in OUTPUT_SHAPES.items()}
+    ref_base, ref_extended = fill(net_output_data, ref_state, frame_id, fast=False)
+    fast_base, fast_extended = fill(net_output_data, fast_state, frame_id, fast=True)
+
+    # same fields, filled in the same order
+    assert fast_extended.to_bytes() == ref_extended.to_bytes()
+
+    # the poly path is fit with a precomputed projection instead of polyfit
+    ref_path, fast_path = ref_base.drivingModelData.path, fast_base.drivingModelData.path
+    for field in ('xCoefficients', 'yCoefficients', 'zCoefficients'):
+      np.testing.assert_allclose(getattr(fast_path, field), getattr(ref_path, field), rtol=1e-5, atol=1e-6)
+    ref_dict, fast_dict = ref_base.drivingModelData.to_dict(), fast_base.drivingModelData.to_dict()
+    del ref_dict['path'], fast_dict['path']
+    assert fast_dict == ref_dict
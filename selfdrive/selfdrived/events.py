@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import bisect
+import functools
 import math
 import os
 from enum import IntEnum
@@ -48,13 +49,61 @@ class ET:
 
 # get event name from enum
 EVENT_NAME = {v: k for k, v in EventName.schema.enumerants.items()}
+NUM_EVENTS = max(EVENT_NAME) + 1
+
+# one bit per event type, so checking for a type across all active events is a single AND
+ET_BITS = {et: 1 << i for i, et in enumerate(v for k, v in vars(ET).items() if not k.startswith('_'))}
+
+
+class _CachedEvent:
+  __slots__ = ('alerts', 'mask', 'msg')
+
+  def __init__(self, alerts: dict):
+    self.alerts = alerts
+    self.mask = sum(ET_BITS.get(et, 0) for et in alerts)
+    self.msg: log.OnroadEvent | None = None
+
+
+def _cached_event(event_name: int) -> _CachedEvent:
+  alerts = EVENTS.get(event_name, {})
+  cached = _event_cache.get(event_name)
+  # EVENTS entries may be replaced at runtime (e.g. in tests), so the cache is keyed on the entry itself
+  if cached is None or cached.alerts is not alerts:
+    cached = _event_cache[event_name] = _CachedEvent(alerts)
+  return cached
+
+_event_cache: dict[int, _CachedEvent] = {}
+
+
+def event_type_mask(event_name: int) -> int:
+  return _cached_event(event_name).mask
+
+
+def onroad_event_msg(event_name: int) -> log.OnroadEvent:
+  cached = _cached_event(event_name)
+  if cached.msg is None:
+    event = log.OnroadEvent.new_message()
+    event.name = event_name
+    for event_type in cached.alerts:
+      setattr(event, event_type, True)
+    cached.msg = event.as_reader()
+  return cached.msg
+
+
+@functools.cache
+def alert_type_name(event_name: int, event_type: str) -> str:
+  return f"{EVENT_NAME[event_name]}/{event_type}"
 
 
 class Events:
   def __init__(self):
     self.events: list[int] = []
     self.static_events: list[int] = []
-    self.event_counters = dict.fromkeys(EVENTS.keys(), 0)
+    # counters are indexed by event name, only events active in the last cycle can be non-zero
+    self.event_counters = [0] * NUM_EVENTS
+    self.counted_events: set[int] = set()
+    self.type_mask = 0
+    self.static_type_mask = 0
 
   @property
   def names(self) -> list[int]:
@@ -64,49 +113,59 @@ class Events:
     return len(self.events)
 
   def add(self, event_name: int, static: bool=False) -> None:
+    mask = event_type_mask(event_name)
     if static:
       bisect.insort(self.static_events, event_name)
+      self.static_type_mask |= mask
     bisect.insort(self.events, event_name)
+    self.type_mask |= mask
 
   def clear(self) -> None:
-    self.event_counters = {k: (v + 1 if k in self.events else 0) for k, v in self.event_counters.items()}
+    active = {e for e in self.events if e < NUM_EVENTS}
+    for e in self.counted_events - active:
+      self.event_counters[e] = 0
+    for e in active:
+      self.event_counters[e] += 1
+    self.counted_events = active
+
     self.events = self.static_events.copy()
+    self.type_mask = self.static_type_mask
 
   def contains(self, event_type: str) -> bool:
-    return any(event_type in EVENTS.get(e, {}) for e in self.events)
+    return bool(self.type_mask & ET_BITS[event_type])
 
   def create_alerts(self, event_types: list[str], callback_args=None):
     if callback_args is None:
       callback_args = []
 
+    types_mask = 0
+    for et in event_types:
+      types_mask |= ET_BITS[et]
+
     ret = []
     for e in self.events:
-      types = EVENTS[e].keys()
+      if not (event_type_mask(e) & types_mask):
+        continue
+
+      alerts = EVENTS[e]
       for et in event_types:
-        if et in types:
-          alert = EVENTS[e][et]
+        if et in alerts:
+          alert = alerts[et]
           if not isinstance(alert, Alert):
             alert = alert(*callback_args)
 
           if DT_CTRL * (self.event_counters[e] + 1) >= alert.creation_delay:
-            alert.alert_type = f"{EVENT_NAME[e]}/{et}"
+            alert.alert_type = alert_type_name(e, et)
             alert.event_type = et
             ret.append(alert)
     return ret
 
   def add_from_msg(self, events):
     for e in events:
-      bisect.insort(self.events, e.name.raw)
+      self.add(e.name.raw)
 
   def to_msg(self):
-    ret = []
-    for event_name in self.events:
-      event = log.OnroadEvent.new_message()
-      event.name = event_name
-      for event_type in EVENTS.get(event_name, {}):
-        setattr(event, event_type, True)
-      ret.append(event)
-    return ret
+    return [onroad_event_msg(event_name) for event_name in self.events]
 
 
 class Alert:
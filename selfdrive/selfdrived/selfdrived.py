@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import os
-import time
 import threading
 
 import cereal.messaging as messaging
@@ -503,13 +502,18 @@ class SelfdriveD:
     self.CS_prev = CS
 
   def params_thread(self, evt):
-    while not evt.is_set():
-      self.is_metric = self.params.get_bool("IsMetric")
-      self.is_ldw_enabled = self.params.get_bool("IsLdwEnabled")
-      self.disengage_on_accelerator = self.params.get_bool("DisengageOnAccelerator")
-      self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
-      self.personality = self.params.get("LongitudinalPersonality", return_default=True)
-      time.sleep(0.1)
+    keys = ["IsMetric", "IsLdwEnabled", "DisengageOnAccelerator", "ExperimentalMode", "LongitudinalPersonality"]
+    with self.params.watch(keys) as watcher:
+      changed = True
+      while not evt.is_set():
+        if changed:
+          self.is_metric = self.params.get_bool("IsMetric")
+          self.is_ldw_enabled = self.params.get_bool("IsLdwEnabled")
+          self.disengage_on_accelerator = self.params.get_bool("DisengageOnAccelerator")
+          self.experimental_mode = self.params.get_bool("ExperimentalMode") and self.CP.openpilotLongitudinalControl
+          self.personality = self.params.get("LongitudinalPersonality", return_default=True)
+        # only wakes up on param writes, the timeout bounds how long exiting takes
+        changed = watcher.wait(timeout=0.1)
 
   def run(self):
     e = threading.Event()
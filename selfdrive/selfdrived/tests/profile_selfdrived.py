@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import cProfile
+import pstats
+import random
+
+import cereal.messaging as messaging
+from cereal import log
+from opendbc.car.car_helpers import interfaces
+from openpilot.common.benchmark import benchmark_parser, print_times, time_calls
+from openpilot.common.prefix import OpenpilotPrefix
+from openpilot.common.realtime import DT_CTRL
+from openpilot.selfdrive.selfdrived.events import Alert, Events, ET, EVENTS
+from openpilot.selfdrive.selfdrived.selfdrived import SelfdriveD
+
+EventName = log.OnroadEvent.EventName
+ALERT_TYPES = [ET.PERMANENT, ET.WARNING, ET.NO_ENTRY, ET.SOFT_DISABLE]
+
+
+def benchmark_events(n_cycles, n_active):
+  # static alerts only, the callback ones depend on the full selfdrived state
+  names = [e for e, alerts in EVENTS.items() if all(isinstance(a, Alert) for a in alerts.values())]
+  events = Events()
+  active = random.sample(names, n_active)
+
+  def cycle():
+    events.clear()
+    for e in active:
+      events.add(e)
+    for et in (ET.USER_DISABLE, ET.IMMEDIATE_DISABLE, ET.SOFT_DISABLE, ET.NO_ENTRY, ET.ENABLE):
+      events.contains(et)
+    events.create_alerts(ALERT_TYPES)
+
+  print_times(f"Events cycle, {n_active} active events", time_calls(cycle, n_cycles))
+
+
+def benchmark_step(n_cycles, profile):
+  CP = interfaces["TOYOTA_RAV4"].get_non_essential_params("TOYOTA_RAV4")
+  sd = SelfdriveD(CP=CP)
+  pm = messaging.PubMaster(['carState'])
+
+  CS = messaging.new_message('carState')
+  CS.carState.canValid = True
+  CS.carState.vEgo = 20.
+  dat = CS.to_bytes()
+
+  def step():
+    pm.send('carState', dat)
+    sd.step()
+
+  # with no other publishers selfdrived initializes after a timeout
+  for _ in range(int(6.5 / DT_CTRL)):
+    step()
+
+  if profile:
+    with cProfile.Profile() as pr:
+      for _ in range(n_cycles):
+        step()
+    pstats.Stats(pr).sort_stats('cumtime').print_stats(25)
+
+  times = time_calls(step, n_cycles)
+  print_times(f"SelfdriveD.step, {len(sd.events)} active events", times)
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the per-cycle cost of selfdrived")
+  parser.add_argument("-n", type=int, default=1000, help="number of cycles")
+  parser.add_argument("--profile", action="store_true", help="print a cProfile of SelfdriveD.step")
+  args = parser.parse_args()
+
+  for n_active in (0, 5, 20):
+    benchmark_events(args.n, n_active)
+
+  with OpenpilotPrefix():
+    benchmark_step(args.n, args.profile)
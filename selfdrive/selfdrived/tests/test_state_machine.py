@@ -90,3 +90,13 @@ class TestStateMachine:
         self.state_machine.update(self.events)
         assert self.state_machine.state == state
         self.events.clear()
+
+  def test_replaced_event_msg(self):
+    # the cached event messages follow replaced EVENTS entries
+    self.events.add(make_event([ET.ENABLE]))
+    assert self.events.to_msg()[0].enable
+    self.events.clear()
+
+    self.events.add(make_event([ET.NO_ENTRY]))
+    msg = self.events.to_msg()[0]
+    assert msg.noEntry and not msg.enable
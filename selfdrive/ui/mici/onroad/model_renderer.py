@@ -1,4 +1,3 @@
-import colorsys
 import numpy as np
 import pyray as rl
 from cereal import messaging, car
@@ -9,7 +8,7 @@ from openpilot.selfdrive.locationd.calibrationd import HEIGHT_INIT
 from openpilot.selfdrive.ui.ui_state import ui_state, UIStatus
 from openpilot.selfdrive.ui.mici.onroad import blend_colors
 from openpilot.system.ui.lib.application import gui_app
-from openpilot.system.ui.lib.shader_polygon import draw_polygon, Gradient
+from openpilot.system.ui.lib.shader_polygon import draw_polygon, hsla_to_rgba, Gradient
 from openpilot.system.ui.widgets import Widget
 
 CLIP_MARGIN = 500
@@ -223,35 +222,30 @@ class ModelRenderer(Widget):
 
     max_len = min(len(self._path.projected_points) // 2, len(self._acceleration_x))
 
-    segment_colors = []
-    gradient_stops = []
-
-    i = 0
-    while i < max_len:
-      # Some points (screen space) are out of frame (rect space)
-      track_y = self._path.projected_points[i][1]
-      if track_y < self._rect.y or track_y > (self._rect.y + self._rect.height):
-        i += 1
-        continue
-
-      # Calculate color based on acceleration (0 is bottom, 1 is top)
-      lin_grad_point = 1 - (track_y - self._rect.y) / self._rect.height
-
-      # speed up: 120, slow down: 0
-      path_hue = np.clip(60 + self._acceleration_x[i] * 35, 0, 120)
-
-      saturation = min(abs(self._acceleration_x[i] * 1.5), 1)
-      lightness = np.interp(saturation, [0.0, 1.0], [0.95, 0.62])
-      alpha = np.interp(lin_grad_point, [0.75 / 2.0, 0.75], [0.4, 0.0])
+    # Some points (screen space) are out of frame (rect space). The path's left side never goes
+    # back down the screen, so the points in frame are a single run
+    track_y = self._path.projected_points[:max_len, 1]
+    in_rect = np.flatnonzero((track_y >= self._rect.y) & (track_y <= self._rect.y + self._rect.height))
+    if in_rect.size:
+      # every other point, and the last one
+      idx = np.arange(in_rect[0], max_len, 2)
+      if idx[-1] == max_len - 2:
+        idx = np.append(idx, max_len - 1)
+      idx = idx[idx <= in_rect[-1]]
+    else:
+      idx = in_rect
 
-      # Use HSL to RGB conversion
-      color = self._hsla_to_color(path_hue / 360.0, saturation, lightness, alpha)
+    # Calculate color based on acceleration (0 is bottom, 1 is top)
+    accel = self._acceleration_x[idx]
+    gradient_stops = 1 - (track_y[idx] - self._rect.y) / self._rect.height
 
-      gradient_stops.append(lin_grad_point)
-      segment_colors.append(color)
+    # speed up: 120, slow down: 0
+    path_hue = np.clip(60 + accel * 35, 0, 120)
 
-      # Skip a point, unless next is last
-      i += 1 + (1 if (i + 2) < max_len else 0)
+    saturation = np.minimum(np.abs(accel * 1.5), 1)
+    lightness = np.interp(saturation, [0.0, 1.0], [0.95, 0.62])
+    alpha = np.interp(gradient_stops, [0.75 / 2.0, 0.75], [0.4, 0.0])
+    segment_colors = hsla_to_rgba(path_hue / 360.0, saturation, lightness, alpha)
 
     # Store the gradient in the path object
     self._exp_gradient.colors = segment_colors
@@ -453,16 +447,6 @@ class ModelRenderer(Widget):
 
     return np.vstack((left_screen.T, right_screen[:, ::-1].T)).astype(np.float32)
 
-  @staticmethod
-  def _hsla_to_color(h, s, l, a):
-    rgb = colorsys.hls_to_rgb(h, l, s)
-    return rl.Color(
-      int(rgb[0] * 255),
-      int(rgb[1] * 255),
-      int(rgb[2] * 255),
-      int(a * 255)
-    )
-
   @staticmethod
   def _blend_colors(begin_colors, end_colors, t):
     if t >= 1.0:
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import time
+import numpy as np
+import pyray as rl
+
+from cereal import messaging
+from openpilot.common.benchmark import benchmark_parser, print_times
+from openpilot.common.transformations.camera import DEVICE_CAMERAS, view_frame_from_device_frame
+from openpilot.selfdrive.ui.onroad.model_renderer import CLIP_MARGIN, ModelRenderer
+from openpilot.system.ui.lib.application import gui_app
+from openpilot.system.ui.lib.shader_polygon import _gradient_color_buffer, triangulate
+
+IDX_N = 33
+T_IDXS = 10.0 * (np.arange(IDX_N) / (IDX_N - 1)) ** 2
+RECT = rl.Rectangle(0, 0, 2160, 1080)
+
+
+def fake_messages(curvature: float, accel: float):
+  model = messaging.new_message('modelV2').modelV2
+  x = T_IDXS * 25.
+  model.position.x, model.position.y, model.position.z = x.tolist(), (curvature * x ** 2).tolist(), np.zeros(IDX_N).tolist()
+  model.acceleration.x = (accel * np.sin(T_IDXS)).tolist()
+  model.init('laneLines', 4)
+  model.init('roadEdges', 2)
+  for line, y in zip([*model.laneLines, *model.roadEdges], (-5.4, -1.8, 1.8, 5.4, -7., 7.), strict=True):
+    line.x, line.y, line.z = x.tolist(), (curvature * x ** 2 + y).tolist(), np.zeros(IDX_N).tolist()
+  model.laneLineProbs = [0.5, 0.9, 0.9, 0.5]
+  model.roadEdgeStds = [0.3, 0.3]
+
+  radar_state = messaging.new_message('radarState').radarState
+  for lead, d_rel in ((radar_state.leadOne, 30.), (radar_state.leadTwo, 60.)):
+    lead.status = True
+    lead.dRel, lead.yRel, lead.vRel = d_rel, 0.5, -2.
+  return model, radar_state
+
+
+def make_renderer() -> ModelRenderer:
+  renderer = ModelRenderer()
+  renderer.set_rect(RECT)
+  intrinsic = DEVICE_CAMERAS["tici", "ar0231"].fcam.intrinsics
+  cx, cy, zoom = intrinsic[0, 2], intrinsic[1, 2], 1.1
+  video_transform = np.array([
+    [zoom, 0.0, RECT.width / 2 - cx * zoom],
+    [0.0, zoom, RECT.height / 2 - cy * zoom],
+    [0.0, 0.0, 1.0],
+  ])
+  renderer.set_transform(video_transform @ intrinsic @ view_frame_from_device_frame)
+  renderer._clip_region = rl.Rectangle(RECT.x - CLIP_MARGIN, RECT.y - CLIP_MARGIN, RECT.width + 2 * CLIP_MARGIN, RECT.height + 2 * CLIP_MARGIN)
+  renderer._experimental_mode = True
+  return renderer
+
+
+def benchmark(n_frames: int, draw: bool):
+  renderer = make_renderer()
+  messages = [fake_messages(c, a) for c, a in zip(np.linspace(-1e-3, 1e-3, 20), np.linspace(-2., 2., 20), strict=True)]
+
+  update_times, buffer_times, draw_times = [], [], []
+  for i in range(n_frames):
+    model, radar_state = messages[i % len(messages)]
+
+    # what ModelRenderer._render does on a new modelV2
+    t = time.perf_counter()
+    renderer._update_raw_points(model)
+    path_x_array = renderer._path.raw_points[:, 0]
+    renderer._update_model(radar_state.leadOne, path_x_array)
+    renderer._update_leads(radar_state, path_x_array)
+    update_times.append(time.perf_counter() - t)
+
+    # the vertex and color buffers draw_polygon hands to raylib
+    t = time.perf_counter()
+    for line in (*renderer._lane_lines, *renderer._road_edges, renderer._path):
+      triangulate(line.projected_points)
+    _gradient_color_buffer(renderer._exp_gradient.colors)
+    buffer_times.append(time.perf_counter() - t)
+
+    if draw:
+      t = time.perf_counter()
+      rl.begin_drawing()
+      rl.clear_background(rl.BLACK)
+      renderer._draw_lane_lines()
+      renderer._draw_path(FakeSubMaster())
+      renderer._draw_lead_indicator()
+      rl.end_drawing()
+      draw_times.append(time.perf_counter() - t)
+
+  print_times("model, path gradient and leads update", update_times)
+  print_times("vertex and color buffers", buffer_times)
+  if draw:
+    print_times("draw", draw_times)
+
+
+class FakeSubMaster:
+  class LongitudinalPlan:
+    allowThrottle = True
+
+  def __getitem__(self, s):
+    assert s == 'longitudinalPlan'
+    return self.LongitudinalPlan
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the frame time of the onroad lane lines, path and lead rendering")
+  parser.add_argument("-n", type=int, default=1000, help="number of frames")
+  parser.add_argument("--draw", action="store_true", help="also draw to a window, includes the GPU time")
+  args = parser.parse_args()
+
+  if args.draw:
+    gui_app.init_window("model renderer benchmark")
+  benchmark(args.n, args.draw)
+  if args.draw:
+    gui_app.close()
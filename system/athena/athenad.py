@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
+import heapq
 import io
+import itertools
 import json
 import os
 import queue
@@ -21,8 +24,7 @@ from queue import Queue
 from typing import cast
 from collections.abc import Callable
 
-import requests
-from requests.adapters import HTTPAdapter, DEFAULT_POOLBLOCK
+import aiohttp
 from jsonrpc import JSONRPCResponseManager, dispatcher
 from websocket import (ABNF, WebSocket, WebSocketException, WebSocketTimeoutException,
                        create_connection)
@@ -31,11 +33,11 @@ import cereal.messaging as messaging
 from cereal import log
 from cereal.services import SERVICE_LIST
 from openpilot.common.api import Api, get_key_pair
-from openpilot.common.utils import CallbackReader, get_upload_stream
+from openpilot.common.utils import get_upload_stream
 from openpilot.common.params import Params
 from openpilot.common.realtime import set_core_affinity
+from openpilot.system.athena.file_index import DirectoryIndex, LogIndex, LOG_ATTR_VALUE_MAX_UNIX_TIME
 from openpilot.system.hardware import HARDWARE, PC
-from openpilot.system.loggerd.xattr_cache import getxattr, setxattr
 from openpilot.common.swaglog import cloudlog
 from openpilot.system.version import get_build_metadata
 from openpilot.system.hardware.hw import Paths
@@ -45,8 +47,6 @@ ATHENA_HOST = os.getenv('ATHENA_HOST', 'wss://athena.comma.ai')
 HANDLER_THREADS = int(os.getenv('HANDLER_THREADS', "4"))
 LOCAL_PORT_WHITELIST = {22, }  # SSH
 
-LOG_ATTR_NAME = 'user.upload'
-LOG_ATTR_VALUE_MAX_UNIX_TIME = int.to_bytes(2147483647, 4, sys.byteorder)
 RECONNECT_TIMEOUT_S = 70
 
 RETRY_DELAY = 10  # seconds
@@ -55,6 +55,16 @@ MAX_AGE = 31 * 24 * 3600  # seconds
 WS_FRAME_SIZE = 4096
 DEVICE_STATE_UPDATE_INTERVAL = 1.0  # in seconds
 DEFAULT_UPLOAD_PRIORITY = 99  # higher number = lower priority
+UPLOAD_TIMEOUT = 30  # seconds, to connect and between reads
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# concurrent uploads per lane. a lane's slots take uploads up to its max size, bulk slots also take small
+# uploads when there are any waiting, so small files like qlogs never queue behind big ones like fcameras
+SMALL_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_LANES: dict[str, tuple[int | None, int]] = {
+  "small": (SMALL_UPLOAD_SIZE, 2),
+  "bulk": (None, 2),
+}
 
 # https://bytesolutions.com/dscp-tos-cos-precedence-conversion-chart,
 # https://en.wikipedia.org/wiki/Differentiated_services
@@ -69,15 +79,11 @@ UploadItemDict = dict[str, str | bool | int | float | dict[str, str]]
 UploadFilesToUrlResponse = dict[str, int | list[UploadItemDict] | list[str]]
 
 
-class UploadTOSAdapter(HTTPAdapter):
-  def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK, **pool_kwargs):
-    pool_kwargs["socket_options"] = [(socket.IPPROTO_IP, socket.IP_TOS, UPLOAD_TOS)]
-    super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
-
-
-UPLOAD_SESS = requests.Session()
-UPLOAD_SESS.mount("http://", UploadTOSAdapter())
-UPLOAD_SESS.mount("https://", UploadTOSAdapter())
+def upload_socket_factory(addr_info) -> socket.socket:
+  family, type_, proto, _, _ = addr_info
+  sock = socket.socket(family=family, type=type_, proto=proto)
+  sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, UPLOAD_TOS)
+  return sock
 
 
 @dataclass
@@ -123,15 +129,116 @@ class UploadItem:
     return self.priority == other.priority
 
 
+class UploadQueue:
+  """
+  Pending and in-progress uploads, shared by the jsonrpc handlers and the upload engine.
+
+  Pending uploads are kept in a heap per lane, ordered by priority then by when they were queued.
+  Retries wait in a separate heap until their delay has passed. Listeners get notified on every
+  put and cancel, the upload engine uses that to wake up and to stop cancelled uploads immediately.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.counter = itertools.count()
+    self.lanes: dict[str, list[tuple[int, int, UploadItem]]] = {lane: [] for lane in UPLOAD_LANES}
+    self.delayed: list[tuple[float, int, str, UploadItem]] = []
+    self.current: dict[int, UploadItem] = {}
+    self.on_put: Callable[[], None] | None = None
+    self.on_cancel: Callable[[set[str]], None] | None = None
+
+  @staticmethod
+  def lane(item: UploadItem) -> str:
+    try:
+      sz = os.path.getsize(item.path if os.path.exists(item.path) else strip_zst_extension(item.path))
+    except OSError:
+      sz = 0
+    for lane, (max_size, _) in UPLOAD_LANES.items():
+      if max_size is None or sz <= max_size:
+        return lane
+    return list(UPLOAD_LANES)[-1]
+
+  def put_nowait(self, item: UploadItem, delay: float = 0.) -> None:
+    lane = self.lane(item)
+    with self.lock:
+      if delay > 0:
+        heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.counter), lane, item))
+      else:
+        heapq.heappush(self.lanes[lane], (item.priority, next(self.counter), item))
+    if self.on_put is not None:
+      self.on_put()
+
+  def _promote_delayed(self) -> None:
+    now = time.monotonic()
+    while self.delayed and self.delayed[0][0] <= now:
+      _, cnt, lane, item = heapq.heappop(self.delayed)
+      heapq.heappush(self.lanes[lane], (item.priority, cnt, item))
+
+  def next_delayed(self) -> float | None:
+    """Monotonic time the next delayed retry becomes available"""
+    with self.lock:
+      return self.delayed[0][0] if self.delayed else None
+
+  def get_nowait(self, lanes: list[str] | None = None) -> UploadItem:
+    """Pops the most important upload available in any of lanes"""
+    with self.lock:
+      self._promote_delayed()
+      candidates = [self.lanes[lane] for lane in (lanes or self.lanes) if self.lanes[lane]]
+      if not candidates:
+        raise queue.Empty
+      return heapq.heappop(min(candidates, key=lambda h: h[0][:2]))[2]
+
+  def qsize(self) -> int:
+    with self.lock:
+      return sum(len(h) for h in self.lanes.values()) + len(self.delayed)
+
+  def items(self) -> list[UploadItem]:
+    """Pending uploads, in no particular order"""
+    with self.lock:
+      return [e[-1] for h in self.lanes.values() for e in h] + [e[-1] for e in self.delayed]
+
+  def list(self) -> list[UploadItem]:
+    """Pending and in-progress uploads"""
+    with self.lock:
+      current = list(self.current.values())
+    return self.items() + current
+
+  def set_current(self, key: int, item: UploadItem | None) -> None:
+    with self.lock:
+      if item is None:
+        self.current.pop(key, None)
+      else:
+        self.current[key] = item
+
+  def cancel(self, ids: set[str]) -> set[str]:
+    """Drops pending uploads and stops in-progress ones with these ids. Returns the ids found."""
+    with self.lock:
+      found = {item.id for h in self.lanes.values() for *_, item in h if item.id in ids}
+      found |= {e[-1].id for e in self.delayed if e[-1].id in ids}
+      found |= {item.id for item in self.current.values() if item.id in ids}
+      for lane, h in self.lanes.items():
+        self.lanes[lane] = [e for e in h if e[-1].id not in ids]
+        heapq.heapify(self.lanes[lane])
+      self.delayed = [e for e in self.delayed if e[-1].id not in ids]
+      heapq.heapify(self.delayed)
+
+    if found and self.on_cancel is not None:
+      self.on_cancel(cast(set[str], found))
+    return cast(set[str], found)
+
+  def clear(self) -> None:
+    with self.lock:
+      for h in self.lanes.values():
+        h.clear()
+      self.delayed.clear()
+
+
 dispatcher["echo"] = lambda s: s
 recv_queue: Queue[str] = queue.Queue()
 send_queue: Queue[str] = queue.Queue()
-upload_queue: Queue[UploadItem] = queue.PriorityQueue()
+upload_queue = UploadQueue()
 low_priority_send_queue: Queue[str] = queue.Queue()
 log_recv_queue: Queue[str] = queue.Queue()
-cancelled_uploads: set[str] = set()
-
-cur_upload_items: dict[int, UploadItem | None] = {}
 
 
 def strip_zst_extension(fn: str) -> str:
@@ -147,20 +254,19 @@ class AbortTransferException(Exception):
 class UploadQueueCache:
 
   @staticmethod
-  def initialize(upload_queue: Queue[UploadItem]) -> None:
+  def initialize(upload_queue: UploadQueue) -> None:
     try:
       upload_queue_json = Params().get("AthenadUploadQueue")
       if upload_queue_json is not None:
         for item in upload_queue_json:
-          upload_queue.put(UploadItem.from_dict(item))
+          upload_queue.put_nowait(UploadItem.from_dict(item))
     except Exception:
       cloudlog.exception("athena.UploadQueueCache.initialize.exception")
 
   @staticmethod
-  def cache(upload_queue: Queue[UploadItem]) -> None:
+  def cache(upload_queue: UploadQueue) -> None:
     try:
-      queue: list[UploadItem | None] = list(upload_queue.queue)
-      items = [asdict(i) for i in queue if i is not None and (i.id not in cancelled_uploads)]
+      items = [asdict(i) for i in upload_queue.items()]
       Params().put("AthenadUploadQueue", items)
     except Exception:
       cloudlog.exception("athena.UploadQueueCache.cache.exception")
@@ -174,9 +280,6 @@ def handle_long_poll(ws: WebSocket, exit_event: threading.Event | None) -> None:
     threading.Thread(target=ws_recv, args=(ws, end_event), name='ws_recv'),
     threading.Thread(target=ws_send, args=(ws, end_event), name='ws_send'),
     threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler'),
-    threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler2'),
-    threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler3'),
-    threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler4'),
     threading.Thread(target=log_handler, args=(end_event,), name='log_handler'),
     threading.Thread(target=stat_handler, args=(end_event,), name='stat_handler'),
   ] + [
@@ -219,102 +322,171 @@ def jsonrpc_handler(end_event: threading.Event) -> None:
       send_queue.put_nowait(json.dumps({"error": str(e)}))
 
 
-def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = True) -> None:
-  item = cur_upload_items[tid]
-  if item is not None and item.retry_count < MAX_RETRY_COUNT:
-    new_retry_count = item.retry_count + 1 if increase_count else item.retry_count
-
-    item = replace(
-      item,
-      retry_count=new_retry_count,
-      progress=0,
-      current=False
-    )
-    upload_queue.put_nowait(item)
-    UploadQueueCache.cache(upload_queue)
-
-    cur_upload_items[tid] = None
-
-    for _ in range(RETRY_DELAY):
-      time.sleep(1)
-      if end_event.is_set():
-        break
-
-
-def cb(sm, item, tid, end_event: threading.Event, sz: int, cur: int) -> None:
-  # Abort transfer if connection changed to metered after starting upload
-  # or if athenad is shutting down to re-connect the websocket
-  if not item.allow_cellular:
-    if (time.monotonic() - sm.recv_time['deviceState']) > DEVICE_STATE_UPDATE_INTERVAL:
-      sm.update(0)
-      if sm['deviceState'].networkMetered:
-        raise AbortTransferException
-
-  if end_event.is_set():
-    raise AbortTransferException
-
-  cur_upload_items[tid] = replace(item, progress=cur / sz if sz else 1)
-
-
-def upload_handler(end_event: threading.Event) -> None:
-  sm = messaging.SubMaster(['deviceState'])
-  tid = threading.get_ident()
-
-  while not end_event.is_set():
-    cur_upload_items[tid] = None
-
+class UploadEngine:
+  """
+  Runs the uploads in upload_queue on an asyncio event loop, with UPLOAD_LANES slots.
+
+  Each upload is a task, so cancelling one through upload_queue stops it right away.
+  Failed uploads go back in the queue after RETRY_DELAY, uploads aborted by a metered
+  connection or by athenad shutting down go back without counting as a retry.
+  """
+
+  def __init__(self, upload_queue: UploadQueue, end_event: threading.Event, sm: messaging.SubMaster | None = None):
+    self.upload_queue = upload_queue
+    self.end_event = end_event
+    self.sm = sm if sm is not None else messaging.SubMaster(['deviceState'])
+    # the progress callbacks of concurrent uploads run in worker threads
+    self.sm_lock = threading.Lock()
+    self.tasks: dict[asyncio.Task, tuple[str, UploadItem]] = {}
+    self.started: set[asyncio.Task] = set()
+    self.cancelled: set[asyncio.Task] = set()
+    self.keys = itertools.count()
+
+  def _wakeup(self) -> None:
+    self.loop.call_soon_threadsafe(self.wakeup.set)
+
+  def _cancel(self, ids: set[str]) -> None:
+    def cancel():
+      for task, (_, item) in self.tasks.items():
+        if item.id in ids:
+          self.cancelled.add(task)
+          task.cancel()
+    self.loop.call_soon_threadsafe(cancel)
+
+  def _start_uploads(self, session: aiohttp.ClientSession) -> None:
+    busy = dict.fromkeys(UPLOAD_LANES, 0)
+    for lane, _ in self.tasks.values():
+      busy[lane] += 1
+
+    lanes: list[str] = []
+    for lane, (_, slots) in UPLOAD_LANES.items():
+      lanes.append(lane)
+      while busy[lane] < slots:
+        try:
+          item = self.upload_queue.get_nowait(lanes)
+        except queue.Empty:
+          break
+        task = self.loop.create_task(self.upload(session, item))
+        self.tasks[task] = (lane, item)
+        busy[lane] += 1
+
+  def _retry(self, item: UploadItem, increase_count: bool = True, delay: float = RETRY_DELAY) -> None:
+    if item.retry_count < MAX_RETRY_COUNT:
+      item = replace(item, retry_count=item.retry_count + 1 if increase_count else item.retry_count, progress=0, current=False)
+      self.upload_queue.put_nowait(item, delay=delay)
+
+  async def upload(self, session: aiohttp.ClientSession, item: UploadItem) -> None:
+    self.started.add(cast(asyncio.Task, asyncio.current_task()))
+    key = next(self.keys)
+    item = replace(item, current=True)
+    self.upload_queue.set_current(key, item)
+
+    fn, sz, network_type, metered = item.path, -1, None, False
     try:
-      cur_upload_items[tid] = item = replace(upload_queue.get(timeout=1), current=True)
-
-      if item.id in cancelled_uploads:
-        cancelled_uploads.remove(item.id)
-        continue
-
       # Remove item if too old
       age = datetime.now() - datetime.fromtimestamp(item.created_at / 1000)
       if age.total_seconds() > MAX_AGE:
         cloudlog.event("athena.upload_handler.expired", item=item, error=True)
-        continue
+        return
 
       # Check if uploading over metered connection is allowed
-      sm.update(0)
-      metered = sm['deviceState'].networkMetered
-      network_type = sm['deviceState'].networkType.raw
+      with self.sm_lock:
+        self.sm.update(0)
+        metered = self.sm['deviceState'].networkMetered
+        network_type = self.sm['deviceState'].networkType.raw
       if metered and (not item.allow_cellular):
-        retry_upload(tid, end_event, False)
-        continue
+        self._retry(item, False)
+        return
 
       try:
-        fn = item.path
-        try:
-          sz = os.path.getsize(fn)
-        except OSError:
-          sz = -1
-
-        cloudlog.event("athena.upload_handler.upload_start", fn=fn, sz=sz, network_type=network_type, metered=metered, retry_count=item.retry_count)
-
-        with _do_upload(item, partial(cb, sm, item, tid, end_event)) as response:
-          if response.status_code not in (200, 201, 401, 403, 412):
-            cloudlog.event("athena.upload_handler.retry", status_code=response.status_code, fn=fn, sz=sz, network_type=network_type, metered=metered)
-            retry_upload(tid, end_event)
-          else:
-            cloudlog.event("athena.upload_handler.success", fn=fn, sz=sz, network_type=network_type, metered=metered)
-
-        UploadQueueCache.cache(upload_queue)
-      except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.SSLError):
-        cloudlog.event("athena.upload_handler.timeout", fn=fn, sz=sz, network_type=network_type, metered=metered)
-        retry_upload(tid, end_event)
-      except AbortTransferException:
+        sz = os.path.getsize(fn)
+      except OSError:
+        sz = -1
+
+      cloudlog.event("athena.upload_handler.upload_start", fn=fn, sz=sz, network_type=network_type, metered=metered, retry_count=item.retry_count)
+
+      def progress(total: int, cur: int) -> None:
+        # Abort transfer if connection changed to metered after starting upload
+        with self.sm_lock:
+          if not item.allow_cellular and (time.monotonic() - self.sm.recv_time['deviceState']) > DEVICE_STATE_UPDATE_INTERVAL:
+            self.sm.update(0)
+            if self.sm['deviceState'].networkMetered:
+              raise AbortTransferException
+        self.upload_queue.set_current(key, replace(item, progress=cur / total if total else 1))
+
+      status = await _do_upload(session, item, progress)
+      if status not in (200, 201, 401, 403, 412):
+        cloudlog.event("athena.upload_handler.retry", status_code=status, fn=fn, sz=sz, network_type=network_type, metered=metered)
+        self._retry(item)
+      else:
+        cloudlog.event("athena.upload_handler.success", fn=fn, sz=sz, network_type=network_type, metered=metered)
+    except (TimeoutError, aiohttp.ClientError):
+      cloudlog.event("athena.upload_handler.timeout", fn=fn, sz=sz, network_type=network_type, metered=metered)
+      self._retry(item)
+    except AbortTransferException:
+      cloudlog.event("athena.upload_handler.abort", fn=fn, sz=sz, network_type=network_type, metered=metered)
+      self._retry(item, False)
+    except asyncio.CancelledError:
+      if asyncio.current_task() in self.cancelled:
+        cloudlog.event("athena.upload_handler.cancelled", fn=fn, sz=sz, id=item.id)
+      else:
+        # athenad is shutting down to re-connect the websocket
         cloudlog.event("athena.upload_handler.abort", fn=fn, sz=sz, network_type=network_type, metered=metered)
-        retry_upload(tid, end_event, False)
-
-    except queue.Empty:
-      pass
+        self._retry(item, False, delay=0)
+      raise
     except Exception:
       cloudlog.exception("athena.upload_handler.exception")
+    finally:
+      self.upload_queue.set_current(key, None)
+      UploadQueueCache.cache(self.upload_queue)
+
+  async def run(self) -> None:
+    self.loop = asyncio.get_running_loop()
+    self.wakeup = asyncio.Event()
+    self.upload_queue.on_put = self._wakeup
+    self.upload_queue.on_cancel = self._cancel
+
+    connector = aiohttp.TCPConnector(socket_factory=upload_socket_factory)
+    try:
+      async with aiohttp.ClientSession(connector=connector) as session:
+        while not self.end_event.is_set():
+          self.wakeup.clear()
+          self._start_uploads(session)
+
+          # wait for an upload to finish, a new or cancelled upload, or a delayed retry, and check end_event every 100ms
+          timeout = 0.1
+          next_delayed = self.upload_queue.next_delayed()
+          if next_delayed is not None:
+            timeout = min(timeout, max(next_delayed - time.monotonic(), 0.))
+          waiters = [asyncio.ensure_future(self.wakeup.wait()), *self.tasks]
+          done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+          waiters[0].cancel()
+
+          for task in done:
+            if task in self.tasks:
+              self.tasks.pop(task)
+              self.started.discard(task)
+              self.cancelled.discard(task)
+
+        for task, (_, item) in self.tasks.items():
+          if task not in self.started and task not in self.cancelled:
+            # never got to run, so it can't put itself back
+            self.upload_queue.put_nowait(item)
+          task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        self.started.clear()
+        self.cancelled.clear()
+    finally:
+      self.upload_queue.on_put = None
+      self.upload_queue.on_cancel = None
+
 
+def upload_handler(end_event: threading.Event) -> None:
+  asyncio.run(UploadEngine(upload_queue, end_event).run())
 
-def _do_upload(upload_item: UploadItem, callback: Callable = None) -> requests.Response:
+
+async def _do_upload(session: aiohttp.ClientSession, upload_item: UploadItem, callback: Callable[[int, int], None] | None = None) -> int:
   path = upload_item.path
   compress = False
 
@@ -323,17 +495,39 @@ def _do_upload(upload_item: UploadItem, callback: Callable = None) -> requests.R
     path = strip_zst_extension(path)
     compress = True
 
-  stream = None
+  # the thread opening the stream finishes even if the upload is cancelled, it closes the stream once it's open
+  open_stream = asyncio.ensure_future(asyncio.to_thread(get_upload_stream, path, compress))
   try:
-    stream, content_length = get_upload_stream(path, compress)
-    response = UPLOAD_SESS.put(upload_item.url,
-                               data=CallbackReader(stream, callback, content_length) if callback else stream,
-                               headers={**upload_item.headers, 'Content-Length': str(content_length)},
-                               timeout=30)
-    return response
+    stream, content_length = await asyncio.shield(open_stream)
+  except asyncio.CancelledError:
+    open_stream.add_done_callback(lambda f: f.cancelled() or f.exception() is not None or f.result()[0].close())
+    raise
+
+  def read_chunk(sent: int) -> bytes:
+    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+    if chunk and callback is not None:
+      callback(content_length, sent + len(chunk))
+    return chunk
+
+  async def body():
+    # reading, compressing and the progress callback all block, so they stay off the event loop
+    sent = 0
+    while chunk := await asyncio.to_thread(read_chunk, sent):
+      sent += len(chunk)
+      yield chunk
+
+  try:
+    timeout = aiohttp.ClientTimeout(sock_connect=UPLOAD_TIMEOUT, sock_read=UPLOAD_TIMEOUT)
+    async with session.put(upload_item.url, data=body(), headers={**upload_item.headers, 'Content-Length': str(content_length)},
+                           timeout=timeout) as response:
+      return response.status
+  except aiohttp.ClientError as e:
+    # errors raised by the callback while sending the body come wrapped in a connection error
+    if isinstance(e.__cause__, AbortTransferException):
+      raise e.__cause__ from None
+    raise
   finally:
-    if stream:
-      stream.close()
+    stream.close()
 
 
 # security: user should be able to request any message from their car
@@ -448,8 +642,7 @@ def uploadFilesToUrls(files_data: list[UploadFileDict]) -> UploadFilesToUrlRespo
 
 @dispatcher.add_method
 def listUploadQueue() -> list[UploadItemDict]:
-  items = list(upload_queue.queue) + list(cur_upload_items.values())
-  return [asdict(i) for i in items if (i is not None) and (i.id not in cancelled_uploads)]
+  return [asdict(i) for i in upload_queue.list()]
 
 
 @dispatcher.add_method
@@ -457,12 +650,11 @@ def cancelUpload(upload_id: str | list[str]) -> dict[str, int | str]:
   if not isinstance(upload_id, list):
     upload_id = [upload_id]
 
-  uploading_ids = {item.id for item in list(upload_queue.queue)}
-  cancelled_ids = uploading_ids.intersection(upload_id)
+  cancelled_ids = upload_queue.cancel(set(upload_id))
   if len(cancelled_ids) == 0:
     return {"success": 0, "error": "not found"}
 
-  cancelled_uploads.update(cancelled_ids)
+  UploadQueueCache.cache(upload_queue)
   return {"success": 1}
 
 @dispatcher.add_method
@@ -575,24 +767,20 @@ def takeSnapshot() -> str | dict[str, str] | None:
     raise Exception("not available while camerad is started")
 
 
+_log_index: LogIndex | None = None
+
+
+def get_log_index() -> LogIndex:
+  global _log_index
+  if _log_index is None or _log_index.path != Paths.swaglog_root():
+    if _log_index is not None:
+      _log_index.close()
+    _log_index = LogIndex(Paths.swaglog_root())
+  return _log_index
+
+
 def get_logs_to_send_sorted() -> list[str]:
-  # TODO: scan once then use inotify to detect file creation/deletion
-  curr_time = int(time.time())  # noqa: TID251
-  logs = []
-  for log_entry in os.listdir(Paths.swaglog_root()):
-    log_path = os.path.join(Paths.swaglog_root(), log_entry)
-    time_sent = 0
-    try:
-      value = getxattr(log_path, LOG_ATTR_NAME)
-      if value is not None:
-        time_sent = int.from_bytes(value, sys.byteorder)
-    except (ValueError, TypeError):
-      pass
-    # assume send failed and we lost the response if sent more than one hour ago
-    if not time_sent or curr_time - time_sent > 3600:
-      logs.append(log_entry)
-  # excluding most recent (active) log file
-  return sorted(logs)[:-1]
+  return get_log_index().to_send(int(time.time()))  # noqa: TID251
 
 
 def log_handler(end_event: threading.Event) -> None:
@@ -616,7 +804,7 @@ def log_handler(end_event: threading.Event) -> None:
         try:
           curr_time = int(time.time())  # noqa: TID251
           log_path = os.path.join(Paths.swaglog_root(), log_entry)
-          setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(curr_time, 4, sys.byteorder))
+          get_log_index().mark_sent(log_entry, curr_time)
           with open(log_path) as f:
             jsonrpc = {
               "method": "forwardLogs",
@@ -642,9 +830,8 @@ def log_handler(end_event: threading.Event) -> None:
           log_success = "result" in log_resp and log_resp["result"].get("success")
           cloudlog.debug(f"athena.log_handler.forward_response {log_entry} {log_success}")
           if log_entry and log_success:
-            log_path = os.path.join(Paths.swaglog_root(), log_entry)
             try:
-              setxattr(log_path, LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
+              get_log_index().mark_sent(log_entry, LOG_ATTR_VALUE_MAX_UNIX_TIME)
             except OSError:
               pass  # file could be deleted by log rotation
           if curr_log == log_entry:
@@ -659,30 +846,35 @@ def log_handler(end_event: threading.Event) -> None:
 
 def stat_handler(end_event: threading.Event) -> None:
   STATS_DIR = Paths.stats_root()
+  stats_index = DirectoryIndex(STATS_DIR, ignore=lambda name: name.startswith(tempfile.gettempprefix()))
   last_scan = 0.0
 
-  while not end_event.is_set():
-    curr_scan = time.monotonic()
-    try:
-      if curr_scan - last_scan > 10:
-        stat_filenames = list(filter(lambda name: not name.startswith(tempfile.gettempprefix()), os.listdir(STATS_DIR)))
-        if len(stat_filenames) > 0:
-          stat_path = os.path.join(STATS_DIR, stat_filenames[0])
-          with open(stat_path) as f:
-            jsonrpc = {
-              "method": "storeStats",
-              "params": {
-                "stats": f.read()
-              },
-              "jsonrpc": "2.0",
-              "id": stat_filenames[0]
-            }
-            low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
-          os.remove(stat_path)
-        last_scan = curr_scan
-    except Exception:
-      cloudlog.exception("athena.stat_handler.exception")
-    time.sleep(0.1)
+  try:
+    while not end_event.is_set():
+      curr_scan = time.monotonic()
+      try:
+        if curr_scan - last_scan > 10:
+          stat_filenames = stats_index.update()
+          if len(stat_filenames) > 0:
+            stat_filename = min(stat_filenames)
+            stat_path = os.path.join(STATS_DIR, stat_filename)
+            with open(stat_path) as f:
+              jsonrpc = {
+                "method": "storeStats",
+                "params": {
+                  "stats": f.read()
+                },
+                "jsonrpc": "2.0",
+                "id": stat_filename
+              }
+              low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
+            os.remove(stat_path)
+          last_scan = curr_scan
+      except Exception:
+        cloudlog.exception("athena.stat_handler.exception")
+      time.sleep(0.1)
+  finally:
+    stats_index.close()
 
 
 def ws_proxy_recv(ws: WebSocket, local_sock: socket.socket, ssock: socket.socket, end_event: threading.Event, global_end_event: threading.Event) -> None:
@@ -835,7 +1027,6 @@ def main(exit_event: threading.Event = None):
       conn_start = None
 
       conn_retries = 0
-      cur_upload_items.clear()
 
       handle_long_poll(ws, exit_event)
 
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+from collections.abc import Callable
+
+from openpilot.common.inotify import Inotify, inotify_available, IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_IGNORED, IN_ISDIR, \
+                                     IN_MOVE_SELF, IN_MOVED_FROM, IN_MOVED_TO, IN_Q_OVERFLOW
+from openpilot.common.swaglog import cloudlog
+from openpilot.system.loggerd.xattr_cache import getxattr, setxattr
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF
+RESET_MASK = IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+
+LOG_ATTR_NAME = 'user.upload'
+LOG_ATTR_VALUE_MAX_UNIX_TIME = 2147483647
+
+
+class DirectoryIndex:
+  """
+  The files in a directory, kept current with inotify instead of listing the directory on every lookup.
+
+  The directory is listed once, and again only after an inotify queue overflow or when
+  the directory itself is replaced. Without inotify, or while the directory doesn't exist,
+  it's relisted at most every rescan_interval.
+  """
+
+  def __init__(self, path: str, ignore: Callable[[str], bool] | None = None, rescan_interval: float = 10.):
+    self.path = path
+    self.ignore = ignore
+    self.rescan_interval = rescan_interval
+
+    self.files: set[str] = set()
+    self.inotify: Inotify | None = None
+    if inotify_available():
+      try:
+        self.inotify = Inotify()
+      except OSError:
+        # out of inotify instances (EMFILE) or no inotify in the kernel (ENOSYS), relist every rescan_interval instead
+        cloudlog.exception(f"athena.file_index: failed to set up inotify for {self.path}, falling back to rescanning")
+    self.wd: int | None = None
+    self.last_scan = -float('inf')
+
+  def _add(self, name: str) -> None:
+    if self.ignore is None or not self.ignore(name):
+      if name not in self.files:
+        self.files.add(name)
+        self.on_add(name)
+
+  def _remove(self, name: str) -> None:
+    if name in self.files:
+      self.files.discard(name)
+      self.on_remove(name)
+
+  def _rescan(self) -> None:
+    self.last_scan = time.monotonic()
+
+    # watch before listing, so files created in between aren't missed
+    if self.inotify is not None and self.wd is None:
+      try:
+        self.wd = self.inotify.add_watch(self.path, WATCH_MASK)
+      except OSError:
+        pass
+
+    try:
+      names = {e.name for e in os.scandir(self.path) if not e.is_dir(follow_symlinks=False)}
+    except FileNotFoundError:
+      names = set()
+
+    for name in self.files - names:
+      self._remove(name)
+    for name in sorted(names - self.files):
+      self._add(name)
+
+  def update(self) -> set[str]:
+    """Applies the changes since the last update and returns the current files"""
+    if self.inotify is not None and self.wd is not None:
+      rescan = False
+      for ev in self.inotify.read(0):
+        if ev.wd != self.wd and not (ev.mask & IN_Q_OVERFLOW):
+          continue
+        elif ev.mask & RESET_MASK:
+          # queue overflowed or the directory went away, watch the new one at this path if there is one
+          cloudlog.warning(f"athena.file_index: rescanning {self.path} on inotify event {ev.mask:#x}")
+          if ev.mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            if not (ev.mask & IN_IGNORED):
+              self.inotify.rm_watch(self.wd)
+            self.wd = None
+          rescan = True
+        elif ev.mask & IN_ISDIR:
+          continue
+        elif ev.mask & (IN_CREATE | IN_MOVED_TO):
+          if ev.mask & IN_MOVED_TO:
+            # replaced by a rename, it's a different file now
+            self._remove(ev.name)
+          self._add(ev.name)
+        elif ev.mask & (IN_DELETE | IN_MOVED_FROM):
+          self._remove(ev.name)
+      if rescan:
+        self._rescan()
+    elif time.monotonic() - self.last_scan > self.rescan_interval:
+      self._rescan()
+    return self.files
+
+  def on_add(self, name: str) -> None:
+    pass
+
+  def on_remove(self, name: str) -> None:
+    pass
+
+  def close(self) -> None:
+    if self.inotify is not None:
+      self.inotify.close()
+      self.inotify = None
+      self.wd = None
+
+
+class LogIndex(DirectoryIndex):
+  """
+  Swaglog files with the time each was last sent to athena.
+
+  Sent times are kept in memory. They are also written to an xattr on the file, which is
+  only read back once per file, when it's first seen after athenad (re)starts.
+  """
+
+  def __init__(self, path: str, rescan_interval: float = 10.):
+    self.time_sent: dict[str, int] = {}
+    super().__init__(path, rescan_interval=rescan_interval)
+
+  def on_add(self, name: str) -> None:
+    time_sent = 0
+    try:
+      value = getxattr(os.path.join(self.path, name), LOG_ATTR_NAME)
+      if value is not None:
+        time_sent = int.from_bytes(value, sys.byteorder)
+    except (OSError, ValueError, TypeError):
+      pass
+    self.time_sent[name] = time_sent
+
+  def on_remove(self, name: str) -> None:
+    self.time_sent.pop(name, None)
+
+  def mark_sent(self, name: str, time_sent: int) -> None:
+    """Records a log as sent, raises OSError if it was deleted by log rotation"""
+    setxattr(os.path.join(self.path, name), LOG_ATTR_NAME, int.to_bytes(time_sent, 4, sys.byteorder))
+    if name in self.files:
+      self.time_sent[name] = time_sent
+
+  def to_send(self, curr_time: int) -> list[str]:
+    self.update()
+    # assume send failed and we lost the response if sent more than one hour ago
+    logs = [name for name, time_sent in self.time_sent.items() if not time_sent or curr_time - time_sent > 3600]
+    # excluding most recent (active) log file
+    return sorted(logs)[:-1]
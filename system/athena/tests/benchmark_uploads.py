@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from openpilot.common.benchmark import benchmark_parser
+from openpilot.system.athena import athenad
+
+CONFIGS = {
+  "serial": {"bulk": (None, 1)},
+  "bulk x4": {"bulk": (None, 4)},
+  "default": dict(athenad.UPLOAD_LANES),
+}
+
+
+class UploadServer:
+  """Local PUT endpoint that reads every upload at a fixed rate after a fixed latency"""
+
+  def __init__(self, latency: float, rate: float):
+    self.latency = latency
+    self.rate = rate
+    self.done: dict[str, float] = {}
+    self.all_done = threading.Event()
+    self.expected = 0
+
+  async def handle(self, request: web.Request) -> web.Response:
+    await asyncio.sleep(self.latency)
+    async for chunk in request.content.iter_chunked(athenad.UPLOAD_CHUNK_SIZE):
+      await asyncio.sleep(len(chunk) / self.rate)
+    self.done[request.path] = time.monotonic()
+    if len(self.done) == self.expected:
+      self.all_done.set()
+    return web.Response(status=201)
+
+  def start(self) -> int:
+    ready = threading.Event()
+    port = []
+
+    async def serve():
+      app = web.Application(client_max_size=1024**3)
+      app.router.add_put('/{name}', self.handle)
+      runner = web.AppRunner(app)
+      await runner.setup()
+      site = web.TCPSite(runner, '127.0.0.1', 0)
+      await site.start()
+      port.append(site._server.sockets[0].getsockname()[1])  # type: ignore[union-attr]
+      ready.set()
+      await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    ready.wait()
+    return port[0]
+
+
+def run(config: str, files: list[tuple[str, int]], port: int, server: UploadServer) -> tuple[float, dict[str, float]]:
+  server.done.clear()
+  server.all_done.clear()
+  server.expected = len(files)
+
+  athenad.UPLOAD_LANES = CONFIGS[config]
+  athenad.upload_queue = athenad.UploadQueue()
+  end_event = threading.Event()
+  t = time.monotonic()
+  for fn, priority in files:
+    name = os.path.basename(fn)
+    athenad.upload_queue.put_nowait(athenad.UploadItem(path=fn, url=f"http://127.0.0.1:{port}/{name}", headers={}, priority=priority,
+                                                       created_at=int(time.time() * 1000), id=name, allow_cellular=True))  # noqa: TID251
+  thread = threading.Thread(target=athenad.upload_handler, args=(end_event,))
+  thread.start()
+  server.all_done.wait()
+  end_event.set()
+  thread.join()
+  return max(server.done.values()) - t, {k: v - t for k, v in server.done.items()}
+
+
+def main():
+  parser = benchmark_parser("Benchmark athenad uploads of fcameras and qlogs against a local server")
+  parser.add_argument("--fcameras", type=int, default=4, help="number of fcamera files queued first")
+  parser.add_argument("--fcamera-size", type=int, default=20, help="fcamera size in MB")
+  parser.add_argument("--qlogs", type=int, default=4, help="number of qlogs queued after the fcameras")
+  parser.add_argument("--latency", type=float, default=0.1, help="server latency per request in seconds")
+  parser.add_argument("--rate", type=float, default=20, help="server read rate per upload in MB/s")
+  parser.add_argument("--config", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+  args = parser.parse_args()
+
+  server = UploadServer(args.latency, args.rate * 1024 * 1024)
+  port = server.start()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    files = []
+    for i in range(args.fcameras):
+      fn = os.path.join(tmp, f"fcamera_{i}.hevc")
+      with open(fn, "wb") as f:
+        f.write(os.urandom(args.fcamera_size * 1024 * 1024))
+      files.append((fn, 0))
+    for i in range(args.qlogs):
+      fn = os.path.join(tmp, f"qlog_{i}")
+      with open(fn, "wb") as f:
+        f.write(os.urandom(200 * 1024))
+      files.append((fn, athenad.DEFAULT_UPLOAD_PRIORITY))
+
+    for config in args.config:
+      total, done = run(config, files, port, server)
+      qlog_latency = [v for k, v in done.items() if "qlog" in k]
+      print(f"{config:>8}: {total:.2f} s total, qlogs done after {min(qlog_latency):.2f} - {max(qlog_latency):.2f} s")
+
+
+if __name__ == "__main__":
+  main()
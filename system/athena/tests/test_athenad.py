@@ -1,8 +1,10 @@
+import asyncio
 import pytest
 from functools import wraps
 import json
 import multiprocessing
 import os
+import aiohttp
 import requests
 import shutil
 import time
@@ -19,7 +21,7 @@ from cereal import messaging
 from openpilot.common.params import Params
 from openpilot.common.timeout import Timeout
 from openpilot.system.athena import athenad
-from openpilot.system.athena.athenad import MAX_RETRY_COUNT, UPLOAD_SESS, dispatcher
+from openpilot.system.athena.athenad import MAX_RETRY_COUNT, dispatcher
 from openpilot.system.athena.tests.helpers import HTTPRequestHandler, MockWebsocket, MockApi, EchoSocket
 from openpilot.selfdrive.test.helpers import http_server_context
 from openpilot.system.hardware.hw import Paths
@@ -29,7 +31,7 @@ def seed_athena_server(host, port):
   with Timeout(2, 'HTTP Server seeding failed'):
     while True:
       try:
-        UPLOAD_SESS.put(f'http://{host}:{port}/qlog.zst', data='', timeout=10)
+        requests.put(f'http://{host}:{port}/qlog.zst', data='', timeout=10)
         break
       except requests.exceptions.ConnectionError:
         time.sleep(0.1)
@@ -76,9 +78,7 @@ class TestAthenadMethods:
       self.params.put(k, v)
     self.params.put_bool("GsmMetered", True)
 
-    athenad.upload_queue = queue.PriorityQueue()
-    athenad.cur_upload_items.clear()
-    athenad.cancelled_uploads.clear()
+    athenad.upload_queue = athenad.UploadQueue()
 
     for i in os.listdir(Paths.log_root()):
       p = os.path.join(Paths.log_root(), i)
@@ -190,13 +190,44 @@ class TestAthenadMethods:
     fn = self._create_file('qlog', data=os.urandom(10000 * 1024))
 
     upload_fn = fn + ('.zst' if compress else '')
+
+    async def do_upload(item):
+      async with aiohttp.ClientSession() as session:
+        return await athenad._do_upload(session, item)
+
     item = athenad.UploadItem(path=upload_fn, url="http://localhost:1238", headers={}, created_at=int(time.time()*1000), id='')  # noqa: TID251
-    with pytest.raises(requests.exceptions.ConnectionError):
-      athenad._do_upload(item)
+    with pytest.raises(aiohttp.ClientConnectionError):
+      asyncio.run(do_upload(item))
 
     item = athenad.UploadItem(path=upload_fn, url=f"{host}/qlog.zst", headers={}, created_at=int(time.time()*1000), id='')  # noqa: TID251
-    resp = athenad._do_upload(item)
-    assert resp.status_code == 201
+    assert asyncio.run(do_upload(item)) == 201
+
+  def test_do_upload_cancelled_while_opening(self, mocker):
+    fn = self._create_file('qlog', data=os.urandom(1024))
+    opened = threading.Event()
+    release = threading.Event()
+    streams = []
+
+    def get_upload_stream(path, compress):
+      opened.set()
+      release.wait()
+      streams.append(open(path, 'rb'))
+      return streams[-1], 1024
+    mocker.patch('openpilot.system.athena.athenad.get_upload_stream', side_effect=get_upload_stream)
+
+    async def cancel_upload():
+      item = athenad.UploadItem(path=fn, url="http://localhost:1238", headers={}, created_at=int(time.time()*1000), id='')  # noqa: TID251
+      async with aiohttp.ClientSession() as session:
+        task = asyncio.create_task(athenad._do_upload(session, item))
+        await asyncio.to_thread(opened.wait)
+        task.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+          await task
+        await asyncio.sleep(0.1)
+
+    asyncio.run(cancel_upload())
+    assert len(streams) == 1 and streams[0].closed
 
   def test_upload_file_to_url(self, host):
     fn = self._create_file('qlog.zst')
@@ -239,8 +270,7 @@ class TestAthenadMethods:
   @pytest.mark.parametrize("status,retry", [(500,True), (412,False)])
   @with_upload_handler
   def test_upload_handler_retry(self, mocker, host, status, retry):
-    mock_put = mocker.patch('openpilot.system.athena.athenad.UPLOAD_SESS.put')
-    mock_put.return_value.__enter__.return_value.status_code = status
+    mocker.patch('openpilot.system.athena.athenad._do_upload', return_value=status)
     fn = self._create_file('qlog.zst')
     item = athenad.UploadItem(path=fn, url=f"{host}/qlog.zst", headers={}, created_at=int(time.time()*1000), id='', allow_cellular=True)  # noqa: TID251
 
@@ -251,7 +281,7 @@ class TestAthenadMethods:
     assert athenad.upload_queue.qsize() == (1 if retry else 0)
 
     if retry:
-      assert athenad.upload_queue.get().retry_count == 1
+      assert athenad.upload_queue.items()[0].retry_count == 1
 
   @with_upload_handler
   def test_upload_handler_timeout(self):
@@ -273,22 +303,68 @@ class TestAthenadMethods:
 
     # Check that upload item was put back in the queue with incremented retry count
     assert athenad.upload_queue.qsize() == 1
-    assert athenad.upload_queue.get().retry_count == 1
+    assert athenad.upload_queue.items()[0].retry_count == 1
 
-  @with_upload_handler
   def test_cancel_upload(self):
     item = athenad.UploadItem(path="qlog.zst", url="http://localhost:44444/qlog.zst", headers={},
                               created_at=int(time.time()*1000), id='id', allow_cellular=True)  # noqa: TID251
     athenad.upload_queue.put_nowait(item)
-    dispatcher["cancelUpload"](item.id)
+    assert dispatcher["cancelUpload"](item.id) == {"success": 1}
+    assert athenad.upload_queue.qsize() == 0
+    assert dispatcher["cancelUpload"](item.id) == {"success": 0, "error": "not found"}
+
+  @with_upload_handler
+  def test_cancel_current_upload(self, mocker):
+    started = threading.Event()
 
-    assert item.id in athenad.cancelled_uploads
+    async def slow_upload(session, item, callback=None):
+      started.set()
+      await asyncio.sleep(60)
+      return 201
 
-    self._wait_for_upload()
-    time.sleep(0.1)
+    mocker.patch('openpilot.system.athena.athenad._do_upload', side_effect=slow_upload)
+    fn = self._create_file('qlog.zst')
+    item = athenad.UploadItem(path=fn, url="http://localhost:44444/qlog.zst", headers={},
+                              created_at=int(time.time()*1000), id='id', allow_cellular=True)  # noqa: TID251
+    athenad.upload_queue.put_nowait(item)
+    assert started.wait(5)
+    assert dispatcher["listUploadQueue"]()[0]['current']
 
+    # the upload stops right away, and isn't retried
+    assert dispatcher["cancelUpload"](item.id) == {"success": 1}
+    with Timeout(1, "upload not cancelled"):
+      while len(dispatcher["listUploadQueue"]()):
+        time.sleep(0.01)
     assert athenad.upload_queue.qsize() == 0
-    assert len(athenad.cancelled_uploads) == 0
+
+  @with_upload_handler
+  def test_upload_lanes(self, mocker):
+    mocker.patch.dict(athenad.UPLOAD_LANES, {"small": (1024, 1), "bulk": (None, 2)})
+    done = queue.Queue()
+    release = asyncio.Event()
+
+    async def upload(session, item, callback=None):
+      if item.path.endswith("fcamera.hevc"):
+        await release.wait()
+      done.put(item.path)
+      return 201
+
+    mocker.patch('openpilot.system.athena.athenad._do_upload', side_effect=upload)
+    for i in range(4):
+      fn = self._create_file(f'{i}/fcamera.hevc', data=b'0' * 2048)
+      athenad.upload_queue.put_nowait(athenad.UploadItem(path=fn, url=f"http://localhost:44444/{i}/fcamera.hevc", headers={},
+                                                         created_at=int(time.time()*1000), id=f'f{i}', allow_cellular=True, priority=0))  # noqa: TID251
+
+    with Timeout(5, "bulk uploads not started"):
+      while sum(i['current'] for i in dispatcher["listUploadQueue"]()) < 2:
+        time.sleep(0.01)
+
+    # big uploads take all the bulk slots, a lower priority qlog still goes through the small lane
+    fn = self._create_file('qlog.zst', data=b'0' * 100)
+    athenad.upload_queue.put_nowait(athenad.UploadItem(path=fn, url="http://localhost:44444/qlog.zst", headers={},
+                                                       created_at=int(time.time()*1000), id='q', allow_cellular=True))  # noqa: TID251
+    assert done.get(timeout=5) == fn
+    assert sum(i['current'] for i in dispatcher["listUploadQueue"]() if i['id'] != 'q') == 2
 
   @with_upload_handler
   def test_cancel_expiry(self):
@@ -310,16 +386,26 @@ class TestAthenadMethods:
     assert len(items) == 0
 
   @with_upload_handler
-  def test_list_upload_queue_current(self, host: str):
+  def test_list_upload_queue_current(self, mocker):
+    started = threading.Event()
+
+    async def slow_upload(session, item, callback=None):
+      callback(100, 50)
+      started.set()
+      await asyncio.sleep(60)
+      return 201
+
+    mocker.patch('openpilot.system.athena.athenad._do_upload', side_effect=slow_upload)
     fn = self._create_file('qlog.zst')
-    item = athenad.UploadItem(path=fn, url=f"{host}/qlog.zst", headers={}, created_at=int(time.time()*1000), id='', allow_cellular=True)  # noqa: TID251
+    item = athenad.UploadItem(path=fn, url="http://localhost:44444/qlog.zst", headers={}, created_at=int(time.time()*1000), id='', allow_cellular=True)  # noqa: TID251
 
     athenad.upload_queue.put_nowait(item)
-    self._wait_for_upload()
+    assert started.wait(5)
 
     items = dispatcher["listUploadQueue"]()
     assert len(items) == 1
     assert items[0]['current']
+    assert items[0]['progress'] == 0.5
 
   def test_list_upload_queue_priority(self):
     priorities = (25, 50, 99, 75, 0)
@@ -351,7 +437,7 @@ class TestAthenadMethods:
     assert items[0] == asdict(item)
     assert not items[0]['current']
 
-    athenad.cancelled_uploads.add(item.id)
+    dispatcher["cancelUpload"](item.id)
     items = dispatcher["listUploadQueue"]()
     assert len(items) == 0
 
@@ -363,17 +449,17 @@ class TestAthenadMethods:
     athenad.upload_queue.put_nowait(item2)
 
     # Ensure canceled items are not persisted
-    athenad.cancelled_uploads.add(item2.id)
+    athenad.upload_queue.cancel({item2.id})
 
     # serialize item
     athenad.UploadQueueCache.cache(athenad.upload_queue)
 
     # deserialize item
-    athenad.upload_queue.queue.clear()
+    athenad.upload_queue.clear()
     athenad.UploadQueueCache.initialize(athenad.upload_queue)
 
     assert athenad.upload_queue.qsize() == 1
-    assert asdict(athenad.upload_queue.queue[-1]) == asdict(item1)
+    assert asdict(athenad.upload_queue.items()[0]) == asdict(item1)
 
   def test_start_local_proxy(self, mock_create_connection):
     end_event = threading.Event()
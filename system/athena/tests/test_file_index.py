@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import pytest
+
+from openpilot.system.athena import file_index
+from openpilot.system.athena.file_index import DirectoryIndex, LogIndex, LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME
+from openpilot.system.loggerd.xattr_cache import setxattr
+
+
+def touch(path):
+  with open(path, 'wb'):
+    pass
+
+
+@pytest.fixture(params=[False, True], ids=["inotify", "polling"])
+def polling(request, mocker):
+  if request.param:
+    mocker.patch.object(file_index, "inotify_available", return_value=False)
+  return request.param
+
+
+class TestDirectoryIndex:
+  def test_tracks_directory(self, tmp_path, polling):
+    touch(tmp_path / "a")
+    (tmp_path / "subdir").mkdir()
+    index = DirectoryIndex(str(tmp_path), ignore=lambda name: name.startswith("tmp"), rescan_interval=0)
+    assert (index.inotify is None) == polling
+    assert index.update() == {"a"}
+
+    touch(tmp_path / "b")
+    touch(tmp_path / "tmp123")
+    os.rename(tmp_path / "tmp123", tmp_path / "c")
+    os.unlink(tmp_path / "a")
+    assert index.update() == {"b", "c"}
+    index.close()
+
+  def test_inotify_unavailable(self, tmp_path, mocker):
+    mocker.patch.object(file_index, "Inotify", side_effect=OSError(24, "Too many open files"))
+    touch(tmp_path / "a")
+    index = DirectoryIndex(str(tmp_path), rescan_interval=0)
+    assert index.inotify is None
+    assert index.update() == {"a"}
+
+    touch(tmp_path / "b")
+    assert index.update() == {"a", "b"}
+    index.close()
+
+  def test_no_relisting(self, tmp_path, mocker):
+    touch(tmp_path / "a")
+    index = DirectoryIndex(str(tmp_path))
+    assert index.update() == {"a"}
+
+    scandir = mocker.spy(os, "scandir")
+    touch(tmp_path / "b")
+    for _ in range(10):
+      assert index.update() == {"a", "b"}
+    assert scandir.call_count == 0
+    index.close()
+
+  def test_directory_replaced(self, tmp_path):
+    path = tmp_path / "stats"
+    index = DirectoryIndex(str(path), rescan_interval=0)
+    assert index.update() == set()
+
+    path.mkdir()
+    touch(path / "a")
+    assert index.update() == {"a"}
+
+    shutil.rmtree(path)
+    path.mkdir()
+    touch(path / "b")
+    assert index.update() == {"b"}
+    index.close()
+
+
+class TestLogIndex:
+  def test_sent_state(self, tmp_path, polling, mocker):
+    for i in range(5):
+      touch(tmp_path / f"swaglog.{i:010}")
+    # sent by a previous athenad
+    setxattr(str(tmp_path / "swaglog.0000000000"), LOG_ATTR_NAME, int.to_bytes(LOG_ATTR_VALUE_MAX_UNIX_TIME, 4, sys.byteorder))
+
+    index = LogIndex(str(tmp_path), rescan_interval=0)
+    assert index.to_send(1000) == [f"swaglog.{i:010}" for i in range(1, 4)]
+
+    # sent state is kept in memory, xattrs are only written
+    getxattr = mocker.spy(file_index, "getxattr")
+    index.mark_sent("swaglog.0000000002", 1000)
+    assert index.to_send(1000) == ["swaglog.0000000001", "swaglog.0000000003"]
+    assert index.to_send(1000 + 3601) == ["swaglog.0000000001", "swaglog.0000000002", "swaglog.0000000003"]
+    assert getxattr.call_count == 0
+    index.close()
+
+    # a restarted index picks the state back up from the xattrs
+    index = LogIndex(str(tmp_path))
+    assert index.to_send(1000) == ["swaglog.0000000001", "swaglog.0000000003"]
+    index.close()
+
+  def test_deleted_log(self, tmp_path):
+    index = LogIndex(str(tmp_path))
+    assert index.to_send(0) == []
+    with pytest.raises(OSError):
+      index.mark_sent("swaglog.0000000000", 0)
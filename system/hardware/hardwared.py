@@ -23,6 +23,7 @@ from openpilot.system.statsd import statlog
 from openpilot.common.swaglog import cloudlog
 from openpilot.system.hardware.power_monitoring import PowerMonitoring
 from openpilot.system.hardware.fan_controller import FanController
+from openpilot.system.hardware.telemetry import TelemetryCollector, network_signal_thread
 from openpilot.system.version import terms_version, training_version
 from openpilot.system.athena.registration import UNREGISTERED_DONGLE_ID
 
@@ -99,7 +100,9 @@ def touch_thread(end_event):
 def hw_state_thread(end_event, hw_queue):
   """Handles non critical hardware state, and sends over queue"""
   count = 0
-  prev_hw_state = None
+  collector = TelemetryCollector(HARDWARE)
+  if AGNOS:
+    threading.Thread(target=network_signal_thread, args=(collector, end_event), daemon=True).start()
 
   modem_version = None
   modem_configured = False
@@ -107,22 +110,32 @@ def hw_state_thread(end_event, hw_queue):
   modem_restart_count = 0
 
   while not end_event.is_set():
-    # these are expensive calls. update every 10s
-    if (count % int(10. / DT_HW)) == 0:
+    # these are expensive calls, the collector only refreshes what is due or changed
+    if collector.update() or count == 0:
+      hw_state = HardwareState(
+        network_type=collector['network_type'],
+        network_info=collector['network_info'],
+        network_strength=collector['network_strength'],
+        network_stats=collector['network_stats'],
+        network_metered=collector['network_metered'],
+        modem_temps=collector['modem_temps'],
+      )
+
       try:
-        network_type = HARDWARE.get_network_type()
-        modem_temps = HARDWARE.get_modem_temperatures()
-        if len(modem_temps) == 0 and prev_hw_state is not None:
-          modem_temps = prev_hw_state.modem_temps
+        hw_queue.put_nowait(hw_state)
+      except queue.Full:
+        pass
 
+    if (count % int(10. / DT_HW)) == 0:
+      try:
         # Log modem version once
         if AGNOS and (modem_version is None):
-          modem_version = HARDWARE.get_modem_version()
+          modem_version = collector['modem_version']
 
           if modem_version is not None:
             cloudlog.event("modem version", version=modem_version)
 
-        if AGNOS and modem_restart_count < 3 and HARDWARE.get_modem_version() is None:
+        if AGNOS and modem_restart_count < 3 and collector['modem_version'] is None:
           # TODO: we may be able to remove this with a MM update
           # ModemManager's probing on startup can fail
           # rarely, restart the service to probe again.
@@ -134,31 +147,19 @@ def hw_state_thread(end_event, hw_queue):
             cloudlog.event("restarting ModemManager")
             os.system("sudo systemctl restart --no-block ModemManager")
 
-        tx, rx = HARDWARE.get_modem_data_usage()
-
-        hw_state = HardwareState(
-          network_type=network_type,
-          network_info=HARDWARE.get_network_info(),
-          network_strength=HARDWARE.get_network_strength(network_type),
-          network_stats={'wwanTx': tx, 'wwanRx': rx},
-          network_metered=HARDWARE.get_network_metered(network_type),
-          modem_temps=modem_temps,
-        )
-
-        try:
-          hw_queue.put_nowait(hw_state)
-        except queue.Full:
-          pass
-
-        if not modem_configured and HARDWARE.get_modem_version() is not None:
+        if not modem_configured and collector['modem_version'] is not None:
           cloudlog.warning("configuring modem")
           HARDWARE.configure_modem()
           modem_configured = True
-
-        prev_hw_state = hw_state
       except Exception:
         cloudlog.exception("Error getting hardware state")
 
+    # per call latency of the hardware getters, once a minute
+    if (count % int(60. / DT_HW)) == 0:
+      for name, stats in collector.pop_stats().items():
+        statlog.sample(f"hw_{name}_latency", stats.total / stats.count)
+        statlog.gauge(f"hw_{name}_latency_max", stats.max)
+
     count += 1
     time.sleep(DT_HW)
 
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from openpilot.common.swaglog import cloudlog
+from openpilot.system.hardware.base import HardwareBase
+from openpilot.system.hardware.tici.hardware import DBUS_PROPS, MM_MODEM, NM, NM_AP, NM_DEV, NetworkStrength, NetworkType
+
+NM_PATH = '/org/freedesktop/NetworkManager'
+MM_PATH = '/org/freedesktop/ModemManager1'
+SIGNAL_QUEUE_SIZE = 64
+
+
+@dataclass
+class MetricBudget:
+  interval: float = 10.      # refresh at least this often
+  min_interval: float = 2.   # and at most this often, also when invalidated by a D-Bus signal
+  timeout: float = 1.        # calls slower than this, or failing, back off the next refresh
+  max_backoff: float = 120.
+
+
+# the modem AT commands are the slow ones, with multi second timeouts on weak signal
+DEFAULT_BUDGETS = {
+  'network_type': MetricBudget(),
+  'network_strength': MetricBudget(min_interval=5.),
+  'network_metered': MetricBudget(),
+  'network_info': MetricBudget(min_interval=5., timeout=2.),
+  'network_stats': MetricBudget(),
+  'modem_temps': MetricBudget(timeout=2.),
+  'modem_version': MetricBudget(),
+}
+
+# D-Bus interface -> property -> metrics to refresh when it changes
+PROPERTY_METRICS: dict[str, dict[str, tuple[str, ...]]] = {
+  NM: {
+    'PrimaryConnection': ('network_type', 'network_metered', 'network_strength'),
+    'ActiveConnections': ('network_type', 'network_metered', 'network_strength'),
+    'Metered': ('network_metered',),
+  },
+  NM_DEV: {
+    'Metered': ('network_metered',),
+  },
+  NM_AP: {
+    'Strength': ('network_strength',),
+  },
+  MM_MODEM: {
+    'SignalQuality': ('network_strength',),
+    'AccessTechnologies': ('network_type', 'network_info'),
+    'State': ('network_info',),
+    'Revision': ('modem_version',),
+  },
+}
+
+
+def metrics_for_properties(interface: str, properties) -> set[str]:
+  interface_metrics = PROPERTY_METRICS.get(interface, {})
+  return {m for p in properties for m in interface_metrics.get(p, ())}
+
+
+@dataclass
+class CallStats:
+  count: int = 0
+  errors: int = 0
+  slow: int = 0
+  last: float = 0.
+  max: float = 0.
+  total: float = 0.
+
+  def add(self, latency: float, error: bool, slow: bool) -> None:
+    self.count += 1
+    self.errors += error
+    self.slow += slow
+    self.last = latency
+    self.max = max(self.max, latency)
+    self.total += latency
+
+
+@dataclass
+class Metric:
+  name: str
+  fn: Callable[[], Any]
+  budget: MetricBudget
+  value: Any
+  interval: float = 0.
+  last_call: float = -float('inf')
+  invalidated: bool = False
+  stats: CallStats = field(default_factory=CallStats)
+
+
+class TelemetryCollector:
+  """Caches the slow HARDWARE network and modem getters, and refreshes each one on its own budget"""
+  def __init__(self, hardware: HardwareBase, budgets: dict[str, MetricBudget] | None = None, clock: Callable[[], float] = time.monotonic):
+    self.hardware = hardware
+    self.clock = clock
+    budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+
+    # network_strength and network_metered depend on network_type, which is refreshed first
+    metrics = [
+      Metric('network_type', hardware.get_network_type, budgets['network_type'], NetworkType.none),
+      Metric('network_strength', lambda: hardware.get_network_strength(self['network_type']),
+             budgets['network_strength'], NetworkStrength.unknown),
+      Metric('network_metered', lambda: hardware.get_network_metered(self['network_type']), budgets['network_metered'], False),
+      Metric('network_info', hardware.get_network_info, budgets['network_info'], None),
+      Metric('network_stats', self._get_network_stats, budgets['network_stats'], {'wwanTx': -1, 'wwanRx': -1}),
+      # the modem doesn't always answer, keep the last temperatures
+      Metric('modem_temps', lambda: hardware.get_modem_temperatures() or self['modem_temps'], budgets['modem_temps'], []),
+      Metric('modem_version', hardware.get_modem_version, budgets['modem_version'], None),
+    ]
+    self.metrics = {m.name: m for m in metrics}
+    for m in metrics:
+      m.interval = m.budget.interval
+
+    self._lock = threading.Lock()
+    self._invalidated: set[str] = set()
+    self._report_stats = {name: CallStats() for name in self.metrics}
+
+  def __getitem__(self, name: str) -> Any:
+    return self.metrics[name].value
+
+  def _get_network_stats(self) -> dict[str, int]:
+    tx, rx = self.hardware.get_modem_data_usage()
+    return {'wwanTx': tx, 'wwanRx': rx}
+
+  def invalidate(self, *names: str) -> None:
+    """Refresh these metrics on the next update, within their min_interval. Safe to call from any thread"""
+    with self._lock:
+      self._invalidated.update(names)
+
+  def update(self) -> bool:
+    """Refreshes the metrics that are due, returns whether any value changed"""
+    with self._lock:
+      invalidated, self._invalidated = self._invalidated, set()
+
+    changed = False
+    for m in self.metrics.values():
+      m.invalidated |= m.name in invalidated
+      since_last = self.clock() - m.last_call
+      if since_last >= m.interval or (m.invalidated and since_last >= m.budget.min_interval):
+        if self._refresh(m):
+          changed = True
+          if m.name == 'network_type':
+            self.metrics['network_strength'].invalidated = True
+            self.metrics['network_metered'].invalidated = True
+    return changed
+
+  def _refresh(self, m: Metric) -> bool:
+    t = self.clock()
+    error = False
+    try:
+      value = m.fn()
+    except Exception:
+      cloudlog.exception(f"Error getting {m.name}")
+      error = True
+    latency = self.clock() - t
+
+    slow = latency > m.budget.timeout
+    m.stats.add(latency, error, slow)
+    self._report_stats[m.name].add(latency, error, slow)
+    m.last_call = t
+    m.invalidated = False
+    if error or slow:
+      # don't keep a slow modem busy, back off until a fast call
+      m.interval = min(m.interval * 2, m.budget.max_backoff)
+      if slow:
+        cloudlog.warning(f"{m.name} took {latency:.2f}s, next refresh in {m.interval:.0f}s")
+    else:
+      m.interval = m.budget.interval
+
+    if error or value == m.value:
+      return False
+    m.value = value
+    return True
+
+  def pop_stats(self) -> dict[str, CallStats]:
+    """Call latencies since the last pop_stats, for the metrics that were refreshed"""
+    stats = {name: s for name, s in self._report_stats.items() if s.count > 0}
+    for name in stats:
+      self._report_stats[name] = CallStats()
+    return stats
+
+
+def network_signal_thread(collector: TelemetryCollector, end_event: threading.Event) -> None:
+  """Invalidates the collector metrics on NetworkManager and ModemManager PropertiesChanged signals"""
+  try:
+    from jeepney.bus_messages import MatchRule, message_bus
+    from jeepney.io.blocking import open_dbus_connection
+    conn = open_dbus_connection(bus="SYSTEM")
+  except Exception:
+    cloudlog.exception("No D-Bus connection, hardware telemetry is polled only")
+    return
+
+  with conn:
+    for path in (NM_PATH, MM_PATH):
+      conn.send_and_get_reply(message_bus.AddMatch(MatchRule(type="signal", interface=DBUS_PROPS, member="PropertiesChanged", path_namespace=path)))
+
+    rule = MatchRule(type="signal", interface=DBUS_PROPS, member="PropertiesChanged")
+    with conn.filter(rule, bufsize=SIGNAL_QUEUE_SIZE) as q:
+      while not end_event.is_set():
+        try:
+          msg = conn.recv_until_filtered(q, timeout=1)
+        except TimeoutError:
+          continue
+
+        interface, changed, invalidated = msg.body
+        metrics = metrics_for_properties(interface, [*changed, *invalidated])
+        if metrics:
+          collector.invalidate(*metrics)
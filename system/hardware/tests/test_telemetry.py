@@ -0,0 +1,153 @@
+from cereal import log
+from openpilot.system.hardware.pc.hardware import Pc
+from openpilot.system.hardware.telemetry import MetricBudget, TelemetryCollector, metrics_for_properties
+from openpilot.system.hardware.tici.hardware import MM_MODEM, NM, NM_AP
+
+NetworkType = log.DeviceState.NetworkType
+NetworkStrength = log.DeviceState.NetworkStrength
+
+
+class FakeClock:
+  def __init__(self):
+    self.t = 100.
+
+  def __call__(self):
+    return self.t
+
+
+class FakeHardware(Pc):
+  """Counts the calls, and takes `latency` seconds of the fake clock for every call"""
+  def __init__(self, clock):
+    self.clock = clock
+    self.calls = {}
+    self.latency = {}
+    self.fail = set()
+    self.network_type = NetworkType.wifi
+    self.modem_temps = [40.]
+
+  def _call(self, name, value):
+    self.calls[name] = self.calls.get(name, 0) + 1
+    self.clock.t += self.latency.get(name, 0.01)
+    if name in self.fail:
+      raise Exception(f"{name} failed")
+    return value
+
+  def get_network_type(self):
+    return self._call('get_network_type', self.network_type)
+
+  def get_network_strength(self, network_type):
+    return self._call('get_network_strength', NetworkStrength.great if network_type == NetworkType.wifi else NetworkStrength.poor)
+
+  def get_network_metered(self, network_type):
+    return self._call('get_network_metered', network_type != NetworkType.wifi)
+
+  def get_network_info(self):
+    return self._call('get_network_info', None)
+
+  def get_modem_data_usage(self):
+    return self._call('get_modem_data_usage', (1, 2))
+
+  def get_modem_temperatures(self):
+    return self._call('get_modem_temperatures', self.modem_temps)
+
+  def get_modem_version(self):
+    return self._call('get_modem_version', "EG25")
+
+
+class TestTelemetryCollector:
+  def setup_method(self):
+    self.clock = FakeClock()
+    self.hw = FakeHardware(self.clock)
+    self.collector = TelemetryCollector(self.hw, clock=self.clock)
+
+  def _run(self, seconds, dt=0.5):
+    end = self.clock.t + seconds
+    while self.clock.t < end:
+      self.collector.update()
+      self.clock.t += dt
+
+  def test_cached(self):
+    assert self.collector.update()
+    assert self.collector['network_type'] == NetworkType.wifi
+    assert self.collector['network_strength'] == NetworkStrength.great
+    assert self.collector['network_stats'] == {'wwanTx': 1, 'wwanRx': 2}
+    assert self.collector['modem_version'] == "EG25"
+    assert all(c == 1 for c in self.hw.calls.values())
+
+    # nothing is due yet
+    self.clock.t += 5.
+    assert not self.collector.update()
+    assert all(c == 1 for c in self.hw.calls.values())
+
+    # every 10s by default
+    self._run(30.)
+    assert all(c == 4 for c in self.hw.calls.values())
+
+  def test_budgets(self):
+    self.collector = TelemetryCollector(self.hw, budgets={'modem_temps': MetricBudget(interval=60.)}, clock=self.clock)
+    self._run(60.)
+    assert self.hw.calls['get_modem_temperatures'] == 1
+    assert self.hw.calls['get_network_type'] == 6
+
+  def test_invalidate(self):
+    self.collector.update()
+    self.hw.network_type = NetworkType.cell4G
+    self.collector.invalidate('network_type')
+
+    # within min_interval of the last call
+    self.collector.update()
+    assert self.collector['network_type'] == NetworkType.wifi
+
+    self.clock.t += 2.
+    assert self.collector.update()
+    assert self.collector['network_type'] == NetworkType.cell4G
+    assert self.hw.calls['get_network_type'] == 2
+    # dependents are refreshed with the new network type, within their min_interval
+    assert self.collector['network_metered']
+    self.clock.t += 3.
+    self.collector.update()
+    assert self.collector['network_strength'] == NetworkStrength.poor
+    assert self.hw.calls['get_modem_temperatures'] == 1
+
+  def test_slow_call_backoff(self):
+    self.hw.latency['get_network_info'] = 5.
+    self._run(300.)
+    # 10, 20, 40, 80, 120, 120s between calls
+    assert self.hw.calls['get_network_info'] < 8
+    assert self.hw.calls['get_network_type'] > 25
+
+    stats = self.collector.pop_stats()
+    assert stats['network_info'].slow == self.hw.calls['get_network_info']
+    assert stats['network_info'].max == 5.
+    assert stats['network_type'].slow == 0
+    assert self.collector.pop_stats() == {}
+
+    # a fast call resets the interval
+    self.hw.latency['get_network_info'] = 0.1
+    self._run(120.)
+    calls = self.hw.calls['get_network_info']
+    self._run(30.)
+    assert self.hw.calls['get_network_info'] == calls + 3
+
+  def test_errors(self):
+    self.collector.update()
+    self.hw.fail.add('get_modem_temperatures')
+    self.clock.t += 10.
+    self.collector.update()
+    assert self.collector['modem_temps'] == [40.]
+    assert self.collector.metrics['modem_temps'].stats.errors == 1
+    assert self.collector.metrics['modem_temps'].interval == 20.
+
+    # no answer keeps the last temperatures
+    self.hw.fail.clear()
+    self.hw.modem_temps = []
+    self.clock.t += 20.
+    self.collector.update()
+    assert self.collector['modem_temps'] == [40.]
+
+  def test_metrics_for_properties(self):
+    assert metrics_for_properties(NM, ['PrimaryConnection']) == {'network_type', 'network_metered', 'network_strength'}
+    assert metrics_for_properties(NM_AP, ['Strength', 'LastSeen']) == {'network_strength'}
+    assert metrics_for_properties(MM_MODEM, ['SignalQuality', 'State']) == {'network_strength', 'network_info'}
+    assert metrics_for_properties(NM_AP, ['LastSeen']) == set()
+    assert metrics_for_properties('org.example', ['Strength']) == set()
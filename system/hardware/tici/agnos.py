@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import dataclasses
 import hashlib
 import json
 import lzma
@@ -11,11 +12,13 @@ from collections.abc import Generator
 import requests
 
 import openpilot.system.updated.casync.casync as casync
+from openpilot.system.updated.casync.seed_index import SeedIndex, SeedIndexReader
 
 SPARSE_CHUNK_FMT = struct.Struct('H2xI4x')
 CAIBX_URL = "https://commadist.azureedge.net/agnosupdate/"
 
 AGNOS_MANIFEST_FILE = "system/hardware/tici/agnos.json"
+SEED_INDEX_PATH = os.getenv("CASYNC_SEED_INDEX", "/data/casync_index")
 
 
 class StreamingDecompressor:
@@ -195,18 +198,48 @@ def extract_casync_image(target_slot_number: int, partition: dict, cloudlog):
 
   sources: list[tuple[str, casync.ChunkReader, casync.ChunkDict]] = []
 
-  # First source is the current partition.
+  # First source is every chunk already on disk: the current partition and anything indexed by earlier updates.
+  # The target partition is about to be overwritten, so it's dropped from the index until it's flashed.
+  index: SeedIndex | None = None
+  try:
+    index = SeedIndex(SEED_INDEX_PATH)
+    index.remove(path)
+  except Exception:
+    index = None
+    cloudlog.exception("casync failed to open seed index")
+
+  caibx_url: str | None = None
   try:
     raw_hash = get_raw_hash(seed_path, partition['size'])
     caibx_url = f"{CAIBX_URL}{partition['name']}-{raw_hash}.caibx"
+  except Exception:
+    cloudlog.exception("casync failed to hash seed partition")
+
+  seed_chunks: casync.ChunkDict | None = None
+  if index is not None:
+    if caibx_url is not None:
+      try:
+        if index.update(seed_path, raw_hash, lambda: casync.parse_caibx(caibx_url)):
+          cloudlog.info(f"casync indexed {caibx_url}")
+      except requests.RequestException:
+        cloudlog.error(f"casync failed to load {caibx_url}")
+      except Exception:
+        cloudlog.exception("casync failed to index seed partition")
 
+    try:
+      seed_chunks = index.chunk_dict()
+    except Exception:
+      cloudlog.exception("casync failed to read seed index")
+
+  if seed_chunks is not None:
+    sources += [('seed', SeedIndexReader(), seed_chunks)]
+  elif caibx_url is not None:
+    # without a usable index, seed from the current partition alone
     try:
       cloudlog.info(f"casync fetching {caibx_url}")
       sources += [('seed', casync.FileChunkReader(seed_path), casync.build_chunk_dict(casync.parse_caibx(caibx_url)))]
     except requests.RequestException:
       cloudlog.error(f"casync failed to load {caibx_url}")
-  except Exception:
-    cloudlog.exception("casync failed to hash seed partition")
 
   # Second source is the target partition, this allows for resuming
   sources += [('target', casync.FileChunkReader(path), casync.build_chunk_dict(target))]
@@ -223,13 +256,22 @@ def extract_casync_image(target_slot_number: int, partition: dict, cloudlog):
       last_p = p
       print(f"Installing {partition['name']}: {p}", flush=True)
 
-  stats = casync.extract(target, sources, path, progress)
+  source_stats: dict[str, casync.SourceStats] = {}
+  stats = casync.extract(target, sources, path, progress, source_stats=source_stats)
   cloudlog.error(f'casync done {json.dumps(stats)}')
+  cloudlog.info(f'casync reads {json.dumps({name: dataclasses.asdict(st) for name, st in source_stats.items()})}')
 
   os.sync()
   if not verify_partition(target_slot_number, partition, force_full_check=True):
     raise Exception(f"Raw hash mismatch '{partition['hash_raw'].lower()}'")
 
+  # the flash is good at this point, the index only speeds up the next update
+  try:
+    if index is not None:
+      index.update(path, partition['hash_raw'].lower(), lambda: target)
+  except Exception:
+    cloudlog.exception("casync failed to index flashed partition")
+
 
 def flash_partition(target_slot_number: int, partition: dict, cloudlog, standalone=False):
   cloudlog.info(f"Downloading and writing {partition['name']}")
@@ -1,11 +1,33 @@
 #!/usr/bin/env python3
+import logging
 import zmq
 from typing import NoReturn
 
 import cereal.messaging as messaging
-from openpilot.common.logging_extra import SwagLogFileFormatter
+from openpilot.common.logging_extra import SwagFormatter, SwagLogger, SwagLogFileFormatter
 from openpilot.system.hardware.hw import Paths
-from openpilot.common.swaglog import get_file_handler
+from openpilot.common.swaglog import get_file_handler, unpack_batch
+
+
+class DroppedRecords:
+  """Turns the dropped records counts of senders into warning records, once per increase"""
+
+  def __init__(self):
+    self.log = SwagLogger()
+    self.log.bind_global(daemon="logmessaged")
+    self.formatter = SwagFormatter(self.log)
+    self.dropped: dict[int, int] = {}
+
+  def update(self, pid: int, dropped: int) -> bytes | None:
+    last = self.dropped.get(pid, 0)
+    # the count restarts with a new process on a reused pid
+    self.dropped[pid] = dropped
+    if dropped <= last:
+      return None
+
+    evt = {'event': 'swaglog_dropped', 'pid': pid, 'dropped': dropped - last, 'total': dropped}
+    record = self.log.makeRecord(self.log.name, logging.WARNING, __file__, 0, evt, (), None)
+    return (chr(logging.WARNING) + self.formatter.format(record)).encode('utf8')
 
 
 def main() -> NoReturn:
@@ -21,26 +43,32 @@ def main() -> NoReturn:
   log_message_sock = messaging.pub_sock('logMessage')
   error_log_message_sock = messaging.pub_sock('errorLogMessage')
 
+  dropped_records = DroppedRecords()
+
   try:
     while True:
-      dat = b''.join(sock.recv_multipart())
-      level = dat[0]
-      record = dat[1:].decode("utf-8")
-      if level >= log_level:
-        log_handler.emit(record)
-
-      if len(record) > 2*1024*1024:
-        print("WARNING: log too big to publish", len(record))
-        print(record[:100])
-        continue
-
-      # then we publish them
-      msg = messaging.new_message(None, valid=True, logMessage=record)
-      log_message_sock.send(msg.to_bytes())
-
-      if level >= 40:  # logging.ERROR
-        msg = messaging.new_message(None, valid=True, errorLogMessage=record)
-        error_log_message_sock.send(msg.to_bytes())
+      pid, dropped, records = unpack_batch(b''.join(sock.recv_multipart()))
+      if pid is not None and (dropped_record := dropped_records.update(pid, dropped)) is not None:
+        records.append(dropped_record)
+
+      for dat in records:
+        level = dat[0]
+        record = dat[1:].decode("utf-8")
+        if level >= log_level:
+          log_handler.emit(record)
+
+        if len(record) > 2*1024*1024:
+          print("WARNING: log too big to publish", len(record))
+          print(record[:100])
+          continue
+
+        # then we publish them
+        msg = messaging.new_message(None, valid=True, logMessage=record)
+        log_message_sock.send(msg.to_bytes())
+
+        if level >= 40:  # logging.ERROR
+          msg = messaging.new_message(None, valid=True, errorLogMessage=record)
+          error_log_message_sock.send(msg.to_bytes())
   finally:
     sock.close()
     ctx.term()
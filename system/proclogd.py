@@ -10,41 +10,43 @@ JIFFY = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
 PAGE_SIZE = os.sysconf(os.sysconf_names['SC_PAGE_SIZE'])
 
 
-def _cpu_times() -> list[dict[str, float]]:
+def _read_all(fd: int) -> bytes:
+  chunks = []
+  offset = 0
+  while dat := os.pread(fd, 4096, offset):
+    chunks.append(dat)
+    offset += len(dat)
+  return b''.join(chunks)
+
+
+def _parse_cpu_times(dat: str) -> list[dict[str, float]]:
   cpu_times: list[dict[str, float]] = []
-  try:
-    with open('/proc/stat') as f:
-      lines = f.readlines()[1:]
-    for line in lines:
-      if not line.startswith('cpu') or len(line) < 4 or not line[3].isdigit():
-        break
-      parts = line.split()
-      cpu_times.append({
-        'cpuNum': int(parts[0][3:]),
-        'user': float(parts[1]) / JIFFY,
-        'nice': float(parts[2]) / JIFFY,
-        'system': float(parts[3]) / JIFFY,
-        'idle': float(parts[4]) / JIFFY,
-        'iowait': float(parts[5]) / JIFFY,
-        'irq': float(parts[6]) / JIFFY,
-        'softirq': float(parts[7]) / JIFFY,
-      })
-  except Exception:
-    cloudlog.exception("failed to read /proc/stat")
+  for line in dat.splitlines()[1:]:
+    if not line.startswith('cpu') or len(line) < 4 or not line[3].isdigit():
+      break
+    parts = line.split()
+    cpu_times.append({
+      'cpuNum': int(parts[0][3:]),
+      'user': float(parts[1]) / JIFFY,
+      'nice': float(parts[2]) / JIFFY,
+      'system': float(parts[3]) / JIFFY,
+      'idle': float(parts[4]) / JIFFY,
+      'iowait': float(parts[5]) / JIFFY,
+      'irq': float(parts[6]) / JIFFY,
+      'softirq': float(parts[7]) / JIFFY,
+    })
   return cpu_times
 
 
-def _mem_info() -> dict[str, int]:
-  keys = ["MemTotal:", "MemFree:", "MemAvailable:", "Buffers:", "Cached:", "Active:", "Inactive:", "Shmem:"]
-  info: dict[str, int] = dict.fromkeys(keys, 0)
-  try:
-    with open('/proc/meminfo') as f:
-      for line in f:
-        parts = line.split()
-        if parts and parts[0] in info:
-          info[parts[0]] = int(parts[1]) * 1024
-  except Exception:
-    cloudlog.exception("failed to read /proc/meminfo")
+MEM_INFO_KEYS = ["MemTotal:", "MemFree:", "MemAvailable:", "Buffers:", "Cached:", "Active:", "Inactive:", "Shmem:"]
+
+
+def _parse_mem_info(dat: str) -> dict[str, int]:
+  info: dict[str, int] = dict.fromkeys(MEM_INFO_KEYS, 0)
+  for line in dat.splitlines():
+    parts = line.split()
+    if parts and parts[0] in info:
+      info[parts[0]] = int(parts[1]) * 1024
   return info
 
 
@@ -89,32 +91,33 @@ def _parse_proc_stat(stat: str) -> ProcStat | None:
   if open_paren == -1 or close_paren == -1 or open_paren > close_paren:
     return None
   name = stat[open_paren + 1:close_paren]
-  stat = stat[:open_paren] + stat[open_paren:close_paren].replace(' ', '_') + stat[close_paren:]
-  parts = stat.split()
-  if len(parts) < 52:
+  # fields after the name, the first one (state) is field 3
+  parts = stat[close_paren + 1:].split()
+  if len(parts) < 50:
     return None
   try:
     return {
       'name': name,
-      'pid': int(parts[_STAT_POS['pid'] - 1]),
-      'state': parts[_STAT_POS['state'] - 1][0],
-      'ppid': int(parts[_STAT_POS['ppid'] - 1]),
-      'utime': int(parts[_STAT_POS['utime'] - 1]),
-      'stime': int(parts[_STAT_POS['stime'] - 1]),
-      'cutime': int(parts[_STAT_POS['cutime'] - 1]),
-      'cstime': int(parts[_STAT_POS['cstime'] - 1]),
-      'priority': int(parts[_STAT_POS['priority'] - 1]),
-      'nice': int(parts[_STAT_POS['nice'] - 1]),
-      'num_threads': int(parts[_STAT_POS['num_threads'] - 1]),
-      'starttime': int(parts[_STAT_POS['starttime'] - 1]),
-      'vms': int(parts[_STAT_POS['vsize'] - 1]),
-      'rss': int(parts[_STAT_POS['rss'] - 1]),
-      'processor': int(parts[_STAT_POS['processor'] - 1]),
+      'pid': int(stat[:open_paren]),
+      'state': parts[_STAT_POS['state'] - 3][0],
+      'ppid': int(parts[_STAT_POS['ppid'] - 3]),
+      'utime': int(parts[_STAT_POS['utime'] - 3]),
+      'stime': int(parts[_STAT_POS['stime'] - 3]),
+      'cutime': int(parts[_STAT_POS['cutime'] - 3]),
+      'cstime': int(parts[_STAT_POS['cstime'] - 3]),
+      'priority': int(parts[_STAT_POS['priority'] - 3]),
+      'nice': int(parts[_STAT_POS['nice'] - 3]),
+      'num_threads': int(parts[_STAT_POS['num_threads'] - 3]),
+      'starttime': int(parts[_STAT_POS['starttime'] - 3]),
+      'vms': int(parts[_STAT_POS['vsize'] - 3]),
+      'rss': int(parts[_STAT_POS['rss'] - 3]),
+      'processor': int(parts[_STAT_POS['processor'] - 3]),
     }
   except Exception:
     cloudlog.exception("failed to parse /proc/<pid>/stat")
     return None
 
+
 class ProcExtra(TypedDict):
   pid: int
   name: str
@@ -122,50 +125,120 @@ class ProcExtra(TypedDict):
   cmdline: list[str]
 
 
-_proc_cache: dict[int, ProcExtra] = {}
+class ProcSampler:
+  """
+  Samples /proc incrementally.
+
+  The stat file of every process is kept open and re-read with pread, a process
+  that exited fails the read with ESRCH, even if its pid was reused since. The
+  cmdline and exe of a process are read once and kept until it exits or execs.
+  Processes are returned ordered by pid, so consecutive samples only differ in
+  the processes that changed.
+  """
+
+  def __init__(self, proc_path: str = '/proc', max_open_files: int = 512):
+    self.proc_path = proc_path
+    self.max_open_files = max_open_files
+    self.stat_fds: dict[int, int] = {}
+    self.extra: dict[int, ProcExtra] = {}
+    self.proc_stat_fd = self._open('stat')
+    self.mem_info_fd = self._open('meminfo')
+
+  def _open(self, path: str) -> int:
+    try:
+      return os.open(os.path.join(self.proc_path, path), os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+      return -1
+
+  def _close_pid(self, pid: int) -> None:
+    fd = self.stat_fds.pop(pid, -1)
+    if fd >= 0:
+      os.close(fd)
+    self.extra.pop(pid, None)
 
+  def _read_stat(self, pid: int) -> str:
+    fd = self.stat_fds.get(pid)
+    if fd is None:
+      if len(self.stat_fds) < self.max_open_files:
+        fd = os.open(os.path.join(self.proc_path, str(pid), 'stat'), os.O_RDONLY | os.O_CLOEXEC)
+        self.stat_fds[pid] = fd
+      else:
+        with open(os.path.join(self.proc_path, str(pid), 'stat'), 'rb') as f:
+          return f.read().decode(errors='replace')
+    return os.pread(fd, 2048, 0).decode(errors='replace')
 
-def _get_proc_extra(pid: int, name: str) -> ProcExtra:
-  cache: ProcExtra | None = _proc_cache.get(pid)
-  if cache is None or cache.get('name') != name:
+  def _read_extra(self, pid: int, name: str) -> ProcExtra:
     exe = ''
     cmdline: list[str] = []
     try:
-      exe = os.readlink(f'/proc/{pid}/exe')
+      exe = os.readlink(os.path.join(self.proc_path, str(pid), 'exe'))
     except OSError:
       pass
     try:
-      with open(f'/proc/{pid}/cmdline', 'rb') as f:
+      with open(os.path.join(self.proc_path, str(pid), 'cmdline'), 'rb') as f:
         cmdline = [c.decode('utf-8', errors='replace') for c in f.read().split(b'\0') if c]
     except OSError:
       pass
-    cache = {'pid': pid, 'name': name, 'exe': exe, 'cmdline': cmdline}
-    _proc_cache[pid] = cache
-  return cache
+    return {'pid': pid, 'name': name, 'exe': exe, 'cmdline': cmdline}
 
+  def procs(self) -> list[tuple[ProcStat, ProcExtra]]:
+    pids = sorted(int(p) for p in os.listdir(self.proc_path) if p.isdigit())
+    # pids past max_open_files have no stat fd, only their cached cmdline and exe
+    for pid in (self.stat_fds.keys() | self.extra.keys()) - set(pids):
+      self._close_pid(pid)
+
+    procs: list[tuple[ProcStat, ProcExtra]] = []
+    for pid in pids:
+      try:
+        stat = self._read_stat(pid)
+      except OSError:
+        # exited, or the pid now belongs to a new process
+        self._close_pid(pid)
+        try:
+          stat = self._read_stat(pid)
+        except OSError:
+          continue
 
-def _procs() -> list[ProcStat]:
-  stats: list[ProcStat] = []
-  for pid_str in os.listdir('/proc'):
-    if not pid_str.isdigit():
-      continue
-    try:
-      with open(f'/proc/{pid_str}/stat') as f:
-        stat = f.read()
       parsed = _parse_proc_stat(stat)
-      if parsed is not None:
-        stats.append(parsed)
-    except OSError:
-      continue
-  return stats
+      if parsed is None:
+        continue
+
+      # the name changes on exec, the cmdline and exe along with it
+      extra = self.extra.get(pid)
+      if extra is None or extra['name'] != parsed['name']:
+        extra = self.extra[pid] = self._read_extra(pid, parsed['name'])
+      procs.append((parsed, extra))
+    return procs
+
+  def cpu_times(self) -> list[dict[str, float]]:
+    try:
+      return _parse_cpu_times(_read_all(self.proc_stat_fd).decode())
+    except Exception:
+      cloudlog.exception("failed to read /proc/stat")
+      return []
+
+  def mem_info(self) -> dict[str, int]:
+    try:
+      return _parse_mem_info(_read_all(self.mem_info_fd).decode())
+    except Exception:
+      cloudlog.exception("failed to read /proc/meminfo")
+      return dict.fromkeys(MEM_INFO_KEYS, 0)
+
+  def close(self) -> None:
+    for pid in list(self.stat_fds):
+      self._close_pid(pid)
+    for fd in (self.proc_stat_fd, self.mem_info_fd):
+      if fd >= 0:
+        os.close(fd)
+    self.proc_stat_fd = self.mem_info_fd = -1
 
 
-def build_proc_log_message(msg) -> None:
+def build_proc_log_message(msg, sampler: ProcSampler) -> None:
   pl = msg.procLog
 
-  procs = _procs()
+  procs = sampler.procs()
   l = pl.init('procs', len(procs))
-  for i, r in enumerate(procs):
+  for i, (r, extra) in enumerate(procs):
     proc = l[i]
     proc.pid = r['pid']
     proc.state = ord(r['state'][0])
@@ -183,13 +256,12 @@ def build_proc_log_message(msg) -> None:
     proc.processor = r['processor']
     proc.name = r['name']
 
-    extra = _get_proc_extra(r['pid'], r['name'])
     proc.exe = extra['exe']
     cmdline = proc.init('cmdline', len(extra['cmdline']))
     for j, arg in enumerate(extra['cmdline']):
       cmdline[j] = arg
 
-  cpu_times = _cpu_times()
+  cpu_times = sampler.cpu_times()
   cpu_list = pl.init('cpuTimes', len(cpu_times))
   for i, ct in enumerate(cpu_times):
     cpu = cpu_list[i]
@@ -202,7 +274,7 @@ def build_proc_log_message(msg) -> None:
     cpu.irq = ct['irq']
     cpu.softirq = ct['softirq']
 
-  mem_info = _mem_info()
+  mem_info = sampler.mem_info()
   pl.mem.total = mem_info["MemTotal:"]
   pl.mem.free = mem_info["MemFree:"]
   pl.mem.available = mem_info["MemAvailable:"]
@@ -216,9 +288,10 @@ def build_proc_log_message(msg) -> None:
 def main() -> NoReturn:
   pm = messaging.PubMaster(['procLog'])
   rk = Ratekeeper(0.5)
+  sampler = ProcSampler()
   while True:
     msg = messaging.new_message('procLog', valid=True)
-    build_proc_log_message(msg)
+    build_proc_log_message(msg, sampler)
     pm.send('procLog', msg)
     rk.keep_time()
 
@@ -15,13 +15,31 @@ from openpilot.system.hardware import HARDWARE
 
 from openpilot.system.sensord.sensors.i2c_sensor import Sensor
 from openpilot.system.sensord.sensors.lsm6ds3_accel import LSM6DS3_Accel
+from openpilot.system.sensord.sensors.lsm6ds3_fifo import LSM6DS3_Fifo
 from openpilot.system.sensord.sensors.lsm6ds3_gyro import LSM6DS3_Gyro
 from openpilot.system.sensord.sensors.lsm6ds3_temp import LSM6DS3_Temp
 from openpilot.system.sensord.sensors.mmc5603nj_magn import MMC5603NJ_Magn
 
 I2C_BUS_IMU = 1
+# samples per IMU FIFO threshold interrupt, 0 for the data ready interrupts
+IMU_FIFO_BATCH = int(os.getenv("IMU_FIFO_BATCH", "0"))
+GPIOEVENT_EVENT_RISING_EDGE = 0x01
 
-def interrupt_loop(sensors: list[tuple[Sensor, str, bool]], event) -> None:
+def publish_fifo(pm: messaging.PubMaster, fifo: LSM6DS3_Fifo, ts: int, irq: bool = True) -> None:
+  try:
+    accel_events, gyro_events = fifo.get_events(ts, irq)
+    if not fifo.is_data_valid():
+      return
+    # one message per sample, with the timestamps reconstructed from the ODR
+    for service, events in (("accelerometer", accel_events), ("gyroscope", gyro_events)):
+      for evt in events:
+        msg = messaging.new_message(service, valid=True)
+        setattr(msg, service, evt)
+        pm.send(service, msg)
+  except Exception:
+    cloudlog.exception("Error processing IMU FIFO")
+
+def interrupt_loop(sensors: list[tuple[Sensor, str, bool]], event, fifo: LSM6DS3_Fifo | None = None) -> None:
   pm = messaging.PubMaster([service for sensor, service, interrupt in sensors if interrupt])
 
   # Requesting both edges as the data ready pulse from the lsm6ds sensor is
@@ -38,12 +56,18 @@ def interrupt_loop(sensors: list[tuple[Sensor, str, bool]], event) -> None:
 
   offset = time.time_ns() - time.monotonic_ns()
 
+  # a threshold interrupt every batch_size samples
+  poll_timeout = 100 if fifo is None else max(100, int(2e3 * fifo.batch_size / fifo.ODR_HZ))
+
   poller = select.poll()
   poller.register(fd, select.POLLIN | select.POLLPRI)
   while not event.is_set():
-    events = poller.poll(100)
+    events = poller.poll(poll_timeout)
     if not events:
       cloudlog.error("poll timed out")
+      if fifo is not None:
+        # the threshold interrupt is a level, drain in case an edge was missed
+        publish_fifo(pm, fifo, time.monotonic_ns(), irq=False)
       continue
     if not (events[0][1] & (select.POLLIN | select.POLLPRI)):
       cloudlog.error("no poll events set")
@@ -59,6 +83,12 @@ def interrupt_loop(sensors: list[tuple[Sensor, str, bool]], event) -> None:
       continue
 
     ts = evd.timestamp - cur_offset
+    if fifo is not None:
+      # the falling edge is the FIFO going below the threshold while draining
+      if evd.id == GPIOEVENT_EVENT_RISING_EDGE:
+        publish_fifo(pm, fifo, ts)
+      continue
+
     for sensor, service, interrupt in sensors:
       if interrupt:
         try:
@@ -92,9 +122,10 @@ def polling_loop(sensor: Sensor, service: str, event: threading.Event) -> None:
 def main() -> None:
   config_realtime_process([1, ], 1)
 
+  accel, gyro = LSM6DS3_Accel(I2C_BUS_IMU), LSM6DS3_Gyro(I2C_BUS_IMU)
   sensors_cfg = [
-    (LSM6DS3_Accel(I2C_BUS_IMU), "accelerometer", True),
-    (LSM6DS3_Gyro(I2C_BUS_IMU), "gyroscope", True),
+    (accel, "accelerometer", True),
+    (gyro, "gyroscope", True),
     (LSM6DS3_Temp(I2C_BUS_IMU), "temperatureSensor", False),
   ]
   if HARDWARE.get_device_type() == "tizi":
@@ -111,9 +142,7 @@ def main() -> None:
 
   # Initialize sensors
   exit_event = threading.Event()
-  threads = [
-    threading.Thread(target=interrupt_loop, args=(sensors_cfg, exit_event), daemon=True)
-  ]
+  threads = []
   for sensor, service, interrupt in sensors_cfg:
     try:
       sensor.init()
@@ -127,6 +156,16 @@ def main() -> None:
     except Exception:
       cloudlog.exception(f"Error initializing {service} sensor")
 
+  fifo = None
+  if IMU_FIFO_BATCH > 0:
+    try:
+      fifo = LSM6DS3_Fifo(I2C_BUS_IMU, accel, gyro, IMU_FIFO_BATCH)
+      fifo.init()
+    except Exception:
+      cloudlog.exception("Error initializing IMU FIFO")
+      fifo = None
+  threads.append(threading.Thread(target=interrupt_loop, args=(sensors_cfg, exit_event, fifo), daemon=True))
+
   try:
     for t in threads:
       t.start()
@@ -140,6 +179,12 @@ def main() -> None:
       if t.is_alive():
         t.join()
 
+    if fifo is not None:
+      try:
+        fifo.shutdown()
+      except Exception:
+        cloudlog.exception("Error shutting down IMU FIFO")
+
     for sensor, _, _ in sensors_cfg:
       try:
         sensor.shutdown()
@@ -1,5 +1,6 @@
 import time
 import smbus2
+from smbus2 import i2c_msg
 import ctypes
 from collections.abc import Iterable
 
@@ -23,6 +24,12 @@ class Sensor:
   def read(self, addr: int, length: int) -> bytes:
     return bytes(self.bus.read_i2c_block_data(self.device_address, addr, length))
 
+  def read_block(self, addr: int, length: int) -> bytes:
+    # SMBus block reads are limited to 32 bytes, this is a single I2C_RDWR ioctl of any length
+    msg = i2c_msg.read(self.device_address, length)
+    self.bus.i2c_rdwr(i2c_msg.write(self.device_address, [addr]), msg)
+    return bytes(msg)
+
   def write(self, addr: int, data: int) -> None:
     self.bus.write_byte_data(self.device_address, addr, data)
 
@@ -69,8 +69,11 @@ class LSM6DS3_Accel(Sensor):
     if (status_reg & self.LSM6DS3_ACCEL_DRDY_XLDA) == 0:
       raise self.DataNotReady
 
+    return self.make_event(ts, self.read(self.LSM6DS3_ACCEL_I2C_REG_OUTX_L_XL, 6))
+
+  def make_event(self, ts: int, b: bytes) -> log.SensorEventData:
+    # 6 bytes of output registers, also the FIFO sample layout
     scale = 9.81 * 2.0 / (1 << 15)
-    b = self.read(self.LSM6DS3_ACCEL_I2C_REG_OUTX_L_XL, 6)
     x = self.parse_16bit(b[0], b[1]) * scale
     y = self.parse_16bit(b[2], b[3]) * scale
     z = self.parse_16bit(b[4], b[5]) * scale
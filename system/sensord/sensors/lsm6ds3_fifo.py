@@ -0,0 +1,136 @@
+import time
+
+from cereal import log
+from openpilot.common.swaglog import cloudlog
+from openpilot.system.sensord.sensors.i2c_sensor import Sensor
+from openpilot.system.sensord.sensors.lsm6ds3_accel import LSM6DS3_Accel
+from openpilot.system.sensord.sensors.lsm6ds3_gyro import LSM6DS3_Gyro
+
+class LSM6DS3_Fifo(Sensor):
+  """Accelerometer and gyroscope samples drained from the shared hardware FIFO, on a FIFO threshold interrupt
+  every batch_size samples instead of a data ready interrupt and two register reads per sample and sensor"""
+  LSM6DS3_FIFO_I2C_REG_FIFO_CTRL1   = 0x06
+  LSM6DS3_FIFO_I2C_REG_FIFO_CTRL2   = 0x07
+  LSM6DS3_FIFO_I2C_REG_FIFO_CTRL3   = 0x08
+  LSM6DS3_FIFO_I2C_REG_FIFO_CTRL5   = 0x0A
+  LSM6DS3_FIFO_I2C_REG_INT1_CTRL    = 0x0D
+  LSM6DS3_FIFO_I2C_REG_FIFO_STATUS1 = 0x3A
+  LSM6DS3_FIFO_I2C_REG_DATA_OUT_L   = 0x3E
+
+  LSM6DS3_FIFO_MODE_BYPASS     = 0b000
+  LSM6DS3_FIFO_MODE_CONTINUOUS = 0b110
+  LSM6DS3_FIFO_ODR_104HZ       = (0b0100 << 3)
+  LSM6DS3_FIFO_DEC_G_NONE      = (0b001 << 3)
+  LSM6DS3_FIFO_DEC_XL_NONE     = 0b001
+  LSM6DS3_FIFO_INT1_FTH        = (1 << 3)
+  LSM6DS3_FIFO_STATUS_OVER_RUN = (1 << 6)
+  LSM6DS3_FIFO_DIFF_MSB_MASK   = 0x0F
+  LSM6DS3_FIFO_PATTERN_MSB_MASK = 0x03
+
+  ODR_HZ = 104.
+  ODR_TOLERANCE = 0.1         # the internal oscillator is within a few %, larger errors are missed interrupts
+  PERIOD_FILTER_K = 0.05
+  PATTERN_WORDS = 6           # gyro x, y, z then accel x, y, z, 16 bit each
+  PATTERN_BYTES = PATTERN_WORDS * 2
+  MAX_BATCH_SIZE = 64         # the threshold is 11 bits of words on the lsm6ds3trc
+  MAX_READ_PATTERNS = 32      # samples per I2C_RDWR transfer, 384 bytes
+
+  def __init__(self, bus: int, accel: LSM6DS3_Accel, gyro: LSM6DS3_Gyro, batch_size: int = 1) -> None:
+    super().__init__(bus)
+    assert 0 < batch_size <= self.MAX_BATCH_SIZE
+    self.accel = accel
+    self.gyro = gyro
+    self.batch_size = batch_size
+    self.period_ns = 1e9 / self.ODR_HZ
+    self.overruns = 0
+    self._last_irq_ts: int | None = None
+    self._last_n = 0
+
+  @property
+  def device_address(self) -> int:
+    return 0x6A
+
+  def init(self) -> None:
+    # after the accelerometer and gyroscope init, which set the ODR and the source
+    self.source = self.accel.source
+    watermark = self.batch_size * self.PATTERN_WORDS
+    int1 = self.read(self.LSM6DS3_FIFO_I2C_REG_INT1_CTRL, 1)[0]
+    int1 &= ~(LSM6DS3_Accel.LSM6DS3_ACCEL_INT1_DRDY_XL | LSM6DS3_Gyro.LSM6DS3_GYRO_INT1_DRDY_G)
+    self.writes((
+      # bypass mode clears the FIFO
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL5, self.LSM6DS3_FIFO_MODE_BYPASS),
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL1, watermark & 0xFF),
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL2, (watermark >> 8) & 0x07),
+      # both sensors in the FIFO at their ODR
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL3, self.LSM6DS3_FIFO_DEC_G_NONE | self.LSM6DS3_FIFO_DEC_XL_NONE),
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL5, self.LSM6DS3_FIFO_ODR_104HZ | self.LSM6DS3_FIFO_MODE_CONTINUOUS),
+      # FIFO threshold interrupt on INT1 instead of the data ready interrupts
+      (self.LSM6DS3_FIFO_I2C_REG_INT1_CTRL, int1 | self.LSM6DS3_FIFO_INT1_FTH),
+    ))
+
+  def get_events(self, ts: int, irq: bool = True) -> tuple[list[log.SensorEventData], list[log.SensorEventData]]:
+    """Drains the FIFO, returns the accelerometer and gyroscope events. With irq, ts is the threshold
+    interrupt time, when the batch_size-th sample since the last drain was written. Otherwise ts is the
+    time of the newest sample"""
+    status = self.read(self.LSM6DS3_FIFO_I2C_REG_FIFO_STATUS1, 4)
+    words = status[0] | ((status[1] & self.LSM6DS3_FIFO_DIFF_MSB_MASK) << 8)
+    pattern = status[2] | ((status[3] & self.LSM6DS3_FIFO_PATTERN_MSB_MASK) << 8)
+    if status[1] & self.LSM6DS3_FIFO_STATUS_OVER_RUN:
+      # the oldest samples were overwritten, the next interrupt interval isn't batch_size samples
+      self.overruns += 1
+      self._last_irq_ts = None
+      cloudlog.warning(f"IMU FIFO overrun, {self.overruns} total")
+
+    if pattern != 0 and words > 0:
+      # a sample was partially read, skip to the next gyro x
+      skip = min(self.PATTERN_WORDS - pattern, words)
+      self.read_block(self.LSM6DS3_FIFO_I2C_REG_DATA_OUT_L, skip * 2)
+      words -= skip
+
+    n = words // self.PATTERN_WORDS
+    if n == 0:
+      return [], []
+    data = b''.join(self.read_block(self.LSM6DS3_FIFO_I2C_REG_DATA_OUT_L, min(n - i, self.MAX_READ_PATTERNS) * self.PATTERN_BYTES)
+                    for i in range(0, n, self.MAX_READ_PATTERNS))
+
+    if irq:
+      # the samples between two interrupts are the ones read on the previous interrupt
+      if self._last_irq_ts is not None:
+        period = (ts - self._last_irq_ts) / self._last_n
+        nominal = 1e9 / self.ODR_HZ
+        if abs(period - nominal) < self.ODR_TOLERANCE * nominal:
+          self.period_ns += self.PERIOD_FILTER_K * (period - self.period_ns)
+      self._last_irq_ts, self._last_n = ts, n
+      anchor = min(self.batch_size, n) - 1
+    else:
+      self._last_irq_ts = None
+      anchor = n - 1
+
+    accel_events, gyro_events = [], []
+    for i in range(n):
+      sample_ts = int(ts + (i - anchor) * self.period_ns)
+      b = data[i * self.PATTERN_BYTES:(i + 1) * self.PATTERN_BYTES]
+      gyro_events.append(self.gyro.make_event(sample_ts, b[:6]))
+      accel_events.append(self.accel.make_event(sample_ts, b[6:]))
+    return accel_events, gyro_events
+
+  def shutdown(self) -> None:
+    value = self.read(self.LSM6DS3_FIFO_I2C_REG_INT1_CTRL, 1)[0]
+    value &= ~self.LSM6DS3_FIFO_INT1_FTH
+    self.writes((
+      (self.LSM6DS3_FIFO_I2C_REG_INT1_CTRL, value),
+      (self.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL5, self.LSM6DS3_FIFO_MODE_BYPASS),
+    ))
+
+if __name__ == "__main__":
+  a, g = LSM6DS3_Accel(1), LSM6DS3_Gyro(1)
+  a.init()
+  g.init()
+  s = LSM6DS3_Fifo(1, a, g, batch_size=10)
+  s.init()
+  time.sleep(0.2)
+  accel_events, gyro_events = s.get_events(time.monotonic_ns(), irq=False)
+  print(len(accel_events), accel_events[-1], gyro_events[-1])
+  s.shutdown()
+  a.shutdown()
+  g.shutdown()
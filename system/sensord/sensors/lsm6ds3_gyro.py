@@ -64,7 +64,10 @@ class LSM6DS3_Gyro(Sensor):
     if not (status_reg & self.LSM6DS3_GYRO_DRDY_GDA):
       raise self.DataNotReady
 
-    b = self.read(self.LSM6DS3_GYRO_I2C_REG_OUTX_L_G, 6)
+    return self.make_event(ts, self.read(self.LSM6DS3_GYRO_I2C_REG_OUTX_L_G, 6))
+
+  def make_event(self, ts: int, b: bytes) -> log.SensorEventData:
+    # 6 bytes of output registers, also the FIFO sample layout
     x = self.parse_16bit(b[0], b[1])
     y = self.parse_16bit(b[2], b[3])
     z = self.parse_16bit(b[4], b[5])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import time
+import smbus2
+
+from openpilot.common.benchmark import benchmark_parser, format_times
+from openpilot.system.sensord.sensors.i2c_sensor import Sensor
+from openpilot.system.sensord.sensors.lsm6ds3_accel import LSM6DS3_Accel
+from openpilot.system.sensord.sensors.lsm6ds3_fifo import LSM6DS3_Fifo
+from openpilot.system.sensord.sensors.lsm6ds3_gyro import LSM6DS3_Gyro
+from openpilot.system.sensord.tests.fake_smbus import FakeSMBus
+
+# a poll and a read of the GPIO event per interrupt
+GPIO_SYSCALLS = 2
+
+
+def print_counts(name, times, n_samples, transactions, interrupts):
+  # times are per interrupt
+  syscalls = transactions + GPIO_SYSCALLS * interrupts
+  counts = f"{syscalls / n_samples:.2f} syscalls/sample ({transactions / n_samples:.2f} I2C, {interrupts / n_samples:.2f} interrupts)"
+  print(f"{name}: {counts}, {format_times(times, n_samples, 'sample')}")
+
+
+def benchmark(n_samples: int, batch_sizes: list[int]):
+  bus = FakeSMBus()
+  smbus2.SMBus = lambda bus_id: bus
+  accel, gyro = LSM6DS3_Accel(1), LSM6DS3_Gyro(1)
+  accel.init()
+  gyro.init()
+  samples = [((i, -i, 2 * i), (1000 + i, -1000, 16000)) for i in range(n_samples)]
+
+  # a data ready interrupt per sample, what sensord.interrupt_loop does for each interrupt sensor
+  bus.transactions = 0
+  times = []
+  for i in range(n_samples):
+    bus.push_sample(*samples[i])
+    t = time.perf_counter()
+    for sensor in (accel, gyro):
+      try:
+        sensor.get_event(i)
+      except Sensor.DataNotReady:
+        pass
+    times.append(time.perf_counter() - t)
+  print_counts("data ready", times, n_samples, bus.transactions, n_samples)
+
+  for batch_size in batch_sizes:
+    fifo = LSM6DS3_Fifo(1, accel, gyro, batch_size)
+    fifo.init()
+    bus.transactions = 0
+    times = []
+    for i in range(0, n_samples - batch_size + 1, batch_size):
+      for s in samples[i:i + batch_size]:
+        bus.push_sample(*s)
+      t = time.perf_counter()
+      fifo.get_events(i)
+      times.append(time.perf_counter() - t)
+    n = len(times) * batch_size
+    print_counts(f"FIFO, batch {batch_size}", times, n, bus.transactions, len(times))
+    fifo.shutdown()
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Count the I2C transactions and syscalls per IMU sample, with the data ready interrupts and the FIFO")
+  parser.add_argument("-n", type=int, default=10400, help="number of samples, 104 per second")
+  parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 10, 26])
+  args = parser.parse_args()
+  benchmark(args.n, args.batch_sizes)
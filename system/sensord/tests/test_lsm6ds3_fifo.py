@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+import smbus2
+
+from openpilot.system.sensord.sensors.lsm6ds3_accel import LSM6DS3_Accel
+from openpilot.system.sensord.sensors.lsm6ds3_fifo import LSM6DS3_Fifo
+from openpilot.system.sensord.sensors.lsm6ds3_gyro import LSM6DS3_Gyro
+from openpilot.system.sensord.tests.fake_smbus import FakeSMBus
+
+PERIOD_NS = 1e9 / LSM6DS3_Fifo.ODR_HZ
+
+
+def sample(i: int) -> tuple[tuple[int, int, int], tuple[int, int, int]]:
+  return (i, -2 * i, 3 * i), (1000 + i, -1000 - i, 16000 - i)
+
+
+class TestLSM6DS3Fifo:
+  @pytest.fixture(autouse=True)
+  def setup(self, monkeypatch):
+    # accelerometer, gyroscope and FIFO share the chip
+    self.bus = FakeSMBus()
+    monkeypatch.setattr(smbus2, "SMBus", lambda bus: self.bus)
+    self.accel, self.gyro = LSM6DS3_Accel(1), LSM6DS3_Gyro(1)
+    self.accel.init()
+    self.gyro.init()
+
+  def make_fifo(self, batch_size: int) -> LSM6DS3_Fifo:
+    fifo = LSM6DS3_Fifo(1, self.accel, self.gyro, batch_size)
+    fifo.init()
+    self.bus.transactions = 0
+    return fifo
+
+  def push(self, start: int, n: int) -> None:
+    for i in range(start, start + n):
+      self.bus.push_sample(*sample(i))
+
+  def test_init(self):
+    self.make_fifo(10)
+    regs = self.bus.registers
+    assert regs[LSM6DS3_Fifo.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL1] == 60
+    assert regs[LSM6DS3_Fifo.LSM6DS3_FIFO_I2C_REG_FIFO_CTRL5] == LSM6DS3_Fifo.LSM6DS3_FIFO_ODR_104HZ | LSM6DS3_Fifo.LSM6DS3_FIFO_MODE_CONTINUOUS
+    # only the threshold interrupt
+    assert regs[LSM6DS3_Fifo.LSM6DS3_FIFO_I2C_REG_INT1_CTRL] == LSM6DS3_Fifo.LSM6DS3_FIFO_INT1_FTH
+
+  def test_same_as_data_ready(self):
+    fifo = self.make_fifo(1)
+    self.push(7, 1)
+    accel_events, gyro_events = fifo.get_events(123)
+    assert self.bus.transactions == 2
+
+    ts = 123
+    accel_event, gyro_event = self.accel.get_event(ts), self.gyro.get_event(ts)
+    assert self.bus.transactions == 6
+    assert accel_events[0].to_dict() == accel_event.to_dict()
+    assert gyro_events[0].to_dict() == gyro_event.to_dict()
+
+  @pytest.mark.parametrize("batch_size", [1, 10, 64])
+  def test_batches(self, batch_size):
+    fifo = self.make_fifo(batch_size)
+    ts = int(1e9)
+    for batch in range(5):
+      self.push(batch * batch_size, batch_size)
+      accel_events, gyro_events = fifo.get_events(ts)
+      assert len(accel_events) == len(gyro_events) == batch_size
+      for j, (a, g) in enumerate(zip(accel_events, gyro_events, strict=True)):
+        i = batch * batch_size + j
+        assert a.timestamp == g.timestamp == int(ts + (j - batch_size + 1) * PERIOD_NS)
+        assert g.gyroUncalibrated.v[2] == pytest.approx(3 * i * 8.75 / 1000 * np.pi / 180)
+        assert a.acceleration.v[1] == pytest.approx(-(1000 + i) * 9.81 * 2 / (1 << 15))
+      ts += int(batch_size * PERIOD_NS)
+
+    # a status read and a block read per MAX_READ_PATTERNS samples
+    reads_per_batch = 1 + -(-batch_size // LSM6DS3_Fifo.MAX_READ_PATTERNS)
+    assert self.bus.transactions == 5 * reads_per_batch
+    assert len(self.bus.fifo) == 0
+
+  def test_late_read(self):
+    # more than batch_size samples when the interrupt is handled late, the timestamps continue past the interrupt
+    fifo = self.make_fifo(4)
+    self.push(0, 6)
+    accel_events, _ = fifo.get_events(0)
+    assert [e.timestamp for e in accel_events] == [int((j - 3) * PERIOD_NS) for j in range(6)]
+
+    # without an interrupt time, ts is the newest sample
+    self.push(6, 100)
+    accel_events, _ = fifo.get_events(0, irq=False)
+    assert len(accel_events) == 100
+    assert accel_events[-1].timestamp == 0
+    assert self.bus.transactions == 2 + 1 + 4
+
+  def test_period_estimate(self):
+    # the internal oscillator runs 2% fast
+    fifo = self.make_fifo(10)
+    period = PERIOD_NS / 1.02
+    for batch in range(200):
+      self.push(batch * 10, 10)
+      fifo.get_events(int(batch * 10 * period))
+    assert fifo.period_ns == pytest.approx(period, rel=1e-3)
+
+    # an interval not close to the ODR isn't used
+    self.push(0, 10)
+    fifo.get_events(int(200 * 10 * period + 1e9))
+    assert fifo.period_ns == pytest.approx(period, rel=1e-3)
+
+  def test_partial_sample(self):
+    fifo = self.make_fifo(2)
+    self.push(0, 2)
+    self.bus._pop_word()
+    self.bus._pop_word()
+    accel_events, gyro_events = fifo.get_events(0)
+    assert len(accel_events) == 1
+
+    self.push(2, 2)
+    accel_events, gyro_events = fifo.get_events(0)
+    assert len(accel_events) == 2
+    assert gyro_events[0].gyroUncalibrated.v[2] == pytest.approx(6 * 8.75 / 1000 * np.pi / 180)
+
+  def test_overrun(self):
+    fifo = self.make_fifo(1)
+    self.push(0, 1)
+    fifo.get_events(0)
+    self.push(1, 400)
+    accel_events, _ = fifo.get_events(int(PERIOD_NS))
+    assert fifo.overruns == 1
+    # the newest samples are kept
+    assert len(accel_events) == 2048 // 6
+    assert accel_events[-1].acceleration.v[1] == pytest.approx(-1400 * 9.81 * 2 / (1 << 15))
+
+  def test_shutdown(self):
+    fifo = self.make_fifo(1)
+    self.push(0, 3)
+    fifo.shutdown()
+    assert self.bus.registers[LSM6DS3_Fifo.LSM6DS3_FIFO_I2C_REG_INT1_CTRL] == 0
+    assert len(self.bus.fifo) == 0
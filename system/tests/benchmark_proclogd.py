@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import tempfile
+
+from cereal import messaging
+from openpilot.common.benchmark import benchmark_parser, print_times, time_calls
+from openpilot.system.proclogd import ProcSampler, build_proc_log_message
+from openpilot.system.tests.test_proclogd import make_fake_proc
+
+
+def cold_procs(proc_path):
+  # a new sampler opens, reads and parses everything, like a sampler without any state
+  sampler = ProcSampler(proc_path)
+  sampler.procs()
+  sampler.close()
+
+
+def proc_log_message(sampler):
+  msg = messaging.new_message('procLog', valid=True)
+  build_proc_log_message(msg, sampler)
+  msg.to_bytes()
+
+
+def benchmark(proc_path, n_cycles):
+  print_times("  cold procs()", time_calls(lambda: cold_procs(proc_path), n_cycles))
+
+  sampler = ProcSampler(proc_path)
+  sampler.procs()
+  print_times("  incremental procs()", time_calls(sampler.procs, n_cycles))
+  print_times("  incremental procLog message", time_calls(lambda: proc_log_message(sampler), n_cycles))
+  sampler.close()
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the proclogd sampler against a fake /proc tree, and the real /proc")
+  parser.add_argument("-n", type=int, default=100, help="number of cycles")
+  parser.add_argument("--procs", type=int, nargs="+", default=[100, 500])
+  args = parser.parse_args()
+
+  for n_procs in args.procs:
+    with tempfile.TemporaryDirectory() as tmp:
+      make_fake_proc(tmp, n_procs)
+      print(f"fake /proc, {n_procs} processes")
+      benchmark(tmp, args.n)
+
+  print("/proc")
+  benchmark("/proc", args.n)
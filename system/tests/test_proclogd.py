@@ -0,0 +1,158 @@
+import os
+import shutil
+
+from cereal import messaging
+from openpilot.system import proclogd
+from openpilot.system.proclogd import ProcSampler, build_proc_log_message
+
+
+def write_proc_stat(proc_path: str, pid: int, name: str, utime: int = 0, ppid: int = 1) -> None:
+  # pid (comm) state, then fields 4 to 52
+  fields = [0] * 49
+  fields[4 - 4] = ppid
+  fields[14 - 4] = utime
+  fields[15 - 4] = 2
+  fields[20 - 4] = 3
+  fields[22 - 4] = 100
+  fields[23 - 4] = 4096 * 16
+  fields[24 - 4] = 8
+  fields[39 - 4] = 1
+  with open(os.path.join(proc_path, str(pid), 'stat'), 'w') as f:
+    f.write(f"{pid} ({name}) S {' '.join(map(str, fields))}\n")
+
+
+def make_fake_proc(proc_path: str, n_procs: int, n_cpus: int = 4) -> None:
+  """A /proc tree with stat and meminfo, and stat, cmdline and exe for n_procs processes"""
+  os.makedirs(proc_path, exist_ok=True)
+  with open(os.path.join(proc_path, 'stat'), 'w') as f:
+    f.write("cpu  400 0 200 10000 10 0 5 0 0 0\n")
+    for i in range(n_cpus):
+      f.write(f"cpu{i} 100 0 50 2500 2 0 1 0 0 0\n")
+    f.write("intr 12345 " + " ".join(["0"] * 512) + "\nctxt 1000\n")
+  with open(os.path.join(proc_path, 'meminfo'), 'w') as f:
+    for k in proclogd.MEM_INFO_KEYS:
+      f.write(f"{k:<16}{1000} kB\n")
+    f.write("SwapTotal:             0 kB\n")
+  for pid in range(1, n_procs + 1):
+    add_fake_proc(proc_path, pid, f"proc {pid}")
+
+
+def add_fake_proc(proc_path: str, pid: int, name: str, cmdline: list[str] | None = None) -> None:
+  os.makedirs(os.path.join(proc_path, str(pid)), exist_ok=True)
+  write_proc_stat(proc_path, pid, name)
+  with open(os.path.join(proc_path, str(pid), 'cmdline'), 'wb') as f:
+    f.write(b'\0'.join(c.encode() for c in (cmdline or ['/usr/bin/python3', f'{name}.py'])) + b'\0')
+  exe = os.path.join(proc_path, str(pid), 'exe')
+  if os.path.lexists(exe):
+    os.unlink(exe)
+  os.symlink('/usr/bin/python3', exe)
+
+
+class TestProcSampler:
+  def _sampler(self, tmp_path, n_procs=3, **kwargs):
+    self.proc_path = str(tmp_path / "proc")
+    make_fake_proc(self.proc_path, n_procs)
+    return ProcSampler(self.proc_path, **kwargs)
+
+  def test_parse_proc_stat(self):
+    stat = "12 (name with ) (parens) R 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20 21 22 23 24 25 26 27 28 29 30 31 32 33 34 35 " + \
+           "36 37 38 39 40 41 42 43 44 45 46 47 48 49"
+    parsed = proclogd._parse_proc_stat(stat)
+    assert parsed is not None
+    assert parsed['pid'] == 12
+    assert parsed['name'] == 'name with ) (parens'
+    assert parsed['state'] == 'R'
+    assert parsed['ppid'] == 1
+    assert parsed['utime'] == 11
+    assert parsed['vms'] == 20
+    assert parsed['processor'] == 36
+
+    assert proclogd._parse_proc_stat("12 (short) R 1 2 3") is None
+    assert proclogd._parse_proc_stat("no parens") is None
+
+  def test_procs(self, tmp_path):
+    sampler = self._sampler(tmp_path, n_procs=12)
+    procs = sampler.procs()
+    assert [p['pid'] for p, _ in procs] == list(range(1, 13))
+    stat, extra = procs[1]
+    assert stat['name'] == 'proc 2'
+    assert stat['ppid'] == 1
+    assert stat['num_threads'] == 3
+    assert extra['cmdline'] == ['/usr/bin/python3', 'proc 2.py']
+    assert extra['exe'] == '/usr/bin/python3'
+
+    assert len(sampler.cpu_times()) == 4
+    assert sampler.mem_info()['MemTotal:'] == 1000 * 1024
+    sampler.close()
+
+  def test_stat_reread(self, tmp_path):
+    sampler = self._sampler(tmp_path)
+    assert sampler.procs()[0][0]['utime'] == 0
+    write_proc_stat(self.proc_path, 1, "proc 1", utime=42)
+    # same fd, new contents
+    assert sampler.procs()[0][0]['utime'] == 42
+    sampler.close()
+
+  def test_static_data_cached(self, tmp_path, mocker):
+    sampler = self._sampler(tmp_path)
+    read_extra = mocker.spy(sampler, '_read_extra')
+    for _ in range(5):
+      sampler.procs()
+    assert read_extra.call_count == 3
+
+    # exec changes the name, and with it the cmdline
+    add_fake_proc(self.proc_path, 2, "new name", cmdline=["./new"])
+    procs = sampler.procs()
+    assert read_extra.call_count == 4
+    assert procs[1][1]['cmdline'] == ["./new"]
+    sampler.close()
+
+  def test_process_exit(self, tmp_path):
+    sampler = self._sampler(tmp_path)
+    sampler.procs()
+    assert len(sampler.stat_fds) == 3
+
+    shutil.rmtree(os.path.join(self.proc_path, "2"))
+    assert [p['pid'] for p, _ in sampler.procs()] == [1, 3]
+    assert set(sampler.stat_fds) == {1, 3}
+    assert set(sampler.extra) == {1, 3}
+
+    # pid reused
+    add_fake_proc(self.proc_path, 2, "reused")
+    procs = sampler.procs()
+    assert procs[1][0]['name'] == procs[1][1]['name'] == "reused"
+    sampler.close()
+
+  def test_max_open_files(self, tmp_path):
+    sampler = self._sampler(tmp_path, n_procs=10, max_open_files=4)
+    procs = sampler.procs()
+    assert len(procs) == 10
+    assert len(sampler.stat_fds) == 4
+
+    # processes without a stat fd are forgotten when they exit too
+    shutil.rmtree(os.path.join(self.proc_path, "10"))
+    assert len(sampler.procs()) == 9
+    assert 10 not in sampler.extra and len(sampler.extra) == 9
+    sampler.close()
+
+  def test_build_proc_log_message(self, tmp_path):
+    sampler = self._sampler(tmp_path)
+    msg = messaging.new_message('procLog', valid=True)
+    build_proc_log_message(msg, sampler)
+    pl = msg.procLog
+    assert [p.pid for p in pl.procs] == [1, 2, 3]
+    assert pl.procs[0].name == 'proc 1'
+    assert pl.procs[0].state == ord('S')
+    assert pl.procs[0].memRss == 8 * proclogd.PAGE_SIZE
+    assert list(pl.procs[0].cmdline) == ['/usr/bin/python3', 'proc 1.py']
+    assert len(pl.cpuTimes) == 4
+    assert pl.mem.total == 1000 * 1024
+    sampler.close()
+
+  def test_real_proc(self):
+    sampler = ProcSampler()
+    procs = sampler.procs()
+    assert any(p['pid'] == os.getpid() for p, _ in procs)
+    assert len(sampler.cpu_times()) == os.cpu_count()
+    assert sampler.mem_info()['MemTotal:'] > 0
+    sampler.close()
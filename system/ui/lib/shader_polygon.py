@@ -1,7 +1,7 @@
 import pyray as rl
 import numpy as np
 from dataclasses import dataclass
-from typing import Any, Optional, cast
+from typing import Any, Optional
 from openpilot.system.ui.lib.application import gui_app, GL_VERSION
 
 MAX_GRADIENT_COLORS = 20  # includes stops as well
@@ -11,8 +11,8 @@ MAX_GRADIENT_COLORS = 20  # includes stops as well
 class Gradient:
   start: tuple[float, float]
   end: tuple[float, float]
-  colors: list[rl.Color]
-  stops: list[float]
+  colors: list[rl.Color] | np.ndarray  # or (N, 4) RGBA in [0, 1]
+  stops: list[float] | np.ndarray
 
   def __post_init__(self):
     if len(self.colors) > MAX_GRADIENT_COLORS:
@@ -123,8 +123,6 @@ class ShaderState:
     self.fill_color_ptr = rl.ffi.new("float[]", [0.0, 0.0, 0.0, 0.0])
     self.use_gradient_ptr = rl.ffi.new("int[]", [0])
     self.color_count_ptr = rl.ffi.new("int[]", [0])
-    self.gradient_colors_ptr = rl.ffi.new("float[]", MAX_GRADIENT_COLORS * 4)
-    self.gradient_stops_ptr = rl.ffi.new("float[]", MAX_GRADIENT_COLORS)
 
   def initialize(self):
     if self.initialized:
@@ -152,6 +150,25 @@ class ShaderState:
     self.initialized = False
 
 
+def hsla_to_rgba(h, s, l, a) -> np.ndarray:
+  """colorsys.hls_to_rgb for arrays, with alpha. All in [0, 1], returns (N, 4) float32."""
+  h, s, l, a = (x.ravel() for x in np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float32)) for x in (h, s, l, a))))
+  m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - l * s)
+  m1 = 2.0 * l - m2
+
+  def channel(hue):
+    hue = hue % 1.0
+    return np.select([hue < 1 / 6, hue < 0.5, hue < 2 / 3], [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (2 / 3 - hue) * 6.0], m1)
+
+  return np.stack([channel(h + 1 / 3), channel(h), channel(h - 1 / 3), a], axis=1).astype(np.float32)
+
+
+def _gradient_color_buffer(colors: list[rl.Color] | np.ndarray) -> np.ndarray:
+  if isinstance(colors, np.ndarray):
+    return np.ascontiguousarray(colors[:MAX_GRADIENT_COLORS], dtype=np.float32)
+  return np.array([(c.r, c.g, c.b, c.a) for c in colors[:MAX_GRADIENT_COLORS]], dtype=np.float32).reshape(-1, 4) / 255.0
+
+
 def _configure_shader_color(state: ShaderState, color: Optional[rl.Color],
                             gradient: Gradient | None, origin_rect: rl.Rectangle):
   assert (color is not None) != (gradient is not None), "Either color or gradient must be provided"
@@ -161,18 +178,13 @@ def _configure_shader_color(state: ShaderState, color: Optional[rl.Color],
   rl.set_shader_value(state.shader, state.locations['useGradient'], state.use_gradient_ptr, UNIFORM_INT)
 
   if use_gradient:
-    gradient = cast(Gradient, gradient)
-    state.color_count_ptr[0] = len(gradient.colors)
-    for i in range(len(gradient.colors)):
-      c = gradient.colors[i]
-      base = i * 4
-      state.gradient_colors_ptr[base:base + 4] = [c.r / 255.0, c.g / 255.0, c.b / 255.0, c.a / 255.0]
-    rl.set_shader_value_v(state.shader, state.locations['gradientColors'], state.gradient_colors_ptr, UNIFORM_VEC4, len(gradient.colors))
-
-    for i in range(len(gradient.stops)):
-      s = float(gradient.stops[i])
-      state.gradient_stops_ptr[i] = 0.0 if s < 0.0 else 1.0 if s > 1.0 else s
-    rl.set_shader_value_v(state.shader, state.locations['gradientStops'], state.gradient_stops_ptr, UNIFORM_FLOAT, len(gradient.stops))
+    assert gradient is not None
+    # contiguous float32 buffers, passed to the shader as they are
+    colors = _gradient_color_buffer(gradient.colors)
+    stops = np.clip(np.asarray(gradient.stops[:MAX_GRADIENT_COLORS], dtype=np.float32), 0.0, 1.0)
+    state.color_count_ptr[0] = len(colors)
+    rl.set_shader_value_v(state.shader, state.locations['gradientColors'], rl.ffi.cast("void *", colors.ctypes.data), UNIFORM_VEC4, len(colors))
+    rl.set_shader_value_v(state.shader, state.locations['gradientStops'], rl.ffi.cast("void *", stops.ctypes.data), UNIFORM_FLOAT, len(stops))
     rl.set_shader_value(state.shader, state.locations['gradientColorCount'], state.color_count_ptr, UNIFORM_INT)
 
     # Map normalized start/end to screen pixels
@@ -186,21 +198,17 @@ def _configure_shader_color(state: ShaderState, color: Optional[rl.Color],
     rl.set_shader_value(state.shader, state.locations['fillColor'], state.fill_color_ptr, UNIFORM_VEC4)
 
 
-def triangulate(pts: np.ndarray) -> list[tuple[float, float]]:
-  """Only supports simple polygons with two chains (ribbon)."""
+def triangulate(pts: np.ndarray) -> np.ndarray:
+  """Only supports simple polygons with two chains (ribbon). Returns a contiguous (N, 2) float32 triangle strip."""
 
   # TODO: consider deduping close screenspace points
   # interleave points to produce a triangle strip
   # assert len(pts) % 2 == 0, "Interleaving expects even number of points"
-  if len(pts) % 2 != 0:
-    pts = pts[:-1]
-
-  tri_strip = []
-  for i in range(len(pts) // 2):
-    tri_strip.append(pts[i])
-    tri_strip.append(pts[-i - 1])
-
-  return cast(list, np.array(tri_strip).tolist())
+  n = len(pts) // 2
+  tri_strip = np.empty((2 * n, 2), dtype=np.float32)
+  tri_strip[0::2] = pts[:n]
+  tri_strip[1::2] = pts[::-1][len(pts) % 2:][:n]
+  return tri_strip
 
 
 def draw_polygon(origin_rect: rl.Rectangle, points: np.ndarray,
@@ -229,7 +237,7 @@ def draw_polygon(origin_rect: rl.Rectangle, points: np.ndarray,
 
   # Draw strip, color here doesn't matter
   rl.begin_shader_mode(state.shader)
-  rl.draw_triangle_strip(tri_strip, len(tri_strip), rl.WHITE)
+  rl.draw_triangle_strip(rl.ffi.cast("Vector2 *", tri_strip.ctypes.data), len(tri_strip), rl.WHITE)
   rl.end_shader_mode()
 
 
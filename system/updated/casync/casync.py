@@ -5,10 +5,13 @@ import os
 import pathlib
 import struct
 import sys
+import threading
 import time
 from abc import ABC, abstractmethod
 from collections import defaultdict, namedtuple
 from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from typing import IO
 
 import requests
@@ -28,6 +31,10 @@ CA_TABLE_MIN_LEN = CA_TABLE_HEADER_LEN + CA_TABLE_ENTRY_LEN
 
 CHUNK_DOWNLOAD_TIMEOUT = 60
 CHUNK_DOWNLOAD_RETRIES = 3
+CHUNK_DOWNLOAD_RETRY_DELAY = 1.
+
+# chunks fetched, decompressed and verified concurrently by extract
+EXTRACT_WORKERS = int(os.getenv("CASYNC_WORKERS", "16"))
 
 CAIBX_DOWNLOAD_TIMEOUT = 120
 
@@ -46,10 +53,12 @@ class BinaryChunkReader(ChunkReader):
   def __init__(self, file_like: IO[bytes]) -> None:
     super().__init__()
     self.f = file_like
+    self.lock = threading.Lock()
 
   def read(self, chunk: Chunk) -> bytes:
-    self.f.seek(chunk.offset)
-    return self.f.read(chunk.length)
+    with self.lock:
+      self.f.seek(chunk.offset)
+      return self.f.read(chunk.length)
 
 
 class FileChunkReader(BinaryChunkReader):
@@ -66,7 +75,14 @@ class RemoteChunkReader(ChunkReader):
   def __init__(self, url: str) -> None:
     super().__init__()
     self.url = url
-    self.session = requests.Session()
+    self.local = threading.local()
+
+  @property
+  def session(self) -> requests.Session:
+    # requests sessions aren't thread safe, keep one connection pool per worker
+    if not hasattr(self.local, 'session'):
+      self.local.session = requests.Session()
+    return self.local.session
 
   def read(self, chunk: Chunk) -> bytes:
     sha_hex = chunk.sha.hex()
@@ -83,7 +99,7 @@ class RemoteChunkReader(ChunkReader):
         except Exception:
           if i == CHUNK_DOWNLOAD_RETRIES - 1:
             raise
-          time.sleep(CHUNK_DOWNLOAD_TIMEOUT)
+          time.sleep(CHUNK_DOWNLOAD_RETRY_DELAY * 2**i)
 
       resp.raise_for_status()
       contents = resp.content
@@ -165,41 +181,102 @@ def build_chunk_dict(chunks: list[Chunk]) -> ChunkDict:
   return r
 
 
+@dataclass
+class SourceStats:
+  """Chunks read from a source, successful or not. seconds is time spent in reads summed over workers."""
+  chunks: int = 0
+  bytes: int = 0
+  failures: int = 0
+  seconds: float = 0.
+
+  @property
+  def throughput(self) -> float:
+    return self.bytes / self.seconds if self.seconds > 0 else 0.
+
+
+def fetch_chunk(chunk: Chunk, sources: list[tuple[str, ChunkReader, ChunkDict]],
+                source_stats: dict[str, SourceStats]) -> tuple[str, bytes]:
+  """Reads a chunk from the first source that has a copy with the right length and hash"""
+  for name, chunk_reader, store_chunks in sources:
+    if chunk.sha in store_chunks:
+      t = time.monotonic()
+      bts = chunk_reader.read(store_chunks[chunk.sha])
+      valid = len(bts) == chunk.length and SHA512.new(bts, truncate="256").digest() == chunk.sha
+
+      st = source_stats[name]
+      st.chunks += 1
+      st.bytes += len(bts)
+      st.seconds += time.monotonic() - t
+      if valid:
+        return name, bts
+      st.failures += 1
+
+  raise RuntimeError("Desired chunk not found in provided stores")
+
+
 def extract(target: list[Chunk],
             sources: list[tuple[str, ChunkReader, ChunkDict]],
             out_path: str,
-            progress: Callable[[int], None] = None):
+            progress: Callable[[int], None] = None,
+            workers: int = EXTRACT_WORKERS,
+            source_stats: dict[str, SourceStats] | None = None):
+  """Writes the target chunks to out_path and returns the bytes written per source.
+
+  Chunks are read, decompressed and verified on a pool of workers, with up to
+  2 * workers chunks in flight, and written at their offsets as they complete.
+  Each distinct chunk is only read once and written to every offset it appears
+  at. Pass source_stats to get the reads and throughput of each source."""
   stats: dict[str, int] = defaultdict(int)
+  if source_stats is None:
+    source_stats = {}
+  for name, _, _ in sources:
+    source_stats.setdefault(name, SourceStats())
+
+  offsets: dict[bytes, list[Chunk]] = defaultdict(list)
+  for c in target:
+    offsets[c.sha].append(c)
+  pending = iter(offsets.values())
+  stats_lock = threading.Lock()
+
+  def fetch(chunk: Chunk) -> tuple[str, bytes]:
+    local_stats: dict[str, SourceStats] = defaultdict(SourceStats)
+    name, bts = fetch_chunk(chunk, sources, local_stats)
+    with stats_lock:
+      for n, st in local_stats.items():
+        total = source_stats[n]
+        total.chunks += st.chunks
+        total.bytes += st.bytes
+        total.failures += st.failures
+        total.seconds += st.seconds
+    return name, bts
 
   mode = 'rb+' if os.path.exists(out_path) else 'wb'
-  with open(out_path, mode) as out:
-    for cur_chunk in target:
-
-      # Find source for desired chunk
-      for name, chunk_reader, store_chunks in sources:
-        if cur_chunk.sha in store_chunks:
-          bts = chunk_reader.read(store_chunks[cur_chunk.sha])
-
-          # Check length
-          if len(bts) != cur_chunk.length:
-            continue
+  with open(out_path, mode) as out, ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="casync") as pool:
+    in_flight: dict[Future, list[Chunk]] = {}
+    try:
+      while True:
+        for chunks in pending:
+          in_flight[pool.submit(fetch, chunks[0])] = chunks
+          if len(in_flight) >= 2 * max(workers, 1):
+            break
+        if not in_flight:
+          break
 
-          # Check hash
-          if SHA512.new(bts, truncate="256").digest() != cur_chunk.sha:
-            continue
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for fut in done:
+          chunks = in_flight.pop(fut)
+          name, bts = fut.result()
 
           # Write to output
-          out.seek(cur_chunk.offset)
-          out.write(bts)
-
-          stats[name] += cur_chunk.length
+          for c in chunks:
+            os.pwrite(out.fileno(), bts, c.offset)
+            stats[name] += c.length
 
           if progress is not None:
             progress(sum(stats.values()))
-
-          break
-      else:
-        raise RuntimeError("Desired chunk not found in provided stores")
+    finally:
+      for fut in in_flight:
+        fut.cancel()
 
   return stats
 
@@ -219,14 +296,19 @@ def extract_directory(target: list[Chunk],
   return stats
 
 
-def print_stats(stats: dict[str, int]):
+def print_stats(stats: dict[str, int], source_stats: dict[str, SourceStats] | None = None):
   total_bytes = sum(stats.values())
   print(f"Total size: {total_bytes / 1024 / 1024:.2f} MB")
   for name, total in stats.items():
     print(f"  {name}: {total / 1024 / 1024:.2f} MB ({total / total_bytes * 100:.1f}%)")
 
+  if source_stats is not None:
+    print("Reads:")
+    for name, st in source_stats.items():
+      print(f"  {name}: {st.chunks} chunks, {st.bytes / 1024 / 1024:.2f} MB, {st.failures} failed, {st.throughput / 1024 / 1024:.2f} MB/s per worker")
+
 
-def extract_simple(caibx_path, out_path, store_path):
+def extract_simple(caibx_path, out_path, store_path, source_stats: dict[str, SourceStats] | None = None):
   # (name, callback, chunks)
   target = parse_caibx(caibx_path)
   sources = [
@@ -234,7 +316,7 @@ def extract_simple(caibx_path, out_path, store_path):
     (store_path, FileChunkReader(store_path), build_chunk_dict(target)),
   ]
 
-  return extract(target, sources, out_path)
+  return extract(target, sources, out_path, source_stats=source_stats)
 
 
 if __name__ == "__main__":
@@ -242,5 +324,6 @@ if __name__ == "__main__":
   out = sys.argv[2]
   store = sys.argv[3]
 
-  stats = extract_simple(caibx, out, store)
-  print_stats(stats)
+  source_stats: dict[str, SourceStats] = {}
+  stats = extract_simple(caibx, out, store, source_stats)
+  print_stats(stats, source_stats)
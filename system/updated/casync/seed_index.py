@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import stat
+import struct
+import threading
+from collections import namedtuple
+from collections.abc import Callable
+
+from openpilot.common.swaglog import cloudlog
+from openpilot.common.utils import atomic_write
+from openpilot.system.updated.casync.casync import Chunk, ChunkDict, ChunkReader
+
+ENTRY = struct.Struct("<32sQQ")  # sha, offset, length
+INDEX_VERSION = 1
+
+# a chunk in the index, read from path instead of the file a ChunkReader was made for
+SeedChunk = namedtuple('SeedChunk', ['sha', 'offset', 'length', 'path'])
+
+
+def file_signature(path: str) -> list[int]:
+  """Cheap check for a file having changed. Block devices don't update size or mtime, they rely on the version."""
+  st = os.stat(path)
+  if stat.S_ISBLK(st.st_mode):
+    return [st.st_rdev]
+  return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class SeedIndex:
+  """
+  Persistent index of the chunks already on disk, from sha to (file, offset, length).
+
+  Every indexed file is described by the caibx of its contents and stored as its
+  own entry, so indexing a new or changed file doesn't touch the others. An entry
+  is kept as long as the file's version and stat signature are unchanged.
+
+  Entries can still go stale (e.g. a block device written behind the index's back),
+  extract verifies the hash of every chunk it reads so stale chunks just fall
+  through to the next source.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    os.makedirs(self.path, exist_ok=True)
+    self._chunks: dict[bytes, SeedChunk] | None = None
+
+  def _entry_path(self, name: str) -> str:
+    return os.path.join(self.path, hashlib.sha256(name.encode()).hexdigest()[:32] + ".idx")
+
+  def _read_header(self, entry_path: str) -> dict | None:
+    try:
+      with open(entry_path, 'rb') as f:
+        header = json.loads(f.readline())
+      return header if header.get('index_version') == INDEX_VERSION else None
+    except (OSError, ValueError):
+      return None
+
+  def _read_entry(self, entry_path: str) -> list[SeedChunk]:
+    with open(entry_path, 'rb') as f:
+      header = json.loads(f.readline())
+      dat = f.read()
+    if header.get('index_version') != INDEX_VERSION or len(dat) != header['count'] * ENTRY.size:
+      return []
+    return [SeedChunk(sha, offset, length, header['path']) for sha, offset, length in ENTRY.iter_unpack(dat)]
+
+  def _write_entry(self, name: str, path: str, version: str, chunks: list[Chunk]) -> None:
+    header = {
+      'index_version': INDEX_VERSION,
+      'name': name,
+      'path': path,
+      'version': version,
+      'signature': file_signature(path),
+      'count': len(chunks),
+    }
+    with atomic_write(self._entry_path(name), mode='wb', overwrite=True) as f:
+      f.write(json.dumps(header).encode() + b"\n")
+      f.write(b"".join(ENTRY.pack(c.sha, c.offset, c.length) for c in chunks))
+
+  def names(self) -> list[str]:
+    headers = (self._read_header(os.path.join(self.path, fn)) for fn in sorted(os.listdir(self.path)) if fn.endswith(".idx"))
+    return [h['name'] for h in headers if h is not None]
+
+  def is_current(self, name: str, version: str) -> bool:
+    header = self._read_header(self._entry_path(name))
+    if header is None or header['version'] != version:
+      return False
+    try:
+      return header['signature'] == file_signature(header['path'])
+    except OSError:
+      return False
+
+  def update(self, path: str, version: str, get_chunks: Callable[[], list[Chunk]], name: str | None = None) -> bool:
+    """Index a file described by the caibx chunks from get_chunks, unless it's already indexed at this version.
+    Returns True if the entry was (re)built."""
+    name = name or path
+    if self.is_current(name, version):
+      return False
+
+    self._write_entry(name, path, version, get_chunks())
+    self._chunks = None
+    return True
+
+  def remove(self, name: str) -> None:
+    """Drop an entry, e.g. before its file is overwritten"""
+    try:
+      os.unlink(self._entry_path(name))
+    except FileNotFoundError:
+      pass
+    self._chunks = None
+
+  def chunk_dict(self) -> ChunkDict:
+    """All indexed chunks by hash. Chunks found in several files are read from one of them."""
+    if self._chunks is None:
+      chunks: dict[bytes, SeedChunk] = {}
+      for fn in sorted(os.listdir(self.path)):
+        if fn.endswith(".idx"):
+          for c in self._read_entry(os.path.join(self.path, fn)):
+            chunks.setdefault(c.sha, c)
+      self._chunks = chunks
+    return self._chunks  # type: ignore[return-value]
+
+  def __len__(self) -> int:
+    return len(self.chunk_dict())
+
+
+class SeedIndexReader(ChunkReader):
+  """Reads chunks of a SeedIndex.chunk_dict() from whichever file they are in"""
+
+  def __init__(self) -> None:
+    super().__init__()
+    self.files: dict[str, int] = {}
+    self.lock = threading.Lock()
+
+  def _fd(self, path: str) -> int:
+    with self.lock:
+      if path not in self.files:
+        self.files[path] = os.open(path, os.O_RDONLY)
+      return self.files[path]
+
+  def read(self, chunk: Chunk) -> bytes:
+    assert isinstance(chunk, SeedChunk)
+    try:
+      return os.pread(self._fd(chunk.path), chunk.length, chunk.offset)
+    except OSError:
+      cloudlog.exception(f"casync failed to read seed chunk from {chunk.path}")
+      return b""
+
+  def __del__(self):
+    for fd in self.files.values():
+      os.close(fd)
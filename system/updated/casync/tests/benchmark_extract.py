@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import os
+import random
+import tempfile
+import time
+
+from openpilot.common.benchmark import benchmark_parser
+from openpilot.system.updated.casync import casync
+from openpilot.system.updated.casync.tests.test_casync import SlowChunkReader, write_caibx
+
+
+def main():
+  parser = benchmark_parser("Benchmark casync extract against a local directory store with simulated request latency")
+  parser.add_argument("--size", type=int, default=64, help="image size in MB")
+  parser.add_argument("--chunk-size", type=int, default=64, help="chunk size in kB")
+  parser.add_argument("--latency", type=float, default=0.02, help="simulated round-trip time per chunk in seconds")
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 32])
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    # half random, half zeroes to have some compressible and repeated chunks
+    contents = random.Random(0).randbytes(args.size * 1024 * 1024 // 2) + bytes(args.size * 1024 * 1024 // 2)
+    store_path = os.path.join(tmp, "store")
+    caibx_path = os.path.join(tmp, "image.caibx")
+    write_caibx(caibx_path, contents, args.chunk_size * 1024, store_path)
+    target = casync.parse_caibx(caibx_path)
+
+    for workers in args.workers:
+      out_path = os.path.join(tmp, f"out_{workers}")
+      reader = SlowChunkReader(casync.RemoteChunkReader(store_path), args.latency)
+      source_stats: dict[str, casync.SourceStats] = {}
+
+      t = time.monotonic()
+      stats = casync.extract(target, [('remote', reader, casync.build_chunk_dict(target))], out_path, workers=workers, source_stats=source_stats)
+      dt = time.monotonic() - t
+
+      print(f"{workers} workers: {dt:.2f} s, {len(contents) / dt / 1024 / 1024:.1f} MB/s, {reader.max_active} reads in flight")
+      casync.print_stats(stats, source_stats)
+      os.unlink(out_path)
+
+
+if __name__ == "__main__":
+  main()
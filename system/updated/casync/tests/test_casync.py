@@ -1,8 +1,15 @@
 import pytest
+import lzma
 import os
 import pathlib
+import random
+import struct
 import tempfile
 import subprocess
+import threading
+import time
+
+from Crypto.Hash import SHA512
 
 from openpilot.system.updated.casync import casync
 from openpilot.system.updated.casync import tar
@@ -116,12 +123,13 @@ class TestCasync:
     sources = [('target', casync.FileChunkReader(self.target_fn), casync.build_chunk_dict(target))]
     sources += [('remote', casync.RemoteChunkReader(self.store_fn), casync.build_chunk_dict(target))]
 
-    stats = casync.extract(target, sources, self.target_fn)
+    source_stats: dict[str, casync.SourceStats] = {}
+    casync.extract(target, sources, self.target_fn, source_stats=source_stats)
 
     with open(self.target_fn, 'rb') as f:
       assert f.read() == self.contents
 
-    assert stats['remote'] < len(self.contents)
+    assert source_stats['remote'].bytes < len(self.contents)
 
   @pytest.mark.skipif(not LOOPBACK, reason="requires loopback device")
   def test_lo_simple_extract(self):
@@ -143,12 +151,13 @@ class TestCasync:
     sources = [('target', casync.FileChunkReader(self.target_lo), casync.build_chunk_dict(target))]
     sources += [('remote', casync.RemoteChunkReader(self.store_fn), casync.build_chunk_dict(target))]
 
-    stats = casync.extract(target, sources, self.target_lo)
+    source_stats: dict[str, casync.SourceStats] = {}
+    casync.extract(target, sources, self.target_lo, source_stats=source_stats)
 
     with open(self.target_lo, 'rb') as f:
       assert f.read(len(self.contents)) == self.contents
 
-    assert stats['remote'] < len(self.contents)
+    assert source_stats['remote'].bytes < len(self.contents)
 
 
 @pytest.mark.skip("not used yet")
@@ -262,3 +271,111 @@ class TestCasyncDirectory:
     assert stats['remote'] > 0
     assert stats['cache'] > 0
     assert stats['cache'] > stats['remote']
+
+
+def write_caibx(caibx_path: str, contents: bytes, chunk_size: int, store_path: str | None = None) -> list[casync.Chunk]:
+  """Writes a caibx with fixed size chunks, and optionally a directory store with the xz compressed chunks"""
+  chunks = []
+  for offset in range(0, len(contents), chunk_size):
+    bts = contents[offset:offset + chunk_size]
+    chunks.append(casync.Chunk(SHA512.new(bts, truncate="256").digest(), offset, len(bts)))
+
+    if store_path is not None:
+      sha_hex = chunks[-1].sha.hex()
+      os.makedirs(os.path.join(store_path, sha_hex[:4]), exist_ok=True)
+      with open(os.path.join(store_path, sha_hex[:4], sha_hex + ".cacnk"), "wb") as f:
+        f.write(lzma.compress(bts))
+
+  with open(caibx_path, "wb") as f:
+    f.write(struct.pack("<QQQQQQ", casync.CA_HEADER_LEN, casync.CA_FORMAT_INDEX, casync.FLAGS, chunk_size, chunk_size, chunk_size))
+    f.write(struct.pack("<QQ", 2**64 - 1, casync.CA_FORMAT_TABLE))
+    for c in chunks:
+      f.write(struct.pack("<Q32s", c.offset + c.length, c.sha))
+    f.write(struct.pack("<QQQQQ", 0, 0, casync.CA_HEADER_LEN, casync.CA_TABLE_HEADER_LEN + casync.CA_TABLE_ENTRY_LEN * (len(chunks) + 1),
+                        casync.CA_FORMAT_TABLE_TAIL_MARKER))
+  return chunks
+
+
+class SlowChunkReader(casync.ChunkReader):
+  """Wraps a reader with a fixed latency, recording how many reads overlap"""
+  def __init__(self, reader: casync.ChunkReader, latency: float):
+    self.reader = reader
+    self.latency = latency
+    self.lock = threading.Lock()
+    self.active = 0
+    self.max_active = 0
+
+  def read(self, chunk: casync.Chunk) -> bytes:
+    with self.lock:
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    time.sleep(self.latency)
+    with self.lock:
+      self.active -= 1
+    return self.reader.read(chunk)
+
+
+class TestExtract:
+  CHUNK_SIZE = 4096
+
+  @pytest.fixture(autouse=True)
+  def setup(self, tmp_path):
+    rng = random.Random(0)
+    blocks = [rng.randbytes(self.CHUNK_SIZE) for _ in range(32)]
+    # repeated chunks and a short last chunk
+    self.contents = b"".join(blocks + blocks[:8] + [blocks[3][:100]])
+
+    self.tmp_path = tmp_path
+    self.store_path = str(tmp_path / "store")
+    self.caibx_path = str(tmp_path / "target.caibx")
+    self.target_path = str(tmp_path / "target")
+    write_caibx(self.caibx_path, self.contents, self.CHUNK_SIZE, self.store_path)
+    self.target = casync.parse_caibx(self.caibx_path)
+
+  @pytest.mark.parametrize("workers", [1, 8])
+  def test_directory_store(self, workers):
+    source_stats: dict[str, casync.SourceStats] = {}
+    sources = [('remote', casync.RemoteChunkReader(self.store_path), casync.build_chunk_dict(self.target))]
+    stats = casync.extract(self.target, sources, self.target_path, workers=workers, source_stats=source_stats)
+
+    with open(self.target_path, 'rb') as f:
+      assert f.read() == self.contents
+    assert stats['remote'] == len(self.contents)
+
+    # each distinct chunk is only fetched once
+    assert source_stats['remote'].chunks == len({c.sha for c in self.target})
+    assert source_stats['remote'].failures == 0
+
+  def test_seed(self):
+    seed_path = str(self.tmp_path / "seed")
+    with open(seed_path, 'wb') as f:
+      f.write(self.contents[:len(self.contents) // 2])
+      f.write(b"\0" * (len(self.contents) // 2))
+
+    source_stats: dict[str, casync.SourceStats] = {}
+    sources = [('seed', casync.FileChunkReader(seed_path), casync.build_chunk_dict(self.target))]
+    sources += [('remote', casync.RemoteChunkReader(self.store_path), casync.build_chunk_dict(self.target))]
+    stats = casync.extract(self.target, sources, self.target_path, source_stats=source_stats)
+
+    with open(self.target_path, 'rb') as f:
+      assert f.read() == self.contents
+    assert stats['seed'] > 0
+    assert stats['remote'] > 0
+    assert stats['seed'] + stats['remote'] == len(self.contents)
+    assert source_stats['seed'].failures == source_stats['remote'].chunks
+
+  def test_missing_chunk(self):
+    chunks = casync.build_chunk_dict(self.target)
+    chunks.pop(self.target[5].sha)
+    sources = [('remote', casync.RemoteChunkReader(self.store_path), chunks)]
+    with pytest.raises(RuntimeError):
+      casync.extract(self.target, sources, self.target_path)
+
+  def test_concurrent_reads(self):
+    reader = SlowChunkReader(casync.RemoteChunkReader(self.store_path), 0.01)
+    sources = [('remote', reader, casync.build_chunk_dict(self.target))]
+    casync.extract(self.target, sources, self.target_path, workers=8)
+
+    with open(self.target_path, 'rb') as f:
+      assert f.read() == self.contents
+    assert reader.max_active > 1
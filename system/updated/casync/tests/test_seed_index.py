@@ -0,0 +1,139 @@
+import logging
+import random
+
+import pytest
+
+from openpilot.system.hardware.tici import agnos
+from openpilot.system.updated.casync import casync
+from openpilot.system.updated.casync.seed_index import SeedIndex, SeedIndexReader
+from openpilot.system.updated.casync.tests.test_casync import write_caibx
+
+CHUNK_SIZE = 4096
+
+
+class TestSeedIndex:
+  @pytest.fixture(autouse=True)
+  def setup(self, tmp_path):
+    rng = random.Random(0)
+    self.blocks = [rng.randbytes(CHUNK_SIZE) for _ in range(64)]
+    self.tmp_path = tmp_path
+    self.index_path = str(tmp_path / "index")
+
+  def make_file(self, name: str, blocks: list[bytes]) -> tuple[str, list[casync.Chunk]]:
+    path = str(self.tmp_path / name)
+    contents = b"".join(blocks)
+    with open(path, "wb") as f:
+      f.write(contents)
+    return path, write_caibx(str(self.tmp_path / f"{name}.caibx"), contents, CHUNK_SIZE)
+
+  def test_persistent(self):
+    path, chunks = self.make_file("system_a", self.blocks[:32])
+    index = SeedIndex(self.index_path)
+    assert index.update(path, "v1", lambda: chunks)
+
+    # a new instance reads the index from disk, and doesn't need the caibx again
+    index = SeedIndex(self.index_path)
+    assert not index.update(path, "v1", lambda: pytest.fail("index rebuilt"))
+    assert index.names() == [path]
+    assert len(index) == 32
+
+    reader = SeedIndexReader()
+    chunk_dict = index.chunk_dict()
+    for block in self.blocks[:32]:
+      c = next(c for c in chunks if c.offset == self.blocks.index(block) * CHUNK_SIZE)
+      assert reader.read(chunk_dict[c.sha]) == block
+
+  def test_incremental(self):
+    path_a, chunks_a = self.make_file("system_a", self.blocks[:32])
+    path_b, chunks_b = self.make_file("system_b", self.blocks[32:])
+    index = SeedIndex(self.index_path)
+    index.update(path_a, "v1", lambda: chunks_a)
+    index.update(path_b, "v1", lambda: chunks_b)
+    assert len(index) == 64
+
+    # a new version or a modified file rebuilds only that entry
+    assert index.update(path_a, "v2", lambda: chunks_a)
+    path_b, chunks_b = self.make_file("system_b", self.blocks[32:40])
+    assert index.update(path_b, "v1", lambda: chunks_b)
+    assert len(index) == 40
+
+    index.remove(path_a)
+    assert index.names() == [path_b]
+    assert len(index) == 8
+
+  def test_extract_local_first(self):
+    # the new version shares most chunks with the installed one
+    path, chunks = self.make_file("system_a", self.blocks[:48])
+    index = SeedIndex(self.index_path)
+    index.update(path, "v1", lambda: chunks)
+
+    new_contents = b"".join(self.blocks[8:56])
+    store_path = str(self.tmp_path / "store")
+    target = write_caibx(str(self.tmp_path / "target.caibx"), new_contents, CHUNK_SIZE, store_path)
+    target_path = str(self.tmp_path / "system_b")
+
+    source_stats: dict[str, casync.SourceStats] = {}
+    sources = [('seed', SeedIndexReader(), index.chunk_dict())]
+    sources += [('remote', casync.RemoteChunkReader(store_path), casync.build_chunk_dict(target))]
+    stats = casync.extract(target, sources, target_path, source_stats=source_stats)
+
+    with open(target_path, "rb") as f:
+      assert f.read() == new_contents
+    assert stats['seed'] == 40 * CHUNK_SIZE
+    assert stats['remote'] == 8 * CHUNK_SIZE
+    assert source_stats['seed'].failures == 0
+    assert source_stats['remote'].chunks == 8
+
+  def test_stale_entry(self):
+    path, chunks = self.make_file("system_a", self.blocks[:8])
+    index = SeedIndex(self.index_path)
+    index.update(path, "v1", lambda: chunks)
+
+    # overwritten in place without updating the index, e.g. a block device
+    with open(path, "r+b") as f:
+      f.write(bytes(CHUNK_SIZE))
+
+    store_path = str(self.tmp_path / "store")
+    contents = b"".join(self.blocks[:8])
+    target = write_caibx(str(self.tmp_path / "target.caibx"), contents, CHUNK_SIZE, store_path)
+    target_path = str(self.tmp_path / "system_b")
+
+    sources = [('seed', SeedIndexReader(), index.chunk_dict())]
+    sources += [('remote', casync.RemoteChunkReader(store_path), casync.build_chunk_dict(target))]
+    stats = casync.extract(target, sources, target_path)
+
+    with open(target_path, "rb") as f:
+      assert f.read() == contents
+    assert stats['remote'] == CHUNK_SIZE
+
+  @pytest.mark.parametrize("failure", ["open", "read"])
+  def test_agnos_seed_without_index(self, monkeypatch, failure):
+    # a broken index must not force a full download, the current slot still seeds the update
+    contents = b"".join(self.blocks[:16])
+    seed_path = str(self.tmp_path / "system_a")
+    with open(seed_path, "wb") as f:
+      f.write(contents)
+    raw_hash = agnos.get_raw_hash(seed_path, len(contents))
+    write_caibx(str(self.tmp_path / f"system-{raw_hash}.caibx"), contents, CHUNK_SIZE)
+
+    # nothing in the remote store, every chunk has to come from the seed
+    store_path = str(self.tmp_path / "store")
+    write_caibx(str(self.tmp_path / "target.caibx"), contents, CHUNK_SIZE)
+    target_path = str(self.tmp_path / "system_b")
+    with open(target_path, "wb") as f:
+      f.write(bytes(len(contents)))
+
+    monkeypatch.setattr(agnos, "CAIBX_URL", str(self.tmp_path) + "/")
+    monkeypatch.setattr(agnos, "get_partition_path", lambda slot, partition: target_path)
+    if failure == "open":
+      open(self.index_path, "wb").close()
+    else:
+      def chunk_dict(self):
+        raise OSError("corrupt index")
+      monkeypatch.setattr(SeedIndex, "chunk_dict", chunk_dict)
+    monkeypatch.setattr(agnos, "SEED_INDEX_PATH", self.index_path)
+
+    partition = {'name': "system", 'size': len(contents), 'hash_raw': raw_hash, 'full_check': True,
+                 'casync_caibx': str(self.tmp_path / "target.caibx"), 'casync_store': store_path}
+    agnos.extract_casync_image(1, partition, logging.getLogger("agnos"))
+    assert agnos.verify_partition(1, partition)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from cereal import messaging
+from openpilot.common.benchmark import benchmark_parser, print_times
+from openpilot.system.webrtc.webrtcd import CerealOutgoingMessageProxy, OutgoingServiceOptions
+
+IDX_N = 33
+
+
+class NullChannel:
+  def send(self, dat: bytes):
+    pass
+
+
+def model_v2() -> bytes:
+  msg = messaging.new_message('modelV2')
+  m = msg.modelV2
+  for f in ('position', 'velocity', 'acceleration', 'orientation', 'orientationRate'):
+    xyzt = getattr(m, f)
+    xyzt.x = xyzt.y = xyzt.z = xyzt.t = np.linspace(0., 100., IDX_N).tolist()
+    xyzt.xStd = xyzt.yStd = xyzt.zStd = np.ones(IDX_N).tolist()
+  m.init('laneLines', 4)
+  m.init('roadEdges', 2)
+  for line in (*m.laneLines, *m.roadEdges):
+    line.x = line.y = line.z = line.t = np.linspace(0., 100., IDX_N).tolist()
+  m.laneLineProbs = m.laneLineStds = [0.5] * 4
+  m.roadEdgeStds = [0.5] * 2
+  m.init('leadsV3', 3)
+  for lead in m.leadsV3:
+    lead.t = lead.x = lead.y = lead.v = lead.a = [0.] * 6
+    lead.xStd = lead.yStd = lead.vStd = lead.aStd = [1.] * 6
+  return msg.to_bytes()
+
+
+def car_state() -> bytes:
+  msg = messaging.new_message('carState')
+  msg.carState.vEgo = 20.
+  return msg.to_bytes()
+
+
+def benchmark_encoding(dat: bytes, name: str, n: int) -> None:
+  print(f"{name}, {len(dat)} bytes")
+  configs = {
+    "json": OutgoingServiceOptions(),
+    "json, 3 fields": OutgoingServiceOptions(fields=["frameId", "position", "leadsV3"]) if name == "modelV2" else
+                      OutgoingServiceOptions(fields=["vEgo", "aEgo", "gearShifter"]),
+    "capnp": OutgoingServiceOptions(encoding="capnp"),
+    "capnp_packed": OutgoingServiceOptions(encoding="capnp_packed"),
+  }
+  for config, options in configs.items():
+    proxy = CerealOutgoingMessageProxy([])
+    proxy.add_channel(NullChannel(), {name: options})
+    size = len(proxy.encode(dat, 0.)[0][1])
+
+    t = time.perf_counter()
+    for _ in range(n):
+      proxy.encode(dat, 0.)
+    dt = (time.perf_counter() - t) / n
+    print(f"  {config:>14}: {dt * 1e6:7.0f} us per message, {size} bytes")
+
+
+async def measure_loop_lag(dat: bytes, rate: float, duration: float, off_loop: bool) -> list[float]:
+  proxy = CerealOutgoingMessageProxy([])
+  proxy.add_channel(NullChannel())
+  loop = asyncio.get_running_loop()
+  executor = ThreadPoolExecutor(max_workers=1)
+
+  async def forward():
+    while True:
+      if off_loop:
+        outgoing = await loop.run_in_executor(executor, proxy.encode, dat, 0.)
+      else:
+        outgoing = proxy.encode(dat, 0.)
+      proxy.send(outgoing)
+      await asyncio.sleep(1. / rate)
+
+  # what a video or audio track does, wake up every 10ms
+  lags = []
+  task = asyncio.create_task(forward())
+  end = time.monotonic() + duration
+  while time.monotonic() < end:
+    t = time.monotonic()
+    await asyncio.sleep(0.01)
+    lags.append(time.monotonic() - t - 0.01)
+  task.cancel()
+  executor.shutdown()
+  return lags
+
+
+def main():
+  parser = benchmark_parser("Benchmark the webrtcd outgoing message proxy with fake messages")
+  parser.add_argument("-n", type=int, default=200, help="messages per encoding")
+  parser.add_argument("--duration", type=float, default=3., help="seconds per event loop lag measurement")
+  args = parser.parse_args()
+
+  model_dat = model_v2()
+  benchmark_encoding(model_dat, "modelV2", args.n)
+  benchmark_encoding(car_state(), "carState", args.n)
+
+  print("event loop lag, modelV2 at 20Hz as json")
+  for off_loop in (False, True):
+    lags = asyncio.run(measure_loop_lag(model_dat, 20., args.duration, off_loop))
+    print_times(f"  {'off loop' if off_loop else 'on loop':>8}", lags)
+
+
+if __name__ == "__main__":
+  main()
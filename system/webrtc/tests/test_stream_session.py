@@ -12,7 +12,7 @@ import capnp
 import pyaudio
 from cereal import messaging, log
 
-from openpilot.system.webrtc.webrtcd import CerealOutgoingMessageProxy, CerealIncomingMessageProxy
+from openpilot.system.webrtc.webrtcd import CerealOutgoingMessageProxy, CerealIncomingMessageProxy, OutgoingServiceOptions
 from openpilot.system.webrtc.device.video import LiveStreamVideoStreamTrack
 from openpilot.system.webrtc.device.audio import AudioInputStreamTrack
 
@@ -34,18 +34,49 @@ class TestStreamSession:
     expected_json = json.dumps(expected_dict).encode()
 
     channel = mocker.Mock(spec=RTCDataChannel)
-    mocked_submaster = messaging.SubMaster(["customReservedRawData0"])
-    def mocked_update(t):
-      mocked_submaster.update_msgs(0, [test_msg])
-
-    mocker.patch.object(messaging.SubMaster, "update", side_effect=mocked_update)
-    proxy = CerealOutgoingMessageProxy(mocked_submaster)
+    proxy = CerealOutgoingMessageProxy(["customReservedRawData0"])
+    mocker.patch.object(proxy.poller, "poll", return_value=proxy.socks)
+    mocker.patch.object(messaging, "drain_sock_raw", return_value=[test_msg.to_bytes()])
     proxy.add_channel(channel)
 
     proxy.update()
 
     channel.send.assert_called_once_with(expected_json)
 
+  def test_outgoing_proxy_options(self, mocker):
+    msg = messaging.new_message("carState")
+    msg.carState.vEgo = 10.
+    msg.carState.gearShifter = "drive"
+    msg.carState.cruiseState.speed = 20.
+    dat = msg.to_bytes()
+
+    proxy = CerealOutgoingMessageProxy([])
+    channels = [mocker.Mock(spec=RTCDataChannel) for _ in range(5)]
+    proxy.add_channel(channels[0])
+    proxy.add_channel(channels[1], {"carState": OutgoingServiceOptions(encoding="capnp")})
+    proxy.add_channel(channels[2], {"carState": OutgoingServiceOptions(encoding="capnp_packed", fields=["vEgo", "cruiseState"])})
+    proxy.add_channel(channels[3], {"carState": OutgoingServiceOptions(fields=["vEgo", "gearShifter"], max_rate=10)})
+    proxy.add_channel(channels[4], {"carState": OutgoingServiceOptions(fields=["vEgo", "gearShifter"])})
+
+    for t in (0., 0.05, 0.1):
+      proxy.send(proxy.encode(dat, t))
+
+    assert json.loads(channels[0].send.call_args.args[0])["data"]["cruiseState"]["speed"] == 20.
+    assert channels[1].send.call_args.args[0] == dat
+
+    projected = log.Event.from_bytes_packed(channels[2].send.call_args.args[0])
+    assert projected.logMonoTime == msg.logMonoTime
+    assert projected.carState.vEgo == 10.
+    assert projected.carState.cruiseState.speed == 20.
+    assert projected.carState.gearShifter == "unknown"
+
+    assert channels[3].send.call_count == 2
+    projected_json = json.loads(channels[3].send.call_args.args[0])
+    assert projected_json["data"] == {"vEgo": 10., "gearShifter": "drive"}
+    # same encoding, encoded once
+    assert channels[3].send.call_args.args[0] is channels[4].send.call_args.args[0]
+    assert channels[4].send.call_count == 3
+
   def test_incoming_proxy(self, mocker):
     tested_msgs = [
       {"type": "customReservedRawData0", "data": "test"}, # primitive
@@ -3,8 +3,10 @@
 import argparse
 import asyncio
 import json
+import time
 import uuid
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import Any, TYPE_CHECKING
 
@@ -22,13 +24,47 @@ from openpilot.system.webrtc.schema import generate_field
 from cereal import messaging, log
 
 
+@dataclass
+class OutgoingServiceOptions:
+  """
+  How a data channel receives a service.
+
+  encoding is "json" (default), "capnp" to forward the serialized Event as is, or
+  "capnp_packed" for the packed capnp encoding of it, which is smaller for mostly
+  empty messages. max_rate limits the messages per second, and fields only sends
+  those fields of the service's struct.
+  """
+  encoding: str = "json"
+  max_rate: float | None = None
+  fields: list[str] | None = None
+
+  def __post_init__(self):
+    assert self.encoding in ("json", "capnp", "capnp_packed"), f"Invalid encoding {self.encoding}"
+    assert self.max_rate is None or self.max_rate > 0, "Invalid max_rate"
+
+
+DEFAULT_OUTGOING_OPTIONS = OutgoingServiceOptions()
+
+
 class CerealOutgoingMessageProxy:
-  def __init__(self, sm: messaging.SubMaster):
-    self.sm = sm
-    self.channels: list[RTCDataChannel] = []
+  """
+  Forwards messages of services to data channels.
+
+  poll() receives and encodes messages and is meant to run off the event loop,
+  send() sends what it returns. Every channel has its own OutgoingServiceOptions per service,
+  each encoding is done once per message for all the channels that use it.
+  """
+
+  def __init__(self, services: list[str]):
+    self.services = services
+    self.poller = messaging.Poller()
+    self.socks = [messaging.sub_sock(s, poller=self.poller) for s in services]
+    # replaced instead of changed, poll() iterates over it in another thread
+    self.channels: list[tuple[RTCDataChannel, dict[str, OutgoingServiceOptions]]] = []
+    self.last_sent: dict[tuple[int, str], float] = {}
 
-  def add_channel(self, channel: 'RTCDataChannel'):
-    self.channels.append(channel)
+  def add_channel(self, channel: 'RTCDataChannel', options: dict[str, OutgoingServiceOptions] | None = None):
+    self.channels = [*self.channels, (channel, options or {})]
 
   def to_json(self, msg_content: Any):
     if isinstance(msg_content, capnp._DynamicStructReader):
@@ -37,23 +73,69 @@ class CerealOutgoingMessageProxy:
       msg_dict = [self.to_json(msg) for msg in msg_content]
     elif isinstance(msg_content, bytes):
       msg_dict = msg_content.decode()
+    elif isinstance(msg_content, capnp.lib.capnp._DynamicEnum):
+      msg_dict = str(msg_content)
     else:
       msg_dict = msg_content
 
     return msg_dict
 
+  def _encode(self, dat: bytes, msg: capnp._DynamicStructReader, service: str, options: OutgoingServiceOptions) -> bytes:
+    msg_content = getattr(msg, service)
+    fields = options.fields
+
+    if options.encoding != "json":
+      if fields is None and options.encoding == "capnp":
+        return dat
+      builder = msg.as_builder()
+      if fields is not None:
+        builder = log.Event.new_message(logMonoTime=msg.logMonoTime, valid=msg.valid)
+        projected = builder.init(service)
+        for f in fields:
+          setattr(projected, f, getattr(msg_content, f))
+      return builder.to_bytes() if options.encoding == "capnp" else builder.to_bytes_packed()
+
+    if fields is None:
+      msg_dict = self.to_json(msg_content)
+    else:
+      msg_dict = {f: self.to_json(getattr(msg_content, f)) for f in fields}
+    outgoing_msg = {"type": service, "logMonoTime": msg.logMonoTime, "valid": msg.valid, "data": msg_dict}
+    return json.dumps(outgoing_msg).encode()
+
+  def encode(self, dat: bytes, cur_time: float) -> list[tuple['RTCDataChannel', bytes]]:
+    msg = messaging.log_from_bytes(dat)
+    service = msg.which()
+
+    outgoing = []
+    encoded: dict[tuple[str, tuple[str, ...] | None], bytes] = {}
+    for channel, channel_options in self.channels:
+      options = channel_options.get(service, DEFAULT_OUTGOING_OPTIONS)
+      if options.max_rate is not None:
+        key = (id(channel), service)
+        if cur_time - self.last_sent.get(key, -float('inf')) < 1. / options.max_rate:
+          continue
+        self.last_sent[key] = cur_time
+
+      encoding_key = (options.encoding, None if options.fields is None else tuple(options.fields))
+      if encoding_key not in encoded:
+        encoded[encoding_key] = self._encode(dat, msg, service, options)
+      outgoing.append((channel, encoded[encoding_key]))
+    return outgoing
+
+  def poll(self, timeout: int = 0) -> list[tuple['RTCDataChannel', bytes]]:
+    """Waits up to timeout ms for messages, and returns them encoded for each channel"""
+    outgoing = []
+    for sock in self.poller.poll(timeout):
+      for dat in messaging.drain_sock_raw(sock):
+        outgoing.extend(self.encode(dat, time.monotonic()))
+    return outgoing
+
+  def send(self, outgoing: list[tuple['RTCDataChannel', bytes]]):
+    for channel, dat in outgoing:
+      channel.send(dat)
+
   def update(self):
-    # this is blocking in async context...
-    self.sm.update(0)
-    for service, updated in self.sm.updated.items():
-      if not updated:
-        continue
-      msg_dict = self.to_json(self.sm[service])
-      mono_time, valid = self.sm.logMonoTime[service], self.sm.valid[service]
-      outgoing_msg = {"type": service, "logMonoTime": mono_time, "valid": valid, "data": msg_dict}
-      encoded_msg = json.dumps(outgoing_msg).encode()
-      for channel in self.channels:
-        channel.send(encoded_msg)
+    self.send(self.poll(0))
 
 
 class CerealIncomingMessageProxy:
@@ -92,15 +174,22 @@ class CerealProxyRunner:
   async def run(self):
     from aiortc.exceptions import InvalidStateError
 
-    while True:
-      try:
-        self.proxy.update()
-      except InvalidStateError:
-        self.logger.warning("Cereal outgoing proxy invalid state (connection closed)")
-        break
-      except Exception:
-        self.logger.exception("Cereal outgoing proxy failure")
-      await asyncio.sleep(0.01)
+    # receiving and encoding happen on a thread, so big messages don't stall the event loop
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webrtcd_proxy")
+    try:
+      while True:
+        try:
+          outgoing = await loop.run_in_executor(executor, self.proxy.poll, 100)
+          self.proxy.send(outgoing)
+        except InvalidStateError:
+          self.logger.warning("Cereal outgoing proxy invalid state (connection closed)")
+          break
+        except Exception:
+          self.logger.exception("Cereal outgoing proxy failure")
+          await asyncio.sleep(0.01)
+    finally:
+      executor.shutdown(wait=False)
 
 
 class DynamicPubMaster(messaging.PubMaster):
@@ -118,7 +207,8 @@ class DynamicPubMaster(messaging.PubMaster):
 class StreamSession:
   shared_pub_master = DynamicPubMaster([])
 
-  def __init__(self, sdp: str, cameras: list[str], incoming_services: list[str], outgoing_services: list[str], debug_mode: bool = False):
+  def __init__(self, sdp: str, cameras: list[str], incoming_services: list[str], outgoing_services: list[str], debug_mode: bool = False,
+               outgoing_options: dict[str, OutgoingServiceOptions] | None = None):
     from aiortc.mediastreams import VideoStreamTrack, AudioStreamTrack
     from aiortc.contrib.media import MediaBlackhole
     from openpilot.system.webrtc.device.video import LiveStreamVideoStreamTrack
@@ -145,10 +235,11 @@ class StreamSession:
     self.incoming_bridge_services = incoming_services
     self.outgoing_bridge: CerealOutgoingMessageProxy | None = None
     self.outgoing_bridge_runner: CerealProxyRunner | None = None
+    self.outgoing_options = outgoing_options or {}
     if len(incoming_services) > 0:
       self.incoming_bridge = CerealIncomingMessageProxy(self.shared_pub_master)
     if len(outgoing_services) > 0:
-      self.outgoing_bridge = CerealOutgoingMessageProxy(messaging.SubMaster(outgoing_services))
+      self.outgoing_bridge = CerealOutgoingMessageProxy(outgoing_services)
       self.outgoing_bridge_runner = CerealProxyRunner(self.outgoing_bridge)
 
     self.audio_output: AudioOutputSpeaker | MediaBlackhole | None = None
@@ -186,7 +277,7 @@ class StreamSession:
           self.stream.set_message_handler(self.message_handler)
         if self.outgoing_bridge_runner is not None:
           channel = self.stream.get_messaging_channel()
-          self.outgoing_bridge_runner.proxy.add_channel(channel)
+          self.outgoing_bridge_runner.proxy.add_channel(channel, self.outgoing_options)
           self.outgoing_bridge_runner.start()
       if self.stream.has_incoming_audio_track():
         track = self.stream.get_incoming_audio_track(buffered=False)
@@ -216,6 +307,8 @@ class StreamRequestBody:
   cameras: list[str]
   bridge_services_in: list[str] = field(default_factory=list)
   bridge_services_out: list[str] = field(default_factory=list)
+  # per outgoing service, the fields of OutgoingServiceOptions
+  bridge_services_out_options: dict[str, dict[str, Any]] = field(default_factory=dict)
 
 
 async def get_stream(request: 'web.Request'):
@@ -223,7 +316,11 @@ async def get_stream(request: 'web.Request'):
   raw_body = await request.json()
   body = StreamRequestBody(**raw_body)
 
-  session = StreamSession(body.sdp, body.cameras, body.bridge_services_in, body.bridge_services_out, debug_mode)
+  outgoing_options = {s: OutgoingServiceOptions(**o) for s, o in body.bridge_services_out_options.items()}
+  for s, o in outgoing_options.items():
+    assert s in body.bridge_services_out, "Options for a service that isn't bridged"
+    assert o.fields is None or all(f in log.Event.schema.fields[s].schema.fields for f in o.fields), "Invalid field name"
+  session = StreamSession(body.sdp, body.cameras, body.bridge_services_in, body.bridge_services_out, debug_mode, outgoing_options)
   answer = await session.get_answer()
   session.start()
 
@@ -13,6 +13,8 @@ import cereal.messaging as messaging
 from msgq.visionipc import VisionIpcServer, VisionStreamType
 
 V4L2_BUF_FLAG_KEYFRAME = 8
+STATS_INTERVAL = 5.  # seconds between the debug latency summaries
+STAGES = ("network", "decode", "convert", "publish")
 
 # start encoderd
 # also start cereal messaging bridge
@@ -24,7 +26,54 @@ ENCODE_SOCKETS = {
   VisionStreamType.VISION_STREAM_WIDE_ROAD: "wideRoadEncodeData",
 }
 
-def decoder(addr, vipc_server, vst, nvidia, W, H, debug=False):
+class CpuDecoder:
+  """ffmpeg HEVC decoder with frame and slice threading, converting into one reused NV12 buffer"""
+  def __init__(self, W, H, threads=0, thread_type="SLICE"):
+    self.W, self.H = W, H
+    self.codec = av.CodecContext.create("hevc", "r")
+    # frame threading (FRAME, AUTO) delays the output by threads - 1 frames, only slice threading is latency free
+    self.codec.thread_count = threads
+    self.codec.thread_type = thread_type
+
+    self.nv12 = np.empty(H*W*3//2, dtype=np.uint8)
+    self.y = self.nv12[:H*W].reshape(H, W)
+    self.uv = self.nv12[H*W:].reshape(H//2, W//2, 2)
+
+  def decode(self, dat):
+    """Frames finished by this packet, all of the buffered ones when dat is None"""
+    return self.codec.decode(av.packet.Packet(dat) if dat is not None else None)
+
+  def to_nv12(self, frame):
+    # the yuv420p planes are copied straight into place, the returned buffer is overwritten by the next frame
+    y, u, v = (np.frombuffer(p, dtype=np.uint8).reshape(-1, p.line_size) for p in frame.planes)
+    self.y[:] = y[:self.H, :self.W]
+    self.uv[..., 0] = u[:self.H//2, :self.W//2]
+    self.uv[..., 1] = v[:self.H//2, :self.W//2]
+    return self.nv12
+
+
+class DecoderStats:
+  """Per stage latency histograms of a decoder, printed and reset every STATS_INTERVAL"""
+  def __init__(self, name):
+    self.name = name
+    self.latency = {stage: messaging.LatencyHistogram() for stage in STAGES}
+    self.reset()
+
+  def reset(self):
+    for h in self.latency.values():
+      h.reset()
+    self.frames = 0
+    self.dropped_packets = 0
+    self.start_time = time.monotonic()
+
+  def print_and_reset(self):
+    dt = time.monotonic() - self.start_time
+    stages = ", ".join(f"{stage} {h.percentile(50)*1e3:.1f}/{h.percentile(99)*1e3:.1f}" for stage, h in self.latency.items())
+    print(f"{self.name}: {self.frames / dt:.1f} fps, {self.dropped_packets} dropped packets, p50/p99 ms: {stages}")
+    self.reset()
+
+
+def decoder(addr, vipc_server, vst, nvidia, W, H, debug=False, threads=0, thread_type="SLICE"):
   sock_name = ENCODE_SOCKETS[vst]
   if debug:
     print(f"start decoder for {sock_name}, {W}x{H}")
@@ -40,11 +89,12 @@ def decoder(addr, vipc_server, vst, nvidia, W, H, debug=False):
     nvDwn_yuv = nvc.PySurfaceDownloader(W, H, nvc.PixelFormat.YUV420, 0)
     img_yuv = np.ndarray((H*W//2*3), dtype=np.uint8)
   else:
-    codec = av.CodecContext.create("hevc", "r")
+    cpu_decoder = CpuDecoder(W, H, threads, thread_type)
 
   os.environ["ZMQ"] = "1"
   messaging.reset_context()
   sock = messaging.sub_sock(sock_name, None, addr=addr, conflate=False)
+  stats = DecoderStats(sock_name)
   cnt = 0
   last_idx = -1
   seen_iframe = False
@@ -54,60 +104,56 @@ def decoder(addr, vipc_server, vst, nvidia, W, H, debug=False):
     msgs = messaging.drain_sock(sock, wait_for_one=True)
     for evt in msgs:
       evta = getattr(evt, evt.which())
-      if debug and evta.idx.encodeId != 0 and evta.idx.encodeId != (last_idx+1):
-        print("DROP PACKET!")
+      if evta.idx.encodeId != 0 and evta.idx.encodeId != (last_idx+1):
+        stats.dropped_packets += 1
       last_idx = evta.idx.encodeId
       if not seen_iframe and not (evta.idx.flags & V4L2_BUF_FLAG_KEYFRAME):
-        if debug:
-          print("waiting for iframe")
         continue
       time_q.append(time.monotonic())
-      network_latency = (int(time.time()*1e9) - evta.unixTimestampNanos)/1e6  # noqa: TID251
-      frame_latency = ((evta.idx.timestampEof/1e9) - (evta.idx.timestampSof/1e9))*1000
-      process_latency = ((evt.logMonoTime/1e9) - (evta.idx.timestampEof/1e9))*1000
+      stats.latency["network"].add((int(time.time()*1e9) - evta.unixTimestampNanos)/1e9)  # noqa: TID251
 
       # put in header (first)
+      t = time.monotonic()
       if not seen_iframe:
         if nvidia:
           nvDec.DecodeSurfaceFromPacket(np.frombuffer(evta.header, dtype=np.uint8))
         else:
-          codec.decode(av.packet.Packet(evta.header))
+          cpu_decoder.decode(evta.header)
         seen_iframe = True
 
       if nvidia:
         rawSurface = nvDec.DecodeSurfaceFromPacket(np.frombuffer(evta.data, dtype=np.uint8))
         if rawSurface.Empty():
-          if debug:
-            print("DROP SURFACE")
           continue
+        t_decode = time.monotonic()
         convSurface = conv_yuv.Execute(rawSurface, cc1)
         nvDwn_yuv.DownloadSingleSurface(convSurface, img_yuv)
+        frames = [img_yuv]
       else:
-        frames = codec.decode(av.packet.Packet(evta.data))
-        if len(frames) == 0:
-          if debug:
-            print("DROP SURFACE")
-          continue
-        assert len(frames) == 1
-        img_yuv = frames[0].to_ndarray(format=av.video.format.VideoFormat('yuv420p')).flatten()
-        uv_offset = H*W
-        y = img_yuv[:uv_offset]
-        uv = img_yuv[uv_offset:].reshape(2, -1).ravel('F')
-        img_yuv = np.hstack((y, uv))
+        # with frame threading, no frame comes out until the pipeline is full
+        frames = cpu_decoder.decode(evta.data)
+        t_decode = time.monotonic()
+      stats.latency["decode"].add(t_decode - t)
+
+      for frame in frames:
+        t = time.monotonic()
+        img_nv12 = frame if nvidia else cpu_decoder.to_nv12(frame)
+        t_convert = time.monotonic()
+        # the nvidia download is part of the conversion
+        stats.latency["convert"].add(t_convert - (t_decode if nvidia else t))
 
-      vipc_server.send(vst, img_yuv.data, cnt, int(time_q[0]*1e9), int(time.monotonic()*1e9))
-      cnt += 1
+        vipc_server.send(vst, img_nv12.data, cnt, int(time_q[0]*1e9), int(time.monotonic()*1e9))
+        stats.latency["publish"].add(time.monotonic() - t_convert)
+        cnt += 1
+        stats.frames += 1
+        time_q = time_q[1:]
 
-      pc_latency = (time.monotonic()-time_q[0])*1000
-      time_q = time_q[1:]
-      if debug:
-        print(f"{len(msgs):2d} {evta.idx.encodeId:4d} {evt.logMonoTime/1e9:.3f} {evta.idx.timestampEof/1e6:.3f} \
-            roll {frame_latency:6.2f} ms latency {process_latency:6.2f} ms + {network_latency:6.2f} ms + {pc_latency:6.2f} ms \
-            = {process_latency+network_latency+pc_latency:6.2f} ms", len(evta.data), sock_name)
+    if debug and time.monotonic() - stats.start_time > STATS_INTERVAL:
+      stats.print_and_reset()
 
 
 class CompressedVipc:
-  def __init__(self, addr, vision_streams, server_name, nvidia=False, debug=False):
+  def __init__(self, addr, vision_streams, server_name, nvidia=False, debug=False, threads=0, thread_type="SLICE"):
     print("getting frame sizes")
     os.environ["ZMQ"] = "1"
     messaging.reset_context()
@@ -126,7 +172,7 @@ class CompressedVipc:
     self.procs = []
     for vst in vision_streams:
       ed = sm[ENCODE_SOCKETS[vst]]
-      p = multiprocessing.Process(target=decoder, args=(addr, self.vipc_server, vst, nvidia, ed.width, ed.height, debug))
+      p = multiprocessing.Process(target=decoder, args=(addr, self.vipc_server, vst, nvidia, ed.width, ed.height, debug, threads, thread_type))
       p.start()
       self.procs.append(p)
 
@@ -146,6 +192,9 @@ if __name__ == "__main__":
   parser.add_argument("--cams", default="0,1,2", help="Cameras to decode")
   parser.add_argument("--server", default="camerad", help="choose vipc server name")
   parser.add_argument("--silent", action="store_true", help="Suppress debug output")
+  parser.add_argument("--threads", type=int, default=0, help="ffmpeg decoder threads per camera, 0 for one per core")
+  parser.add_argument("--thread-type", default="SLICE", choices=["SLICE", "FRAME", "AUTO"],
+                      help="ffmpeg decoder threading, FRAME and AUTO add threads - 1 frames of latency, for offline decoding")
   args = parser.parse_args()
 
   vision_streams = [
@@ -155,7 +204,7 @@ if __name__ == "__main__":
   ]
 
   vsts = [vision_streams[int(x)] for x in args.cams.split(",")]
-  cvipc = CompressedVipc(args.addr, vsts, args.server, args.nvidia, debug=(not args.silent))
+  cvipc = CompressedVipc(args.addr, vsts, args.server, args.nvidia, debug=(not args.silent), threads=args.threads, thread_type=args.thread_type)
 
   # register exit handler
   signal.signal(signal.SIGINT, lambda sig, frame: cvipc.kill())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import os
+import time
+import av
+
+import cereal.messaging as messaging
+from openpilot.common.benchmark import benchmark_parser, format_times
+from openpilot.tools.camerastream.compressed_vipc import CpuDecoder
+from openpilot.tools.camerastream.tests.test_compressed_vipc import encode_stream, yuv420p_to_nv12
+from openpilot.tools.lib.logreader import LogReader
+
+
+def print_run(name, decode_times, convert_times, n_frames, total_time):
+  # decode times are per packet, convert times per frame
+  print(f"{name:>16}: {n_frames / total_time:6.1f} fps\n" +
+        f"{'decode':>24}: {format_times(decode_times, n_frames, 'frame')}\n" +
+        f"{'convert':>24}: {format_times(convert_times)}")
+
+
+def record(addr: str, sock_name: str, n_frames: int, fn: str):
+  os.environ["ZMQ"] = "1"
+  messaging.reset_context()
+  sock = messaging.sub_sock(sock_name, None, addr=addr, conflate=False)
+  events = []
+  while len(events) < n_frames:
+    events += messaging.drain_sock_raw(sock, wait_for_one=True)
+  with open(fn, "wb") as f:
+    f.write(b"".join(events[:n_frames]))
+  print(f"recorded {n_frames} {sock_name} events to {fn}")
+
+
+def run(events, decode, convert):
+  decode_times, convert_times = [], []
+  nv12 = []
+  # fps includes comparing the output
+  start = time.perf_counter()
+  for e in events + [None]:
+    t = time.perf_counter()
+    frames = decode(e)
+    decode_times.append(time.perf_counter() - t)
+    for f in frames:
+      t = time.perf_counter()
+      out = convert(f)
+      convert_times.append(time.perf_counter() - t)
+      nv12.append(hash(out.tobytes()))
+  return decode_times, convert_times, nv12, time.perf_counter() - start
+
+
+def benchmark(events, threads: int):
+  W, H = events[0].width, events[0].height
+  print(f"{len(events)} packets, {W}x{H}")
+  # the first packet comes with the stream header
+  packets = [events[0].header + events[0].data] + [e.data for e in events[1:]]
+
+  # the default codec context and yuv420p ndarray conversion, before CpuDecoder
+  codec = av.CodecContext.create("hevc", "r")
+  decode_times, convert_times, expected, total = run(packets, lambda p: codec.decode(av.packet.Packet(p) if p is not None else None), yuv420p_to_nv12)
+  print_run("default", decode_times, convert_times, len(expected), total)
+
+  for name, n, thread_type in [("no threads", 1, "SLICE"), ("slice threads", threads, "SLICE"),
+                               ("frame threads", threads, "FRAME"), ("auto threads", threads, "AUTO")]:
+    decoder = CpuDecoder(W, H, n, thread_type)
+    decode_times, convert_times, nv12, total = run(packets, decoder.decode, decoder.to_nv12)
+    assert nv12 == expected
+    print_run(name, decode_times, convert_times, len(nv12), total)
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the compressed_vipc CPU decoding and NV12 conversion on a recorded encodeData stream")
+  parser.add_argument("stream", nargs="?", help="file of recorded encodeData events, a synthetic stream is encoded if not given")
+  parser.add_argument("--socket", default="roadEncodeData")
+  parser.add_argument("--record", metavar="ADDR", help="first record the stream from the device at ADDR")
+  parser.add_argument("--frames", type=int, default=200, help="number of frames to record or encode")
+  parser.add_argument("--size", type=int, nargs=2, default=[1928, 1208], metavar=("W", "H"), help="size of the synthetic stream")
+  parser.add_argument("--threads", type=int, default=4, help="ffmpeg decoder threads")
+  args = parser.parse_args()
+
+  if args.record:
+    assert args.stream, "a file to record to is required"
+    record(args.record, args.socket, args.frames, args.stream)
+
+  if args.stream:
+    events = [getattr(m, args.socket) for m in LogReader(args.stream) if m.which() == args.socket]
+  else:
+    events = [getattr(messaging.log_from_bytes(m), args.socket) for m in encode_stream(*args.size, args.frames, args.socket)]
+  benchmark(events, args.threads)
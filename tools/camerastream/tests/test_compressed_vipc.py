@@ -0,0 +1,74 @@
+from fractions import Fraction
+import av
+import numpy as np
+import pytest
+
+import cereal.messaging as messaging
+from openpilot.tools.camerastream.compressed_vipc import V4L2_BUF_FLAG_KEYFRAME, CpuDecoder
+
+
+def has_encoder(name: str) -> bool:
+  try:
+    av.codec.Codec(name, "w")
+  except av.codec.codec.UnknownCodecError:
+    return False
+  return True
+
+
+def encode_stream(W: int, H: int, n_frames: int, sock_name: str = "roadEncodeData") -> list[bytes]:
+  """encodeData events of a moving gradient with some noise, like encoderd sends them"""
+  enc = av.CodecContext.create("libx265", "w")
+  enc.width, enc.height, enc.pix_fmt = W, H, "yuv420p"
+  enc.time_base = Fraction(1, 20)
+  enc.options = {"preset": "ultrafast", "x265-params": "log-level=error:bframes=0:repeat-headers=1"}
+
+  rng = np.random.default_rng(0)
+  gradient = np.add.outer(np.arange(H * 3 // 2), np.arange(W)).astype(np.uint8)
+  packets = []
+  for i in range(n_frames):
+    img = np.roll(gradient, 4 * i, axis=1) + rng.integers(0, 8, gradient.shape, dtype=np.uint8)
+    frame = av.VideoFrame.from_ndarray(img, format="yuv420p")
+    frame.pts = i
+    packets += enc.encode(frame)
+  packets += enc.encode(None)
+
+  events = []
+  for i, packet in enumerate(packets):
+    msg = messaging.new_message(sock_name)
+    ed = getattr(msg, sock_name)
+    ed.width, ed.height = W, H
+    ed.idx.encodeId = i
+    ed.idx.flags = V4L2_BUF_FLAG_KEYFRAME if packet.is_keyframe else 0
+    ed.data = bytes(packet)
+    events.append(msg.to_bytes())
+  return events
+
+
+def yuv420p_to_nv12(frame: av.VideoFrame) -> np.ndarray:
+  # the decoder's conversion before CpuDecoder
+  img_yuv = frame.to_ndarray(format=av.video.format.VideoFormat('yuv420p')).flatten()
+  uv_offset = frame.width * frame.height
+  return np.hstack((img_yuv[:uv_offset], img_yuv[uv_offset:].reshape(2, -1).ravel('F')))
+
+
+@pytest.mark.skipif(not has_encoder("libx265"), reason="PyAV is built without the libx265 encoder")
+class TestCpuDecoder:
+  @pytest.mark.parametrize("threads,thread_type", [(1, "SLICE"), (4, "FRAME"), (0, "AUTO")])
+  def test_nv12(self, threads, thread_type):
+    W, H, n_frames = 160, 96, 20
+    events = [messaging.log_from_bytes(e).roadEncodeData for e in encode_stream(W, H, n_frames)]
+
+    reference = av.CodecContext.create("hevc", "r")
+    expected = [yuv420p_to_nv12(f) for e in events for f in reference.decode(av.packet.Packet(e.data))]
+
+    decoder = CpuDecoder(W, H, threads, thread_type)
+    nv12 = []
+    for e in events + [None]:
+      for f in decoder.decode(e.data if e is not None else None):
+        out = decoder.to_nv12(f)
+        assert out is decoder.nv12
+        nv12.append(out.copy())
+
+    assert len(nv12) == n_frames
+    for a, b in zip(nv12, expected, strict=False):
+      np.testing.assert_array_equal(a, b)
@@ -0,0 +1,111 @@
+import logging
+from collections.abc import Iterator
+from typing import IO
+
+import pyray as rl
+
+from msgq.visionipc import VisionIpcServer, VisionStreamType
+from openpilot.selfdrive.ui.layouts.main import MainLayout
+from openpilot.selfdrive.ui.ui_state import ui_state
+from openpilot.system.ui.lib.application import gui_app
+from openpilot.tools.lib.framereader import FrameReader
+from openpilot.tools.lib.logreader import LogReader
+
+logger = logging.getLogger('clip.py')
+
+CAMERAS = {
+  'roadEncodeIdx': VisionStreamType.VISION_STREAM_ROAD,
+  'wideRoadEncodeIdx': VisionStreamType.VISION_STREAM_WIDE_ROAD,
+}
+VIPC_BUFFERS = 4
+
+
+class CameraFrames:
+  """NV12 frames of one camera across the route, looked up by the segmentNum and segmentId of its encodeIdx"""
+  def __init__(self, paths: list[str | None]):
+    self.paths = paths
+    self.segment = next(i for i, p in enumerate(paths) if p is not None)
+    self.fr: FrameReader | None = FrameReader(paths[self.segment], pix_fmt='nv12')
+    self.w, self.h = self.fr.w, self.fr.h
+
+  def get(self, segment_num: int, segment_id: int):
+    if segment_num != self.segment:
+      path = self.paths[segment_num] if segment_num < len(self.paths) else None
+      self.fr = FrameReader(path, pix_fmt='nv12') if path is not None else None
+      self.segment = segment_num
+    if self.fr is None or segment_id >= self.fr.frame_count:
+      return None
+    return self.fr.get(segment_id)
+
+
+def frame_times(route_start_ns: int, begin_at: int, n_frames: int, framerate: int) -> Iterator[int]:
+  # integer nanoseconds, so every frame lands on an exact log timestamp regardless of the clip length
+  for i in range(n_frames):
+    yield route_start_ns + begin_at * 10**9 + i * 10**9 // framerate
+
+
+def render_clip(lr: LogReader, camera_paths: dict[str, list[str | None]], route_start_ns: int, begin_at: int, start: int, end: int,
+                framerate: int, encoder: IO[bytes]):
+  """Steps the UI through the log one frame at a time into an offscreen texture, and writes the frames from start to end
+  as raw RGBA to the encoder. The frames from begin_at to start warm up the UI and aren't written."""
+  cameras = {CAMERAS[s]: CameraFrames(paths) for s, paths in camera_paths.items() if any(p is not None for p in paths)}
+  assert VisionStreamType.VISION_STREAM_ROAD in cameras, 'no road camera in the clip range'
+
+  vipc_server = VisionIpcServer('camerad')
+  for stream, frames in cameras.items():
+    vipc_server.create_buffers(stream, VIPC_BUFFERS, frames.w, frames.h)
+  vipc_server.start_listener()
+
+  rl.set_config_flags(rl.ConfigFlags.FLAG_WINDOW_HIDDEN)
+  gui_app.init_window('clip', fps=framerate)
+  # nothing is shown, don't wait between frames
+  rl.set_target_fps(0)
+  main_layout = MainLayout()
+  main_layout.set_rect(rl.Rectangle(0, 0, gui_app.width, gui_app.height))
+  texture = rl.load_render_texture(gui_app.width, gui_app.height)
+
+  # the UI reads its messages from the log instead of the sockets, up to the time of the frame being rendered.
+  # messages are stamped with the frame's log time, so alive and frequency checks follow the log, not how fast it renders
+  services = set(ui_state.sm.data) | set(CAMERAS)
+  events = (msg for msg in lr if msg.which() in services)
+  msgs: list = []
+  ui_state.sm.update = lambda timeout=None: ui_state.sm.update_msgs(t / 1e9, [m for m in msgs if m.which() in ui_state.sm.data])
+
+  n_warm = (start - begin_at) * framerate
+  n_frames = (end - start) * framerate
+  next_msg = next(events, None)
+  try:
+    for i, t in enumerate(frame_times(route_start_ns, begin_at, n_warm + n_frames, framerate)):
+      if next_msg is None:
+        raise ValueError(f'route ended {(t - route_start_ns) / 1e9:.2f}s in, before the end of the clip ({end}s)')
+
+      msgs = []
+      while next_msg is not None and next_msg.logMonoTime <= t:
+        msgs.append(next_msg)
+        next_msg = next(events, None)
+
+      # only the latest frame of each camera is shown
+      encode_idxs = {CAMERAS[m.which()]: getattr(m, m.which()) for m in msgs if m.which() in CAMERAS}
+      for stream, idx in encode_idxs.items():
+        if stream in cameras and (yuv := cameras[stream].get(idx.segmentNum, idx.segmentId)) is not None:
+          vipc_server.send(stream, yuv.data, idx.frameId, idx.timestampSof, idx.timestampEof)
+
+      ui_state.update()
+      rl.begin_texture_mode(texture)
+      rl.clear_background(rl.BLACK)
+      main_layout.render()
+      rl.end_texture_mode()
+      # advances raylib's frame timing and input polling, the window stays hidden
+      rl.begin_drawing()
+      rl.end_drawing()
+
+      if i >= n_warm:
+        image = rl.load_image_from_texture(texture.texture)
+        encoder.write(bytes(rl.ffi.buffer(image.data, image.width * image.height * 4)))
+        rl.unload_image(image)
+
+      if i % (10 * framerate) == 0:
+        logger.debug(f'rendered {i}/{n_warm + n_frames} frames')
+  finally:
+    rl.unload_render_texture(texture)
+    gui_app.close()
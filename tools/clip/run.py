@@ -10,7 +10,7 @@ from argparse import ArgumentParser, ArgumentTypeError
 from collections.abc import Sequence
 from pathlib import Path
 from random import randint
-from subprocess import Popen
+from subprocess import PIPE, Popen
 from typing import Literal
 
 from cereal.messaging import SubMaster
@@ -87,6 +87,9 @@ def get_meta_text(lr: LogReader, route: Route):
 
 def parse_args(parser: ArgumentParser):
   args = parser.parse_args()
+  validate_env(parser, args.offscreen)
+  if args.offscreen and args.quality == 'low':
+    parser.error('offscreen rendering reads the full resolution cameras, low quality isn\'t supported')
   if args.demo:
     args.route = DEMO_ROUTE
     if args.start is None or args.end is None:
@@ -138,13 +141,14 @@ def populate_car_params(lr: LogReader):
   logger.debug('persisted CarParams')
 
 
-def validate_env(parser: ArgumentParser):
+def validate_env(parser: ArgumentParser, offscreen: bool):
   if platform.system() not in ['Linux']:
     parser.exit(1, f'clip.py: error: {platform.system()} is not a supported operating system\n')
   for proc in ['Xvfb', 'ffmpeg']:
     if shutil.which(proc) is None:
       parser.exit(1, f'clip.py: error: missing {proc} command, is it installed?\n')
-  for proc in [REPLAY, UI]:
+  # offscreen rendering runs the UI in this process and reads the route directly
+  for proc in ([] if offscreen else [REPLAY, UI]):
     if shutil.which(proc) is None:
       parser.exit(1, f'clip.py: error: missing {proc} command, did you build openpilot yet?\n')
 
@@ -176,6 +180,36 @@ def wait_for_frames(procs: list[Popen]):
     check_for_failure(procs)
 
 
+def clip_offscreen(route: Route, lr: LogReader, encoder_cmd: list[str], begin_at: int, start: int, end: int, procs: list[Popen]):
+  # the clip resolution is the big UI's, set before the UI is imported
+  os.environ['BIG'] = '1'
+  os.environ['SCALE'] = '1'
+  from openpilot.tools.clip.offscreen import render_clip
+
+  # route time is relative to the start of the first segment, frames are stepped by log time from there
+  route_start_ns = lr.first('initData').logMonoTime
+  segments = range(begin_at // 60, min(end // 60, route.max_seg_number) + 1)
+  log_paths = [route.log_paths()[i] for i in segments]
+  if None in log_paths:
+    raise FileNotFoundError(f'missing rlogs for segments {list(segments)}, offscreen rendering needs the full logs')
+  camera_paths = {
+    'roadEncodeIdx': [p if i in segments else None for i, p in enumerate(route.camera_paths())],
+    'wideRoadEncodeIdx': [p if i in segments else None for i, p in enumerate(route.ecamera_paths())],
+  }
+
+  with Popen(encoder_cmd, stdin=PIPE, stderr=PIPE) as encoder:
+    logger.info(f'rendering {(end - start) * FRAMERATE} frames...')
+    try:
+      render_clip(LogReader(log_paths, sort_by_time=True), camera_paths, route_start_ns, begin_at, start, end, FRAMERATE, encoder.stdin)
+    finally:
+      encoder.stdin.close()
+    if encoder.wait(PROC_WAIT_SECONDS) != 0:
+      msg = f'ffmpeg failed, exit code {encoder.returncode}'
+      logger.error(encoder.stderr.read().decode())
+      raise ChildProcessError(msg)
+  check_for_failure(procs)
+
+
 def clip(
   data_dir: str | None,
   quality: Literal['low', 'high'],
@@ -187,6 +221,7 @@ def clip(
   speed: int,
   target_mb: int,
   title: str | None,
+  offscreen: bool = False,
 ):
   logger.info(f'clipping route {route.name.canonical_name}, start={start} end={end} quality={quality} target_filesize={target_mb}MB')
   lr = get_logreader(route)
@@ -215,24 +250,53 @@ def clip(
       "fps=60",
     ]
 
-  ffmpeg_cmd = [
-    'ffmpeg', '-y',
-    '-video_size', RESOLUTION,
-    '-framerate', str(FRAMERATE),
-    '-f', 'x11grab',
-    '-rtbufsize', '100M',
-    '-draw_mouse', '0',
-    '-i', display,
+  encode_args = [
     '-c:v', 'libx264',
     '-maxrate', f'{bit_rate_kbps}k',
     '-bufsize', f'{bit_rate_kbps*2}k',
     '-crf', '23',
-    '-filter:v', ','.join(overlays),
     '-preset', 'ultrafast',
     '-tune', 'zerolatency',
     '-pix_fmt', 'yuv420p',
     '-movflags', '+faststart',
     '-f', 'mp4',
+  ]
+
+  xvfb_cmd = ['Xvfb', display, '-terminate', '-screen', '0', f'{RESOLUTION}x{PIXEL_DEPTH}']
+
+  if offscreen:
+    # raw RGBA frames from the render texture, which is bottom up
+    encoder_cmd = [
+      'ffmpeg', '-y',
+      '-loglevel', 'error',
+      '-f', 'rawvideo',
+      '-pix_fmt', 'rgba',
+      '-video_size', RESOLUTION,
+      '-framerate', str(FRAMERATE),
+      '-i', 'pipe:0',
+      '-filter:v', ','.join(['vflip', *overlays]),
+      *encode_args,
+      out,
+    ]
+    with OpenpilotPrefix(prefix, shared_download_cache=True):
+      populate_car_params(lr)
+      # Xvfb only provides the GL context, the window is hidden
+      with managed_proc(xvfb_cmd, os.environ.copy()) as xvfb_proc:
+        os.environ['DISPLAY'] = display
+        clip_offscreen(route, lr, encoder_cmd, begin_at, start, end, [xvfb_proc])
+        logger.info(f'recording complete: {Path(out).resolve()}')
+    return
+
+  ffmpeg_cmd = [
+    'ffmpeg', '-y',
+    '-video_size', RESOLUTION,
+    '-framerate', str(FRAMERATE),
+    '-f', 'x11grab',
+    '-rtbufsize', '100M',
+    '-draw_mouse', '0',
+    '-i', display,
+    '-filter:v', ','.join(overlays),
+    *encode_args,
     '-t', str(duration),
     out,
   ]
@@ -245,7 +309,6 @@ def clip(
   replay_cmd.append(route.name.canonical_name)
 
   ui_cmd = [UI, '-platform', 'xcb']
-  xvfb_cmd = ['Xvfb', display, '-terminate', '-screen', '0', f'{RESOLUTION}x{PIXEL_DEPTH}']
 
   with OpenpilotPrefix(prefix, shared_download_cache=True):
     populate_car_params(lr)
@@ -269,7 +332,6 @@ def clip(
 
 def main():
   p = ArgumentParser(prog='clip.py', description='clip your openpilot route.', epilog='comma.ai')
-  validate_env(p)
   route_group = p.add_mutually_exclusive_group(required=True)
   route_group.add_argument('route', nargs='?', type=validate_route, help=f'The route (e.g. {DEMO_ROUTE} or {DEMO_ROUTE}/{DEMO_START}/{DEMO_END})')
   route_group.add_argument('--demo', help='use the demo route', action='store_true')
@@ -282,6 +344,7 @@ def main():
   p.add_argument('-x', '--speed', help='record the clip at this speed multiple', type=int, default=1)
   p.add_argument('-s', '--start', help='start clipping at <start> seconds', type=int)
   p.add_argument('-t', '--title', help='overlay this title on the video (e.g. "Chill driving across the Golden Gate Bridge")', type=validate_title)
+  p.add_argument('--offscreen', help='render the UI frame by frame from the logs instead of recording it in real time', action='store_true')
   args = parse_args(p)
   exit_code = 1
   try:
@@ -296,6 +359,7 @@ def main():
       speed=args.speed,
       target_mb=args.file_size,
       title=args.title,
+      offscreen=args.offscreen,
     )
     exit_code = 0
   except KeyboardInterrupt as e:
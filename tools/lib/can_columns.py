@@ -0,0 +1,264 @@
+import os
+import struct
+import warnings
+from dataclasses import dataclass, fields
+
+import capnp
+import numpy as np
+
+from cereal import log as capnp_log
+from openpilot.common.utils import atomic_write
+from openpilot.tools.lib.cache import cache_path_for_file_path
+from openpilot.tools.lib.logreader import read_log_file
+
+CACHE_VERSION = 1
+
+# Cap'n Proto wire format
+STRUCT_POINTER = 0
+LIST_POINTER = 1
+BYTE_ELEMENTS = 2
+COMPOSITE_ELEMENTS = 7
+
+EVENT_SCHEMA = capnp_log.Event.schema
+CAN_DATA_SCHEMA = capnp_log.CanData.schema
+# byte offsets into the data sections, and pointer indexes
+DISCRIMINANT_OFFSET = EVENT_SCHEMA.node.struct.discriminantOffset * 2
+LOG_MONO_TIME_OFFSET = EVENT_SCHEMA.fields['logMonoTime'].proto.slot.offset * 8
+ADDRESS_OFFSET = CAN_DATA_SCHEMA.fields['address'].proto.slot.offset * 4
+SRC_OFFSET = CAN_DATA_SCHEMA.fields['src'].proto.slot.offset
+DAT_POINTER = CAN_DATA_SCHEMA.fields['dat'].proto.slot.offset
+
+
+@dataclass
+class CanColumns:
+  """CAN frames of a log as contiguous arrays. Frames of event i are event_offsets[i]:event_offsets[i+1],
+  the data of frame j is blob[dat_offsets[j]:dat_offsets[j+1]]"""
+  event_mono_time: np.ndarray  # uint64, logMonoTime of each can event
+  event_offsets: np.ndarray    # int64, n_events + 1
+  bus: np.ndarray              # uint8, the src of each frame
+  address: np.ndarray          # uint32
+  dat_offsets: np.ndarray      # int64, n_frames + 1
+  blob: np.ndarray             # uint8
+
+  def __len__(self) -> int:
+    return len(self.address)
+
+  @property
+  def n_events(self) -> int:
+    return len(self.event_mono_time)
+
+  @property
+  def mono_time(self) -> np.ndarray:
+    return np.repeat(self.event_mono_time, np.diff(self.event_offsets))
+
+  @property
+  def dat_len(self) -> np.ndarray:
+    return np.diff(self.dat_offsets)
+
+  def dat(self, i: int) -> bytes:
+    return self.blob[self.dat_offsets[i]:self.dat_offsets[i + 1]].tobytes()
+
+  @staticmethod
+  def empty() -> 'CanColumns':
+    return CanColumns(np.zeros(0, np.uint64), np.zeros(1, np.int64), np.zeros(0, np.uint8), np.zeros(0, np.uint32),
+                      np.zeros(1, np.int64), np.zeros(0, np.uint8))
+
+  @staticmethod
+  def from_can_list(can_list: list[tuple[int, list[tuple[int, bytes, int]]]]) -> 'CanColumns':
+    """From the (nanos, [(address, dat, src), ...]) list can_capnp_to_list returns"""
+    frames = [f for _, fs in can_list for f in fs]
+    blob = b''.join(f[1] for f in frames)
+    return CanColumns(
+      np.array([t for t, _ in can_list], dtype=np.uint64),
+      np.cumsum([0] + [len(fs) for _, fs in can_list], dtype=np.int64),
+      np.array([f[2] for f in frames], dtype=np.uint8),
+      np.array([f[0] for f in frames], dtype=np.uint32),
+      np.cumsum([0] + [len(f[1]) for f in frames], dtype=np.int64),
+      np.frombuffer(blob, dtype=np.uint8).copy(),
+    )
+
+  def to_can_list(self) -> list[tuple[int, list[tuple[int, bytes, int]]]]:
+    """The (nanos, [(address, dat, src), ...]) list can_capnp_to_list returns"""
+    blob = self.blob.tobytes()
+    address, bus, dat_offsets = self.address.tolist(), self.bus.tolist(), self.dat_offsets.tolist()
+    event_offsets = self.event_offsets.tolist()
+    return [(t, [(address[j], blob[dat_offsets[j]:dat_offsets[j + 1]], bus[j]) for j in range(event_offsets[i], event_offsets[i + 1])])
+            for i, t in enumerate(self.event_mono_time.tolist())]
+
+  def take_events(self, order: np.ndarray) -> 'CanColumns':
+    counts = np.diff(self.event_offsets)[order]
+    event_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    frames = _ranges(self.event_offsets[:-1][order], counts)
+    dat_len = self.dat_len[frames]
+    return CanColumns(self.event_mono_time[order], event_offsets, self.bus[frames], self.address[frames],
+                      np.concatenate([[0], np.cumsum(dat_len)]).astype(np.int64), self.blob[_ranges(self.dat_offsets[:-1][frames], dat_len)])
+
+  def sorted_by_time(self) -> 'CanColumns':
+    # stable, like LogReader(sort_by_time=True)
+    return self.take_events(np.argsort(self.event_mono_time, kind='stable'))
+
+  @staticmethod
+  def concatenate(columns: list['CanColumns']) -> 'CanColumns':
+    if not columns:
+      return CanColumns.empty()
+    event_offsets = [columns[0].event_offsets]
+    dat_offsets = [columns[0].dat_offsets]
+    for c in columns[1:]:
+      event_offsets.append(c.event_offsets[1:] + event_offsets[-1][-1])
+      dat_offsets.append(c.dat_offsets[1:] + dat_offsets[-1][-1])
+    return CanColumns(np.concatenate([c.event_mono_time for c in columns]), np.concatenate(event_offsets),
+                      np.concatenate([c.bus for c in columns]), np.concatenate([c.address for c in columns]),
+                      np.concatenate(dat_offsets), np.concatenate([c.blob for c in columns]))
+
+  def save(self, fn: str) -> None:
+    with atomic_write(fn, mode='wb', overwrite=True) as f:
+      np.savez(f, **{field.name: getattr(self, field.name) for field in fields(self)})
+
+  @staticmethod
+  def load(fn: str) -> 'CanColumns':
+    with np.load(fn) as dat:
+      return CanColumns(**{field.name: dat[field.name] for field in fields(CanColumns)})
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+  """Concatenation of arange(start, start + length) for each start and length"""
+  total = int(np.sum(lengths))
+  ends = np.cumsum(lengths)
+  return np.repeat(starts - (ends - lengths), lengths) + np.arange(total)
+
+
+def _signed_offset(p):
+  # 30 bit signed word offset of a pointer
+  off = (p >> 2) & 0x3FFFFFFF
+  return off - (1 << 30) if off >= (1 << 29) else off
+
+
+def _read_bits(words: np.ndarray, elem: np.ndarray, data_words: np.ndarray, byte_offset: int, size: int) -> np.ndarray:
+  """A field at byte_offset of the data section of each struct, zero when the data section is too small"""
+  valid = data_words * 8 >= byte_offset + size
+  w = words[np.where(valid, elem + byte_offset // 8, 0)]
+  v = (w >> np.uint64((byte_offset % 8) * 8)) & np.uint64((1 << (size * 8)) - 1)
+  return np.where(valid, v, 0)
+
+
+def extract_can(dat: bytes, msgtype: str = 'can') -> CanColumns:
+  """Extracts the frames of the can (or sendcan) events from decompressed log bytes, without building a message per event.
+  The Event and the list of CanData are read from the raw Cap'n Proto words, events with far pointers are read with pycapnp"""
+  which = EVENT_SCHEMA.fields[msgtype].proto.discriminantValue
+  list_pointer = EVENT_SCHEMA.fields[msgtype].proto.slot.offset
+  n_bytes = len(dat)
+  unpack_from = struct.unpack_from
+
+  # *** pass 1: walk the messages, find the CanData list of each event ***
+  events: list[tuple[int, int, int, int, int]] = []  # logMonoTime, first CanData word, count, data words, pointer words
+  bounds: list[tuple[int, int]] = []  # message bytes of each event, for the slow path
+  slow: list[int] = []
+  pos = 0
+  while pos + 8 <= n_bytes:
+    n_segments = unpack_from('<I', dat, pos)[0] + 1
+    header = (4 * (n_segments + 1) + 7) & ~7
+    msg_end = pos + header + 8 * sum(unpack_from(f'<{n_segments}I', dat, pos + 4)) if pos + header <= n_bytes else n_bytes + 1
+    if msg_end > n_bytes:
+      warnings.warn("Corrupted events detected", RuntimeWarning, stacklevel=2)
+      break
+    seg0, end_word = (pos + header) // 8, msg_end // 8
+    msg_start, pos = pos, msg_end
+
+    root = unpack_from('<Q', dat, seg0 * 8)[0]
+    event = seg0 + 1 + _signed_offset(root)
+    event_data_words, event_ptr_words = (root >> 32) & 0xFFFF, root >> 48
+    if root & 3 != STRUCT_POINTER or event < seg0 or event + event_data_words + event_ptr_words > end_word:
+      # a far pointer, could be any event
+      slow.append(len(events))
+      events.append((0, 0, 0, 0, 0))
+      bounds.append((msg_start, msg_end))
+      continue
+    if event_data_words * 8 < DISCRIMINANT_OFFSET + 2 or unpack_from('<H', dat, event * 8 + DISCRIMINANT_OFFSET)[0] != which:
+      continue
+
+    t = unpack_from('<Q', dat, event * 8 + LOG_MONO_TIME_OFFSET)[0]
+    bounds.append((msg_start, msg_end))
+    p_word = event + event_data_words + list_pointer
+    p = unpack_from('<Q', dat, p_word * 8)[0] if event_ptr_words > list_pointer else 0
+    if p == 0:
+      events.append((t, 0, 0, 0, 0))
+      continue
+
+    tag = p_word + 1 + _signed_offset(p)
+    if p & 3 == LIST_POINTER and (p >> 32) & 7 == COMPOSITE_ELEMENTS and seg0 <= tag < end_word:
+      tag_word = unpack_from('<Q', dat, tag * 8)[0]
+      n, dw, pw = (tag_word >> 2) & 0x3FFFFFFF, (tag_word >> 32) & 0xFFFF, tag_word >> 48
+      if tag + 1 + n * (dw + pw) <= end_word:
+        events.append((t, tag + 1, n, dw, pw))
+        continue
+    slow.append(len(events))
+    events.append((0, 0, 0, 0, 0))
+
+  # *** pass 2: all the frames at once ***
+  ev = np.array(events, dtype=np.int64).reshape(-1, 5)
+  words = np.frombuffer(dat, dtype=np.uint64, count=n_bytes // 8)
+  counts = ev[:, 2]
+  event_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+  dw_f, pw_f = np.repeat(ev[:, 3], counts), np.repeat(ev[:, 4], counts)
+  elem = _ranges(np.zeros(len(ev), dtype=np.int64), counts) * (dw_f + pw_f) + np.repeat(ev[:, 1], counts)
+
+  address = _read_bits(words, elem, dw_f, ADDRESS_OFFSET, 4).astype(np.uint32)
+  bus = _read_bits(words, elem, dw_f, SRC_OFFSET, 1).astype(np.uint8)
+
+  has_dat = pw_f > DAT_POINTER
+  dat_word = elem + dw_f + DAT_POINTER
+  p = np.where(has_dat, words[np.where(has_dat, dat_word, 0)], np.uint64(0))
+  off = ((p >> np.uint64(2)) & np.uint64(0x3FFFFFFF)).astype(np.int64)
+  off = np.where(off >= (1 << 29), off - (1 << 30), off)
+  dat_start = (dat_word + 1 + off) * 8
+  dat_len = np.where(p == 0, 0, p >> np.uint64(35)).astype(np.int64)
+  is_bytes = ((p & np.uint64(3)) == LIST_POINTER) & (((p >> np.uint64(32)) & np.uint64(7)) == BYTE_ELEMENTS)
+  # far pointers and anything out of bounds take the slow path
+  bad = ~((p == 0) | (is_bytes & (dat_start >= 0) & (dat_start + dat_len <= n_bytes)))
+  dat_start = np.where(bad, 0, dat_start)
+  dat_len = np.where(bad, 0, dat_len)
+
+  columns = CanColumns(ev[:, 0].astype(np.uint64), event_offsets, bus, address,
+                       np.concatenate([[0], np.cumsum(dat_len)]).astype(np.int64), np.frombuffer(dat, dtype=np.uint8)[_ranges(dat_start, dat_len)])
+
+  if np.any(bad):
+    slow = sorted(set(slow) | set(np.repeat(np.arange(len(ev)), counts)[bad].tolist()))
+  if slow:
+    columns = _merge_slow(columns, dat, [(i, *bounds[i]) for i in slow], msgtype)
+  return columns
+
+
+def _merge_slow(columns: CanColumns, dat: bytes, slow: list[tuple[int, int, int]], msgtype: str) -> CanColumns:
+  slow_events, slow_lists = [], []
+  for i, start, end in slow:
+    try:
+      with capnp_log.Event.from_bytes(dat[start:end]) as evt:
+        if evt.which() != msgtype:
+          continue
+        slow_events.append(i)
+        slow_lists.append((evt.logMonoTime, [(f.address, f.dat, f.src) for f in getattr(evt, msgtype)]))
+    except capnp.KjException:
+      warnings.warn("Corrupted events detected", RuntimeWarning, stacklevel=3)
+
+  # every slow event has a placeholder in columns, keep the fast ones and put the slow ones in their place
+  is_slow = np.zeros(columns.n_events, dtype=bool)
+  is_slow[[i for i, _, _ in slow]] = True
+  fast_idx = np.flatnonzero(~is_slow)
+  merged = CanColumns.concatenate([columns.take_events(fast_idx), CanColumns.from_can_list(slow_lists)])
+  order = np.argsort(np.concatenate([fast_idx, np.array(slow_events, dtype=np.int64)]), kind='stable')
+  return merged.take_events(order)
+
+
+def load_can_columns(fn: str, msgtype: str = 'can', sort_by_time: bool = False, cache: bool | None = None) -> CanColumns:
+  """CanColumns of a log file or URL, cached per file when cache or FILEREADER_CACHE is set"""
+  if cache is None:
+    cache = bool(int(os.environ.get("FILEREADER_CACHE", "0")))
+
+  cache_fn = f"{cache_path_for_file_path(fn)}.{msgtype}.v{CACHE_VERSION}.npz" if cache else None
+  if cache_fn is not None and os.path.exists(cache_fn) and not (os.path.exists(fn) and os.path.getmtime(fn) > os.path.getmtime(cache_fn)):
+    columns = CanColumns.load(cache_fn)
+  else:
+    columns = extract_can(read_log_file(fn), msgtype)
+    if cache_fn is not None:
+      columns.save(cache_fn)
+  return columns.sorted_by_time() if sort_by_time else columns
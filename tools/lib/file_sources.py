@@ -1,9 +1,15 @@
+import os
+import time
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 
+from openpilot.common.utils import atomic_write
+from openpilot.system.hardware.hw import Paths
 from openpilot.tools.lib.comma_car_segments import get_url as get_comma_segments_url
 from openpilot.tools.lib.openpilotci import get_url
-from openpilot.tools.lib.filereader import DATA_ENDPOINT, file_exists, internal_source_available
+from openpilot.tools.lib.filereader import DATA_ENDPOINT, file_exists, internal_source_available, resolve_name
 from openpilot.tools.lib.route import Route, SegmentRange, FileName
+from openpilot.tools.lib.url_file import hash_256
 
 # When passed a tuple of file names, each source will return the first that exists (rlog.zst, rlog.bz2)
 FileNames = tuple[str, ...]
@@ -11,6 +17,14 @@ Source = Callable[[SegmentRange, list[int], FileNames], dict[int, str]]
 
 InternalUnavailableException = Exception("Internal source not available")
 
+# Max concurrent existence checks when resolving a source
+MAX_PROBE_WORKERS = int(os.getenv("FILE_SOURCES_WORKERS", "16"))
+
+# How long existence check results are kept in the download cache when FILEREADER_CACHE is set.
+# Missing files expire sooner since they show up once the segment gets uploaded.
+EXISTS_CACHE_TTL = 24 * 60 * 60
+NOT_EXISTS_CACHE_TTL = 10 * 60
+
 
 def comma_api_source(sr: SegmentRange, seg_idxs: list[int], fns: FileNames) -> dict[int, str]:
   route = Route(sr.route_name)
@@ -40,18 +54,48 @@ def comma_car_segments_source(sr: SegmentRange, seg_idxs: list[int], fns: FileNa
   return eval_source({seg: get_comma_segments_url(sr.route_name, seg) for seg in seg_idxs})
 
 
+def _exists_cache_path(url: str) -> str:
+  return os.path.join(Paths.download_cache_root(), hash_256(url) + "_exists")
+
+
+def cached_file_exists(url: str) -> bool:
+  """file_exists, with remote results persisted in the download cache across processes when FILEREADER_CACHE is set"""
+  if not int(os.environ.get("FILEREADER_CACHE", "0")) or not resolve_name(url).startswith(("http://", "https://")):
+    return file_exists(url)
+
+  cache_path = _exists_cache_path(url)
+  try:
+    with open(cache_path) as f:
+      exists = f.read() == "1"
+    ttl = EXISTS_CACHE_TTL if exists else NOT_EXISTS_CACHE_TTL
+    if time.time() - os.path.getmtime(cache_path) < ttl:  # noqa: TID251
+      return exists
+  except OSError:
+    pass
+
+  exists = file_exists(url)
+  try:
+    os.makedirs(Paths.download_cache_root(), exist_ok=True)
+    with atomic_write(cache_path, mode="w", overwrite=True) as f:
+      f.write("1" if exists else "0")
+  except OSError:
+    pass
+  return exists
+
+
 def eval_source(files: dict[int, list[str] | str]) -> dict[int, str]:
   # Returns valid file URLs given a list of possible file URLs for each segment (e.g. rlog.bz2, rlog.zst)
+  candidates = {seg_idx: [urls] if isinstance(urls, str) else list(urls) for seg_idx, urls in files.items()}
   valid_files: dict[int, str] = {}
 
-  for seg_idx, urls in files.items():
-    if isinstance(urls, str):
-      urls = [urls]
-
-    # Add first valid file URL
-    for url in urls:
-      if file_exists(url):
-        valid_files[seg_idx] = url
-        break
-
-  return valid_files
+  # Check the n-th candidate of all remaining segments concurrently, so that like
+  # the serial version only candidates after a missing one are ever requested
+  with ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS) as executor:
+    for i in range(max((len(urls) for urls in candidates.values()), default=0)):
+      urls = {seg_idx: c[i] for seg_idx, c in candidates.items() if seg_idx not in valid_files and i < len(c)}
+      for (seg_idx, url), exists in zip(urls.items(), executor.map(cached_file_exists, urls.values()), strict=True):
+        if exists:
+          valid_files[seg_idx] = url
+
+  # Keep the order of the input
+  return {seg_idx: valid_files[seg_idx] for seg_idx in files if seg_idx in valid_files}
@@ -87,26 +87,36 @@ class CachedEventReader:
     return getattr(self._evt, name)
 
 
+def decompress_log(dat: bytes, ext: str | None = None) -> bytes:
+  if ext == ".bz2" or dat.startswith(b'BZh9'):
+    return bz2.decompress(dat)
+  elif ext == ".zst" or dat.startswith(b'\x28\xB5\x2F\xFD'):
+    # https://github.com/facebook/zstd/blob/dev/doc/zstd_compression_format.md#zstandard-frames
+    return decompress_stream(dat)
+  return dat
+
+
+def read_log_file(fn: str) -> bytes:
+  """The decompressed bytes of a log file or URL"""
+  _, ext = os.path.splitext(urllib.parse.urlparse(fn).path)
+  if ext not in ('', '.bz2', '.zst'):
+    # old rlogs weren't compressed
+    raise ValueError(f"unknown extension {ext}")
+
+  with FileReader(fn) as f:
+    dat = f.read()
+  return decompress_log(dat, ext)
+
+
 class _LogFileReader:
   def __init__(self, fn, only_union_types=False, sort_by_time=False, dat=None):
     self.data_version = None
     self._only_union_types = only_union_types
 
-    ext = None
     if not dat:
-      _, ext = os.path.splitext(urllib.parse.urlparse(fn).path)
-      if ext not in ('', '.bz2', '.zst'):
-        # old rlogs weren't compressed
-        raise ValueError(f"unknown extension {ext}")
-
-      with FileReader(fn) as f:
-        dat = f.read()
-
-    if ext == ".bz2" or dat.startswith(b'BZh9'):
-      dat = bz2.decompress(dat)
-    elif ext == ".zst" or dat.startswith(b'\x28\xB5\x2F\xFD'):
-      # https://github.com/facebook/zstd/blob/dev/doc/zstd_compression_format.md#zstandard-frames
-      dat = decompress_stream(dat)
+      dat = read_log_file(fn)
+    else:
+      dat = decompress_log(dat)
 
     ents = capnp_log.Event.read_multiple_bytes(dat)
 
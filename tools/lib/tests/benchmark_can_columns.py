@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+
+from openpilot.common.benchmark import benchmark_parser, print_times, time_calls
+from openpilot.tools.lib import cache, can_columns
+from openpilot.tools.lib.can_columns import extract_can, load_can_columns
+from openpilot.tools.lib.logreader import LogReader, read_log_file
+from openpilot.tools.lib.tests.test_can_columns import make_log
+
+
+def capnp_extract(dat: bytes):
+  # what test_models and can_replay did, a builder copy of each event and pycapnp access of each frame
+  can_list = []
+  for msg in LogReader.from_bytes(dat):
+    if msg.which() == 'can':
+      can = msg.as_builder().can
+      can_list.append((msg.logMonoTime, [(f.address, f.dat, f.src) for f in can]))
+  return can_list
+
+
+def benchmark(fn: str | None, n_iters: int):
+  with tempfile.TemporaryDirectory() as tmp:
+    if fn is None:
+      fn = os.path.join(tmp, "rlog")
+      with open(fn, "wb") as f:
+        f.write(make_log(n_events=6000))
+    dat = read_log_file(fn)
+    columns = extract_can(dat)
+    assert columns.to_can_list() == capnp_extract(dat)
+    print(f"{fn}: {len(dat) / 1e6:.1f} MB, {columns.n_events} can events, {len(columns)} frames")
+
+    cache_dir = os.path.join(tmp, "cache")
+    can_columns.cache_path_for_file_path = lambda f: cache.cache_path_for_file_path(f, cache_dir)
+    load_can_columns(fn, cache=True)
+
+    cases = {
+      "pycapnp": lambda: capnp_extract(dat),
+      "extract_can": lambda: extract_can(dat),
+      "extract_can, to_can_list": lambda: extract_can(dat).to_can_list(),
+      "cached": lambda: load_can_columns(fn, cache=True),
+    }
+    for name, f in cases.items():
+      print_times(f"{name:>24}", time_calls(f, n_iters), len(columns) * n_iters, "frame")
+
+
+if __name__ == "__main__":
+  parser = benchmark_parser("Benchmark the columnar CAN extraction against iterating the log with pycapnp")
+  parser.add_argument("fn", nargs="?", help="local rlog, a synthetic log is used if not given")
+  parser.add_argument("--iters", type=int, default=5)
+  args = parser.parse_args()
+  benchmark(args.fn, args.iters)
@@ -0,0 +1,94 @@
+import bz2
+import struct
+import numpy as np
+import pytest
+
+from cereal import messaging
+from openpilot.tools.lib import cache, can_columns
+from openpilot.tools.lib.can_columns import CanColumns, extract_can, load_can_columns
+from openpilot.tools.lib.logreader import LogReader
+
+
+def can_event(rng, t: int, n_frames: int, msgtype: str = 'can') -> bytes:
+  msg = messaging.new_message(msgtype, n_frames)
+  msg.logMonoTime = t
+  for f in getattr(msg, msgtype):
+    f.address = int(rng.integers(0, 1 << 29))
+    f.src = int(rng.integers(0, 256))
+    f.dat = rng.bytes(int(rng.integers(0, 65)))
+  return msg.to_bytes()
+
+
+def make_log(seed: int = 0, n_events: int = 200, big_every: int = 0) -> bytes:
+  rng = np.random.default_rng(seed)
+  msgs = []
+  for i in range(n_events):
+    t = int(1e9) + i * int(1e7) + int(rng.integers(-int(2e7), int(2e7)))
+    # large events spill into more segments, with far pointers
+    n_frames = 2000 if big_every and i % big_every == 0 else int(rng.integers(0, 40))
+    msgs.append(can_event(rng, t, n_frames))
+    msgs.append(can_event(rng, t, int(rng.integers(0, 5)), 'sendcan'))
+    car_state = messaging.new_message('carState')
+    car_state.carState.vEgo = float(i)
+    msgs.append(car_state.to_bytes())
+  return b''.join(msgs)
+
+
+def reference(dat: bytes, msgtype: str = 'can', sort_by_time: bool = False):
+  can_list = [(m.logMonoTime, [(f.address, f.dat, f.src) for f in getattr(m, msgtype)]) for m in LogReader.from_bytes(dat) if m.which() == msgtype]
+  return sorted(can_list, key=lambda x: x[0]) if sort_by_time else can_list
+
+
+class TestCanColumns:
+  @pytest.mark.parametrize("msgtype", ["can", "sendcan"])
+  def test_matches_pycapnp(self, msgtype):
+    dat = make_log()
+    columns = extract_can(dat, msgtype)
+    assert columns.to_can_list() == reference(dat, msgtype)
+    assert len(columns) == columns.event_offsets[-1] == len(columns.bus) == len(columns.dat_offsets) - 1
+    assert columns.mono_time.shape == columns.address.shape
+
+  def test_multi_segment(self):
+    dat = make_log(seed=1, n_events=20, big_every=5)
+    # segment count - 1 of the first message
+    assert struct.unpack_from('<I', dat)[0] > 0
+    assert extract_can(dat).to_can_list() == reference(dat)
+
+  def test_sorted_by_time(self):
+    dat = make_log(seed=2)
+    columns = extract_can(dat)
+    assert not np.all(np.diff(columns.event_mono_time.astype(np.int64)) >= 0)
+    assert columns.sorted_by_time().to_can_list() == reference(dat, sort_by_time=True)
+
+  def test_concatenate(self):
+    logs = [make_log(seed=s, n_events=50) for s in range(3)]
+    columns = CanColumns.concatenate([extract_can(dat) for dat in logs])
+    assert columns.to_can_list() == [c for dat in logs for c in reference(dat)]
+    assert CanColumns.concatenate([]).to_can_list() == []
+    assert CanColumns.from_can_list(columns.to_can_list()).to_can_list() == columns.to_can_list()
+
+  def test_corrupted(self):
+    dat = make_log(n_events=20)
+    with pytest.warns(RuntimeWarning):
+      columns = extract_can(dat[:-100])
+    assert columns.to_can_list() == reference(dat)[:columns.n_events]
+    assert columns.n_events > 0
+    assert extract_can(b'').n_events == 0
+
+  def test_cache(self, tmp_path, monkeypatch):
+    monkeypatch.setattr(can_columns, "cache_path_for_file_path", lambda fn: cache.cache_path_for_file_path(fn, str(tmp_path / "cache")))
+    fn = str(tmp_path / "rlog.bz2")
+    dat = make_log()
+    with open(fn, "wb") as f:
+      f.write(bz2.compress(dat))
+
+    assert load_can_columns(fn, cache=True).to_can_list() == reference(dat)
+    assert len(list((tmp_path / "cache" / "local").iterdir())) == 1
+
+    # from the cache, sorted after loading
+    def no_extract(*args):
+      raise AssertionError
+    monkeypatch.setattr(can_columns, "extract_can", no_extract)
+    assert load_can_columns(fn, cache=True, sort_by_time=True).to_can_list() == reference(dat, sort_by_time=True)
+    with pytest.raises(AssertionError):
+      load_can_columns(fn, cache=False)
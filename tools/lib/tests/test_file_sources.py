@@ -0,0 +1,109 @@
+import http.server
+import os
+import time
+import pytest
+
+from openpilot.selfdrive.test.helpers import http_server_context
+from openpilot.tools.lib import file_sources
+from openpilot.tools.lib.file_sources import eval_source
+from openpilot.tools.lib.filereader import file_exists
+
+
+class FileSourcesRequestHandler(http.server.BaseHTTPRequestHandler):
+  EXISTING: set[str] = set()
+  REQUESTS: list[str] = []
+
+  def do_HEAD(self):
+    self.REQUESTS.append(self.path)
+    if self.path in self.EXISTING:
+      self.send_response(200)
+      self.send_header("Content-Length", "4")
+    else:
+      self.send_response(404)
+    self.end_headers()
+
+  def log_message(self, *args):
+    pass
+
+
+@pytest.fixture
+def host():
+  FileSourcesRequestHandler.EXISTING = set()
+  FileSourcesRequestHandler.REQUESTS = []
+  with http_server_context(handler=FileSourcesRequestHandler) as (host, port):
+    yield f"http://{host}:{port}"
+
+
+@pytest.fixture(autouse=True)
+def download_cache(tmp_path, monkeypatch):
+  monkeypatch.setenv("COMMA_CACHE", str(tmp_path))
+  monkeypatch.delenv("FILEREADER_CACHE", raising=False)
+
+
+@pytest.fixture
+def exists_cache(monkeypatch):
+  monkeypatch.setenv("FILEREADER_CACHE", "1")
+
+
+def candidates(host, n_segs):
+  return {seg: [f"{host}/route/{seg}/rlog.zst", f"{host}/route/{seg}/rlog.bz2"] for seg in range(n_segs)}
+
+
+class TestFileSources:
+  def setup_method(self):
+    file_exists.cache_clear()
+
+  def test_first_existing_candidate(self, host):
+    FileSourcesRequestHandler.EXISTING = {"/route/0/rlog.zst", "/route/0/rlog.bz2", "/route/1/rlog.bz2", "/route/3/rlog.zst"}
+
+    files = eval_source(candidates(host, 4))
+    assert files == {0: f"{host}/route/0/rlog.zst", 1: f"{host}/route/1/rlog.bz2", 3: f"{host}/route/3/rlog.zst"}
+    assert list(files) == [0, 1, 3]
+
+    # candidates after an existing one are never requested
+    assert "/route/0/rlog.bz2" not in FileSourcesRequestHandler.REQUESTS
+    assert "/route/3/rlog.bz2" not in FileSourcesRequestHandler.REQUESTS
+    assert len(FileSourcesRequestHandler.REQUESTS) == 6
+
+  def test_single_url_candidates(self, host):
+    FileSourcesRequestHandler.EXISTING = {"/seg0"}
+    assert eval_source({0: f"{host}/seg0", 1: f"{host}/seg1"}) == {0: f"{host}/seg0"}
+
+  def test_no_persistent_cache(self, host, tmp_path):
+    assert eval_source(candidates(host, 1)) == {}
+    n_requests = len(FileSourcesRequestHandler.REQUESTS)
+
+    # without FILEREADER_CACHE only the in-process cache is used
+    file_exists.cache_clear()
+    assert eval_source(candidates(host, 1)) == {}
+    assert len(FileSourcesRequestHandler.REQUESTS) == 2 * n_requests
+    assert not list(tmp_path.iterdir())
+
+  def test_persistent_cache(self, host, exists_cache):
+    FileSourcesRequestHandler.EXISTING = {"/route/0/rlog.zst", "/route/1/rlog.bz2"}
+    expected = {0: f"{host}/route/0/rlog.zst", 1: f"{host}/route/1/rlog.bz2"}
+    assert eval_source(candidates(host, 3)) == expected
+    n_requests = len(FileSourcesRequestHandler.REQUESTS)
+
+    # results are reused across processes, not just from the in-process cache
+    file_exists.cache_clear()
+    assert eval_source(candidates(host, 3)) == expected
+    assert len(FileSourcesRequestHandler.REQUESTS) == n_requests
+
+  def test_cache_expiry(self, host, exists_cache):
+    assert eval_source(candidates(host, 1)) == {}
+    n_requests = len(FileSourcesRequestHandler.REQUESTS)
+
+    # the file gets uploaded, but the negative result is still cached
+    FileSourcesRequestHandler.EXISTING = {"/route/0/rlog.zst"}
+    file_exists.cache_clear()
+    assert eval_source(candidates(host, 1)) == {}
+    assert len(FileSourcesRequestHandler.REQUESTS) == n_requests
+
+    # age the negative cache entries past their TTL
+    expired = time.time() - file_sources.NOT_EXISTS_CACHE_TTL - 1  # noqa: TID251
+    for url in candidates(host, 1)[0]:
+      os.utime(file_sources._exists_cache_path(url), (expired, expired))
+    file_exists.cache_clear()
+    assert eval_source(candidates(host, 1)) == {0: f"{host}/route/0/rlog.zst"}
+    assert len(FileSourcesRequestHandler.REQUESTS) == n_requests + 1
@@ -1,30 +1,178 @@
 #!/usr/bin/env python3
 import argparse
 import base64
+import concurrent.futures
+import hashlib
 import io
 import os
-import math
 import pprint
 import webbrowser
 from collections import defaultdict
 from pathlib import Path
-import matplotlib.pyplot as plt
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
 from tabulate import tabulate
 
+from openpilot.tools.lib.cache import DEFAULT_CACHE_DIR
 from openpilot.tools.lib.logreader import LogReader
 from openpilot.system.hardware.hw import Paths
 
+# bump when the plots change, to invalidate the cached ones
+PLOT_VERSION = 1
+PLOT_CACHE_DIR = Path(DEFAULT_CACHE_DIR) / "longitudinal_reports"
+
+# the signals of each run, as columns of (name, getter) per service, each with the log times in t
+SIGNALS = {
+  'carControl': (('longActive', lambda m: m.longActive), ('accel', lambda m: m.actuators.accel), ('pitch', lambda m: m.orientationNED[1])),
+  'carOutput': (('accel', lambda m: m.actuatorsOutput.accel),),
+  'carState': (('aEgo', lambda m: m.aEgo), ('vEgo', lambda m: m.vEgo), ('standstill', lambda m: m.cruiseState.standstill),
+               ('gasPressed', lambda m: m.gasPressed), ('brakePressed', lambda m: m.brakePressed)),
+  'livePose': (('accel', lambda m: m.accelerationDevice.x),),
+  'longitudinalPlan': (('aTarget', lambda m: m.aTarget),),
+}
+
+Run = dict[str, dict[str, np.ndarray]]
+
 
 def format_car_params(CP):
   return pprint.pformat({k: v for k, v in CP.to_dict().items() if not k.endswith('DEPRECATED')}, indent=2)
 
 
-def report(platform, route, _description, CP, ID, maneuvers):
+def to_columns(times: dict[str, list[int]], rows: dict[str, list[tuple]]) -> Run:
+  run = {}
+  for service, fields in SIGNALS.items():
+    t = np.array(times[service], dtype=np.int64)
+    values = np.array(rows[service], dtype=np.float64).reshape(-1, len(fields))
+    # relative seconds
+    run[service] = {'t': (t - t[:1]) / 1e9, **{name: values[:, i] for i, (name, _) in enumerate(fields)}}
+  return run
+
+
+def extract_maneuvers(lr) -> list[tuple[str, list[Run]]]:
+  """Splits the log into the runs of each maneuver, and reads the signals of each run into columns in one pass"""
+  maneuvers: list[tuple[str, list[tuple[dict, dict]]]] = []
+  active_prev = False
+  description_prev = None
+
+  for msg in lr:
+    which = msg.which()
+    if which == 'alertDebug':
+      active = 'Maneuver Active' in msg.alertDebug.alertText1
+      if active and not active_prev:
+        run = ({s: [] for s in SIGNALS}, {s: [] for s in SIGNALS})
+        if msg.alertDebug.alertText2 == description_prev:
+          maneuvers[-1][1].append(run)
+        else:
+          maneuvers.append((msg.alertDebug.alertText2, [run]))
+        description_prev = maneuvers[-1][0]
+      active_prev = active
+
+    if active_prev and which in SIGNALS:
+      times, rows = maneuvers[-1][1][-1]
+      m = getattr(msg, which)
+      times[which].append(msg.logMonoTime)
+      rows[which].append(tuple(getter(m) for _, getter in SIGNALS[which]))
+
+  return [(description, [to_columns(*run) for run in runs]) for description, runs in maneuvers]
+
+
+def run_metrics(run: Run, CP) -> dict:
+  cc, cs, lp = run['carControl'], run['carState'], run['livePose']
+  valid = bool(np.all(cc['longActive']) and (not np.any(cs['standstill']) or CP.autoResumeSng))
+
+  # first acceleration target and the first time it's crossed
+  a_target = float(run['longitudinalPlan']['aTarget'][0])
+  crossed = ((0 < a_target) & (a_target < lp['accel'])) | ((0 > a_target) & (a_target > lp['accel']))
+  # Localizer is noisy, require two consecutive 20Hz frames above threshold
+  crossed_twice = crossed[1:] & crossed[:-1]
+  cross_time = float(lp['t'][np.argmax(crossed_twice) + 1]) if np.any(crossed_twice) else None
+
+  return {'valid': valid, 'a_target': a_target, 'cross_time': cross_time, 'pitch': float(np.mean(np.degrees(cc['pitch'])))}
+
+
+def plot_run(run: Run, a_target: float, cross_time: float | None) -> bytes:
+  cc, co, cs, lp, plan = (run[s] for s in SIGNALS)
+  # a Figure without pyplot, so it can be drawn in worker processes
+  with matplotlib.rc_context({'font.size': 40}):
+    fig = Figure(figsize=(30, 26))
+    ax = fig.subplots(4, 1, sharex=True, gridspec_kw={'height_ratios': [5, 3, 1, 1]})
+
+    ax[0].grid(linewidth=4)
+    ax[0].plot(cc['t'], cc['accel'], label='carControl.actuators.accel', linewidth=6)
+    ax[0].plot(co['t'], co['accel'], label='carOutput.actuatorsOutput.accel', linewidth=6)
+    ax[0].plot(plan['t'], plan['aTarget'], label='longitudinalPlan.aTarget', linewidth=6)
+    ax[0].plot(cs['t'], cs['aEgo'], label='carState.aEgo', linewidth=6)
+    ax[0].plot(lp['t'], lp['accel'], label='livePose.accelerationDevice.x', linewidth=6)
+    # TODO localizer accel
+    ax[0].set_ylabel('Acceleration (m/s^2)')
+    #ax[0].set_ylim(-6.5, 6.5)
+    ax[0].legend(prop={'size': 30})
+
+    if cross_time is not None:
+      ax[0].plot(cross_time, a_target, marker='o', markersize=50, markeredgewidth=7, markeredgecolor='black', markerfacecolor='None')
+
+    ax[1].grid(linewidth=4)
+    ax[1].plot(cs['t'], cs['vEgo'], 'g', label='vEgo', linewidth=6)
+    ax[1].set_ylabel('Velocity (m/s)')
+    ax[1].legend()
+
+    ax[2].plot(cc['t'], cc['longActive'], label='longActive', linewidth=6)
+    ax[3].plot(cs['t'], cs['gasPressed'], label='gasPressed', linewidth=6)
+    ax[3].plot(cs['t'], cs['brakePressed'], label='brakePressed', linewidth=6)
+    for i in (2, 3):
+      ax[i].set_yticks([0, 1], minor=False)
+      ax[i].set_ylim(-1, 2)
+      ax[i].legend()
+
+    ax[-1].set_xlabel("Time (s)")
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='webp')
+  return buffer.getvalue()
+
+
+def plot_cache_path(route: str, description: str, run_idx: int, run: Run) -> Path:
+  # the signals are part of the key, so a different split of the route into runs isn't served stale plots
+  h = hashlib.sha256(f"{PLOT_VERSION}\0{route}\0{description}\0{run_idx}".encode())
+  for service in SIGNALS:
+    for col in run[service].values():
+      h.update(col.tobytes())
+  return PLOT_CACHE_DIR / route.replace('/', '_').replace('|', '_') / f"{h.hexdigest()[:32]}.webp"
+
+
+def render_plots(route: str, maneuvers: list[tuple[str, list[Run]]], metrics: list[list[dict]], jobs: int | None, cache: bool) -> list[list[bytes]]:
+  """Plots of all runs, read from the cache or drawn in parallel"""
+  paths = [[plot_cache_path(route, description, i, run) for i, run in enumerate(runs)] for description, runs in maneuvers]
+  plots = [[b''] * len(runs) for _, runs in maneuvers]
+  futures: dict[tuple[int, int], concurrent.futures.Future] = {}
+  with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+    for i, (description, runs) in enumerate(maneuvers):
+      for j, run in enumerate(runs):
+        if cache and paths[i][j].exists():
+          plots[i][j] = paths[i][j].read_bytes()
+        else:
+          futures[i, j] = pool.submit(plot_run, run, metrics[i][j]['a_target'], metrics[i][j]['cross_time'])
+      print(f'plotting maneuver: {description}, runs: {len(runs)}, cached: {sum((i, j) not in futures for j in range(len(runs)))}')
+
+    for (i, j), future in futures.items():
+      plots[i][j] = future.result()
+      if cache:
+        paths[i][j].parent.mkdir(parents=True, exist_ok=True)
+        paths[i][j].write_bytes(plots[i][j])
+  return plots
+
+
+def report(platform, route, _description, CP, ID, maneuvers, jobs=None, cache=True):
   output_path = Path(__file__).resolve().parent / "longitudinal_reports"
   output_fn = output_path / f"{platform}_{route.replace('/', '_')}.html"
   output_path.mkdir(exist_ok=True)
   target_cross_times = defaultdict(list)
 
+  metrics = [[run_metrics(run, CP) for run in runs] for _, runs in maneuvers]
+  plots = render_plots(route, maneuvers, metrics, jobs, cache)
+
   builder = [
     "<style>summary { cursor: pointer; }\n td, th { padding: 8px; } </style>\n",
     "<h1>Longitudinal maneuver report</h1>\n",
@@ -36,95 +184,28 @@ def report(platform, route, _description, CP, ID, maneuvers):
     builder.append(f"<h3>Description: {_description}</h3>\n")
   builder.append(f"<details><summary><h3 style='display: inline-block;'>CarParams</h3></summary><pre>{format_car_params(CP)}</pre></details>\n")
   builder.append('{ summary }')  # to be replaced below
-  for description, runs in maneuvers:
-    print(f'plotting maneuver: {description}, runs: {len(runs)}')
+  for (description, _), maneuver_metrics, maneuver_plots in zip(maneuvers, metrics, plots, strict=True):
     builder.append("<div style='border-top: 1px solid #000; margin: 20px 0;'></div>\n")
     builder.append(f"<h2>{description}</h2>\n")
-    for run, msgs in enumerate(runs):
-      t_carControl, carControl = zip(*[(m.logMonoTime, m.carControl) for m in msgs if m.which() == 'carControl'], strict=True)
-      t_carOutput, carOutput = zip(*[(m.logMonoTime, m.carOutput) for m in msgs if m.which() == 'carOutput'], strict=True)
-      t_carState, carState = zip(*[(m.logMonoTime, m.carState) for m in msgs if m.which() == 'carState'], strict=True)
-      t_livePose, livePose = zip(*[(m.logMonoTime, m.livePose) for m in msgs if m.which() == 'livePose'], strict=True)
-      t_longitudinalPlan, longitudinalPlan = zip(*[(m.logMonoTime, m.longitudinalPlan) for m in msgs if m.which() == 'longitudinalPlan'], strict=True)
-
-      # make time relative seconds
-      t_carControl = [(t - t_carControl[0]) / 1e9 for t in t_carControl]
-      t_carOutput = [(t - t_carOutput[0]) / 1e9 for t in t_carOutput]
-      t_carState = [(t - t_carState[0]) / 1e9 for t in t_carState]
-      t_livePose = [(t - t_livePose[0]) / 1e9 for t in t_livePose]
-      t_longitudinalPlan = [(t - t_longitudinalPlan[0]) / 1e9 for t in t_longitudinalPlan]
-
-      # maneuver validity
-      longActive = [m.longActive for m in carControl]
-      maneuver_valid = all(longActive) and (not any(cs.cruiseState.standstill for cs in carState) or CP.autoResumeSng)
-
+    for run, (m, plot) in enumerate(zip(maneuver_metrics, maneuver_plots, strict=True)):
+      maneuver_valid = m['valid']
       _open = 'open' if maneuver_valid else ''
       title = f'Run #{int(run)+1}' + (' <span style="color: red">(invalid maneuver!)</span>' if not maneuver_valid else '')
 
       builder.append(f"<details {_open}><summary><h3 style='display: inline-block;'>{title}</h3></summary>\n")
 
-      # get first acceleration target and first intersection
-      aTarget = longitudinalPlan[0].aTarget
-      target_cross_time = None
-      builder.append(f'<h3 style="font-weight: normal">Initial aTarget: {round(aTarget, 2)} m/s^2')
-
-      # Localizer is noisy, require two consecutive 20Hz frames above threshold
-      prev_crossed = False
-      for t, lp in zip(t_livePose, livePose, strict=True):
-        crossed = (0 < aTarget < lp.accelerationDevice.x) or (0 > aTarget > lp.accelerationDevice.x)
-        if crossed and prev_crossed:
-          builder.append(f', <strong>crossed in {t:.3f}s</strong>')
-          target_cross_time = t
-          if maneuver_valid:
-            target_cross_times[description].append(t)
-          break
-        prev_crossed = crossed
+      builder.append(f'<h3 style="font-weight: normal">Initial aTarget: {round(m["a_target"], 2)} m/s^2')
+      if m['cross_time'] is not None:
+        builder.append(f', <strong>crossed in {m["cross_time"]:.3f}s</strong>')
+        if maneuver_valid:
+          target_cross_times[description].append(m['cross_time'])
       else:
         builder.append(', <strong>not crossed</strong>')
       builder.append('</h3>')
 
-      pitches = [math.degrees(m.orientationNED[1]) for m in carControl]
-      builder.append(f'<h3 style="font-weight: normal">Average pitch: <strong>{sum(pitches) / len(pitches):0.2f} degrees</strong></h3>')
-
-      plt.rcParams['font.size'] = 40
-      fig = plt.figure(figsize=(30, 26))
-      ax = fig.subplots(4, 1, sharex=True, gridspec_kw={'height_ratios': [5, 3, 1, 1]})
-
-      ax[0].grid(linewidth=4)
-      ax[0].plot(t_carControl, [m.actuators.accel for m in carControl], label='carControl.actuators.accel', linewidth=6)
-      ax[0].plot(t_carOutput, [m.actuatorsOutput.accel for m in carOutput], label='carOutput.actuatorsOutput.accel', linewidth=6)
-      ax[0].plot(t_longitudinalPlan, [m.aTarget for m in longitudinalPlan], label='longitudinalPlan.aTarget', linewidth=6)
-      ax[0].plot(t_carState, [m.aEgo for m in carState], label='carState.aEgo', linewidth=6)
-      ax[0].plot(t_livePose, [m.accelerationDevice.x for m in livePose], label='livePose.accelerationDevice.x', linewidth=6)
-      # TODO localizer accel
-      ax[0].set_ylabel('Acceleration (m/s^2)')
-      #ax[0].set_ylim(-6.5, 6.5)
-      ax[0].legend(prop={'size': 30})
-
-      if target_cross_time is not None:
-        ax[0].plot(target_cross_time, aTarget, marker='o', markersize=50, markeredgewidth=7, markeredgecolor='black', markerfacecolor='None')
-
-      ax[1].grid(linewidth=4)
-      ax[1].plot(t_carState, [m.vEgo for m in carState], 'g', label='vEgo', linewidth=6)
-      ax[1].set_ylabel('Velocity (m/s)')
-      ax[1].legend()
-
-      ax[2].plot(t_carControl, longActive, label='longActive', linewidth=6)
-      ax[3].plot(t_carState, [m.gasPressed for m in carState], label='gasPressed', linewidth=6)
-      ax[3].plot(t_carState, [m.brakePressed for m in carState], label='brakePressed', linewidth=6)
-      for i in (2, 3):
-        ax[i].set_yticks([0, 1], minor=False)
-        ax[i].set_ylim(-1, 2)
-        ax[i].legend()
-
-      ax[-1].set_xlabel("Time (s)")
-      fig.tight_layout()
-
-      buffer = io.BytesIO()
-      fig.savefig(buffer, format='webp')
-      plt.close(fig)
-      buffer.seek(0)
-      builder.append(f"<img src='data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}' style='width:100%; max-width:800px;'>\n")
+      builder.append(f'<h3 style="font-weight: normal">Average pitch: <strong>{m["pitch"]:0.2f} degrees</strong></h3>')
+
+      builder.append(f"<img src='data:image/webp;base64,{base64.b64encode(plot).decode()}' style='width:100%; max-width:800px;'>\n")
       builder.append("</details>\n")
 
   summary = ["<h2>Summary</h2>\n"]
@@ -152,6 +233,8 @@ if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='Generate longitudinal maneuver report from route')
   parser.add_argument('route', type=str, help='Route name (e.g. 00000000--5f742174be)')
   parser.add_argument('description', type=str, nargs='?')
+  parser.add_argument('-j', '--jobs', type=int, default=None, help='processes drawing the plots, one per core by default')
+  parser.add_argument('--no-cache', action='store_true', help=f'redraw all plots instead of reusing the ones in {PLOT_CACHE_DIR}')
 
   args = parser.parse_args()
 
@@ -166,22 +249,5 @@ if __name__ == '__main__':
   platform = CP.carFingerprint
   print('processing report for', platform)
 
-  maneuvers: list[tuple[str, list[list]]] = []
-  active_prev = False
-  description_prev = None
-
-  for msg in lr:
-    if msg.which() == 'alertDebug':
-      active = 'Maneuver Active' in msg.alertDebug.alertText1
-      if active and not active_prev:
-        if msg.alertDebug.alertText2 == description_prev:
-          maneuvers[-1][1].append([])
-        else:
-          maneuvers.append((msg.alertDebug.alertText2, [[]]))
-        description_prev = maneuvers[-1][0]
-      active_prev = active
-
-    if active_prev:
-      maneuvers[-1][1][-1].append(msg)
-
-  report(platform, args.route, args.description, CP, ID, maneuvers)
+  maneuvers = extract_maneuvers(lr)
+  report(platform, args.route, args.description, CP, ID, maneuvers, args.jobs, not args.no_cache)
@@ -8,7 +8,7 @@ import threading
 os.environ['FILEREADER_CACHE'] = '1'
 
 from openpilot.common.realtime import config_realtime_process, Ratekeeper, DT_CTRL
-from openpilot.selfdrive.pandad import can_capnp_to_list
+from openpilot.tools.lib.can_columns import CanColumns, load_can_columns
 from openpilot.tools.lib.logreader import LogReader
 from panda import PandaJungle
 
@@ -86,8 +86,8 @@ def load_route(route_or_segment_name):
   lr = LogReader(route_or_segment_name)
   CP = lr.first("carParams")
   print(f"carFingerprint: '{CP.carFingerprint}'")
-  mbytes = [m.as_builder().to_bytes() for m in lr if m.which() == 'can']
-  return [m[1] for m in can_capnp_to_list(mbytes)]
+  columns = CanColumns.concatenate([load_can_columns(fn) for fn in lr.logreader_identifiers])
+  return [frames for _, frames in columns.to_can_list()]
 
 
 if __name__ == "__main__":
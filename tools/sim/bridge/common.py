@@ -1,6 +1,7 @@
 import signal
 import threading
 import functools
+import time
 import numpy as np
 
 from collections import namedtuple
@@ -8,9 +9,10 @@ from enum import Enum
 from multiprocessing import Process, Queue, Value
 from abc import ABC, abstractmethod
 
+import cereal.messaging as messaging
 from opendbc.car.honda.values import CruiseButtons
 from openpilot.common.params import Params
-from openpilot.common.realtime import Ratekeeper
+from openpilot.common.realtime import DT_CTRL, Ratekeeper
 from openpilot.selfdrive.test.helpers import set_params_enabled
 from openpilot.tools.sim.lib.common import SimulatorState, World
 from openpilot.tools.sim.lib.simulated_car import SimulatedCar
@@ -18,6 +20,11 @@ from openpilot.tools.sim.lib.simulated_sensors import SimulatedSensors
 
 QueueMessage = namedtuple("QueueMessage", ["type", "info"], defaults=[None])
 
+# in lockstep, how long to wait for openpilot to respond to a tick once it has responded before.
+# lockstep runs faster than real time, the SubMaster alive and frequency checks that would fail
+# are relaxed in openpilot's processes by SIMULATION, which launch_openpilot.sh sets
+LOCKSTEP_TIMEOUT = 1.
+
 class QueueMessageType(Enum):
   START_STATUS = 0
   CONTROL_COMMAND = 1
@@ -37,7 +44,7 @@ def rk_loop(function, hz, exit_event: threading.Event):
 class SimulatorBridge(ABC):
   TICKS_PER_FRAME = 5
 
-  def __init__(self, dual_camera, high_quality):
+  def __init__(self, dual_camera, high_quality, lockstep=False, cpu_yuv=False):
     set_params_enabled()
     self.params = Params()
     self.params.put_bool("AlphaLongitudinalEnabled", True)
@@ -46,6 +53,10 @@ class SimulatorBridge(ABC):
 
     self.dual_camera = dual_camera
     self.high_quality = high_quality
+    # advance the world, simulated car and sensors, and openpilot one tick at a time instead of in real time
+    self.lockstep = lockstep
+    self.cpu_yuv = cpu_yuv
+    self.frame = 0
 
     self._exit_event: threading.Event | None = None
     self._threads = []
@@ -98,21 +109,32 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
   def spawn_world(self, q: Queue) -> World:
     pass
 
+  def lockstep_wait(self, service: str, sent_nanos: int):
+    """Wait for openpilot's response to what was sent at sent_nanos, before it's running just for a tick"""
+    timeout = LOCKSTEP_TIMEOUT if self.lockstep_sm.seen[service] else DT_CTRL
+    deadline = time.monotonic() + timeout
+    while self.lockstep_sm.logMonoTime[service] < sent_nanos and time.monotonic() < deadline:
+      self.lockstep_sm.update(max(int((deadline - time.monotonic()) * 1000), 1))
+
   def _run(self, q: Queue):
     self.world = self.spawn_world(q)
 
     self.simulated_car = SimulatedCar()
-    self.simulated_sensors = SimulatedSensors(self.dual_camera)
+    self.simulated_sensors = SimulatedSensors(self.dual_camera, self.cpu_yuv)
 
     self._exit_event = threading.Event()
 
-    self.simulated_car_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_car.update, self.simulator_state),
-                                                                        100, self._exit_event))
-    self.simulated_car_thread.start()
+    if self.lockstep:
+      # the car and camera are sent from the loop below, each followed by waiting for openpilot to process it
+      self.lockstep_sm = messaging.SubMaster(['carControl', 'modelV2'])
+    else:
+      self.simulated_car_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_car.update, self.simulator_state),
+                                                                          100, self._exit_event))
+      self.simulated_car_thread.start()
 
-    self.simulated_camera_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_sensors.send_camera_images, self.world),
-                                                                        20, self._exit_event))
-    self.simulated_camera_thread.start()
+      self.simulated_camera_thread = threading.Thread(target=rk_loop, args=(functools.partial(self.simulated_sensors.send_camera_images, self.world),
+                                                                          20, self._exit_event))
+      self.simulated_camera_thread.start()
 
     # Simulation tends to be slow in the initial steps. This prevents lagging later
     for _ in range(20):
@@ -167,7 +189,12 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
       steer_manual = steer_manual * -40
 
       # Update openpilot on current sensor state
-      self.simulated_sensors.update(self.simulator_state, self.world)
+      self.simulated_sensors.update(self.simulator_state, self.world, self.frame * DT_CTRL if self.lockstep else None)
+
+      if self.lockstep:
+        sent_nanos = time.monotonic_ns()
+        self.simulated_car.update(self.simulator_state)
+        self.lockstep_wait('carControl', sent_nanos)
 
       self.simulated_car.sm.update(0)
       self.simulator_state.is_engaged = self.simulated_car.sm['selfdriveState'].active
@@ -193,14 +220,21 @@ Ignition: {self.simulator_state.ignition} Engaged: {self.simulator_state.is_enga
       if self.world.exit_event.is_set():
         self.shutdown()
 
-      if self.rk.frame % self.TICKS_PER_FRAME == 0:
+      if self.frame % self.TICKS_PER_FRAME == 0:
         self.world.tick()
         self.world.read_cameras()
 
+        if self.lockstep:
+          sent_nanos = time.monotonic_ns()
+          self.simulated_sensors.send_camera_images(self.world)
+          self.lockstep_wait('modelV2', sent_nanos)
+
       # don't print during test, so no print/IO Block between OP and metadrive processes
-      if not self.test_run and self.rk.frame % 25 == 0:
+      if not self.test_run and self.frame % 25 == 0:
         self.print_status()
 
       self.started.value = True
 
-      self.rk.keep_time()
+      self.frame += 1
+      if not self.lockstep:
+        self.rk.keep_time()
@@ -0,0 +1,19 @@
+import math
+from multiprocessing import Queue
+
+from openpilot.common.realtime import DT_CTRL
+from openpilot.tools.sim.bridge.common import SimulatorBridge
+from openpilot.tools.sim.bridge.stub.stub_world import StubWorld
+
+
+class StubBridge(SimulatorBridge):
+  TICKS_PER_FRAME = 5
+
+  def __init__(self, dual_camera, high_quality, test_duration=math.inf, test_run=False, lockstep=False, cpu_yuv=False):
+    super().__init__(dual_camera, high_quality, lockstep, cpu_yuv)
+
+    self.test_run = test_run
+    self.test_duration = test_duration if self.test_run else math.inf
+
+  def spawn_world(self, queue: Queue):
+    return StubWorld(queue, self.TICKS_PER_FRAME * DT_CTRL, self.test_duration, self.test_run, self.dual_camera)
@@ -0,0 +1,128 @@
+import math
+import numpy as np
+
+from openpilot.common.transformations.camera import DEVICE_CAMERAS
+from openpilot.tools.sim.bridge.common import QueueMessage, QueueMessageType
+from openpilot.tools.sim.lib.common import SimulatorState, World, vec3
+from openpilot.tools.sim.lib.camerad import W, H
+
+CAMERA_CONFIG = DEVICE_CAMERAS[("pc", "unknown")]
+CAMERA_HEIGHT = 1.22
+
+# a Honda Civic 2022, like the simulated car
+WHEELBASE = 2.7
+STEER_RATIO = 15.38
+# the bridge maps accel to throttle and brake with these
+MAX_ACCEL = 1.6
+MAX_BRAKE = 4.0
+DRAG = 0.0005  # 1/m, deceleration per (m/s)^2
+
+# a straight two lane road along x, the car starts in the center of the right lane
+LANE_WIDTH = 3.7
+LANE_LINES = ((-LANE_WIDTH / 2, False), (LANE_WIDTH / 2, True), (LANE_WIDTH * 3 / 2, False))  # (y, dashed)
+LINE_WIDTH = 0.15
+DASH_LENGTH = 3.
+MAX_LINE_DISTANCE = 150.
+
+# BGR, like the metadrive images
+SKY_COLOR = (200, 160, 120)
+ROAD_COLOR = (90, 90, 90)
+LINE_COLOR = (230, 230, 230)
+
+
+class StubWorld(World):
+  """Lightweight built in world: a kinematic bicycle model on a straight road, with procedurally drawn camera images.
+
+  Everything advances by dt per tick, so runs are deterministic."""
+  def __init__(self, status_q, dt, test_duration=math.inf, test_run=False, dual_camera=False):
+    super().__init__(dual_camera)
+    self.status_q = status_q
+    self.dt = dt
+    self.test_duration = test_duration
+    self.test_run = test_run
+
+    self.background = np.empty((H, W, 3), dtype=np.uint8)
+    self.background[:H // 2] = SKY_COLOR
+    self.background[H // 2:] = ROAD_COLOR
+    self.cameras = [(self.road_image, CAMERA_CONFIG.fcam.focal_length)]
+    if dual_camera:
+      self.cameras.append((self.wide_road_image, CAMERA_CONFIG.ecam.focal_length))
+
+    self.status_q.put(QueueMessage(QueueMessageType.START_STATUS, "started"))
+    self.reset()
+
+  def reset(self):
+    self.t = 0.
+    self.x = self.y = self.heading = 0.
+    self.v = self.accel = 0.
+    self.steering_angle = 0.
+    self.done = False
+
+  def apply_controls(self, steer_angle, throttle_out, brake_out):
+    # actuators respond immediately
+    self.steering_angle = steer_angle
+    self.accel = throttle_out * MAX_ACCEL - brake_out * MAX_BRAKE
+
+  def tick(self):
+    if self.done:
+      return
+
+    a = self.accel - DRAG * self.v**2
+    self.v = max(self.v + a * self.dt, 0.)
+    yaw_rate = self.v * math.tan(math.radians(self.steering_angle) / STEER_RATIO) / WHEELBASE
+    self.heading += yaw_rate * self.dt
+    self.x += self.v * math.cos(self.heading) * self.dt
+    self.y += self.v * math.sin(self.heading) * self.dt
+    self.t += self.dt
+
+    done_info = {}
+    if self.t >= self.test_duration:
+      done_info["timeout"] = True
+    if self.test_run and abs(self.y) > LANE_WIDTH / 2:
+      done_info["out_of_lane"] = True
+    if done_info:
+      self.done = True
+      self.status_q.put(QueueMessage(QueueMessageType.TERMINATION_INFO, done_info))
+      self.exit_event.set()
+
+  def read_state(self):
+    pass
+
+  def read_sensors(self, state: SimulatorState):
+    state.velocity = vec3(x=self.v * math.cos(self.heading), y=self.v * math.sin(self.heading), z=0)
+    state.bearing = math.degrees(self.heading)
+    state.steering_angle = self.steering_angle
+    state.gps.from_xy((self.x, self.y))
+    state.valid = True
+
+  def render(self, img: np.ndarray, focal_length: float):
+    np.copyto(img, self.background)
+
+    # ground distance of each row below the horizon, then the lane lines' column on it
+    rows = np.arange(H // 2 + 1, H)
+    dist = focal_length * CAMERA_HEIGHT / (rows - H / 2)
+    visible = dist < MAX_LINE_DISTANCE
+    rows, dist = rows[visible], dist[visible]
+    cos_h, sin_h = math.cos(self.heading), math.sin(self.heading)
+    for line_y, dashed in LANE_LINES:
+      dy = line_y - self.y
+      left = dy / cos_h - dist * math.tan(self.heading)
+      center = W / 2 - focal_length * left / dist
+      half_width = np.maximum(focal_length * LINE_WIDTH / 2 / dist, 0.5)
+      draw = (center + half_width >= 0) & (center - half_width < W)
+      if dashed:
+        x = self.x + (dist - dy * sin_h) / cos_h
+        draw &= (x % (2 * DASH_LENGTH)) < DASH_LENGTH
+      starts = np.clip(center - half_width, 0, W).astype(int)
+      ends = np.clip(center + half_width, 0, W).astype(int)
+      for row, start, end in zip(rows[draw], starts[draw], ends[draw], strict=True):
+        img[row, start:end + 1] = LINE_COLOR
+
+  def read_cameras(self):
+    for img, focal_length in self.cameras:
+      self.render(img, focal_length)
+    self.image_lock.release()
+
+  def close(self, reason: str):
+    self.status_q.put(QueueMessage(QueueMessageType.CLOSE_STATUS, reason))
+    self.exit_event.set()
@@ -1,7 +1,5 @@
 import numpy as np
 import os
-import pyopencl as cl
-import pyopencl.array as cl_array
 
 from msgq.visionipc import VisionIpcServer, VisionStreamType
 from cereal import messaging
@@ -9,9 +7,40 @@ from cereal import messaging
 from openpilot.common.basedir import BASEDIR
 from openpilot.tools.sim.lib.common import W, H
 
+def rgb_to_nv12(bgr: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+  """CPU version of the rgb_to_nv12.cl kernel, same integer math and BGR channel order"""
+  h, w, _ = bgr.shape
+  if out is None:
+    out = np.empty(h * w * 3 // 2, dtype=np.uint8)
+
+  # planar, no intermediate result of the kernel's math overflows 16 bits
+  b, g, r = np.moveaxis(bgr, 2, 0).astype(np.uint16)
+  y = b * 13
+  y += g * 65
+  y += r * 33
+  y += 64
+  y >>= 7
+  y += 16
+  out[:h * w].reshape(h, w)[:] = y
+
+  # sum of each 2x2 square, halved
+  def average(c):
+    s = c[0::2, 0::2] + c[0::2, 1::2]
+    s += c[1::2, 0::2]
+    s += c[1::2, 1::2]
+    s += 1
+    s >>= 1
+    return s
+  ab, ag, ar = average(b), average(g), average(r)
+  uv = out[h * w:].reshape(h // 2, w // 2, 2)
+  uv[..., 0] = (ab * 56 + 0x8080 - ag * 37 - ar * 19) >> 8
+  uv[..., 1] = (ar * 56 + 0x8080 - ag * 47 - ab * 9) >> 8
+  return out
+
+
 class Camerad:
   """Simulates the camerad daemon"""
-  def __init__(self, dual_camera):
+  def __init__(self, dual_camera, cpu_yuv=False):
     self.pm = messaging.PubMaster(['roadCameraState', 'wideRoadCameraState'])
 
     self.frame_road_id = 0
@@ -24,7 +53,15 @@ class Camerad:
 
     self.vipc_server.start_listener()
 
+    self.cpu_yuv = cpu_yuv
+    if cpu_yuv:
+      self.yuv = np.empty(W * H * 3 // 2, dtype=np.uint8)
+      return
+
     # set up for pyopencl rgb to yuv conversion
+    import pyopencl as cl
+    import pyopencl.array as cl_array
+    self.cl_array = cl_array
     self.ctx = cl.create_some_context()
     self.queue = cl.CommandQueue(self.ctx)
     cl_arg = f" -DHEIGHT={H} -DWIDTH={W} -DRGB_STRIDE={W * 3} -DUV_WIDTH={W // 2} -DUV_HEIGHT={H // 2} -DRGB_SIZE={W * H} -DCL_DEBUG "
@@ -49,8 +86,11 @@ class Camerad:
     assert rgb.shape == (H, W, 3), f"{rgb.shape}"
     assert rgb.dtype == np.uint8
 
-    rgb_cl = cl_array.to_device(self.queue, rgb)
-    yuv_cl = cl_array.empty_like(rgb_cl)
+    if self.cpu_yuv:
+      return rgb_to_nv12(rgb, self.yuv).data
+
+    rgb_cl = self.cl_array.to_device(self.queue, rgb)
+    yuv_cl = self.cl_array.empty_like(rgb_cl)
     self.krnl(self.queue, (self.Wdiv4, self.Hdiv4), None, rgb_cl.data, yuv_cl.data).wait()
     yuv = np.resize(yuv_cl.get(), rgb.size // 2)
     return yuv.data.tobytes()
@@ -14,9 +14,9 @@ if TYPE_CHECKING:
 class SimulatedSensors:
   """Simulates the C3 sensors (acc, gyro, gps, peripherals, dm state, cameras) to OpenPilot"""
 
-  def __init__(self, dual_camera=False):
+  def __init__(self, dual_camera=False, cpu_yuv=False):
     self.pm = messaging.PubMaster(['accelerometer', 'gyroscope', 'gpsLocationExternal', 'driverStateV2', 'driverMonitoringState', 'peripheralState'])
-    self.camerad = Camerad(dual_camera=dual_camera)
+    self.camerad = Camerad(dual_camera=dual_camera, cpu_yuv=cpu_yuv)
     self.last_perp_update = 0
     self.last_dmon_update = 0
 
@@ -108,8 +108,10 @@ class SimulatedSensors:
       yuv = self.camerad.rgb_to_yuv(world.wide_road_image)
       self.camerad.cam_send_yuv_wide_road(yuv)
 
-  def update(self, simulator_state: 'SimulatorState', world: 'World'):
-    now = time.monotonic()
+  def update(self, simulator_state: 'SimulatorState', world: 'World', now: float | None = None):
+    # lockstep runs pass the simulation time
+    if now is None:
+      now = time.monotonic()
     self.send_imu_message(simulator_state)
     self.send_gps_message(simulator_state)
 
@@ -4,12 +4,16 @@ import argparse
 from typing import Any
 from multiprocessing import Queue
 
-from openpilot.tools.sim.bridge.metadrive.metadrive_bridge import MetaDriveBridge
 
-def create_bridge(dual_camera, high_quality):
+def create_bridge(dual_camera, high_quality, sim="metadrive", lockstep=False, cpu_yuv=False):
   queue: Any = Queue()
 
-  simulator_bridge = MetaDriveBridge(dual_camera, high_quality)
+  if sim == "stub":
+    from openpilot.tools.sim.bridge.stub.stub_bridge import StubBridge
+    simulator_bridge = StubBridge(dual_camera, high_quality, lockstep=lockstep, cpu_yuv=cpu_yuv)
+  else:
+    from openpilot.tools.sim.bridge.metadrive.metadrive_bridge import MetaDriveBridge
+    simulator_bridge = MetaDriveBridge(dual_camera, high_quality, cpu_yuv=cpu_yuv)
   simulator_process = simulator_bridge.run(queue)
 
   return queue, simulator_process, simulator_bridge
@@ -23,13 +27,19 @@ def parse_args(add_args=None):
   parser.add_argument('--joystick', action='store_true')
   parser.add_argument('--high_quality', action='store_true')
   parser.add_argument('--dual_camera', action='store_true')
+  parser.add_argument('--sim', choices=['metadrive', 'stub'], default='metadrive', help='stub is a built in straight road, without rendering dependencies')
+  parser.add_argument('--lockstep', action='store_true', help='advance the simulation and openpilot tick by tick, as fast as they run (stub only)')
+  parser.add_argument('--cpu_yuv', action='store_true', help='convert the camera images to NV12 on the CPU instead of with OpenCL')
 
-  return parser.parse_args(add_args)
+  args = parser.parse_args(add_args)
+  if args.lockstep and args.sim != 'stub':
+    parser.error('--lockstep is only supported with --sim stub, metadrive runs in real time')
+  return args
 
 if __name__ == "__main__":
   args = parse_args()
 
-  queue, simulator_process, simulator_bridge = create_bridge(args.dual_camera, args.high_quality)
+  queue, simulator_process, simulator_bridge = create_bridge(args.dual_camera, args.high_quality, args.sim, args.lockstep, args.cpu_yuv)
 
   if args.joystick:
     # start input poll for joystick
@@ -0,0 +1,30 @@
+import numpy as np
+
+from openpilot.tools.sim.lib.camerad import rgb_to_nv12
+
+
+def kernel_rgb_to_nv12(bgr: np.ndarray) -> np.ndarray:
+  # a pixel at a time port of rgb_to_nv12.cl
+  h, w, _ = bgr.shape
+  bgr = bgr.astype(int)
+  out = np.zeros(h * w * 3 // 2, dtype=np.uint8)
+  for row in range(h):
+    for col in range(w):
+      b, g, r = bgr[row, col]
+      out[row * w + col] = (((b * 13 + g * 65 + r * 33) + 64) >> 7) + 16
+  for row in range(0, h, 2):
+    for col in range(0, w, 2):
+      ab, ag, ar = ((bgr[row, col] + bgr[row, col + 1] + bgr[row + 1, col] + bgr[row + 1, col + 1] + 1) >> 1)
+      uvi = h * w + row // 2 * w + col
+      out[uvi] = (ab * 56 - ag * 37 - ar * 19 + 0x8080) >> 8
+      out[uvi + 1] = (ar * 56 - ag * 47 - ab * 9 + 0x8080) >> 8
+  return out
+
+
+def test_rgb_to_nv12():
+  rng = np.random.default_rng(0)
+  for bgr in (rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), np.zeros((4, 8, 3), dtype=np.uint8), np.full((4, 8, 3), 255, dtype=np.uint8)):
+    np.testing.assert_array_equal(rgb_to_nv12(bgr), kernel_rgb_to_nv12(bgr))
+
+  out = np.empty(4 * 8 * 3 // 2, dtype=np.uint8)
+  assert rgb_to_nv12(bgr, out) is out
@@ -0,0 +1,69 @@
+import queue
+import numpy as np
+import pytest
+
+from openpilot.tools.sim.bridge.common import QueueMessageType
+from openpilot.tools.sim.bridge.stub.stub_bridge import StubBridge
+from openpilot.tools.sim.bridge.stub.stub_world import LANE_WIDTH, LINE_COLOR, StubWorld
+from openpilot.tools.sim.lib.common import SimulatorState
+from openpilot.tools.sim.tests.test_sim_bridge import TestSimBridgeBase
+
+
+def drive(n_ticks: int, steer: float, test_run: bool = False) -> tuple[StubWorld, queue.Queue]:
+  q: queue.Queue = queue.Queue()
+  world = StubWorld(q, 0.05, test_duration=n_ticks * 0.05, test_run=test_run)
+  for _ in range(n_ticks):
+    world.apply_controls(steer, 0.5, 0.)
+    world.tick()
+  return world, q
+
+
+class TestStubWorld:
+  def test_deterministic(self):
+    a, _ = drive(200, 20.)
+    b, _ = drive(200, 20.)
+    a.read_cameras()
+    b.read_cameras()
+    assert (a.x, a.y, a.heading, a.v) == (b.x, b.y, b.heading, b.v)
+    np.testing.assert_array_equal(a.road_image, b.road_image)
+
+  def test_drive(self):
+    world, q = drive(200, 0.)
+    assert world.v == pytest.approx(0.8 * 10, rel=0.05)
+    assert world.x == pytest.approx(0.8 * 10**2 / 2, rel=0.05)
+    assert world.y == 0.
+
+    state = SimulatorState()
+    world.read_sensors(state)
+    assert state.valid
+    assert state.speed == world.v
+
+    messages = [q.get_nowait() for _ in range(q.qsize())]
+    assert messages[-1].type == QueueMessageType.TERMINATION_INFO
+    assert messages[-1].info == {"timeout": True}
+    assert world.exit_event.is_set()
+
+  def test_out_of_lane(self):
+    world, q = drive(400, 90., test_run=True)
+    assert abs(world.y) > LANE_WIDTH / 2
+    assert "out_of_lane" in [m for m in (q.get_nowait() for _ in range(q.qsize())) if m.type == QueueMessageType.TERMINATION_INFO][0].info
+
+  def test_camera(self):
+    world, _ = drive(1, 0.)
+    world.read_cameras()
+    assert world.image_lock.acquire(timeout=0)
+    # lane lines on the road on both sides of the car
+    H, W, _ = world.road_image.shape
+    _, cols = np.nonzero(np.all(world.road_image == LINE_COLOR, axis=2))
+    assert cols.min() < W / 2 < cols.max()
+    assert not np.any(np.all(world.road_image[:H // 2] == LINE_COLOR, axis=2))
+
+
+@pytest.mark.slow
+class TestStubBridge(TestSimBridgeBase):
+  @pytest.fixture(autouse=True)
+  def setup_create_bridge(self, test_duration):
+    self.test_duration = 30
+
+  def create_bridge(self):
+    return StubBridge(False, False, self.test_duration, True, lockstep=True, cpu_yuv=True)